@@ -0,0 +1,105 @@
+"""
+Benchmark the lookup of email domains in the blacklist of SpamModerator.
+
+It compares the query run before for every comment posted, that matched
+exact domains, with the DomainMatcher of django_comments_ink.blacklist,
+that matches subdomains too and is kept in memory. It also reports the
+time to load the matcher from the database.
+
+Run it from the root of the repository:
+
+    python benchmarks/blacklist.py --domains 1000000 --rounds 20000
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "django_comments_ink"))
+os.environ["DJANGO_SETTINGS_MODULE"] = "tests.settings"
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.conf import settings  # noqa: E402
+
+settings.DATABASES["default"]["NAME"] = ":memory:"
+
+from django.core.management import call_command  # noqa: E402
+from django.core.cache.backends.filebased import FileBasedCache  # noqa: E402
+from django_comments_ink import blacklist, caching  # noqa: E402
+from django_comments_ink.models import BlackListedDomain  # noqa: E402
+
+
+def random_domain(rnd):
+    label = "".join(rnd.choice("abcdefghijklmnopqrstuvwxyz") for _ in range(10))
+    return "%s.%s" % (label, rnd.choice(["com", "net", "org", "info", "ru"]))
+
+
+def measure(name, lookup, domains):
+    start = time.perf_counter()
+    for domain in domains:
+        lookup(domain)
+    elapsed = time.perf_counter() - start
+    print("%-28s %9.2fus per lookup" % (name, elapsed / len(domains) * 1e6))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--domains", type=int, default=1000000)
+    parser.add_argument("--rounds", type=int, default=20000)
+    args = parser.parse_args()
+
+    call_command("migrate", run_syncdb=True, verbosity=0)
+    rnd = random.Random(0)
+    listed = [random_domain(rnd) for _ in range(args.domains)]
+    BlackListedDomain.objects.bulk_create(
+        (BlackListedDomain(domain=domain) for domain in listed),
+        batch_size=10000,
+    )
+
+    # Half the lookups are subdomains of blacklisted domains.
+    lookups = [
+        ("mail.%s" % rnd.choice(listed) if index % 2 else random_domain(rnd))
+        for index in range(args.rounds)
+    ]
+
+    start = time.perf_counter()
+    matcher = blacklist.load()
+    print(
+        "Load %d domains %18.2fs" % (len(matcher), time.perf_counter() - start)
+    )
+
+    def exact_query(domain):
+        return BlackListedDomain.objects.filter(domain=domain).count()
+
+    def suffixes_query(domain):
+        return BlackListedDomain.objects.filter(
+            domain__in=blacklist.get_suffixes(domain)
+        ).exists()
+
+    measure("query, exact domain", exact_query, lookups)
+    measure("query, with subdomains", suffixes_query, lookups)
+    measure("matcher, with subdomains", matcher.match, lookups)
+
+    # With the cache of the settings (LocMemCache, not shared among
+    # processes) is_blacklisted runs the query with subdomains.
+    measure("is_blacklisted, local cache", blacklist.is_blacklisted, lookups)
+
+    # With a shared cache, it only reads the generation from the cache.
+    with tempfile.TemporaryDirectory() as location:
+        caching.dci_cache = FileBasedCache(location, {})
+        blacklist.is_blacklisted("example.com")
+        measure(
+            "is_blacklisted, shared cache", blacklist.is_blacklisted, lookups
+        )
+
+
+if __name__ == "__main__":
+    main()
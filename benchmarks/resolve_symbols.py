@@ -0,0 +1,160 @@
+"""
+Benchmark the lookup of the classes named in the settings while rendering
+a list of comments with reactions, as HTML and through the web API.
+
+It compares django_comments_ink.get_symbol, that imports the class of a
+setting once, with the previous implementation, that called import_string
+on every call to get_model(), get_form(), get_comment_reactions_enum() or
+get_object_reactions_enum().
+
+Run it from the root of the repository:
+
+    python benchmarks/resolve_symbols.py --comments 200 --rounds 20
+"""
+
+import argparse
+import os
+import sys
+import time
+from datetime import datetime
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "django_comments_ink"))
+os.environ["DJANGO_SETTINGS_MODULE"] = "tests.settings"
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.conf import settings  # noqa: E402
+
+settings.DATABASES["default"]["NAME"] = ":memory:"
+
+from django.contrib.auth.models import User  # noqa: E402
+from django.contrib.contenttypes.models import ContentType  # noqa: E402
+from django.contrib.sites.models import Site  # noqa: E402
+from django.core.management import call_command  # noqa: E402
+from django.template import Context, Template  # noqa: E402
+from django.test import RequestFactory  # noqa: E402
+from django.urls import path  # noqa: E402
+from django.utils.module_loading import import_string  # noqa: E402
+
+import django_comments_ink  # noqa: E402
+from django_comments_ink.api.serializers import (  # noqa: E402
+    ReadCommentSerializer,
+)
+from django_comments_ink import caching  # noqa: E402
+from django_comments_ink.conf import settings as dci_settings  # noqa: E402
+from django_comments_ink.models import (  # noqa: E402
+    CommentReaction,
+    CommentReactionAuthor,
+    InkComment,
+)
+from django_comments_ink.tests.models import Diary  # noqa: E402
+from django_comments_ink.tests.urls import urlpatterns  # noqa: E402
+
+# The templates link to the login page.
+urlpatterns = urlpatterns + [path("login/", lambda request: None, name="login")]
+settings.ROOT_URLCONF = __name__
+
+
+def import_on_every_call(setting):
+    return import_string(getattr(dci_settings, setting))
+
+
+def measure(name, get_symbol, render, rounds, num_comments):
+    calls = 0
+
+    def counting_get_symbol(setting):
+        nonlocal calls
+        calls += 1
+        return get_symbol(setting)
+
+    original = django_comments_ink.get_symbol
+    django_comments_ink.get_symbol = counting_get_symbol
+    start = time.perf_counter()
+    for _ in range(rounds):
+        render()
+    elapsed = time.perf_counter() - start
+    django_comments_ink.get_symbol = original
+
+    start = time.perf_counter()
+    for _ in range(calls):
+        get_symbol("COMMENTS_INK_COMMENT_REACTIONS_ENUM")
+    lookups = time.perf_counter() - start
+
+    print(
+        "%-20s %8.1fus per comment   %5.1f lookups per comment, "
+        "%7.2fus of them"
+        % (
+            name,
+            elapsed / rounds / num_comments * 1e6,
+            calls / rounds / num_comments,
+            lookups / rounds / num_comments * 1e6,
+        )
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--comments", type=int, default=200)
+    parser.add_argument("--rounds", type=int, default=20)
+    args = parser.parse_args()
+
+    call_command("migrate", run_syncdb=True, verbosity=0)
+    # Measure the rendering, not the cache.
+    caching.get_cache = lambda: None
+    user = User.objects.create_user("bob", "bob@example.com", "pwd")
+    diary = Diary.objects.create(body="What I did on September...")
+    fields = {
+        "content_type": ContentType.objects.get_for_model(diary),
+        "object_pk": str(diary.pk),
+        "site": Site.objects.get(pk=1),
+        "user_name": "Alice",
+        "user_email": "alice@example.com",
+        "comment": "A comment of a reasonable length. " * 5,
+        "submit_date": datetime.now(),
+        "is_public": True,
+    }
+    for _ in range(args.comments):
+        comment = InkComment.objects.create(**fields)
+        for value in ["+", "-"]:
+            reaction = CommentReaction.objects.create(
+                comment=comment, reaction=value, counter=1
+            )
+            CommentReactionAuthor.objects.create(reaction=reaction, author=user)
+
+    request = RequestFactory().get("/diary/")
+    request.user = user
+    template = Template(
+        "{% load comments_ink %}{% render_inkcomment_list for object %}"
+    )
+
+    def render():
+        template.render(Context({"request": request, "object": diary}))
+
+    def serialize():
+        qs = InkComment.objects.filter(object_pk=diary.pk)
+        ReadCommentSerializer(qs, context={"request": None}, many=True).data
+
+    for name, func in [("list", render), ("API", serialize)]:
+        func()  # Warm up.
+        measure(
+            "%s, import_string" % name,
+            import_on_every_call,
+            func,
+            args.rounds,
+            args.comments,
+        )
+        measure(
+            "%s, get_symbol" % name,
+            django_comments_ink.get_symbol,
+            func,
+            args.rounds,
+            args.comments,
+        )
+
+
+if __name__ == "__main__":
+    main()
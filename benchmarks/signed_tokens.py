@@ -0,0 +1,125 @@
+"""
+Benchmark the tokens of the confirmation and mute URLs sent by email.
+
+It compares the compact tokens of django_comments_ink.tokens with the
+signed, compressed pickles of django_comments_ink.signed, used before, in
+time to encode and decode a token, queries to decode it, and length.
+
+Run it from the root of the repository:
+
+    python benchmarks/signed_tokens.py --rounds 2000
+"""
+
+import argparse
+import os
+import sys
+import time
+from datetime import datetime
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "django_comments_ink"))
+os.environ["DJANGO_SETTINGS_MODULE"] = "tests.settings"
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.conf import settings  # noqa: E402
+
+settings.DATABASES["default"]["NAME"] = ":memory:"
+
+from django.contrib.contenttypes.models import ContentType  # noqa: E402
+from django.contrib.sites.models import Site  # noqa: E402
+from django.core.management import call_command  # noqa: E402
+from django.db import connection  # noqa: E402
+from django_comments_ink import signed, tokens  # noqa: E402
+from django_comments_ink.models import InkComment, TmpInkComment  # noqa: E402
+from django_comments_ink.tests.models import Article  # noqa: E402
+
+
+def measure(name, dumps, loads, obj, rounds):
+    num_queries = 0
+
+    def count_queries(execute, sql, params, many, context):
+        nonlocal num_queries
+        num_queries += 1
+        return execute(sql, params, many, context)
+
+    start = time.perf_counter()
+    for _ in range(rounds):
+        key = dumps(obj)
+    encode = time.perf_counter() - start
+
+    with connection.execute_wrapper(count_queries):
+        start = time.perf_counter()
+        for _ in range(rounds):
+            loads(key)
+        decode = time.perf_counter() - start
+
+    print(
+        "%-22s encode %7.1fus   decode %7.1fus   %5.1f queries   %5d bytes"
+        % (
+            name,
+            encode / rounds * 1e6,
+            decode / rounds * 1e6,
+            num_queries / rounds,
+            len(key),
+        )
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--rounds", type=int, default=2000)
+    args = parser.parse_args()
+
+    call_command("migrate", run_syncdb=True, verbosity=0)
+    article = Article.objects.create(
+        title="September", slug="september", body="During September..."
+    )
+    fields = {
+        "content_type": ContentType.objects.get_for_model(article),
+        "object_pk": str(article.pk),
+        "site_id": Site.objects.get(pk=1).pk,
+        "user_name": "Alice",
+        "user_email": "alice@example.com",
+        "user_url": "",
+        "comment": "A comment of a reasonable length. " * 20,
+        "submit_date": datetime.now(),
+        "is_public": True,
+        "is_removed": False,
+        "ip_address": "127.0.0.1",
+        "followup": True,
+    }
+    # The comment posted, waiting for confirmation.
+    tmp_comment = TmpInkComment(
+        fields,
+        content_object=article,
+        parent_id=0,
+        level=0,
+        order=1,
+        comments_page=1,
+    )
+    # The comment of a follower, whose mute URL is sent on every new comment.
+    comment = InkComment.objects.create(**fields)
+
+    def signed_dumps(obj):
+        return signed.dumps(obj, compress=True)
+
+    measure(
+        "confirm, signed", signed_dumps, signed.loads, tmp_comment, args.rounds
+    )
+    measure(
+        "confirm, tokens", tokens.dumps, tokens.loads, tmp_comment, args.rounds
+    )
+
+    def mute_dumps(obj):
+        return tokens.dumps(obj, kind=tokens.MUTE)
+
+    measure("mute, signed", signed_dumps, signed.loads, comment, args.rounds)
+    measure("mute, tokens", mute_dumps, tokens.loads, comment, args.rounds)
+
+
+if __name__ == "__main__":
+    main()
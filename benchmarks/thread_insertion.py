@@ -0,0 +1,160 @@
+"""
+Benchmark the insertion of replies in a large comment thread.
+
+It compares the current implementation of InkComment._calculate_thread_data,
+which leaves gaps between the 'order' of consecutive comments, with the
+previous one, based on http://www.sqlteam.com/article/sql-for-threaded-
+discussion-forums, that renumbers every comment after the new reply.
+
+Run it from the root of the repository:
+
+    python benchmarks/thread_insertion.py --comments 10000
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import datetime
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "django_comments_ink"))
+os.environ["DJANGO_SETTINGS_MODULE"] = "tests.settings"
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.conf import settings  # noqa: E402
+
+settings.DATABASES["default"]["NAME"] = ":memory:"
+
+from django.contrib.contenttypes.models import ContentType  # noqa: E402
+from django.contrib.sites.models import Site  # noqa: E402
+from django.core.management import call_command  # noqa: E402
+from django.db import connection  # noqa: E402
+from django.db.models import F, Max, Min  # noqa: E402
+from django_comments_ink.models import (  # noqa: E402
+    InkComment,
+    MaxThreadLevelExceededException,
+    max_thread_level_for_content_type,
+)
+from django_comments_ink.tests.models import Article  # noqa: E402
+
+
+def sqlteam_calculate_thread_data(self):
+    # The implementation replaced by the gap-based ordering.
+    parent = InkComment.objects.get(pk=self.parent_id)
+    if parent.level == max_thread_level_for_content_type(self.content_type):
+        raise MaxThreadLevelExceededException(self)
+
+    self.thread = parent.thread
+    self.level = parent.level + 1
+    qc_eq_thread = InkComment.norel_objects.filter(thread=parent.thread)
+    qc_ge_level = qc_eq_thread.filter(
+        level__lte=parent.level, order__gt=parent.order
+    )
+    if qc_ge_level.count():
+        min_order = qc_ge_level.aggregate(Min("order"))["order__min"]
+        qc_eq_thread.filter(order__gte=min_order).update(order=F("order") + 1)
+        self.order = min_order
+    else:
+        max_order = qc_eq_thread.aggregate(Max("order"))["order__max"]
+        self.order = max_order + 1
+
+    if self.id != parent.id:
+        parent_ids = []
+        while True:
+            parent_ids.append(parent.pk)
+            if parent.id == parent.parent_id:
+                break
+            parent = qc_eq_thread.get(pk=parent.parent_id)
+        if parent_ids:
+            qc_eq_thread.filter(pk__in=parent_ids).update(
+                nested_count=F("nested_count") + 1
+            )
+
+
+def run(name, num_comments, seed):
+    article = Article.objects.create(
+        title=name, slug=name, body="Benchmark article."
+    )
+    fields = {
+        "content_type": ContentType.objects.get_for_model(article),
+        "object_pk": article.pk,
+        "site": Site.objects.get(pk=1),
+        "submit_date": datetime.now(),
+    }
+    max_level = settings.COMMENTS_INK_MAX_THREAD_LEVEL
+    root = InkComment.objects.create(comment="root", **fields)
+    # Pick a random parent among the comments that accept replies.
+    parents = [root.pk]
+    rnd = random.Random(seed)
+
+    calculate_thread_data = InkComment._calculate_thread_data
+    elapsed = 0.0
+    num_queries = 0
+
+    def count_queries(execute, sql, params, many, context):
+        nonlocal num_queries
+        num_queries += 1
+        return execute(sql, params, many, context)
+
+    def timed_calculate_thread_data(self):
+        nonlocal elapsed
+        with connection.execute_wrapper(count_queries):
+            start = time.perf_counter()
+            calculate_thread_data(self)
+            elapsed += time.perf_counter() - start
+
+    InkComment._calculate_thread_data = timed_calculate_thread_data
+    try:
+        start = time.perf_counter()
+        for index in range(num_comments - 1):
+            reply = InkComment.objects.create(
+                comment="reply %d" % index,
+                parent_id=rnd.choice(parents),
+                **fields,
+            )
+            if reply.level < max_level:
+                parents.append(reply.pk)
+        total = time.perf_counter() - start
+    finally:
+        InkComment._calculate_thread_data = calculate_thread_data
+
+    print(
+        "%-8s %7d comments   total %8.2fs   thread data %8.2fs   "
+        "%6.1f queries/reply"
+        % (name, num_comments, total, elapsed, num_queries / num_comments)
+    )
+    return InkComment.norel_objects.filter(thread=root.thread_id).order_by(
+        "order"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--comments", type=int, default=10000)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    call_command("migrate", run_syncdb=True, verbosity=0)
+    gaps = run("gaps", args.comments, args.seed)
+    original = InkComment._calculate_thread_data
+    InkComment._calculate_thread_data = sqlteam_calculate_thread_data
+    try:
+        sqlteam = run("sqlteam", args.comments, args.seed)
+    finally:
+        InkComment._calculate_thread_data = original
+
+    # Both algorithms must list the comments in the same order.
+    def structure(qs):
+        return [(c.comment, c.level, c.nested_count) for c in qs]
+
+    assert structure(gaps) == structure(sqlteam)
+
+
+if __name__ == "__main__":
+    main()
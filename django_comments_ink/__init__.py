@@ -4,28 +4,54 @@ from django.utils.module_loading import import_string
 default_app_config = "django_comments_ink.apps.CommentsInkConfig"
 
 
-def get_model():
-    from django_comments_ink.conf import settings
+# Settings holding the dotted path to a class, and the classes imported for
+# them. A class is imported once, and again only after its setting changes.
+SYMBOL_SETTINGS = (
+    "COMMENTS_INK_MODEL",
+    "COMMENTS_INK_FORM_CLASS",
+    "COMMENTS_INK_COMMENT_REACTIONS_ENUM",
+    "COMMENTS_INK_OBJECT_REACTIONS_ENUM",
+)
 
-    return import_string(settings.COMMENTS_INK_MODEL)
+_symbols = {}
 
 
-def get_form():
-    from django_comments_ink.conf import settings
+def get_symbol(setting):
+    try:
+        return _symbols[setting]
+    except KeyError:
+        from django_comments_ink.conf import settings
 
-    return import_string(settings.COMMENTS_INK_FORM_CLASS)
+        symbol = _symbols[setting] = import_string(getattr(settings, setting))
+        return symbol
 
 
-def get_comment_reactions_enum():
-    from django_comments_ink.conf import settings
+def on_setting_changed(setting, value, **kwargs):
+    from django_comments_ink.conf import defaults, settings
 
-    return import_string(settings.COMMENTS_INK_COMMENT_REACTIONS_ENUM)
+    # django_comments_ink.conf.settings holds a copy of the settings,
+    # update it for override_settings.
+    if setting in SYMBOL_SETTINGS:
+        if value == None:
+            value = getattr(defaults, setting)
+        setattr(settings, setting, value)
+        _symbols.pop(setting, None)
 
 
-def get_object_reactions_enum():
-    from django_comments_ink.conf import settings
+def get_model():
+    return get_symbol("COMMENTS_INK_MODEL")
+
 
-    return import_string(settings.COMMENTS_INK_OBJECT_REACTIONS_ENUM)
+def get_form():
+    return get_symbol("COMMENTS_INK_FORM_CLASS")
+
+
+def get_comment_reactions_enum():
+    return get_symbol("COMMENTS_INK_COMMENT_REACTIONS_ENUM")
+
+
+def get_object_reactions_enum():
+    return get_symbol("COMMENTS_INK_OBJECT_REACTIONS_ENUM")
 
 
 def get_form_target():
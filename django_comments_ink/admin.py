@@ -4,7 +4,11 @@ from django.contrib import admin
 from django_comments import get_model
 from django_comments.admin import CommentsAdmin
 from django_comments.models import CommentFlag
-from django_comments_ink.models import BlackListedDomain, InkComment
+from django_comments_ink.models import (
+    BlackListedDomain,
+    InkComment,
+    OutboxTask,
+)
 
 
 class InkCommentsAdmin(CommentsAdmin):
@@ -71,7 +75,22 @@ class BlackListedDomainAdmin(admin.ModelAdmin):
     search_fields = ["domain"]
 
 
+class OutboxTaskAdmin(admin.ModelAdmin):
+    list_display = (
+        "id",
+        "kind",
+        "status",
+        "attempts",
+        "available_at",
+        "locked_until",
+        "created_at",
+    )
+    list_filter = ("kind", "status")
+    readonly_fields = ("created_at",)
+
+
 if get_model() is InkComment:
     admin.site.register(InkComment, InkCommentsAdmin)
     admin.site.register(CommentFlag)
     admin.site.register(BlackListedDomain, BlackListedDomainAdmin)
+    admin.site.register(OutboxTask, OutboxTaskAdmin)
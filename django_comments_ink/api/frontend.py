@@ -1,11 +1,11 @@
 from django.contrib.contenttypes.models import ContentType
-from django.utils.module_loading import import_string
 from django_comments.forms import CommentSecurityForm
 from django_comments_ink import get_model as get_comment_model
 from django_comments_ink.conf import settings
 from django_comments_ink.models import max_thread_level_for_content_type
 from django_comments_ink.utils import (
     get_app_model_options,
+    get_check_input_allowed,
     get_current_site_id,
     get_html_id_suffix,
 )
@@ -63,7 +63,7 @@ def comments_api_props(obj, user, request=None):
     ctype_slug = "%s-%s" % (ctype.app_label, ctype.model)
     options = get_app_model_options(content_type=ctype)
     check_input_allowed_str = options.pop("check_input_allowed")
-    check_func = import_string(check_input_allowed_str)
+    check_func = get_check_input_allowed(check_input_allowed_str)
     d = {
         "comment_count": queryset.count(),
         "input_allowed": check_func(obj),
@@ -1,6 +1,8 @@
 from django.apps import apps
 from django.contrib.contenttypes.models import ContentType
 from django.contrib.sites.shortcuts import get_current_site
+from django.db import transaction
+from django.urls import reverse
 from django.utils import formats, timezone
 from django.utils.html import escape
 from django.utils.translation import activate, get_language
@@ -15,7 +17,7 @@ from rest_framework import exceptions, serializers
 from django_comments_ink import (
     get_comment_reactions_enum,
     get_model,
-    signed,
+    tokens,
 )
 from django_comments_ink.conf import settings
 from django_comments_ink.models import (
@@ -37,12 +39,19 @@ from django_comments_ink.views.commenting import (
     get_comment_if_exists,
     create_comment,
     notify_comment_followers,
-    send_email_confirmation_request,
+    request_comment_confirmation,
 )
 
 
 COMMENT_MAX_LENGTH = getattr(settings, "COMMENT_MAX_LENGTH", 3000)
 
+# Arguments given to reverse() to find where the ids go in a permalink.
+PERMALINK_ARGS = {
+    "content_type_id": "1110111",
+    "object_pk": "2220222",
+    "comment_id": "3330333",
+}
+
 
 class WriteCommentSerializer(serializers.Serializer):
     content_type = serializers.CharField()
@@ -194,30 +203,29 @@ class WriteCommentSerializer(serializers.Serializer):
             or self.request.user.is_authenticated
         ):
             if get_comment_if_exists(resp["comment"]) is None:
-                new_comment = create_comment(resp["comment"])
-                resp["comment"].ink_comment = new_comment
-                confirmation_received.send(
-                    sender=TmpInkComment,
-                    comment=resp["comment"],
-                    request=self.request,
-                )
-                comment_was_posted.send(
-                    sender=new_comment.__class__,
-                    comment=new_comment,
-                    request=self.request,
-                )
-                if resp["comment"].is_public:
-                    resp["code"] = 201
-                    notify_comment_followers(new_comment)
-                else:
-                    resp["code"] = 202
+                with transaction.atomic():
+                    new_comment = create_comment(resp["comment"])
+                    resp["comment"].ink_comment = new_comment
+                    confirmation_received.send(
+                        sender=TmpInkComment,
+                        comment=resp["comment"],
+                        request=self.request,
+                    )
+                    comment_was_posted.send(
+                        sender=new_comment.__class__,
+                        comment=new_comment,
+                        request=self.request,
+                    )
+                    if resp["comment"].is_public:
+                        resp["code"] = 201
+                        notify_comment_followers(new_comment)
+                    else:
+                        resp["code"] = 202
         else:
-            key = signed.dumps(
-                resp["comment"],
-                compress=True,
-                extra_key=settings.COMMENTS_INK_SALT,
+            key = tokens.dumps(
+                resp["comment"], extra_key=settings.COMMENTS_INK_SALT
             )
-            send_email_confirmation_request(resp["comment"], key, site)
+            request_comment_confirmation(resp["comment"], key, site)
             resp["code"] = 204  # Confirmation sent by mail.
 
         return resp
@@ -247,6 +255,10 @@ class ReadReactionsField(serializers.RelatedField):
         max_users_listed = getattr(
             settings, "COMMENTS_INK_MAX_USERS_IN_TOOLTIP", 10
         )
+        # Authors prefetched, up to the limit, by InkComment.get_queryset.
+        authors = getattr(value, "listed_authors", None)
+        if authors == None:
+            authors = value.authors.all()[:max_users_listed]
         return {
             "reaction": value.reaction,
             "label": reaction_item.label,
@@ -257,7 +269,7 @@ class ReadReactionsField(serializers.RelatedField):
                     "id": author.id,
                     "author": settings.COMMENTS_INK_API_USER_REPR(author),
                 }
-                for author in value.authors.all()[:max_users_listed]
+                for author in authors
             ],
         }
 
@@ -294,6 +306,7 @@ class ReadCommentSerializer(serializers.ModelSerializer):
 
     def __init__(self, *args, **kwargs):
         self.request = kwargs["context"]["request"]
+        self.permalink_format = None
         super(ReadCommentSerializer, self).__init__(*args, **kwargs)
 
     def get_submit_date(self, obj):
@@ -315,13 +328,42 @@ class ReadCommentSerializer(serializers.ModelSerializer):
     def get_allow_reply(self, obj):
         return obj.allow_thread()
 
+    def get_permalink_format(self):
+        """
+        Returns the URL of the 'comments-url-redirect' view with a named
+        placeholder per argument, or '' when the arguments can't be told
+        apart from the rest of the URL.
+        """
+        args = tuple(PERMALINK_ARGS.values())
+        url = reverse("comments-url-redirect", args=args)
+        if any(url.count(arg) != 1 for arg in args):
+            return ""
+        url = url.replace("%", "%%")
+        for name, arg in PERMALINK_ARGS.items():
+            url = url.replace(arg, "%%(%s)s" % name)
+        return url
+
     def get_permalink(self, obj):
-        return obj.get_absolute_url()
+        if type(obj).get_absolute_url != InkComment.get_absolute_url:
+            return obj.get_absolute_url()
+        # Call reverse() once, and fill in the ids of each comment.
+        if self.permalink_format == None:
+            self.permalink_format = self.get_permalink_format()
+        if self.permalink_format == "":
+            return obj.get_absolute_url()
+        url = self.permalink_format % {
+            "content_type_id": obj.content_type_id,
+            "object_pk": obj.object_pk,
+            "comment_id": obj.pk,
+        }
+        return "%s#comment-%s" % (url, obj.pk)
 
     def get_flags(self, obj):
-        qs = obj.flags.filter(flag=CommentFlag.SUGGEST_REMOVAL)
+        # Flags prefetched by InkComment.get_queryset, already filtered.
         flags = []
-        for flag in qs:
+        for flag in obj.flags.all():
+            if flag.flag != CommentFlag.SUGGEST_REMOVAL:
+                continue
             flags.append(
                 {
                     "flag": "removal",
@@ -2,11 +2,13 @@ from django.urls import path, re_path
 
 from .views import (
     CommentCount,
+    CommentCountList,
     CommentCreate,
     CommentList,
     CommentReactionAuthorList,
     CreateReportFlag,
     ObjectReactionAuthorList,
+    ObjectReactionList,
     PostCommentReaction,
     PostObjectReaction,
 )
@@ -24,6 +26,19 @@ urlpatterns = [
         name="comments-ink-api-react-to-object",
     ),
     path("flag/", CreateReportFlag.as_view(), name="comments-ink-api-flag"),
+    # Number of comments sent to many objects, given in the query string.
+    path(
+        "count/",
+        CommentCountList.as_view(),
+        name="comments-ink-api-count-list",
+    ),
+    # Reactions sent to many objects of the <ctype>, whose object IDs are
+    # given in the query string.
+    re_path(
+        r"^reactions/(?P<content_type>\w+[-]{1}\w+)/$",
+        ObjectReactionList.as_view(),
+        name="comments-ink-api-object-reactions",
+    ),
     re_path(
         r"^(?P<comment_pk>[\d]+)/(?P<reaction_value>[\w\+\-]+)/$",
         CommentReactionAuthorList.as_view(),
@@ -1,22 +1,32 @@
+from functools import wraps
+
 from django.contrib.contenttypes.models import ContentType
+from django.db import transaction
 from django.db.models import F
 from django.shortcuts import get_object_or_404
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
 
 from django_comments.views.moderation import perform_flag
 
 from rest_framework import generics, mixins, permissions, renderers, status
+from rest_framework.exceptions import ValidationError
 from rest_framework.pagination import PageNumberPagination
 from rest_framework.response import Response
 from rest_framework.schemas.openapi import AutoSchema
 
-from django_comments_ink import get_model as get_comment_model
+from django_comments_ink import caching, get_model as get_comment_model
 from django_comments_ink.api import serializers
 from django_comments_ink.conf import settings
 from django_comments_ink.models import (
+    get_comment_counts,
     get_object_reactions,
+    get_object_reactions_generation_key,
+    get_objects_reactions,
     CommentReaction,
     ObjectReaction,
 )
+from django_comments_ink.paginator import DRFCommentsCursorPaginator
 from django_comments_ink.utils import check_option, get_current_site_id
 
 
@@ -37,6 +47,45 @@ class DefaultsMixin:
         return super().pagination_class
 
 
+def conditional_get(method):
+    """
+    Decorator for the `get` method of views that implement
+    `get_generation_key`.
+
+    The generation stored in that key, incremented each time the data
+    returned by the view changes, provides the ETag and Last-Modified
+    headers. Requests with a matching If-None-Match or If-Modified-Since
+    header get a 304 Not Modified response, before any database query.
+    """
+
+    @wraps(method)
+    def wrapper(self, request, *args, **kwargs):
+        key = self.get_generation_key()
+        if key == None:
+            return method(self, request, *args, **kwargs)
+
+        generation, modified = caching.get_generation_and_modified(key)
+        if generation == None:  # There is no cache.
+            return method(self, request, *args, **kwargs)
+
+        # The renderer is part of the ETag, as the browsable API and the
+        # JSON renderer return different content for the same URL.
+        etag = quote_etag(
+            "%s-%s" % (generation, request.accepted_renderer.format)
+        )
+        response = get_conditional_response(
+            request, etag=etag, last_modified=modified
+        )
+        if response == None:
+            response = method(self, request, *args, **kwargs)
+        response["ETag"] = etag
+        if modified != None:
+            response["Last-Modified"] = http_date(modified)
+        return response
+
+    return wrapper
+
+
 class CommentCreate(DefaultsMixin, generics.CreateAPIView):
     """Create a comment."""
 
@@ -70,6 +119,32 @@ class CommentList(DefaultsMixin, generics.ListAPIView):
     serializer_class = serializers.ReadCommentSerializer
     permission_classes = (permissions.AllowAny,)
 
+    @property
+    def pagination_class(self):
+        if (
+            self.kwargs.get("override_drf_defaults", False)
+            and settings.COMMENTS_INK_API_COMMENTS_PER_PAGE > 0
+        ):
+            return DRFCommentsCursorPaginator
+        return super().pagination_class
+
+    def get_generation_key(self):
+        content_type_arg = self.kwargs.get("content_type", None)
+        object_pk_arg = self.kwargs.get("object_pk", None)
+        app, model = content_type_arg.split("-")
+        try:
+            content_type = ContentType.objects.get_by_natural_key(app, model)
+        except ContentType.DoesNotExist:
+            return None
+        site_id = get_current_site_id(self.request)
+        return caching.get_generation_key(
+            content_type.pk, object_pk_arg, site_id
+        )
+
+    @conditional_get
+    def get(self, request, *args, **kwargs):
+        return super().get(request, *args, **kwargs)
+
     def get_queryset(self, **kwargs):
         content_type_arg = self.kwargs.get("content_type", None)
         object_pk_arg = self.kwargs.get("object_pk", None)
@@ -93,28 +168,91 @@ class CommentCount(DefaultsMixin, generics.GenericAPIView):
     serializer_class = serializers.ReadCommentSerializer
     permission_classes = (permissions.AllowAny,)
 
+    def get_site_id(self):
+        site_id = getattr(settings, "SITE_ID", None)
+        if not site_id:
+            site_id = get_current_site_id(self.request)
+        return site_id
+
+    def get_generation_key(self):
+        content_type_arg = self.kwargs.get("content_type", None)
+        app_label, model = content_type_arg.split("-")
+        content_type = ContentType.objects.get_by_natural_key(app_label, model)
+        return caching.get_generation_key(
+            content_type.pk,
+            self.kwargs.get("object_pk", None),
+            self.get_site_id(),
+        )
+
     def get_queryset(self):
         content_type_arg = self.kwargs.get("content_type", None)
         object_pk_arg = self.kwargs.get("object_pk", None)
         app_label, model = content_type_arg.split("-")
         content_type = ContentType.objects.get_by_natural_key(app_label, model)
-        site_id = getattr(settings, "SITE_ID", None)
-        if not site_id:
-            site_id = get_current_site_id(self.request)
         fkwds = {
             "content_type": content_type,
             "object_pk": object_pk_arg,
-            "site__pk": site_id,
+            "site__pk": self.get_site_id(),
             "is_public": True,
         }
         if getattr(settings, "COMMENTS_HIDE_REMOVED", True):
             fkwds["is_removed"] = False
         return get_comment_model().objects.filter(**fkwds)
 
+    @conditional_get
     def get(self, request, *args, **kwargs):
         return Response({"count": self.get_queryset().count()})
 
 
+class CommentCountList(DefaultsMixin, generics.GenericAPIView):
+    """
+    Get the number of comments posted to many objects. Objects are given
+    in the `objects` query string parameter as a comma separated list of
+    <app_label>-<model>:<object_pk> items.
+    """
+
+    serializer_class = serializers.ReadCommentSerializer
+    permission_classes = (permissions.AllowAny,)
+    max_objects = 100
+
+    def get_targets(self):
+        items = self.request.query_params.get("objects", "").split(",")
+        items = [item for item in items if item != ""]
+        if len(items) > self.max_objects:
+            raise ValidationError(
+                "Too many objects, the maximum is %d." % self.max_objects
+            )
+        targets = []
+        for item in items:
+            try:
+                content_type_arg, object_pk = item.split(":")
+                app_label, model = content_type_arg.split("-")
+                content_type = ContentType.objects.get_by_natural_key(
+                    app_label, model
+                )
+            except (ValueError, ContentType.DoesNotExist):
+                raise ValidationError("Invalid object '%s'." % item)
+            targets.append((item, content_type, object_pk))
+        return targets
+
+    def get(self, request, *args, **kwargs):
+        site_id = getattr(settings, "SITE_ID", None)
+        if not site_id:
+            site_id = get_current_site_id(self.request)
+        targets = self.get_targets()
+        counts = get_comment_counts(
+            [(ctype, object_pk) for _, ctype, object_pk in targets], site_id
+        )
+        return Response(
+            {
+                "counts": {
+                    item: counts[(ctype.pk, object_pk)]
+                    for item, ctype, object_pk in targets
+                }
+            }
+        )
+
+
 class CreateReportFlag(DefaultsMixin, generics.CreateAPIView):
     """Create 'removal suggestion' flags."""
 
@@ -145,7 +283,9 @@ class PostCommentReaction(mixins.CreateModelMixin, generics.GenericAPIView):
             get_comment_model(), pk=int(request.data["comment"])
         )
         check_option("comment_reactions_enabled", comment=comment)
-        self.create(request, *args, **kwargs)
+        # The cache is invalidated again once the reaction is committed.
+        with transaction.atomic():
+            self.create(request, *args, **kwargs)
         # Create a new response object with the list of reactions the
         # comment has received. If other users sent reactions they all will
         # be reflected in the comment, not only the reaction sent with this
@@ -162,9 +302,11 @@ class PostCommentReaction(mixins.CreateModelMixin, generics.GenericAPIView):
         if cr_qs.filter(authors=self.request.user).count() == 1:
             self.created = False
             if cr_qs[0].counter == 1:
+                cr_qs[0].delete_from_cache()
                 cr_qs.delete()
             else:
                 cr_qs.update(counter=F("counter") - 1)
+                cr_qs[0].delete_from_cache()
                 cr_qs[0].authors.remove(self.request.user)
         else:
             creaction, _ = CommentReaction.objects.get_or_create(
@@ -188,7 +330,9 @@ class PostObjectReaction(mixins.CreateModelMixin, generics.GenericAPIView):
             ContentType, pk=int(request.data["content_type"])
         )
         check_option("object_reactions_enabled", content_type=content_type)
-        self.create(request, *args, **kwargs)
+        # The cache is invalidated again once the reaction is committed.
+        with transaction.atomic():
+            self.create(request, *args, **kwargs)
         # Create a new response object with the list of reactions the
         # object has received. If other users sent reactions they all will
         # be reflected, not only the reaction sent with this particular request.
@@ -208,6 +352,7 @@ class PostObjectReaction(mixins.CreateModelMixin, generics.GenericAPIView):
                 or_qs.delete()
             else:
                 or_qs.update(counter=F("counter") - 1)
+                or_qs[0].delete_from_cache()
                 or_qs[0].authors.remove(self.request.user)
         else:
             oreaction, _ = ObjectReaction.objects.get_or_create(
@@ -220,6 +365,39 @@ class PostObjectReaction(mixins.CreateModelMixin, generics.GenericAPIView):
             oreaction.save()
 
 
+class ObjectReactionList(DefaultsMixin, generics.GenericAPIView):
+    """
+    Get the reactions posted to many objects of a given ContentType. Object
+    IDs are given in the `object_pks` query string parameter as a comma
+    separated list.
+    """
+
+    serializer_class = serializers.WriteObjectReactionSerializer
+    permission_classes = (permissions.AllowAny,)
+    max_objects = 100
+
+    def get(self, request, *args, **kwargs):
+        content_type_arg = self.kwargs.get("content_type", None)
+        app, model = content_type_arg.split("-")
+        try:
+            content_type = ContentType.objects.get_by_natural_key(app, model)
+        except ContentType.DoesNotExist:
+            raise ValidationError(
+                "Invalid content type '%s'." % content_type_arg
+            )
+        check_option("object_reactions_enabled", content_type=content_type)
+
+        object_pks = request.query_params.get("object_pks", "").split(",")
+        object_pks = [object_pk for object_pk in object_pks if object_pk != ""]
+        if len(object_pks) > self.max_objects:
+            raise ValidationError(
+                "Too many objects, the maximum is %d." % self.max_objects
+            )
+        site_id = get_current_site_id(request)
+        reactions = get_objects_reactions(content_type, object_pks, site_id)
+        return Response({"reactions": reactions})
+
+
 class AuthorListPagination(PageNumberPagination):
     page_size = settings.COMMENTS_INK_USERS_REACTED_PER_PAGE
 
@@ -259,6 +437,23 @@ class ObjectReactionAuthorList(DefaultsMixin, generics.ListAPIView):
     permission_classes = (permissions.AllowAny,)
     pagination_class = AuthorListPagination
 
+    def get_generation_key(self):
+        content_type_arg = self.kwargs.get("content_type", None)
+        app, model = content_type_arg.split("-")
+        try:
+            content_type = ContentType.objects.get_by_natural_key(app, model)
+        except ContentType.DoesNotExist:
+            return None
+        return get_object_reactions_generation_key(
+            content_type.pk,
+            self.kwargs.get("object_pk", None),
+            get_current_site_id(self.request),
+        )
+
+    @conditional_get
+    def get(self, request, *args, **kwargs):
+        return super().get(request, *args, **kwargs)
+
     def get_queryset(self, **kwargs):
         content_type_arg = self.kwargs.get("content_type", None)
         object_pk_arg = self.kwargs.get("object_pk", None)
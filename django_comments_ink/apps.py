@@ -1,4 +1,5 @@
 from django.apps import AppConfig
+from django.core.signals import setting_changed
 from django.db.models.signals import pre_save
 
 
@@ -8,9 +9,31 @@ class CommentsInkConfig(AppConfig):
     verbose_name = "Comments Ink"
 
     def ready(self):
-        from django_comments_ink import get_model
+        from django_comments_ink import (
+            SYMBOL_SETTINGS,
+            get_model,
+            get_symbol,
+            on_setting_changed,
+        )
         from django_comments_ink.conf import settings
         from django_comments_ink.models import publish_or_withhold_on_pre_save
+        from django_comments_ink.utils import (
+            get_app_model_options_registry,
+            on_app_model_options_changed,
+        )
+
+        # Import the classes and functions named in the settings once.
+        for setting in SYMBOL_SETTINGS:
+            get_symbol(setting)
+        setting_changed.connect(
+            on_setting_changed, dispatch_uid="dci_symbol_settings"
+        )
+        # Merge the options, and import the functions they refer to, once.
+        get_app_model_options_registry()
+        setting_changed.connect(
+            on_app_model_options_changed,
+            dispatch_uid="dci_app_model_options",
+        )
 
         if getattr(settings, "COMMENTS_HIDE_REMOVED", True) or getattr(
             settings, "COMMENTS_INK_PUBLISH_OR_WITHHOLD_NESTED", True
@@ -0,0 +1,131 @@
+"""
+In-memory matcher of the domains in the BlackListedDomain table.
+
+Every process loads the blacklist once into a set, and answers whether an
+email domain is blacklisted without querying the database. A domain is
+blacklisted when it, or any of its parent domains, is in the table:
+blacklisting 'spam.tld' also blocks 'mail.spam.tld'.
+
+The set is reloaded when the generation stored in the cache key
+COMMENTS_INK_CACHE_KEYS['blacklist_generation'] changes, which happens
+whenever a BlackListedDomain is saved or deleted. Code that modifies the
+table in bulk, skipping the model signals or within `bulk_changes()`, must
+call `invalidate()`.
+
+Without a cache shared among processes, there is no way to tell the other
+processes that the table changed, and `is_blacklisted` queries the database
+instead. That is the case when there is no cache, and with the local-memory
+and dummy backends, whose generation is only seen by the process that
+changed it, or by none at all.
+"""
+
+import logging
+import threading
+
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import router
+from django_comments_ink import caching
+from django_comments_ink.conf import settings
+from django_comments_ink.models import (
+    BlackListedDomain,
+    blacklist_bulk_changes,
+    normalize_domain,
+)
+
+
+logger = logging.getLogger(__name__)
+
+# Cache backends whose values are not shared among processes.
+LOCAL_CACHES = (DummyCache, LocMemCache)
+
+
+normalize = normalize_domain
+bulk_changes = blacklist_bulk_changes
+
+
+def get_suffixes(domain):
+    """
+    Returns the domain followed by its parent domains:
+    'a.b.tld' -> ['a.b.tld', 'b.tld', 'tld'].
+    """
+    labels = normalize(domain).split(".")
+    return [".".join(labels[index:]) for index in range(len(labels))]
+
+
+class DomainMatcher:
+    """Matches domains, and their subdomains, against a set of domains."""
+
+    def __init__(self, domains):
+        self.domains = frozenset(
+            normalized for normalized in map(normalize, domains) if normalized
+        )
+
+    def __len__(self):
+        return len(self.domains)
+
+    def __contains__(self, domain):
+        return self.match(domain)
+
+    def match(self, domain):
+        domains = self.domains
+        labels = normalize(domain).split(".")
+        for index in range(len(labels)):
+            if ".".join(labels[index:]) in domains:
+                return True
+        return False
+
+
+def get_generation_key():
+    return settings.COMMENTS_INK_CACHE_KEYS["blacklist_generation"]
+
+
+def invalidate():
+    """Makes every process reload the blacklist before using it again."""
+    caching.incr_generation_in_key(get_generation_key())
+
+
+def load(using=None):
+    using = using or router.db_for_read(BlackListedDomain)
+    qs = BlackListedDomain.objects.using(using)
+    return DomainMatcher(
+        qs.values_list("domain", flat=True).iterator(chunk_size=10000)
+    )
+
+
+_matcher = None
+_matcher_generation = None
+_matcher_lock = threading.Lock()
+
+
+def get_matcher():
+    """
+    Returns the DomainMatcher of the process, loading it again if the
+    blacklist changed since it was loaded. Returns None without a cache
+    shared among processes.
+    """
+    global _matcher, _matcher_generation
+    dci_cache = caching.get_cache()
+    if dci_cache == None or isinstance(dci_cache, LOCAL_CACHES):
+        return None
+    generation = caching.get_generation_from_key(get_generation_key())
+    if _matcher == None or _matcher_generation != generation:
+        with _matcher_lock:
+            if _matcher == None or _matcher_generation != generation:
+                _matcher = load()
+                _matcher_generation = generation
+                logger.debug(
+                    "Loaded %d blacklisted domains, generation %s",
+                    len(_matcher),
+                    generation,
+                )
+    return _matcher
+
+
+def is_blacklisted(domain):
+    matcher = get_matcher()
+    if matcher == None:
+        # Domains are stored normalized, the query uses the 'domain' index.
+        qs = BlackListedDomain.objects.filter(domain__in=get_suffixes(domain))
+        return qs.exists()
+    return matcher.match(domain)
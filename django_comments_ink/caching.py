@@ -1,6 +1,8 @@
 import logging
+import time
 
 from django.core.cache import InvalidCacheBackendError, caches
+from django.db.transaction import on_commit
 from django_comments_ink.conf import settings
 
 logger = logging.getLogger(__name__)
@@ -28,7 +30,229 @@ def get_cache():
     return dci_cache
 
 
-def clear_comment_cache(content_type_id, object_pk, site_id):
+def _initial_generation():
+    # Seed new generation counters with a timestamp, so that when the counter
+    # is evicted from the cache (memcached LRU, redis maxmemory...), the new
+    # counter does not collide with a generation used before the eviction.
+    return int(time.time() * 1000)
+
+
+def get_generation_key(content_type_id, object_pk, site_id):
+    return settings.COMMENTS_INK_CACHE_KEYS["comment_generation"].format(
+        ctype_pk=content_type_id, object_pk=object_pk, site_id=site_id
+    )
+
+
+def get_generation(content_type_id, object_pk, site_id):
+    """
+    Returns the generation number for the comments sent to the given
+    content_type_id, object_pk and site_id.
+
+    The generation is part of every cache key used to store data related
+    with the comments of an object. Whenever a comment changes the
+    generation is incremented, and the keys computed with the previous
+    value are no longer reachable.
+    """
+    key = get_generation_key(content_type_id, object_pk, site_id)
+    return get_generation_from_key(key)
+
+
+def get_generations(content_type_id, object_pks, site_id):
+    """
+    Returns a dictionary with the generation number for the comments sent
+    to each of the given object_pks of the content_type_id and site_id.
+    Existing generations are read at once, and the missing ones are created
+    at once too. Returns an empty dictionary when there is no cache.
+    """
+    dci_cache = get_cache()
+    if dci_cache == None:
+        return {}
+
+    keys = {
+        object_pk: get_generation_key(content_type_id, object_pk, site_id)
+        for object_pk in object_pks
+    }
+    cached = dci_cache.get_many(list(keys.values()))
+    missing = [key for key in keys.values() if cached.get(key) == None]
+    if len(missing):
+        # There is no add_many(). Unlike add(), set_many() may overwrite a
+        # generation created or incremented meanwhile by another request.
+        # The new value is a new generation as well, so at worst the values
+        # that request cached are not reached and get rebuilt.
+        generation, now = _initial_generation(), int(time.time())
+        seeds = {}
+        for key in missing:
+            seeds[key] = generation
+            seeds[get_modified_key(key)] = now
+        dci_cache.set_many(seeds, timeout=None)
+        cached.update(dci_cache.get_many(missing))
+    return {object_pk: cached.get(key, 0) for object_pk, key in keys.items()}
+
+
+def get_generation_from_key(key):
+    """
+    Returns the generation number stored in the given key, creating it
+    when it doesn't exist. Returns 0 when there is no cache.
+    """
+    dci_cache = get_cache()
+    if dci_cache == None:
+        return 0
+
+    generation = dci_cache.get(key)
+    if generation == None:
+        # add() does nothing if a concurrent request created the key already.
+        dci_cache.add(key, _initial_generation(), timeout=None)
+        dci_cache.add(get_modified_key(key), int(time.time()), timeout=None)
+        generation = dci_cache.get(key, 0)
+    return generation
+
+
+def get_modified_key(key):
+    # Key storing the time at which the generation in `key` was incremented.
+    return "%s|modified" % key
+
+
+def get_generation_and_modified(key):
+    """
+    Returns a tuple (generation, modified) with the generation number stored
+    in the given key, and the timestamp of its last increment, or None if
+    it's unknown. Both values are read at once. Returns (None, None) when
+    there is no cache.
+    """
+    dci_cache = get_cache()
+    if dci_cache == None:
+        return None, None
+
+    modified_key = get_modified_key(key)
+    values = dci_cache.get_many([key, modified_key])
+    generation = values.get(key)
+    if generation == None:
+        generation = get_generation_from_key(key)
+    return generation, values.get(modified_key)
+
+
+def incr_generation(content_type_id, object_pk, site_id):
+    """
+    Increments the generation number for the comments sent to the given
+    content_type_id, object_pk and site_id, and returns it. Returns None
+    when there is no cache.
+    """
+    key = get_generation_key(content_type_id, object_pk, site_id)
+    return incr_generation_in_key(key)
+
+
+def incr_generation_in_key(key):
+    """
+    Increments the generation number stored in the given key, and returns
+    it. Returns None when there is no cache.
+    """
+    dci_cache = get_cache()
+    if dci_cache == None:
+        return None
+
+    # Bumping the generation makes unreachable every key built with the
+    # previous one (see get_generation). Stale entries expire on their own.
+    try:
+        generation = dci_cache.incr(key)
+    except ValueError:
+        # The key does not exist. Start a new generation, unless a concurrent
+        # request created it in the meantime, in which case increment it.
+        generation = _initial_generation()
+        if not dci_cache.add(key, generation, timeout=None):
+            generation = dci_cache.incr(key)
+    dci_cache.set(get_modified_key(key), int(time.time()), timeout=None)
+    logger.debug("Increment cache generation in key %s", key)
+    return generation
+
+
+def incr_generation_in_key_on_commit(key, using=None):
+    """
+    Increments the generation number stored in the given key now, and again
+    once the current transaction in the DB `using` is committed, in case
+    another request cached values read before the change was committed.
+    Returns the generation after the first increment.
+    """
+    generation = incr_generation_in_key(key)
+    on_commit(lambda: incr_generation_in_key(key), using=using)
+    return generation
+
+
+# Seconds between reads of a key being rebuilt by another request.
+REBUILD_POLL_INTERVAL = 0.05
+
+
+def get_rebuild_options(key_name):
+    options = {"lock_timeout": 30, "stale_timeout": 0, "wait_timeout": 5}
+    rebuild_options = getattr(settings, "COMMENTS_INK_CACHE_REBUILD", {})
+    options.update(rebuild_options.get(key_name, {}))
+    return options
+
+
+def get_or_rebuild(key_name, key, stale_key, generation, rebuild):
+    """
+    Returns the value cached in `key`, calling `rebuild` to compute and
+    store it when it's missing. Concurrent requests don't rebuild the same
+    key: only the one that acquires the lock calls `rebuild`, the others
+    return the value stored in `stale_key` for a previous generation, if
+    it's been outdated for less than the 'stale_timeout' given for
+    `key_name` in COMMENTS_INK_CACHE_REBUILD. Without such a value, they
+    wait up to 'wait_timeout' seconds for the request holding the lock to
+    store the new one, and only rebuild it themselves after that, or if
+    that request released the lock without storing it.
+
+    The entry in `stale_key` is a tuple (generation, value, outdated_since).
+    """
+    dci_cache = get_cache()
+    if dci_cache == None or key == "":
+        return rebuild()
+
+    result = dci_cache.get(key)
+    if result != None:
+        logger.debug("Get %s from the cache", key)
+        return result
+
+    options = get_rebuild_options(key_name)
+    lock_key = "%s|lock" % key
+    if not dci_cache.add(lock_key, 1, timeout=options["lock_timeout"]):
+        stale = dci_cache.get(stale_key) if stale_key != "" else None
+        if stale != None and stale[0] != generation:
+            stale_gen, result, outdated_since = stale
+            if outdated_since == None:
+                # First request finding it outdated.
+                outdated_since = time.time()
+                dci_cache.set(
+                    stale_key,
+                    (stale_gen, result, outdated_since),
+                    timeout=None,
+                )
+            if time.time() - outdated_since <= options["stale_timeout"]:
+                logger.debug("Get stale %s while %s is rebuilt", stale_key, key)
+                return result
+        # There is no value to return while the key is being rebuilt.
+        deadline = time.monotonic() + options["wait_timeout"]
+        while time.monotonic() < deadline:
+            time.sleep(REBUILD_POLL_INTERVAL)
+            result = dci_cache.get(key)
+            if result != None:
+                logger.debug("Get %s once rebuilt by another request", key)
+                return result
+            if dci_cache.get(lock_key) == None:
+                break  # The rebuild failed.
+        return rebuild()
+
+    try:
+        logger.debug("Rebuild %s", key)
+        result = rebuild()
+        values = {key: result}
+        if stale_key != "":
+            values[stale_key] = (generation, result, None)
+        dci_cache.set_many(values, timeout=None)
+    finally:
+        dci_cache.delete(lock_key)
+    return result
+
+
+def clear_comment_cache(content_type_id, object_pk, site_id, using=None):
     dci_cache = get_cache()
     if dci_cache == None:
         logger.warning(
@@ -38,22 +262,8 @@ def clear_comment_cache(content_type_id, object_pk, site_id):
         )
         return False
 
-    keys = []
-    for key_pattern in ["comment_qs", "comment_count", "comments_paged"]:
-        key = settings.COMMENTS_INK_CACHE_KEYS[key_pattern].format(
-            ctype_pk=content_type_id, object_pk=object_pk, site_id=site_id
-        )
-        keys.append(key)
-
-    for key_pattern in ["comment_list_auth", "comment_list_anon"]:
-        key = settings.COMMENTS_INK_CACHE_KEYS[key_pattern].format(path="*")
-        keys.append(key)
-
-    for key in keys:
-        if dci_cache.get(key):
-            logger.debug("Delete cached key %s" % key)
-            dci_cache.delete(key)
-
+    key = get_generation_key(content_type_id, object_pk, site_id)
+    incr_generation_in_key_on_commit(key, using=using)
     return True
 
 
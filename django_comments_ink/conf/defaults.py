@@ -7,6 +7,11 @@ COMMENT_MAX_LENGTH = 3000
 # Extra key to salt the InkCommentForm.
 COMMENTS_INK_SALT = b""
 
+# Whether confirmation and mute URLs created with the pickle based format
+# of django_comments_ink.signed are still accepted. New URLs use the compact
+# format of django_comments_ink.tokens.
+COMMENTS_INK_LEGACY_TOKENS = True
+
 # Whether comment posts should be confirmed by email.
 COMMENTS_INK_CONFIRM_EMAIL = True
 
@@ -45,6 +50,33 @@ COMMENTS_INK_SEND_HTML_EMAIL = True
 # your own celery app.
 COMMENTS_INK_THREADED_EMAILS = True
 
+# Pool of threads that send emails when COMMENTS_INK_THREADED_EMAILS is True:
+#  * 'workers': number of threads sending emails.
+#  * 'queue_size': maximum number of jobs waiting for a thread. A job sends
+#    one email, or the follow-up notifications of a comment.
+#  * 'when_full': what to do with a job when the queue is full. Either
+#    'block' until there is room for it, 'drop' it, or 'sync' to send it
+#    in the thread of the caller.
+#  * 'retries': times a failed job is retried.
+#  * 'retry_delay': seconds to wait before the first retry. The delay is
+#    doubled before each of the next retries.
+COMMENTS_INK_MAIL_DISPATCHER = {
+    "workers": 2,
+    "queue_size": 1000,
+    "when_full": "block",
+    "retries": 3,
+    "retry_delay": 1,
+}
+
+# Whether the emails sent when a comment is posted, confirmed or flagged are
+# written to an outbox table, in the same transaction as the comment, to be
+# sent by the 'dci_worker' management command, instead of during the request.
+COMMENTS_INK_OUTBOX = False
+
+# Number of messages handed at once to the email backend, over the same
+# connection, when sending the follow-up notifications of a comment.
+COMMENTS_INK_MAIL_CHUNK_SIZE = 100
+
 # Define what commenting features a pair app_label.model can have.
 COMMENTS_INK_APP_MODEL_OPTIONS = {
     "default": {
@@ -92,6 +124,12 @@ COMMENTS_INK_MAX_LAST_PAGE_ORPHANS = 10
 # Number of comments per page. When <=0 pagination is disabled.
 COMMENTS_INK_COMMENTS_PER_PAGE = 25
 
+# Number of comments per page returned by the comment list web API, when
+# COMMENTS_INK_OVERRIDE_DRF_DEFAULTS is True. Pages contain whole threads,
+# and are requested with the cursor returned in the previous page.
+# When <=0 pagination is disabled, and all the comments are returned at once.
+COMMENTS_INK_API_COMMENTS_PER_PAGE = 0
+
 # How many users are listed when hovering a reaction.
 COMMENTS_INK_MAX_USERS_IN_TOOLTIP = 10
 
@@ -145,39 +183,80 @@ COMMENTS_INK_CACHE_NAME = "dci"
 # If the value is True:
 #  * renderer_classes are:
 #    (renderers,JSONRenderer, renderers.BrowsableAPIRenderer)
-#  * pagination_class is None
+#  * pagination_class is None, except for the comment list, which is
+#    paginated with a cursor when COMMENTS_INK_API_COMMENTS_PER_PAGE > 0.
 # If the value is False, uses the provided
 # renderer_classes and pagination_class attributes.
 COMMENTS_INK_OVERRIDE_DRF_DEFAULTS = True
 
 # Format patterns used with cached keys.
+#
+# Keys related with the comments sent to an object include the '{gen}'
+# parameter: the generation of the comments for the given content_type,
+# object_pk and site_id. The generation is stored in the 'comment_generation'
+# key and it's incremented each time a comment changes, which makes all the
+# keys built with the previous generation unreachable at once.
+#
+# Generations are also used by the web API to answer conditional GET requests
+# (with If-None-Match or If-Modified-Since headers) with a 304 Not Modified
+# response, without querying the database.
 COMMENTS_INK_CACHE_KEYS = {
+    # The key 'comment_generation' holds the generation number for
+    # the comments of the given content_type, object_pk and site_id.
+    "comment_generation": "/comment_gen/{ctype_pk}/{object_pk}/{site_id}",
     # The rendered template fragment with the list of comments for the given
     # combination of content_type, object_pk and site_id. There are two keys,
     # one for when the user is authenticated, and another for when the user is
     # is anonymous.
-    "comment_list_auth": "{path}|auth",
-    "comment_list_anon": "{path}|anon",
+    "comment_list_auth": "{path}|auth|{gen}",
+    "comment_list_anon": "{path}|anon|{gen}",
     # The key 'comment_qs' holds the QuerySet of comments for the given params.
-    "comment_qs": "/comment_qs/{ctype_pk}/{object_pk}/{site_id}",
+    "comment_qs": "/comment_qs/{ctype_pk}/{object_pk}/{site_id}/{gen}",
     # The key 'comment_count' stores the number of
     # comments returned by the previous QuerySet.
-    "comment_count": "/comment_count/{ctype_pk}/{object_pk}/{site_id}",
+    "comment_count": "/comment_count/{ctype_pk}/{object_pk}/{site_id}/{gen}",
     # The key 'comments_paged' stores a dictionary of k: v, where
     # keys are combinations of page number and folded comments, and
     # values are cache keys where to find the computed values that
     # correspond to the output of paginate_querysey.
-    "comments_paged": "/comments_paged/{ctype_pk}/{object_pk}/{site_id}",
+    "comments_paged": "/comments_paged/{ctype_pk}/{object_pk}/{site_id}/{gen}",
     # The key 'comment_reactions' stores the json output produced by
     # InkComment.get_reactions(), for the comment receiving the method.
     "comment_reactions": "/comment_reactions/cm/{comment_id}",
     # The key 'object_reactions' stores the json output produced by
     # get_object_reactions(ctype.pk, object_pk, site_id).
     "object_reactions": "/object_reactions/{ctype_pk}/{object_pk}/{site_id}",
+    # The key 'object_reactions_generation' holds the generation number for
+    # the reactions to the given content_type, object_pk and site_id. It's
+    # incremented each time a reaction to the object changes.
+    "object_reactions_generation": (
+        "/object_reactions_gen/{ctype_pk}/{object_pk}/{site_id}"
+    ),
     # The key 'comment_votes' stores the json output produced by
     # InkComment.get_votes(), for the comment receiving the method.
     "comment_votes": "/comment_votes/cm/{comment_id}",
     # The key 'comment_flags' stores the json output produced by
     # InkComment.get_flags(), for the comment receiving the method.
     "comment_flags": "/comment_flag/cm/{comment_id}",
+    # The key 'blacklist_generation' holds the generation number of the
+    # BlackListedDomain table. It's incremented when domains are added or
+    # removed, to reload the blacklist kept in memory by every process.
+    "blacklist_generation": "/blacklist_gen",
+}
+
+# Protection against cache stampedes, per key in COMMENTS_INK_CACHE_KEYS.
+#
+# When one of these keys is missing from the cache (usually because the
+# generation changed after a new comment), only one request rebuilds it,
+# while the others get the value stored for the previous generation:
+#  * 'lock_timeout': seconds a request can hold the lock to rebuild the key.
+#    Once expired, another request will take over the rebuild.
+#  * 'stale_timeout': seconds during which the value of a previous
+#    generation can still be returned, since it was first found outdated.
+#  * 'wait_timeout': when there is no value of a previous generation to
+#    return, seconds that requests not holding the lock wait for the one
+#    holding it to store the value, before rebuilding it too. 5 by default.
+COMMENTS_INK_CACHE_REBUILD = {
+    "comment_list_auth": {"lock_timeout": 30, "stale_timeout": 60},
+    "comment_list_anon": {"lock_timeout": 30, "stale_timeout": 60},
 }
@@ -0,0 +1,192 @@
+"""
+Thread pool to send emails out of the request/response cycle.
+
+Jobs wait in a bounded queue until one of a fixed number of worker threads
+runs them. When the queue is full, the 'when_full' option decides whether
+the caller blocks, the job is dropped, or the job runs in the caller's
+thread. Failed jobs are retried with an exponential backoff. The queue is
+drained when the process exits.
+
+The options are read from the setting COMMENTS_INK_MAIL_DISPATCHER.
+"""
+
+import atexit
+import logging
+import queue
+import threading
+import time
+
+from django_comments_ink.conf import settings
+
+
+logger = logging.getLogger(__name__)
+
+WHEN_FULL_CHOICES = ("block", "drop", "sync")
+
+
+def get_dispatcher_options():
+    options = {
+        "workers": 2,
+        "queue_size": 1000,
+        "when_full": "block",
+        "retries": 3,
+        "retry_delay": 1,
+    }
+    options.update(getattr(settings, "COMMENTS_INK_MAIL_DISPATCHER", {}))
+    if options["when_full"] not in WHEN_FULL_CHOICES:
+        raise ValueError(
+            "COMMENTS_INK_MAIL_DISPATCHER['when_full'] must be one of: %s."
+            % ", ".join(WHEN_FULL_CHOICES)
+        )
+    return options
+
+
+class MailDispatcher:
+    """
+    Runs jobs, callables that send email, in a pool of worker threads.
+
+    A job is retried up to `retries` times when it raises an exception,
+    waiting `retry_delay` seconds before the first retry, and doubling the
+    delay before every other retry. Jobs must be safe to call again after
+    a failure.
+    """
+
+    def __init__(
+        self,
+        workers=2,
+        queue_size=1000,
+        when_full="block",
+        retries=3,
+        retry_delay=1,
+    ):
+        self.num_workers = max(workers, 1)
+        self.when_full = when_full
+        self.retries = retries
+        self.retry_delay = retry_delay
+        self.queue = queue.Queue(maxsize=max(queue_size, 1))
+        self.workers = []
+        self.lock = threading.Lock()
+        self.counters = {
+            "queued": 0,
+            "sent": 0,
+            "failed": 0,
+            "dropped": 0,
+            "retried": 0,
+            "latency_total": 0.0,
+            "latency_max": 0.0,
+        }
+
+    def start(self):
+        with self.lock:
+            self.workers = [w for w in self.workers if w.is_alive()]
+            while len(self.workers) < self.num_workers:
+                worker = threading.Thread(
+                    target=self.work,
+                    name="dci-mail-%d" % len(self.workers),
+                    daemon=True,
+                )
+                worker.start()
+                self.workers.append(worker)
+
+    def submit(self, job):
+        """
+        Queues `job` to be run by a worker. Returns False if the job is
+        dropped because the queue is full.
+        """
+        self.start()
+        item = (job, time.monotonic())
+        try:
+            self.queue.put(item, block=self.when_full == "block")
+        except queue.Full:
+            if self.when_full == "drop":
+                self.count("dropped")
+                logger.warning("Mail queue is full, job dropped: %r", job)
+                return False
+            # The caller sends the email.
+            self.run(*item)
+            return True
+        self.count("queued")
+        return True
+
+    def work(self):
+        while True:
+            item = self.queue.get()
+            try:
+                if item == None:
+                    return
+                self.run(*item)
+            finally:
+                self.queue.task_done()
+
+    def run(self, job, queued_at):
+        for attempt in range(self.retries + 1):
+            try:
+                job()
+            except Exception:
+                if attempt == self.retries:
+                    self.count("failed")
+                    logger.exception("Could not send mail: %r", job)
+                    return
+                self.count("retried")
+                time.sleep(self.retry_delay * 2**attempt)
+            else:
+                break
+        latency = time.monotonic() - queued_at
+        with self.lock:
+            self.counters["sent"] += 1
+            self.counters["latency_total"] += latency
+            self.counters["latency_max"] = max(
+                self.counters["latency_max"], latency
+            )
+
+    def count(self, counter):
+        with self.lock:
+            self.counters[counter] += 1
+
+    def stats(self):
+        """
+        Returns the counters of jobs queued, sent, failed, dropped and
+        retried, along with the average and maximum seconds taken from the
+        moment a job is submitted until it's sent.
+        """
+        with self.lock:
+            stats = dict(self.counters)
+        latency_total = stats.pop("latency_total")
+        stats["latency_avg"] = latency_total / max(stats["sent"], 1)
+        stats["pending"] = self.queue.qsize()
+        return stats
+
+    def join(self):
+        """Blocks until every job queued has been run."""
+        self.queue.join()
+
+    def shutdown(self, timeout=None):
+        """
+        Stops the workers after they run the jobs already queued. Workers
+        start again when another job is submitted.
+        """
+        with self.lock:
+            workers, self.workers = self.workers, []
+        for _ in workers:
+            self.queue.put(None)
+        deadline = None if timeout == None else time.monotonic() + timeout
+        for worker in workers:
+            if deadline != None:
+                worker.join(max(deadline - time.monotonic(), 0))
+            else:
+                worker.join()
+
+
+_dispatcher = None
+_dispatcher_lock = threading.Lock()
+
+
+def get_dispatcher():
+    """Returns the MailDispatcher of the process, creating it once."""
+    global _dispatcher
+    if _dispatcher == None:
+        with _dispatcher_lock:
+            if _dispatcher == None:
+                _dispatcher = MailDispatcher(**get_dispatcher_options())
+                atexit.register(_dispatcher.shutdown, timeout=30)
+    return _dispatcher
@@ -0,0 +1,130 @@
+import signal
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from django_comments_ink import outbox
+
+
+class Command(BaseCommand):
+    help = (
+        "Run the tasks written to the outbox when COMMENTS_INK_OUTBOX is "
+        "True: the emails sent when comments are posted, confirmed or flagged."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--database",
+            default="default",
+            help="DB connection of the outbox table.",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=100,
+            help="Number of tasks claimed at once.",
+        )
+        parser.add_argument(
+            "--concurrency",
+            type=int,
+            default=4,
+            help="Number of threads running the tasks of a batch.",
+        )
+        parser.add_argument(
+            "--lease",
+            type=int,
+            default=300,
+            help=(
+                "Seconds a claimed task is locked. If the worker stops, "
+                "another worker runs the task after the lease expires."
+            ),
+        )
+        parser.add_argument(
+            "--max-attempts",
+            type=int,
+            default=5,
+            help="Attempts before a task is marked as failed.",
+        )
+        parser.add_argument(
+            "--retry-delay",
+            type=int,
+            default=60,
+            help="Seconds before retrying a failed task, doubled each time.",
+        )
+        parser.add_argument(
+            "--sleep",
+            type=float,
+            default=1.0,
+            help="Seconds to wait when there are no tasks to run.",
+        )
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Exit when there are no more tasks to run.",
+        )
+
+    def run_task(self, task):
+        return outbox.run(
+            task,
+            max_attempts=self.max_attempts,
+            retry_delay=self.retry_delay,
+            using=self.using,
+        )
+
+    def run_task_in_thread(self, task):
+        try:
+            return self.run_task(task)
+        finally:
+            # Threads of the pool open their own DB connections.
+            connections.close_all()
+
+    def stop(self, signum, frame):
+        self.stopping = True
+
+    def handle(self, *args, **options):
+        self.using = options["database"]
+        self.max_attempts = options["max_attempts"]
+        self.retry_delay = options["retry_delay"]
+        self.stopping = False
+        concurrency = max(options["concurrency"], 1)
+        worker_id = outbox.get_worker_id()
+        summary = {"succeeded": 0, "failed": 0}
+        # Finish the batch at hand before exiting.
+        previous_handler = signal.signal(signal.SIGTERM, self.stop)
+
+        executor = None
+        if concurrency > 1:
+            executor = ThreadPoolExecutor(max_workers=concurrency)
+        try:
+            while not self.stopping:
+                tasks = outbox.claim(
+                    worker_id,
+                    batch_size=options["batch_size"],
+                    lease=options["lease"],
+                    using=self.using,
+                )
+                if not len(tasks):
+                    if options["once"]:
+                        break
+                    time.sleep(options["sleep"])
+                    continue
+                if executor:
+                    results = executor.map(self.run_task_in_thread, tasks)
+                else:
+                    results = map(self.run_task, tasks)
+                for succeeded in results:
+                    summary["succeeded" if succeeded else "failed"] += 1
+                if options["verbosity"] > 1:
+                    self.stdout.write("Ran %d outbox task(s)." % len(tasks))
+        except KeyboardInterrupt:
+            pass
+        finally:
+            if executor:
+                executor.shutdown(wait=True)
+            signal.signal(signal.SIGTERM, previous_handler)
+        self.stdout.write(
+            "%(succeeded)d outbox task(s) succeeded, %(failed)d failed."
+            % summary
+        )
@@ -0,0 +1,276 @@
+import heapq
+import os
+import re
+import sys
+import tempfile
+from itertools import groupby, islice
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from django_comments_ink import blacklist
+from django_comments_ink.models import BlackListedDomain
+
+
+DOMAIN_RE = re.compile(r"^[a-z0-9_-]+(\.[a-z0-9_-]+)+$")
+
+MAX_LENGTH = BlackListedDomain._meta.get_field("domain").max_length
+
+
+def parse_domain(line):
+    """
+    Returns the normalized domain in a line of a blacklist file, '' if the
+    line is blank or a comment, or None if the domain is not valid.
+
+    Besides one domain per line, it accepts lines with more fields after
+    the domain, separated by blanks, commas or semicolons, and email
+    addresses, of which only the domain is kept.
+    """
+    domain = line.strip().lower()
+    if is_valid(domain):
+        return domain  # Most lines hold just a domain.
+    line = line.split("#", 1)[0].strip()
+    if line == "":
+        return ""
+    domain = blacklist.normalize(re.split(r"[\s,;]", line, maxsplit=1)[0])
+    domain = domain.rsplit("@", 1)[-1]
+    try:
+        domain = domain.encode("idna").decode("ascii")
+    except UnicodeError:
+        return None
+    return domain if is_valid(domain) else None
+
+
+def is_valid(domain):
+    return len(domain) <= MAX_LENGTH and DOMAIN_RE.match(domain) != None
+
+
+class ExternalSorter:
+    """
+    Sorts a stream of (domain, pk) tuples that does not fit in memory.
+    Tuples are sorted in runs of `chunk_size` items, written to temporary
+    files, and merged when read back.
+    """
+
+    def __init__(self, chunk_size, tmpdir=None):
+        self.chunk_size = max(chunk_size, 1)
+        self.tmpdir = tmpdir
+        self.runs = []
+        self.chunk = set()
+
+    def add(self, domain, pk=0):
+        self.chunk.add((domain, pk))
+        if len(self.chunk) >= self.chunk_size:
+            self.flush()
+
+    def extend(self, items):
+        items = iter(items)
+        while True:
+            size = len(self.chunk)
+            self.chunk.update(islice(items, self.chunk_size - size))
+            if len(self.chunk) < self.chunk_size:
+                if len(self.chunk) == size:
+                    return  # The items are exhausted.
+                continue
+            self.flush()
+
+    def flush(self):
+        if not len(self.chunk):
+            return
+        run = tempfile.TemporaryFile(
+            mode="w+", encoding="ascii", dir=self.tmpdir
+        )
+        run.writelines("%s\t%d\n" % item for item in sorted(self.chunk))
+        run.seek(0)
+        self.runs.append(run)
+        self.chunk = set()
+
+    def read_run(self, run):
+        for line in run:
+            domain, pk = line.rstrip("\n").split("\t")
+            yield domain, int(pk)
+
+    def __iter__(self):
+        if not len(self.runs):
+            return iter(sorted(self.chunk))
+        self.flush()
+        return heapq.merge(*[self.read_run(run) for run in self.runs])
+
+    def close(self):
+        for run in self.runs:
+            run.close()
+        self.runs = []
+        self.chunk = set()
+
+
+def load_blacklist(
+    lines,
+    using="default",
+    dry_run=False,
+    delete=True,
+    batch_size=10000,
+    chunk_size=1000000,
+):
+    """
+    Makes the BlackListedDomain table of the given DB connection match the
+    domains in `lines`, an iterable of lines of a blacklist file.
+
+    The domains of the file and the rows of the table are sorted together,
+    in temporary files when there are more than `chunk_size` of them, and
+    compared in one pass. Missing domains are inserted with bulk_create,
+    and domains that are not in the file, or are duplicated in the table,
+    are deleted, both in batches of `batch_size` and in one transaction.
+    With `delete=False` domains are only added. With `dry_run=True` the
+    table is not modified.
+
+    Returns a dictionary with the number of lines read, invalid lines,
+    domains in the file, and domains added, deleted and kept.
+    """
+    summary = {
+        "lines": 0,
+        "invalid": 0,
+        "domains": 0,
+        "added": 0,
+        "deleted": 0,
+        "kept": 0,
+    }
+    qs = BlackListedDomain.objects.using(using)
+    to_create = []
+    to_delete = []
+
+    def write_batches(force=False):
+        if len(to_create) and (force or len(to_create) >= batch_size):
+            if not dry_run:
+                qs.bulk_create(
+                    [BlackListedDomain(domain=domain) for domain in to_create]
+                )
+            to_create.clear()
+        if len(to_delete) and (force or len(to_delete) >= batch_size):
+            if not dry_run:
+                # The blacklist is reloaded once on commit, not per row.
+                with blacklist.bulk_changes():
+                    qs.filter(pk__in=to_delete).delete()
+            to_delete.clear()
+
+    def read_file():
+        for line in lines:
+            summary["lines"] += 1
+            domain = parse_domain(line)
+            if domain == None:
+                summary["invalid"] += 1
+            elif domain != "":
+                yield domain, 0
+
+    def read_table():
+        rows = qs.order_by().values_list("domain", "pk")
+        for domain, pk in rows.iterator(chunk_size=batch_size):
+            domain = blacklist.normalize(domain)
+            if is_valid(domain):
+                yield domain, pk
+            elif delete:
+                # Not a domain, it can never be in the file.
+                summary["deleted"] += 1
+                to_delete.append(pk)
+            else:
+                summary["kept"] += 1
+
+    sorter = ExternalSorter(chunk_size)
+    try:
+        sorter.extend(read_file())
+        with transaction.atomic(using=using):
+            sorter.extend(read_table())
+            # Domains of the file have pk=0, and come first in their group.
+            for domain, group in groupby(sorter, key=lambda item: item[0]):
+                pks = [pk for _, pk in group]
+                in_file = pks[0] == 0
+                if in_file:
+                    pks = pks[pks.count(0) :]
+                    summary["domains"] += 1
+                    if len(pks):
+                        summary["kept"] += 1
+                        pks = pks[1:]
+                    else:
+                        summary["added"] += 1
+                        to_create.append(domain)
+                elif not delete:
+                    summary["kept"] += 1
+                    pks = pks[1:]
+                summary["deleted"] += len(pks)
+                to_delete.extend(pks)
+                write_batches()
+            write_batches(force=True)
+
+            if not dry_run and (summary["added"] or summary["deleted"]):
+                transaction.on_commit(blacklist.invalidate, using=using)
+    finally:
+        sorter.close()
+    return summary
+
+
+class Command(BaseCommand):
+    help = (
+        "Load a file with one blacklisted domain per line, like the one of "
+        "http://www.joewein.net/spam/blacklist.htm, into the BlackListedDomain "
+        "table, adding the new domains and deleting the ones not in the file."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "path", type=str, help="Path to the file, or '-' for stdin."
+        )
+        parser.add_argument(
+            "--database",
+            default="default",
+            help="DB connection of the BlackListedDomain table.",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Report the changes, without applying them.",
+        )
+        parser.add_argument(
+            "--no-delete",
+            action="store_true",
+            help="Only add domains, keeping the ones not in the file.",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=10000,
+            help="Number of domains inserted, or deleted, at once.",
+        )
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=1000000,
+            help=(
+                "Number of domains sorted in memory. Beyond it, they are "
+                "sorted in temporary files."
+            ),
+        )
+
+    def handle(self, *args, **options):
+        path = options["path"]
+        if path != "-" and not os.path.isfile(path):
+            raise CommandError("File '%s' does not exist." % path)
+
+        kwargs = {
+            "using": options["database"],
+            "dry_run": options["dry_run"],
+            "delete": not options["no_delete"],
+            "batch_size": max(options["batch_size"], 1),
+            "chunk_size": options["chunk_size"],
+        }
+        if path == "-":
+            summary = load_blacklist(sys.stdin, **kwargs)
+        else:
+            with open(path, encoding="utf-8", errors="replace") as lines:
+                summary = load_blacklist(lines, **kwargs)
+
+        self.stdout.write(
+            "Read %(lines)d lines, %(invalid)d invalid, with %(domains)d "
+            "domains: %(added)d added, %(deleted)d deleted, %(kept)d kept."
+            % summary
+        )
+        if options["dry_run"]:
+            self.stdout.write("Dry run, the blacklist was not modified.")
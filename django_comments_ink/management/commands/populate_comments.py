@@ -1,5 +1,9 @@
+import time
+
 from django.core.management.base import BaseCommand
-from django.db import connections
+from django.core.management.color import no_style
+from django.db import connections, transaction
+from django.db.models import Max
 from django.db.utils import ConnectionDoesNotExist, IntegrityError
 from django_comments.models import Comment
 from django_comments_ink.models import CommentThread, InkComment
@@ -12,37 +16,126 @@ class Command(BaseCommand):
 
     def add_arguments(self, parser):
         parser.add_argument("using", nargs="*", type=str)
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Number of comments inserted and committed at once.",
+        )
+        parser.add_argument(
+            "--resume",
+            action="store_true",
+            help=(
+                "Continue a previous run, importing only the comments with "
+                "an ID greater than the last one already imported."
+            ),
+        )
+
+    def iter_batches(self, using, start_id, batch_size):
+        """Yields lists of up to batch_size comment IDs greater than start_id."""
+        qs = (
+            Comment.objects.using(using)
+            .filter(pk__gt=start_id)
+            .order_by("pk")
+            .values_list("pk", flat=True)
+        )
+        batch = []
+        for comment_id in qs.iterator(chunk_size=batch_size):
+            batch.append(comment_id)
+            if len(batch) == batch_size:
+                yield batch
+                batch = []
+        if len(batch):
+            yield batch
+
+    def insert_batch(self, using, batch):
+        # Every comment becomes the root of its own thread.
+        CommentThread.objects.using(using).bulk_create(
+            [CommentThread(id=comment_id) for comment_id in batch]
+        )
+        # bulk_create does not support multi-table inheritance, so the rows
+        # of the InkComment table are inserted with multi-row INSERTs.
+        ops = connections[using].ops
+        qn = ops.quote_name
+        columns = [
+            "comment_ptr_id",
+            "thread_id",
+            "parent_id",
+            "level",
+            "order",
+            "followup",
+            "nested_count",
+        ]
+        # Each row takes 4 query parameters.
+        rows_per_query = ops.bulk_batch_size(columns[:4], batch) or len(batch)
+        with connections[using].cursor() as cursor:
+            for index in range(0, len(batch), rows_per_query):
+                ids = batch[index : index + rows_per_query]
+                sql = "INSERT INTO %s (%s) VALUES %s" % (
+                    qn(InkComment._meta.db_table),
+                    ", ".join(qn(column) for column in columns),
+                    ", ".join(["(%s, %s, %s, 0, 1, %s, 0)"] * len(ids)),
+                )
+                params = []
+                for comment_id in ids:
+                    params.extend([comment_id, comment_id, comment_id, False])
+                cursor.execute(sql, params)
+
+    def populate_db(self, using, batch_size, resume):
+        start_id = 0
+        if resume:
+            qs = InkComment.norel_objects.using(using)
+            start_id = qs.aggregate(last_id=Max("pk"))["last_id"] or 0
+        elif InkComment.norel_objects.using(using).exists():
+            raise IntegrityError("Table must be empty.")
+
+        pending = Comment.objects.using(using).filter(pk__gt=start_id).count()
+        added = 0
+        started = time.monotonic()
+        for batch in self.iter_batches(using, start_id, batch_size):
+            try:
+                with transaction.atomic(using=using):
+                    self.insert_batch(using, batch)
+            except IntegrityError as exc:
+                self.stdout.write(
+                    "Could not import the comments with ID %d to %d: %s"
+                    % (batch[0], batch[-1], exc)
+                )
+                self.stdout.write(
+                    "Run the command again with --resume to continue "
+                    "after the comment with ID %d." % (batch[0] - 1)
+                )
+                break
+            added += len(batch)
+            if self.verbosity > 0:
+                elapsed = max(time.monotonic() - started, 1e-6)
+                self.stdout.write(
+                    "Imported %d of %d comments, up to ID %d "
+                    "(%.0f comments/s)."
+                    % (added, pending, batch[-1], added / elapsed)
+                )
 
-    def populate_db(self, cursor):
-        for comment in Comment.objects.all():
-            #
-            # Insert into django_comments_ink_thread.
-            sql = (
-                "INSERT INTO %(table)s ('id', 'score', 'rating') "
-                "VALUES (%(id)d, 0, 0)"
-            )
-            cursor.execute(
-                sql % {"table": CommentThread._meta.db_table, "id": comment.id}
-            )
-            #
-            # Insert into django_comments_ink_comment.
-            sql = (
-                "INSERT INTO %(table)s "
-                "       ('comment_ptr_id', 'thread_id', 'parent_id',"
-                "        'level', 'order', 'followup', 'nested_count') "
-                "VALUES (%(id)d, %(id)d, %(id)d, 0, 1, FALSE, 0)"
-            )
-            cursor.execute(
-                sql % {"table": InkComment._meta.db_table, "id": comment.id}
-            )
+        # Threads were inserted with explicit IDs.
+        connection = connections[using]
+        sequence_sql = connection.ops.sequence_reset_sql(
+            no_style(), [CommentThread]
+        )
+        if len(sequence_sql):
+            with connection.cursor() as cursor:
+                for sql in sequence_sql:
+                    cursor.execute(sql)
+        return added
 
     def handle(self, *args, **options):
         total = 0
+        self.verbosity = options["verbosity"]
         using = options["using"] or ["default"]
         for db_conn in using:
             try:
-                self.populate_db(connections[db_conn].cursor())
-                total += InkComment.objects.using(db_conn).count()
+                connections[db_conn]
+                total += self.populate_db(
+                    db_conn, options["batch_size"], options["resume"]
+                )
             except ConnectionDoesNotExist:
                 self.stdout.write(
                     "DB connection '%s' does not exist." % db_conn
@@ -57,6 +150,4 @@ class Command(BaseCommand):
                     self.stdout.write(
                         "Table '%s' must be empty." % InkComment._meta.db_table
                     )
-            finally:
-                continue
         self.stdout.write("Added %d InkComment object(s)." % total)
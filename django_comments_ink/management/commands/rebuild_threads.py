@@ -0,0 +1,370 @@
+import json
+import os
+import shutil
+from concurrent.futures import ProcessPoolExecutor
+from itertools import groupby
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.db.models.functions import Mod
+from django.db.utils import ConnectionDoesNotExist
+
+from django_comments_ink import caching
+from django_comments_ink.management.workers import call, init_worker
+from django_comments_ink.models import THREAD_ORDER_GAP, InkComment
+
+
+FIELDS = ("pk", "thread_id", "parent_id", "level", "order", "nested_count")
+
+
+def check_thread(thread_id, rows, find_root=None):
+    """
+    Rebuilds the tree of a thread out of its rows, tuples with the values
+    in FIELDS sorted by 'order', and checks every comment against it.
+
+    Returns a list of issues, dictionaries with the 'comment', the 'issue'
+    (the name of the wrong field, or 'orphan'), the value 'found' and the
+    value 'expected'.
+
+    Comments that can't be reached from the root of the thread belong to
+    the thread of the root at the end of their chain of parents. When the
+    chain leaves the thread, `find_root` is called with the id of the first
+    parent out of it, and returns the id of that root, or None. Comments
+    whose chain doesn't end in a root are orphans, reported with no
+    expected value and not fixed.
+    """
+    by_id = {row[0]: row for row in rows}
+    children = {}
+    for row in rows:
+        if row[0] != row[2]:
+            children.setdefault(row[2], []).append(row[0])
+
+    # The root of a thread has the same id as the thread.
+    expected = {}
+    dfs = []
+    if thread_id in by_id:
+        # Depth-first walk, siblings in their current relative order.
+        stack = [(thread_id, 0)]
+        while len(stack):
+            comment_id, level = stack.pop()
+            if comment_id in expected:
+                continue  # The parent_id of the root forms a cycle.
+            expected[comment_id] = {"parent_id": by_id[comment_id][2]}
+            expected[comment_id]["level"] = level
+            dfs.append(comment_id)
+            for child_id in reversed(children.get(comment_id, [])):
+                stack.append((child_id, level + 1))
+        expected[thread_id]["parent_id"] = thread_id
+
+    # The nested_count of a comment is the size of its subtree, minus one.
+    nested_count = {comment_id: 0 for comment_id in dfs}
+    for comment_id in reversed(dfs):
+        parent_id = expected[comment_id]["parent_id"]
+        if parent_id != comment_id:
+            nested_count[parent_id] += 1 + nested_count[comment_id]
+
+    # Keep the current 'order' while it follows the depth-first walk.
+    # Otherwise spread it again, like models.renumber_thread does.
+    orders = [by_id[comment_id][4] for comment_id in dfs]
+    in_order = all(a < b for a, b in zip(orders, orders[1:]))
+    for index, comment_id in enumerate(dfs):
+        expected[comment_id]["nested_count"] = nested_count[comment_id]
+        if in_order:
+            expected[comment_id]["order"] = by_id[comment_id][4]
+        else:
+            expected[comment_id]["order"] = 1 + index * THREAD_ORDER_GAP
+
+    issues = []
+    for row in rows:
+        comment_id = row[0]
+        if comment_id not in expected:
+            root_id = None
+            ancestor_id, seen = comment_id, set()
+            while ancestor_id in by_id and ancestor_id not in seen:
+                seen.add(ancestor_id)
+                if by_id[ancestor_id][2] == ancestor_id:
+                    root_id = ancestor_id
+                    break
+                ancestor_id = by_id[ancestor_id][2]
+            else:
+                if ancestor_id not in by_id and find_root != None:
+                    root_id = find_root(ancestor_id)
+            if root_id != None and root_id != thread_id:
+                issues.append(
+                    {
+                        "comment": comment_id,
+                        "issue": "thread_id",
+                        "found": thread_id,
+                        "expected": root_id,
+                    }
+                )
+            else:
+                issues.append(
+                    {
+                        "comment": comment_id,
+                        "issue": "orphan",
+                        "found": row[2],
+                        "expected": None,
+                    }
+                )
+            continue
+        for field, found in zip(FIELDS[2:], row[2:]):
+            if found != expected[comment_id][field]:
+                issues.append(
+                    {
+                        "comment": comment_id,
+                        "issue": field,
+                        "found": found,
+                        "expected": expected[comment_id][field],
+                    }
+                )
+    return issues
+
+
+def iter_threads(qs, thread_ids_qs, batch_size):
+    """
+    Yields a tuple (thread_id, rows) for every thread in `qs`, reading
+    `batch_size` threads per query. Every query is evaluated completely
+    before the fixes of its threads are written.
+    """
+    last_thread_id = None
+    while True:
+        page_qs = thread_ids_qs
+        if last_thread_id != None:
+            page_qs = page_qs.filter(thread_id__gt=last_thread_id)
+        thread_ids = list(page_qs[:batch_size])
+        if not len(thread_ids):
+            return
+        last_thread_id = thread_ids[-1]
+        rows = (
+            qs.filter(thread_id__in=thread_ids)
+            .order_by("thread_id", "order", "pk")
+            .values_list(*FIELDS)
+        )
+        for thread_id, group in groupby(rows, key=lambda row: row[1]):
+            yield thread_id, list(group)
+
+
+def rebuild_threads(
+    using,
+    bucket=0,
+    num_buckets=1,
+    dry_run=False,
+    batch_size=1000,
+    report_path=None,
+    thread_ids=None,
+):
+    """
+    Checks the threads of comments in the given DB connection, and fixes
+    the comments with wrong values, unless `dry_run` is True.
+
+    With num_buckets > 1, only threads with `thread_id % num_buckets ==
+    bucket` are processed, so that threads can be spread across processes.
+    With `thread_ids`, only those threads are processed.
+
+    Threads are read in pages of `batch_size` threads, and fixes are written
+    in batches of up to `batch_size` comments.
+    When `report_path` is given, each issue found is written to it as a
+    line of JSON.
+
+    Returns a dictionary with the number of threads, comments, issues and
+    comments fixed, and with the ids of the threads to which comments were
+    moved in 'moved_to'. Those threads have to be checked again.
+    """
+    qs = InkComment.norel_objects.using(using)
+    if thread_ids != None:
+        qs = qs.filter(thread_id__in=thread_ids)
+    if num_buckets > 1:
+        qs = qs.annotate(bucket=Mod("thread_id", num_buckets)).filter(
+            bucket=bucket
+        )
+    thread_ids_qs = (
+        qs.order_by("thread_id").values_list("thread_id", flat=True).distinct()
+    )
+
+    summary = {"threads": 0, "comments": 0, "issues": 0, "fixed": 0}
+    moved_to = set()
+    report = open(report_path, "w") if report_path else None
+    pending = {}
+    parents = {}
+
+    def find_root(comment_id):
+        # Follow the chain of parents of the comment, across threads.
+        seen = set()
+        while comment_id not in seen:
+            seen.add(comment_id)
+            if comment_id not in parents:
+                parents[comment_id] = (
+                    InkComment.norel_objects.using(using)
+                    .filter(pk=comment_id)
+                    .values_list("parent_id", flat=True)
+                    .first()
+                )
+            parent_id = parents[comment_id]
+            if parent_id == None:
+                return None  # The comment doesn't exist.
+            if parent_id == comment_id:
+                return comment_id
+            comment_id = parent_id
+        return None  # The chain of parents forms a cycle.
+
+    def write_fixes():
+        # Values in 'pending' are the rows of the comments, with the fixes.
+        InkComment.norel_objects.using(using).bulk_update(
+            [InkComment(pk=pk, **values) for pk, values in pending.items()],
+            FIELDS[1:],
+        )
+        objects = (
+            InkComment.norel_objects.using(using)
+            .filter(pk__in=list(pending))
+            .values_list("content_type_id", "object_pk", "site_id")
+            .distinct()
+        )
+        for content_type_id, object_pk, site_id in objects:
+            caching.clear_comment_cache(content_type_id, object_pk, site_id)
+        summary["fixed"] += len(pending)
+        pending.clear()
+
+    try:
+        for thread_id, thread_rows in iter_threads(
+            qs, thread_ids_qs, batch_size
+        ):
+            summary["threads"] += 1
+            summary["comments"] += len(thread_rows)
+            by_id = {row[0]: row for row in thread_rows}
+            for issue in check_thread(thread_id, thread_rows, find_root):
+                summary["issues"] += 1
+                fixable = issue["issue"] != "orphan"
+                if fixable and not dry_run:
+                    comment_id = issue["comment"]
+                    if comment_id not in pending:
+                        row = by_id[comment_id]
+                        pending[comment_id] = dict(zip(FIELDS[1:], row[1:]))
+                    pending[comment_id][issue["issue"]] = issue["expected"]
+                    if issue["issue"] == "thread_id":
+                        moved_to.add(issue["expected"])
+                if report:
+                    issue["thread"] = thread_id
+                    issue["fixed"] = fixable and not dry_run
+                    report.write(json.dumps(issue) + "\n")
+            if len(pending) >= batch_size:
+                write_fixes()
+        if len(pending):
+            write_fixes()
+    finally:
+        if report:
+            report.close()
+    summary["moved_to"] = sorted(moved_to)
+    return summary
+
+
+class Command(BaseCommand):
+    help = (
+        "Check the level, order, parent_id and nested_count of every comment "
+        "against the tree of its thread, and fix the wrong ones."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("using", nargs="*", type=str)
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Report the issues found, without fixing them.",
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=1,
+            help="Number of processes among which to spread the threads.",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Number of threads read, and of comments fixed, at once.",
+        )
+        parser.add_argument(
+            "--report",
+            type=str,
+            default=None,
+            help="Write each issue found as a line of JSON to this file.",
+        )
+
+    def process_db(self, using, report):
+        # Fail early, before starting any worker.
+        connections[using]
+        kwargs = {"dry_run": self.dry_run, "batch_size": self.batch_size}
+        parts = [None] * self.workers
+        if report:
+            parts = [f"{report}.{bucket}" for bucket in range(self.workers)]
+        if self.workers == 1:
+            results = [rebuild_threads(using, report_path=parts[0], **kwargs)]
+        else:
+            # Don't let the workers inherit open connections.
+            connections.close_all()
+            with ProcessPoolExecutor(
+                max_workers=self.workers, initializer=init_worker
+            ) as executor:
+                futures = [
+                    executor.submit(
+                        call,
+                        f"{__name__}.rebuild_threads",
+                        using,
+                        bucket,
+                        self.workers,
+                        report_path=parts[bucket],
+                        **kwargs,
+                    )
+                    for bucket in range(self.workers)
+                ]
+                results = [future.result() for future in futures]
+
+        summary = {"threads": 0, "comments": 0, "issues": 0, "fixed": 0}
+        moved_to = set()
+        for result in results:
+            moved_to.update(result.pop("moved_to"))
+            for key, value in result.items():
+                summary[key] += value
+
+        # The threads that received comments from other threads are checked
+        # again, once all the workers are done, to fix the moved comments.
+        while len(moved_to):
+            part = f"{report}.moved{len(parts)}" if report else None
+            result = rebuild_threads(
+                using, report_path=part, thread_ids=moved_to, **kwargs
+            )
+            summary["issues"] += result["issues"]
+            summary["fixed"] += result["fixed"]
+            moved_to = set(result["moved_to"])
+            parts.append(part)
+
+        if report:
+            with open(report, "w") as output:
+                for part in parts:
+                    with open(part) as part_file:
+                        shutil.copyfileobj(part_file, output)
+                    os.remove(part)
+        return summary
+
+    def handle(self, *args, **options):
+        using = options["using"] or ["default"]
+        self.dry_run = options["dry_run"]
+        self.workers = max(options["workers"], 1)
+        self.batch_size = options["batch_size"]
+        report = options["report"]
+        if report and len(using) > 1:
+            raise CommandError("--report takes one DB connection at a time.")
+
+        for db_conn in using:
+            try:
+                summary = self.process_db(db_conn, report)
+            except ConnectionDoesNotExist:
+                self.stdout.write(
+                    "DB connection '%s' does not exist." % db_conn
+                )
+                continue
+            self.stdout.write(
+                "Checked %(comments)d comments in %(threads)d threads "
+                "in '%(using)s': %(issues)d issue(s) found, "
+                "%(fixed)d comment(s) fixed." % dict(summary, using=db_conn)
+            )
@@ -1,22 +1,109 @@
 import logging
+from concurrent.futures import ProcessPoolExecutor
 
 from django.contrib.contenttypes.models import ContentType
 from django.core.management.base import BaseCommand
+from django.db import connections
 from django.db.models import Q
+from django.db.models.functions import Mod
 from django.db.utils import ConnectionDoesNotExist
 
+from django_comments_ink import caching
 from django_comments_ink.conf import settings
+from django_comments_ink.management.workers import call, init_worker
 from django_comments_ink.models import InkComment
 
 
 logger = logging.getLogger(__name__)
 
 
+def repair_nested_count(
+    using, q, bucket=0, num_buckets=1, dry_run=False, batch_size=1000
+):
+    """
+    Computes the nested_count of the comments matching `q`, and updates the
+    ones whose nested_count is wrong, unless `dry_run` is True.
+
+    With num_buckets > 1, only threads with `thread_id % num_buckets ==
+    bucket` are processed, so that threads can be spread across processes.
+
+    Returns a tuple with the number of comments processed and a list of
+    (comment_id, old_nested_count, new_nested_count) for the wrong ones.
+    """
+    qs = InkComment.norel_objects.using(using).filter(q)
+    if num_buckets > 1:
+        qs = qs.annotate(bucket=Mod("thread_id", num_buckets)).filter(
+            bucket=bucket
+        )
+    # Within a thread, replies come after their parent in 'order'. Going
+    # backwards, a comment's nested comments are visited before the comment.
+    rows = (
+        qs.order_by("thread_id", "-order")
+        .values_list("pk", "thread_id", "parent_id", "nested_count")
+        .iterator(chunk_size=batch_size)
+    )
+
+    processed = 0
+    changes = []
+    active_thread_id = None
+    parents = {}
+    for comment_id, thread_id, parent_id, old_nested_count in rows:
+        processed += 1
+        # Clean up parents when there is a control break.
+        if thread_id != active_thread_id:
+            parents = {}
+            active_thread_id = thread_id
+
+        nested_count = parents.get(comment_id, 0)
+        parents[parent_id] = parents.get(parent_id, 0) + 1 + nested_count
+        if nested_count != old_nested_count:
+            changes.append((comment_id, old_nested_count, nested_count))
+
+    if dry_run or not len(changes):
+        return processed, changes
+
+    # Write only the comments that changed, without calling save(): no
+    # signals, and the cache of each affected object is cleared only once.
+    objects = set()
+    for index in range(0, len(changes), batch_size):
+        chunk = changes[index : index + batch_size]
+        InkComment.norel_objects.using(using).bulk_update(
+            [InkComment(pk=pk, nested_count=count) for pk, _, count in chunk],
+            ["nested_count"],
+        )
+        objects.update(
+            InkComment.norel_objects.using(using)
+            .filter(pk__in=[pk for pk, _, _ in chunk])
+            .values_list("content_type_id", "object_pk", "site_id")
+            .distinct()
+        )
+    for content_type_id, object_pk, site_id in objects:
+        caching.clear_comment_cache(content_type_id, object_pk, site_id)
+    return processed, changes
+
+
 class Command(BaseCommand):
     help = "Initialize the nested_count field for all the comments in the DB."
 
     def add_arguments(self, parser):
         parser.add_argument("using", nargs="*", type=str)
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Report the comments with a wrong nested_count, only.",
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=1,
+            help="Number of processes among which to spread the threads.",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Number of rows fetched and updated at once.",
+        )
 
     def update_nested_count(self, using):
         total = 0
@@ -39,15 +126,11 @@ class Command(BaseCommand):
             except ContentType.DoesNotExist as exc:
                 logger.warn("app.model '%s' does not exist", app_model)
             else:
-                qs = (
-                    InkComment.objects.using(using)
-                    .filter(content_type=ctype, level__lte=mtl)
-                    .order_by("thread__id", "-order")
-                )
-                count = self.process_queryset(qs)
+                q = Q(content_type_id=ctype.pk, level__lte=mtl)
+                count = self.process_queryset(using, q)
                 total += count
                 self.stdout.write(
-                    f"Updated {count} InkComments for {app_model}."
+                    f"{self.verb} {count} InkComments for {app_model}."
                 )
 
         if not len(MTLs):
@@ -56,49 +139,65 @@ class Command(BaseCommand):
         # 2nd: Process the rest of the comments.
         MTL = settings.COMMENTS_INK_MAX_THREAD_LEVEL
         if len(ctype_list):
-            qs = (
-                InkComment.objects.using(using)
-                .filter(~Q(content_type__in=ctype_list), level__lte=MTL)
-                .order_by("thread__id", "-order")
+            q = ~Q(content_type_id__in=[ct.pk for ct in ctype_list]) & Q(
+                level__lte=MTL
             )
-            count = self.process_queryset(qs)
+            count = self.process_queryset(using, q)
             total += count
-            self.stdout.write(f"Updated additional {count} InkComments.")
+            self.stdout.write(f"{self.verb} additional {count} InkComments.")
         else:
-            qs = (
-                InkComment.objects.using(using)
-                .filter(level__lte=MTL)
-                .order_by("thread__id", "-order")
-            )
-            total = self.process_queryset(qs)
-            self.stdout.write(f"Updated {total} InkComments.")
+            total = self.process_queryset(using, Q(level__lte=MTL))
+            self.stdout.write(f"{self.verb} {total} InkComments.")
 
         return total
 
-    def process_queryset(self, qs):
-        active_thread_id = -1
-        parents = {}
-
-        for comment in qs:
-            # Clean up parents when there is a control break.
-            if comment.thread.id != active_thread_id:
-                parents = {}
-                active_thread_id = comment.thread.id
-
-            nested_count = parents.get(comment.comment_ptr_id, 0)
-            parents.setdefault(comment.parent_id, 0)
-            if nested_count > 0:
-                parents[comment.parent_id] += 1 + nested_count
-            else:
-                parents[comment.parent_id] += 1
-            comment.nested_count = nested_count
-            comment.save()
-
-        return qs.count()
+    def process_queryset(self, using, q):
+        # Fail early, before starting any worker.
+        connections[using]
+        kwargs = {"dry_run": self.dry_run, "batch_size": self.batch_size}
+        if self.workers > 1:
+            # Don't let the workers inherit open connections.
+            connections.close_all()
+            with ProcessPoolExecutor(
+                max_workers=self.workers, initializer=init_worker
+            ) as executor:
+                futures = [
+                    executor.submit(
+                        call,
+                        f"{__name__}.repair_nested_count",
+                        using,
+                        q,
+                        bucket,
+                        self.workers,
+                        **kwargs,
+                    )
+                    for bucket in range(self.workers)
+                ]
+                results = [future.result() for future in futures]
+        else:
+            results = [repair_nested_count(using, q, **kwargs)]
+
+        processed = 0
+        for count, changes in results:
+            processed += count
+            self.drift += len(changes)
+            if self.verbosity > 1:
+                for comment_id, old_count, new_count in changes:
+                    self.stdout.write(
+                        f"InkComment {comment_id}: nested_count "
+                        f"{old_count} -> {new_count}."
+                    )
+        return processed
 
     def handle(self, *args, **options):
         total = 0
         using = options["using"] or ["default"]
+        self.dry_run = options["dry_run"]
+        self.workers = max(options["workers"], 1)
+        self.batch_size = options["batch_size"]
+        self.verbosity = options["verbosity"]
+        self.verb = "Checked" if self.dry_run else "Updated"
+        self.drift = 0
 
         for db_conn in using:
             try:
@@ -108,6 +207,16 @@ class Command(BaseCommand):
                     "DB connection '%s' does not exist." % db_conn
                 )
                 continue
+        if self.dry_run:
+            self.stdout.write(
+                "%d InkComment object(s) with a wrong nested_count."
+                % self.drift
+            )
+        else:
+            self.stdout.write(
+                "%d InkComment object(s) with a wrong nested_count fixed."
+                % self.drift
+            )
         self.stdout.write(
             "%d InkComment object(s) processed in all DBs." % total
         )
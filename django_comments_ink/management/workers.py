@@ -0,0 +1,35 @@
+"""
+Run the work of the management commands in a pool of processes.
+
+This module doesn't need the app registry to be imported, so that processes
+started with the 'spawn' or 'forkserver' methods can unpickle the initializer
+and the tasks submitted to them before Django is set up.
+"""
+
+from importlib import import_module
+
+import django
+from django.db import connections
+
+
+# Connections inherited from the parent process, when forked.
+_inherited = []
+
+
+def init_worker():
+    django.setup()
+    # Connections inherited from the parent process can't be shared, and
+    # closing them here would close them in the parent too. Drop them, and
+    # keep a reference so that they are not closed when garbage collected.
+    for conn in connections.all():
+        if conn.connection != None:
+            _inherited.append(conn.connection)
+            conn.connection = None
+
+
+def call(path, *args, **kwargs):
+    """
+    Calls the function at the dotted `path`, imported once in the worker.
+    """
+    module_path, name = path.rsplit(".", 1)
+    return getattr(import_module(module_path), name)(*args, **kwargs)
@@ -0,0 +1,17 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("django_comments_ink", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="inkcomment",
+            index=models.Index(
+                fields=["thread", "order"],
+                name="django_comm_thread__d7c935_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,27 @@
+from django.db import migrations
+
+
+def normalize_domains(apps, schema_editor):
+    # BlackListedDomain.save normalizes domains since this migration. Rows
+    # saved before, or created with bulk_create, are normalized here.
+    BlackListedDomain = apps.get_model(
+        "django_comments_ink", "BlackListedDomain"
+    )
+    qs = BlackListedDomain.objects.using(schema_editor.connection.alias)
+    changed = []
+    for item in qs.iterator(chunk_size=10000):
+        domain = item.domain.strip().strip(".").lower()
+        if domain != item.domain:
+            item.domain = domain
+            changed.append(item)
+    qs.bulk_update(changed, ["domain"], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("django_comments_ink", "0003_outboxtask"),
+    ]
+
+    operations = [
+        migrations.RunPython(normalize_domains, migrations.RunPython.noop),
+    ]
@@ -1,16 +1,24 @@
 import logging
+import threading
 from collections import OrderedDict
+from contextlib import contextmanager
 
+from django import VERSION as DJANGO_VERSION
+from django.contrib.auth import get_user_model
 from django.contrib.contenttypes.fields import GenericForeignKey
 from django.contrib.contenttypes.models import ContentType
 from django.contrib.sites.models import Site
 from django.core import signing
-from django.db import models
-from django.db.models import F, Max, Min, Prefetch, Q
-from django.db.models.signals import post_delete
-from django.db.transaction import atomic
+from django.db import connections, models, router
+from django.db.models import Count, F, Max, Min, Prefetch, Q
+from django.db.models import prefetch_related_objects
+from django.db.models.expressions import RawSQL
+from django.db.models.signals import post_delete, post_save
+from django.db.transaction import atomic, on_commit
 from django.urls import reverse
+from django.utils.timezone import now
 from django.utils.translation import gettext_lazy as _
+from django_comments.abstracts import CommentAbstractModel
 from django_comments.managers import CommentManager
 from django_comments.models import Comment, CommentFlag
 from django_comments_ink import (
@@ -20,6 +28,7 @@ from django_comments_ink import (
     get_object_reactions_enum,
 )
 from django_comments_ink.conf import settings
+from django_comments_ink.paginator import carry_layout_over
 from django_comments_ink.utils import get_current_site_id
 
 
@@ -77,10 +86,14 @@ class CommentThread(models.Model):
         super(CommentThread, self).save(*args, **kwargs)
         cm = InkComment.objects.get(pk=self.id)
         caching.clear_comment_cache(
-            cm.content_type.pk, cm.object_pk, cm.site.pk
+            cm.content_type.pk, cm.object_pk, cm.site.pk, using=self._state.db
         )
 
 
+# Distance between the 'order' of consecutive comments of a thread.
+THREAD_ORDER_GAP = 1024
+
+
 class InkComment(Comment):
     thread = models.ForeignKey(
         CommentThread,
@@ -98,6 +111,9 @@ class InkComment(Comment):
     objects = InkCommentManager()
     norel_objects = CommentManager()
 
+    class Meta(CommentAbstractModel.Meta):
+        indexes = [models.Index(fields=["thread", "order"])]
+
     def get_absolute_url(self, anchor_pattern="#comment-%(id)s"):
         return reverse(
             "comments-url-redirect",
@@ -105,7 +121,7 @@ class InkComment(Comment):
         ) + (anchor_pattern % self.__dict__)
 
     def save(self, *args, **kwargs):
-        caching.clear_comment_cache(
+        generation = caching.incr_generation(
             self.content_type.id, self.object_pk, self.site.pk
         )
         is_new = self.pk is None
@@ -116,49 +132,98 @@ class InkComment(Comment):
                 comment_thread.save()
                 self.parent_id = self.id
                 self.thread = comment_thread
+                kwargs["force_insert"] = False
+                super(Comment, self).save(*args, **kwargs)
             else:
-                if max_thread_level_for_content_type(self.content_type):
-                    with atomic():
-                        self._calculate_thread_data()
-                else:
+                if not max_thread_level_for_content_type(self.content_type):
                     raise MaxThreadLevelExceededException(self)
-            kwargs["force_insert"] = False
-            super(Comment, self).save(*args, **kwargs)
+                # The thread stays locked until the reply has its 'order'.
+                with atomic():
+                    self._calculate_thread_data()
+                    kwargs["force_insert"] = False
+                    super(Comment, self).save(*args, **kwargs)
+
+        # Increment the generation again on commit, in case another request
+        # cached the comments before the change was committed. When nothing
+        # else changed in between, the layout cached before the first
+        # increment gets the new reply.
+        is_reply = is_new and self.level > 0
+        target = (self.content_type.id, self.object_pk, self.site.pk)
+
+        def incr_generation():
+            new_generation = caching.incr_generation(*target)
+            if (
+                is_reply
+                and generation != None
+                and new_generation == generation + 1
+            ):
+                carry_layout_over(
+                    *target,
+                    new_generation,
+                    self.thread_id,
+                    prev_generation=generation - 1,
+                )
+
+        on_commit(incr_generation, using=self._state.db)
 
     def _calculate_thread_data(self):
-        # Implements the following approach:
-        #  http://www.sqlteam.com/article/sql-for-threaded-discussion-forums
-        parent = InkComment.objects.get(pk=self.parent_id)
+        # Comments are listed by thread and 'order'. Within a thread 'order'
+        # follows a depth-first walk of the tree, leaving THREAD_ORDER_GAP
+        # between consecutive comments. A reply takes a value between the last
+        # comment of its parent's subtree and the comment that follows it, so
+        # inserting it does not rewrite any other row. The thread is renumbered
+        # only when there is no room left in the gap.
+        #
+        # Concurrent replies to the same thread would take the same 'order',
+        # and replies to different comments of a thread can share a gap, so
+        # the CommentThread row is locked, serializing the replies to the
+        # thread. The lock lasts until the enclosing transaction ends, so
+        # views keep that short: emails are sent after the commit. The parent
+        # is read after taking the lock, in case another reply renumbered the
+        # thread meanwhile.
+        parent_thread = InkComment.norel_objects.filter(pk=self.parent_id)
+        list(
+            CommentThread.objects.select_for_update().filter(
+                pk__in=parent_thread.values("thread_id")
+            )
+        )
+        parent = InkComment.norel_objects.get(pk=self.parent_id)
         if parent.level == max_thread_level_for_content_type(self.content_type):
             raise MaxThreadLevelExceededException(self)
 
-        self.thread = parent.thread
+        self.thread_id = parent.thread_id
         self.level = parent.level + 1
-        qc_eq_thread = InkComment.norel_objects.filter(thread=parent.thread)
-        qc_ge_level = qc_eq_thread.filter(
-            level__lte=parent.level, order__gt=parent.order
-        )
-        if qc_ge_level.count():
-            min_order = qc_ge_level.aggregate(Min("order"))["order__min"]
-            qc_eq_thread.filter(order__gte=min_order).update(
-                order=F("order") + 1
-            )
-            self.order = min_order
-        else:
-            max_order = qc_eq_thread.aggregate(Max("order"))["order__max"]
-            self.order = max_order + 1
-
-        if self.id != parent.id:
-            parent_ids = []
-            while True:
-                parent_ids.append(parent.pk)
-                if parent.id == parent.parent_id:
-                    break
-                parent = qc_eq_thread.get(pk=parent.parent_id)
-            if parent_ids:
-                qc_eq_thread.filter(pk__in=parent_ids).update(
-                    nested_count=F("nested_count") + 1
+        qc_eq_thread = InkComment.norel_objects.filter(thread=parent.thread_id)
+        while True:
+            # Both lookups walk the (thread, order) index from the parent.
+            next_order = (
+                qc_eq_thread.filter(
+                    level__lte=parent.level, order__gt=parent.order
                 )
+                .order_by("order")
+                .values_list("order", flat=True)
+                .first()
+            )
+            qc_subtree = qc_eq_thread.filter(order__gte=parent.order)
+            if next_order != None:
+                qc_subtree = qc_subtree.filter(order__lt=next_order)
+            last_order = (
+                qc_subtree.order_by("-order")
+                .values_list("order", flat=True)
+                .first()
+            )
+            if next_order == None:
+                self.order = last_order + THREAD_ORDER_GAP
+                break
+            if next_order - last_order > 1:
+                self.order = (last_order + next_order) // 2
+                break
+            renumber_thread(parent.thread_id)
+            parent.refresh_from_db(fields=["order"])
+
+        InkComment.norel_objects.filter(
+            pk__in=get_comment_ancestors(parent.pk)
+        ).update(nested_count=F("nested_count") + 1)
 
     def get_reply_url(self):
         return reverse("comments-ink-reply", args=(self.pk,))
@@ -170,6 +235,10 @@ class InkComment(Comment):
             return False
 
     def get_reactions(self):
+        # Attached to the comment by prefetch_comment_feedback.
+        if getattr(self, "_reactions", None) != None:
+            return self._reactions
+
         dci_cache = caching.get_cache()
         key = settings.COMMENTS_INK_CACHE_KEYS["comment_reactions"].format(
             comment_id=self.pk
@@ -180,37 +249,26 @@ class InkComment(Comment):
                 logger.debug("Fetching %s from the cache", key)
                 return result
 
-        total_counter = 0
         max_users_listed = getattr(
             settings, "COMMENTS_INK_MAX_USERS_IN_TOOLTIP", 10
         )
-        reactions = OrderedDict([(k, {}) for k in get_comment_reactions_enum()])
-        # First add the existing reactions sorted by reaction value.
-        for item in self.reactions.order_by("reaction"):
-            total_counter += item.counter
-            reaction = get_comment_reactions_enum()(item.reaction)
-            authors = [
-                settings.COMMENTS_INK_API_USER_REPR(author)
-                for author in item.authors.all()[:max_users_listed]
+        users_order = settings.COMMENTS_INK_USERS_REACTED_LIST_ORDER
+        result = summarize_reactions(
+            [
+                (item, item.authors.order_by(*users_order)[:max_users_listed])
+                for item in self.reactions.order_by("reaction")
             ]
-            reactions[reaction.value] = {
-                "value": reaction.value,
-                "authors": authors,
-                "counter": item.counter,
-                "label": reaction.label,
-                "icon": reaction.icon,
-            }
-        # Return only the values of OrderedDict after it's being sorted.
-        result = {
-            "counter": total_counter,
-            "list": [v for k, v in reactions.items() if len(v)],
-        }
+        )
         if dci_cache != None and key != "":
             dci_cache.set(key, result, timeout=None)
             logger.debug("Caching reactions for comment %d" % self.pk)
         return result
 
     def get_flags(self):
+        # Attached to the comment by prefetch_comment_feedback.
+        if getattr(self, "_flags", None) != None:
+            return self._flags
+
         dci_cache = caching.get_cache()
         key = settings.COMMENTS_INK_CACHE_KEYS["comment_flags"].format(
             comment_id=self.pk
@@ -222,10 +280,8 @@ class InkComment(Comment):
                 return result
 
         flag_qs = self.flags.filter(flag=CommentFlag.SUGGEST_REMOVAL)
-        result = {
-            "users": [flag.user for flag in flag_qs],
-            "counter": flag_qs.count(),
-        }
+        users = [flag.user for flag in flag_qs.select_related("user")]
+        result = {"users": users, "counter": len(users)}
 
         if dci_cache != None and key != "":
             dci_cache.set(key, result, timeout=None)
@@ -251,9 +307,23 @@ class InkComment(Comment):
 
         flags = CommentFlag.objects.filter(
             flag__in=[CommentFlag.SUGGEST_REMOVAL]
-        ).prefetch_related("user")
+        ).select_related("user")
 
-        reactions = CommentReaction.objects.all().prefetch_related("authors")
+        # Only the first users who reacted are listed. Since Django 4.2 the
+        # prefetch itself is limited to them, per reaction, in the attribute
+        # `listed_authors` (sliced prefetches need their own attribute).
+        authors = get_user_model().objects.order_by(
+            *settings.COMMENTS_INK_USERS_REACTED_LIST_ORDER
+        )
+        if DJANGO_VERSION >= (4, 2):
+            authors_prefetch = Prefetch(
+                "authors",
+                queryset=authors[: settings.COMMENTS_INK_MAX_USERS_IN_TOOLTIP],
+                to_attr="listed_authors",
+            )
+        else:
+            authors_prefetch = Prefetch("authors", queryset=authors)
+        reactions = CommentReaction.objects.prefetch_related(authors_prefetch)
 
         prefetch_args = [
             Prefetch("flags", queryset=flags),
@@ -276,17 +346,205 @@ class InkComment(Comment):
         )
 
 
-def publish_or_withhold_nested_comments(comment, shall_be_public=False):
-    qs = get_model().norel_objects.filter(
-        ~Q(pk=comment.id), parent_id=comment.id
+def get_comment_counts(targets, site_id):
+    """
+    Returns the number of comments posted to each of the given targets,
+    as a dictionary keyed by the pairs (content_type.pk, object_pk), with
+    object_pk as a string. Targets are pairs (content_type, object_pk).
+
+    Comments are counted as with the get_inkcomment_count template tag,
+    and share its cache keys. Counts found in the cache, zeros included,
+    are read at once, and the missing ones are computed with one grouped
+    query per content type.
+    """
+    object_pks = {}  # Lists of object_pks by content type.
+    for content_type, object_pk in targets:
+        object_pks.setdefault(content_type, []).append(str(object_pk))
+
+    counts = {}
+    dci_cache = caching.get_cache()
+    for content_type, pks in object_pks.items():
+        pks = list(dict.fromkeys(pks))  # Remove duplicates.
+        keys = {}
+        if dci_cache != None:
+            generations = caching.get_generations(content_type.pk, pks, site_id)
+            key_ptn = settings.COMMENTS_INK_CACHE_KEYS["comment_count"]
+            keys = {
+                object_pk: key_ptn.format(
+                    ctype_pk=content_type.pk,
+                    object_pk=object_pk,
+                    site_id=site_id,
+                    gen=generation,
+                )
+                for object_pk, generation in generations.items()
+            }
+            keys = {pk: key for pk, key in keys.items() if key != ""}
+            cached = dci_cache.get_many(list(keys.values()))
+            for object_pk, key in keys.items():
+                if key in cached:
+                    counts[(content_type.pk, object_pk)] = cached[key]
+
+        missing = [pk for pk in pks if (content_type.pk, pk) not in counts]
+        if not len(missing):
+            continue
+
+        fkwds = {
+            "content_type": content_type,
+            "object_pk__in": missing,
+            "site__pk": site_id,
+            "is_public": True,
+            "level__lte": max_thread_level_for_content_type(content_type),
+        }
+        if getattr(settings, "COMMENTS_HIDE_REMOVED", True):
+            fkwds["is_removed"] = False
+        found = dict(
+            get_model()
+            .norel_objects.filter(**fkwds)
+            .order_by()
+            .values_list("object_pk")
+            .annotate(Count("pk"))
+        )
+        to_cache = {}
+        for object_pk in missing:
+            counts[(content_type.pk, object_pk)] = found.get(object_pk, 0)
+            if object_pk in keys:
+                to_cache[keys[object_pk]] = found.get(object_pk, 0)
+        if len(to_cache):
+            logger.debug("Caching %d comment counts", len(to_cache))
+            dci_cache.set_many(to_cache, timeout=None)
+    return counts
+
+
+# ----------------------------------------------------------------------
+# Traversal of the tree of nested comments.
+
+# Database vendors whose backends support recursive common table expressions.
+RECURSIVE_CTE_VENDORS = ("sqlite", "postgresql")
+
+
+def _get_nested_comment_ids_with_cte(comment_id, using):
+    # The parent_id field may not be defined in the comment model's own table
+    # if it is a subclass of InkComment (multi-table inheritance).
+    parent_field = get_model()._meta.get_field("parent_id")
+    opts = parent_field.model._meta
+    connection = connections[using]
+    qn = connection.ops.quote_name
+    sql = (
+        "WITH RECURSIVE nested(id) AS ("
+        "  SELECT {pk} FROM {table} WHERE {parent} = %s AND {pk} <> %s"
+        "  UNION"
+        "  SELECT t.{pk} FROM {table} t"
+        "  INNER JOIN nested ON t.{parent} = nested.id"
+        "  WHERE t.{pk} <> t.{parent}"
+        ") SELECT id FROM nested"
+    ).format(
+        table=qn(opts.db_table),
+        pk=qn(opts.pk.column),
+        parent=qn(parent_field.column),
     )
-    nested = [cm.id for cm in qs]
-    qs.update(is_public=shall_be_public)
-    while len(nested):
-        cm_id = nested.pop()
-        qs = get_model().norel_objects.filter(~Q(pk=cm_id), parent_id=cm_id)
-        nested.extend([cm.id for cm in qs])
-        qs.update(is_public=shall_be_public)
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [comment_id, comment_id])
+        return [row[0] for row in cursor.fetchall()]
+
+
+def _get_nested_comment_ids_by_level(comment_id, using):
+    qs = get_model().norel_objects.using(using)
+    nested = []
+    parents = [comment_id]
+    while len(parents):
+        parents = list(
+            qs.filter(~Q(pk__in=parents), parent_id__in=parents).values_list(
+                "pk", flat=True
+            )
+        )
+        nested.extend(parents)
+    return nested
+
+
+def get_nested_comment_ids(comment_id, using=None):
+    """
+    Returns the list of IDs of the comments nested under the given comment.
+
+    With databases supporting recursive common table expressions the whole
+    subtree is fetched with a single query. Otherwise it issues one query
+    per level of the tree.
+    """
+    using = using or router.db_for_read(get_model())
+    if connections[using].vendor in RECURSIVE_CTE_VENDORS:
+        return _get_nested_comment_ids_with_cte(comment_id, using)
+    return _get_nested_comment_ids_by_level(comment_id, using)
+
+
+def _get_comment_ancestors_cte(comment_id, using):
+    parent_field = InkComment._meta.get_field("parent_id")
+    opts = parent_field.model._meta
+    qn = connections[using].ops.quote_name
+    sql = (
+        "WITH RECURSIVE ancestors(id, parent_id) AS ("
+        "  SELECT {pk}, {parent} FROM {table} WHERE {pk} = %s"
+        "  UNION"
+        "  SELECT t.{pk}, t.{parent} FROM {table} t"
+        "  INNER JOIN ancestors ON t.{pk} = ancestors.parent_id"
+        "  WHERE ancestors.id <> ancestors.parent_id"
+        ") SELECT id FROM ancestors"
+    ).format(
+        table=qn(opts.db_table),
+        pk=qn(opts.pk.column),
+        parent=qn(parent_field.column),
+    )
+    return RawSQL(sql, [comment_id])
+
+
+def _get_comment_ancestors_by_level(comment_id, using):
+    qs = InkComment.norel_objects.using(using)
+    ancestors = []
+    while True:
+        ancestors.append(comment_id)
+        parent_id = qs.values_list("parent_id", flat=True).get(pk=comment_id)
+        if parent_id == comment_id:
+            return ancestors
+        comment_id = parent_id
+
+
+def get_comment_ancestors(comment_id, using=None):
+    """
+    Returns a value to use in a 'pk__in' lookup to match the given comment
+    and its ancestors, up to the root comment of the thread.
+
+    With databases supporting recursive common table expressions it is a
+    subquery, so that the ancestors can be updated in a single statement.
+    Otherwise it is the list of IDs, fetched with one query per level.
+    """
+    using = using or router.db_for_write(InkComment)
+    if connections[using].vendor in RECURSIVE_CTE_VENDORS:
+        return _get_comment_ancestors_cte(comment_id, using)
+    return _get_comment_ancestors_by_level(comment_id, using)
+
+
+def renumber_thread(thread_id):
+    """
+    Spreads again the 'order' of the comments in the given thread, leaving
+    THREAD_ORDER_GAP between consecutive comments.
+    """
+    qs = InkComment.norel_objects.filter(thread=thread_id)
+    comments = [
+        InkComment(pk=pk, order=1 + index * THREAD_ORDER_GAP)
+        for index, pk in enumerate(
+            qs.order_by("order").values_list("pk", flat=True)
+        )
+    ]
+    InkComment.norel_objects.bulk_update(comments, ["order"], batch_size=500)
+
+
+def publish_or_withhold_nested_comments(comment, shall_be_public=False):
+    nested = get_nested_comment_ids(comment.id)
+    if nested:
+        # Update the table that defines 'is_public' directly. Updating it
+        # through the child model makes Django fetch the primary keys first.
+        owner = get_model()._meta.get_field("is_public").model
+        owner._base_manager.filter(pk__in=nested).update(
+            is_public=shall_be_public
+        )
     # Update nested_count in parents comments in the same thread.
     # The comment.nested_count doesn't change because the comment's is_public
     # attribute is not changing, only its nested comments change, and it will
@@ -296,7 +554,7 @@ def publish_or_withhold_nested_comments(comment, shall_be_public=False):
     else:
         op = F("nested_count") - comment.nested_count
     get_model().norel_objects.filter(
-        thread=comment.thread,
+        thread_id=comment.thread_id,
         level__lt=comment.level,
         order__lt=comment.order,
     ).update(nested_count=op)
@@ -310,17 +568,11 @@ def publish_or_withhold_on_pre_save(sender, instance, raw, using, **kwargs):
 
 def on_comment_deleted(sender, instance, using, **kwargs):
     # Create the list of nested ink-comments that have to be deleted too.
-    qs = get_model().norel_objects.filter(
-        ~Q(pk=instance.id), parent_id=instance.id
-    )
-    nested = [cm.id for cm in qs]
-    for cm_id in nested:
-        qs = get_model().norel_objects.filter(~Q(pk=cm_id), parent_id=cm_id)
-        nested.extend([cm.id for cm in qs])
+    nested = get_nested_comment_ids(instance.id, using=using)
 
     # Update the nested_count attribute up the tree.
     get_model().norel_objects.filter(
-        thread=instance.thread,
+        thread_id=instance.thread_id,
         level__lt=instance.level,
         order__lt=instance.order,
     ).update(nested_count=F("nested_count") - instance.nested_count - 1)
@@ -328,16 +580,22 @@ def on_comment_deleted(sender, instance, using, **kwargs):
     # Delete all reactions, and reaction authors, associated
     # with nested instances.
     creactions_qs = CommentReaction.objects.filter(comment__pk__in=nested)
-    creactions_ids = [cr.id for cr in creactions_qs]
 
     CommentReactionAuthor.objects.filter(
-        reaction__pk__in=creactions_ids
+        reaction__comment__pk__in=nested
     )._raw_delete(using)
     creactions_qs._raw_delete(using)
 
     # Delete all the comments down the tree from instance.
     get_model().objects.filter(pk__in=nested)._raw_delete(using)
 
+    caching.clear_comment_cache(
+        instance.content_type_id,
+        instance.object_pk,
+        instance.site_id,
+        using=using,
+    )
+
 
 post_delete.connect(on_comment_deleted, sender=InkComment)
 
@@ -369,6 +627,15 @@ class TmpInkComment(dict):
         except KeyError:
             return None
 
+    def __missing__(self, key):
+        # Tokens don't carry the target object, it's retrieved when used.
+        if key == "content_object" and self.get("content_type"):
+            self[key] = self["content_type"].get_object_for_this_type(
+                pk=self["object_pk"]
+            )
+            return self[key]
+        raise KeyError(key)
+
     def __setattr__(self, key, value):
         self[key] = value
 
@@ -440,6 +707,7 @@ class CommentVote(models.Model):
             self.comment.content_type.pk,
             self.comment.object_pk,
             self.comment.site.pk,
+            using=self._state.db,
         )
 
     def save(self, *args, **kwargs):
@@ -454,7 +722,31 @@ def on_comment_vote_deleted(sender, instance, using, **kwargs):
 post_delete.connect(on_comment_vote_deleted, sender=CommentVote)
 
 
+def on_comment_flag_changed(sender, instance, using, **kwargs):
+    dci_cache = caching.get_cache()
+    key = settings.COMMENTS_INK_CACHE_KEYS["comment_flags"].format(
+        comment_id=instance.comment_id
+    )
+    if dci_cache != None and key != "" and dci_cache.get(key):
+        logger.debug("Delete cached list of comment flags in key %s" % key)
+        dci_cache.delete(key)
+    caching.clear_comment_cache(
+        instance.comment.content_type_id,
+        instance.comment.object_pk,
+        instance.comment.site_id,
+        using=using,
+    )
+
+
+post_save.connect(on_comment_flag_changed, sender=CommentFlag)
+post_delete.connect(on_comment_flag_changed, sender=CommentFlag)
+
+
 # ----------------------------------------------------------------------
+def normalize_domain(domain):
+    return domain.strip().strip(".").lower()
+
+
 class BlackListedDomain(models.Model):
     """
     A blacklisted domain from which comments should be discarded.
@@ -464,6 +756,7 @@ class BlackListedDomain(models.Model):
     You can download for free a recent version of the list, and subscribe
     to get notified on changes. Changes can be fetched with rsync for a
     small fee (check their conditions, or use any other Spam filter).
+    Load the file with the ``load_blacklist`` management command.
     """
 
     domain = models.CharField(max_length=200, db_index=True)
@@ -471,10 +764,47 @@ class BlackListedDomain(models.Model):
     def __str__(self):
         return self.domain
 
+    def save(self, *args, **kwargs):
+        # Domains are stored normalized, so that lookups can use the index.
+        self.domain = normalize_domain(self.domain)
+        super(BlackListedDomain, self).save(*args, **kwargs)
+
     class Meta:
         ordering = ("domain",)
 
 
+_blacklist_state = threading.local()
+
+
+@contextmanager
+def blacklist_bulk_changes():
+    """
+    Saving or deleting BlackListedDomain objects within the block does not
+    make processes reload the blacklist. The caller must invalidate it once
+    the changes are done (see blacklist.invalidate).
+    """
+    _blacklist_state.bulk = True
+    try:
+        yield
+    finally:
+        _blacklist_state.bulk = False
+
+
+def on_blacklisted_domain_changed(sender, instance, using, **kwargs):
+    if getattr(_blacklist_state, "bulk", False):
+        return
+    # Processes reload their in-memory blacklist (see blacklist.get_matcher).
+    # The generation is incremented again on commit, in case another process
+    # reloaded the blacklist before the change was committed.
+    caching.incr_generation_in_key_on_commit(
+        settings.COMMENTS_INK_CACHE_KEYS["blacklist_generation"], using=using
+    )
+
+
+post_save.connect(on_blacklisted_domain_changed, sender=BlackListedDomain)
+post_delete.connect(on_blacklisted_domain_changed, sender=BlackListedDomain)
+
+
 # ----------------------------------------------------------------------
 class BaseReactionEnum(models.TextChoices):
     @classmethod
@@ -550,6 +880,7 @@ class CommentReaction(models.Model):
             self.comment.content_type.pk,
             self.comment.object_pk,
             self.comment.site.pk,
+            using=self._state.db,
         )
 
     def save(self, *args, **kwargs):
@@ -564,6 +895,171 @@ class CommentReactionAuthor(models.Model):
     )
 
 
+def get_listed_authors(items, through):
+    """
+    Returns a dictionary with the first COMMENTS_INK_MAX_USERS_IN_TOOLTIP
+    users who reacted with each of the given reactions, sorted as in
+    COMMENTS_INK_USERS_REACTED_LIST_ORDER, keyed by reaction pk. `through`
+    is the model that relates the reactions with their authors.
+
+    Since Django 4.2 the prefetch itself is limited to the listed users, per
+    reaction, so that popular reactions don't fetch all their authors.
+    """
+    max_users_listed = getattr(
+        settings, "COMMENTS_INK_MAX_USERS_IN_TOOLTIP", 10
+    )
+    # The ordering of the users, applied to the 'author' of the through model.
+    users_order = [
+        (
+            "-author__%s" % field[1:]
+            if field.startswith("-")
+            else "author__" + field
+        )
+        for field in settings.COMMENTS_INK_USERS_REACTED_LIST_ORDER
+    ]
+    reaction_authors = through.objects.select_related("author").order_by(
+        *users_order
+    )
+    if DJANGO_VERSION >= (4, 2):
+        reaction_field = through._meta.get_field("reaction")
+        prefetch_related_objects(
+            items,
+            Prefetch(
+                reaction_field.remote_field.get_accessor_name(),
+                queryset=reaction_authors[:max_users_listed],
+                to_attr="listed_reaction_authors",
+            ),
+        )
+        return {
+            item.pk: [ra.author for ra in item.listed_reaction_authors]
+            for item in items
+        }
+
+    authors = {item.pk: [] for item in items}
+    for reaction_author in reaction_authors.filter(reaction__in=items):
+        item_authors = authors[reaction_author.reaction_id]
+        if len(item_authors) < max_users_listed:
+            item_authors.append(reaction_author.author)
+    return authors
+
+
+def summarize_reactions(items):
+    """
+    Returns the summary of the reactions to a comment, as returned by
+    InkComment.get_reactions, out of a list of (CommentReaction, authors)
+    tuples sorted by reaction.
+    """
+    total_counter = 0
+    reactions_enum = get_comment_reactions_enum()
+    reactions = OrderedDict([(k, {}) for k in reactions_enum])
+    for item, authors in items:
+        total_counter += item.counter
+        reaction = reactions_enum(item.reaction)
+        reactions[reaction.value] = {
+            "value": reaction.value,
+            "authors": [
+                settings.COMMENTS_INK_API_USER_REPR(author)
+                for author in authors
+            ],
+            "counter": item.counter,
+            "label": reaction.label,
+            "icon": reaction.icon,
+        }
+    # Return only the values of OrderedDict after it's being sorted.
+    return {
+        "counter": total_counter,
+        "list": [v for k, v in reactions.items() if len(v)],
+    }
+
+
+def prefetch_comment_feedback(comments, user=None):
+    """
+    Fetches the reactions, the removal flags and, when `user` is given, the
+    votes of the user for all the given comments, with a fixed number of
+    queries. Results are attached to each comment, so that get_reactions,
+    get_flags and the get_user_vote template tag don't hit the database.
+
+    Reactions and flags found in the cache are not fetched again, and the
+    ones fetched are stored in the cache.
+    """
+    comments = [cm for cm in comments]
+    if not len(comments):
+        return comments
+
+    dci_cache = caching.get_cache()
+    cache_keys = settings.COMMENTS_INK_CACHE_KEYS
+    reactions_keys = {
+        cm.pk: cache_keys["comment_reactions"].format(comment_id=cm.pk)
+        for cm in comments
+    }
+    flags_keys = {
+        cm.pk: cache_keys["comment_flags"].format(comment_id=cm.pk)
+        for cm in comments
+    }
+    cached = {}
+    if dci_cache != None:
+        keys = [*reactions_keys.values(), *flags_keys.values()]
+        cached = dci_cache.get_many([key for key in keys if key != ""])
+    to_cache = {}
+
+    # Reactions, with up to COMMENTS_INK_MAX_USERS_IN_TOOLTIP authors each.
+    reactions = {pk: cached.get(key) for pk, key in reactions_keys.items()}
+    missing = [pk for pk, result in reactions.items() if result == None]
+    if len(missing):
+        items = list(
+            CommentReaction.objects.filter(comment__in=missing).order_by(
+                "comment", "reaction"
+            )
+        )
+        authors = get_listed_authors(items, CommentReactionAuthor)
+        items_by_comment = {pk: [] for pk in missing}
+        for item in items:
+            items_by_comment[item.comment_id].append((item, authors[item.pk]))
+        for pk in missing:
+            reactions[pk] = summarize_reactions(items_by_comment[pk])
+            to_cache[reactions_keys[pk]] = reactions[pk]
+
+    # Flags suggesting the removal of the comment.
+    flags = {pk: cached.get(key) for pk, key in flags_keys.items()}
+    missing = [pk for pk, result in flags.items() if result == None]
+    if len(missing):
+        users = {pk: [] for pk in missing}
+        for flag in CommentFlag.objects.filter(
+            comment__in=missing, flag=CommentFlag.SUGGEST_REMOVAL
+        ).select_related("user"):
+            users[flag.comment_id].append(flag.user)
+        for pk in missing:
+            flags[pk] = {"users": users[pk], "counter": len(users[pk])}
+            to_cache[flags_keys[pk]] = flags[pk]
+
+    if dci_cache != None:
+        to_cache.pop("", None)
+        if len(to_cache):
+            dci_cache.set_many(to_cache, timeout=None)
+
+    # Votes of the user.
+    votes = None
+    if user != None and user.is_authenticated:
+        votes = {}
+        for comment_id, vote in CommentVote.objects.filter(
+            comment__in=[cm.pk for cm in comments], author=user
+        ).values_list("comment_id", "vote"):
+            if comment_id in votes:
+                logger.error(
+                    "More than one CommentVote for comment ID %d and user %s."
+                    % (comment_id, user)
+                )
+                vote = ""
+            votes[comment_id] = vote
+
+    for cm in comments:
+        cm._reactions = reactions[cm.pk]
+        cm._flags = flags[cm.pk]
+        if votes != None:
+            cm._user_vote = (user.pk, votes.get(cm.pk, ""))
+    return comments
+
+
 # -----------------------------------------------
 # Object reaction model.
 
@@ -608,6 +1104,12 @@ class ObjectReaction(models.Model):
                 "Delete cached list of object reactions in key %s" % key
             )
             dci_cache.delete(key)
+        caching.incr_generation_in_key_on_commit(
+            get_object_reactions_generation_key(
+                self.content_type.id, self.object_pk, self.site.id
+            ),
+            using=self._state.db,
+        )
 
     def save(self, *args, **kwargs):
         self.delete_from_cache()
@@ -628,58 +1130,127 @@ class ObjectReactionAuthor(models.Model):
     )
 
 
+def get_object_reactions_generation_key(content_type_id, object_pk, site_id):
+    key = settings.COMMENTS_INK_CACHE_KEYS["object_reactions_generation"]
+    return key.format(
+        ctype_pk=content_type_id, object_pk=object_pk, site_id=site_id
+    )
+
+
 def get_object_reactions(content_type, object_pk, site_id):
     """Returns list of dicts with object reactions and their counters."""
+    return get_objects_reactions(content_type, [object_pk], site_id)[
+        str(object_pk)
+    ]
+
+
+def get_objects_reactions(content_type, object_pks, site_id):
+    """
+    Returns a dictionary with the object reactions of each of the given
+    object_pks of the content_type, keyed by object_pk as a string. Each
+    value is the list returned by get_object_reactions.
+
+    Reactions found in the cache are read at once, and the missing ones
+    are fetched with a fixed number of queries and stored in the cache.
+    """
+    object_pks = list(dict.fromkeys([str(pk) for pk in object_pks]))
     dci_cache = caching.get_cache()
-    key = settings.COMMENTS_INK_CACHE_KEYS["object_reactions"].format(
-        ctype_pk=content_type.pk, object_pk=object_pk, site_id=site_id
-    )
-    if dci_cache != None and key != "":
-        result = dci_cache.get(key)
-        if result != None:
-            logger.debug("Fetching %s from the cache", key)
-            return result
+    keys = {
+        object_pk: settings.COMMENTS_INK_CACHE_KEYS["object_reactions"].format(
+            ctype_pk=content_type.pk, object_pk=object_pk, site_id=site_id
+        )
+        for object_pk in object_pks
+    }
+    keys = {object_pk: key for object_pk, key in keys.items() if key != ""}
+    result = {}
+    if dci_cache != None and len(keys):
+        cached = dci_cache.get_many(list(keys.values()))
+        for object_pk, key in keys.items():
+            if key in cached:
+                logger.debug("Fetching %s from the cache", key)
+                result[object_pk] = cached[key]
 
-    max_users_listed = getattr(
-        settings, "COMMENTS_INK_MAX_USERS_IN_TOOLTIP", 10
-    )
-    reactionsd = dict(
-        [
-            (
-                item.reaction,
-                {
-                    "counter": item.counter,
-                    "authors": [
-                        settings.COMMENTS_INK_API_USER_REPR(author)
-                        for author in item.authors.all()[:max_users_listed]
-                    ],
-                },
-            )
-            for item in ObjectReaction.objects.filter(
-                content_type=content_type,
-                object_pk=object_pk,
-                site__id=site_id,
-            )
-        ]
+    missing = [object_pk for object_pk in object_pks if object_pk not in result]
+    if not len(missing):
+        return result
+
+    items = list(
+        ObjectReaction.objects.filter(
+            content_type=content_type,
+            object_pk__in=missing,
+            site__id=site_id,
+        )
     )
+    authors = get_listed_authors(items, ObjectReactionAuthor)
+    reactionsd = {object_pk: {} for object_pk in missing}
+    for item in items:
+        reactionsd[item.object_pk][item.reaction] = {
+            "counter": item.counter,
+            "authors": [
+                settings.COMMENTS_INK_API_USER_REPR(author)
+                for author in authors[item.pk]
+            ],
+        }
 
-    object_reactions = []
+    to_cache = {}
     defs = {"counter": 0, "authors": []}
-    for item in get_object_reactions_enum():
-        object_reactions.append(
-            {
-                "value": item.value,
-                "label": item.label,
-                "icon": item.icon,
-                "counter": reactionsd.get(item.value, defs)["counter"],
-                "authors": reactionsd.get(item.value, defs)["authors"],
-            }
-        )
+    for object_pk in missing:
+        object_reactions = []
+        for item in get_object_reactions_enum():
+            reaction = reactionsd[object_pk].get(item.value, defs)
+            object_reactions.append(
+                {
+                    "value": item.value,
+                    "label": item.label,
+                    "icon": item.icon,
+                    "counter": reaction["counter"],
+                    "authors": reaction["authors"],
+                }
+            )
+        result[object_pk] = object_reactions
+        if object_pk in keys:
+            to_cache[keys[object_pk]] = object_reactions
 
-    if dci_cache != None and key != "":
-        dci_cache.set(key, object_reactions, timeout=None)
+    if dci_cache != None and len(to_cache):
+        dci_cache.set_many(to_cache, timeout=None)
         logger.debug(
-            "Caching reactions for object with ctype_pk %d, object_pk %s, "
-            "site_id %d" % (content_type.pk, object_pk, site_id)
+            "Caching reactions for %d objects with ctype_pk %d, site_id %d"
+            % (len(to_cache), content_type.pk, site_id)
         )
-    return object_reactions
+    return result
+
+
+# ----------------------------------------------------------------------
+class OutboxTask(models.Model):
+    """
+    A side effect of a comment (an email to send), written in the same
+    transaction as the comment, and run later by the dci_worker command.
+    See django_comments_ink.outbox.
+    """
+
+    PENDING = "pending"
+    FAILED = "failed"
+    STATUS_CHOICES = [(PENDING, _("pending")), (FAILED, _("failed"))]
+
+    kind = models.CharField(_("kind"), max_length=64)
+    payload = models.JSONField(_("payload"), default=dict)
+    status = models.CharField(
+        _("status"), max_length=8, choices=STATUS_CHOICES, default=PENDING
+    )
+    attempts = models.PositiveIntegerField(_("attempts"), default=0)
+    available_at = models.DateTimeField(_("available at"), default=now)
+    locked_by = models.CharField(
+        _("locked by"), max_length=64, blank=True, default=""
+    )
+    locked_until = models.DateTimeField(_("locked until"), null=True)
+    last_error = models.TextField(_("last error"), blank=True, default="")
+    created_at = models.DateTimeField(_("created at"), auto_now_add=True)
+
+    class Meta:
+        ordering = ("available_at", "id")
+        indexes = [models.Index(fields=["status", "available_at"])]
+        verbose_name = _("outbox task")
+        verbose_name_plural = _("outbox tasks")
+
+    def __str__(self):
+        return "%s #%d" % (self.kind, self.pk)
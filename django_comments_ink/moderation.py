@@ -1,12 +1,16 @@
 from django import VERSION
+from django.contrib.auth.models import AnonymousUser
+from django.contrib.sites.models import Site
 from django.contrib.sites.shortcuts import get_current_site
+from django.http import HttpRequest
 from django.template import Context, loader
 from django_comments import get_model
 from django_comments.models import CommentFlag
 from django_comments.moderation import CommentModerator, Moderator
 from django_comments.signals import comment_was_flagged, comment_will_be_posted
+from django_comments_ink import blacklist, outbox
 from django_comments_ink.conf import settings
-from django_comments_ink.models import BlackListedDomain, TmpInkComment
+from django_comments_ink.models import TmpInkComment
 from django_comments_ink.signals import confirmation_received
 from django_comments_ink.utils import send_mail
 
@@ -88,6 +92,10 @@ class SpamModerator(InkCommentModerator):
     ``SpamModerator`` uses the additional ``django_comments_ink`` model:
      * ``BlackListedDomain``
 
+    Subdomains of a blacklisted domain are blacklisted too. The list is
+    kept in memory, and reloaded when domains are added or removed (see
+    ``django_comments_ink.blacklist``).
+
     Remember to update the content regularly through an external Spam
     filtering service.
     """
@@ -97,7 +105,7 @@ class SpamModerator(InkCommentModerator):
         # Whether coming from anonymous user or registered user.
         # So it has to contain an '@' attribute.
         domain = comment.user_email.split("@", 1)[1]
-        if BlackListedDomain.objects.filter(domain=domain).count():
+        if blacklist.is_blacklisted(domain):
             return False
         return super(SpamModerator, self).allow(
             comment, content_object, request
@@ -122,9 +130,51 @@ class InkModerator(Moderator):
             return
         if flag.flag != CommentFlag.SUGGEST_REMOVAL:
             return
+        if outbox.is_enabled():
+            payload = {
+                "flag_id": flag.pk,
+                "site_id": get_current_site(request).pk,
+                "is_secure": request.is_secure(),
+            }
+            outbox.enqueue("removal_suggestion", payload)
+            return
         self._registry[model].notify_removal_suggestion(
             comment, comment.content_object, request
         )
 
 
 moderator = InkModerator()
+
+
+class QueuedRequest(HttpRequest):
+    """
+    Stands for the request that flagged a comment, when the removal
+    suggestion is sent by the dci_worker command.
+    """
+
+    def __init__(self, site, user, is_secure):
+        super().__init__()
+        self.META["HTTP_HOST"] = site.domain
+        self.user = user or AnonymousUser()
+        self.secure = is_secure
+
+    def _get_scheme(self):
+        return "https" if self.secure else "http"
+
+
+def send_queued_removal_suggestion(payload):
+    try:
+        flag = CommentFlag.objects.select_related("comment", "user").get(
+            pk=payload["flag_id"]
+        )
+    except CommentFlag.DoesNotExist:
+        return  # The flag has been removed since.
+    comment = flag.comment
+    model = comment.content_type.model_class()
+    if model not in moderator._registry:
+        return
+    site = Site.objects.get(pk=payload["site_id"])
+    request = QueuedRequest(site, flag.user, payload["is_secure"])
+    moderator._registry[model].notify_removal_suggestion(
+        comment, comment.content_object, request
+    )
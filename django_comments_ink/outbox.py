@@ -0,0 +1,126 @@
+"""
+Transactional outbox for the side effects of comments.
+
+When the setting COMMENTS_INK_OUTBOX is True, the emails sent when a comment
+is posted, confirmed or flagged are not sent during the request. Instead, an
+OutboxTask is written in the same transaction as the comment, and the
+dci_worker management command runs it later. If the transaction is rolled
+back, so is the task. If the worker stops while running a task, another
+worker takes it over once its lease expires.
+
+Tasks are run at least once: a task that fails after sending some of its
+emails sends them again when retried.
+"""
+
+import logging
+import traceback
+import uuid
+from datetime import timedelta
+
+from django.db import connections, router, transaction
+from django.db.models import Q
+from django.utils.module_loading import import_string
+from django.utils.timezone import now
+
+from django_comments_ink import utils
+from django_comments_ink.conf import settings
+from django_comments_ink.models import OutboxTask
+
+
+logger = logging.getLogger(__name__)
+
+# Kinds of task, and the function called with the payload of the task.
+TASK_HANDLERS = {
+    "confirmation_request": (
+        "django_comments_ink.views.commenting.send_queued_confirmation_request"
+    ),
+    "followup_notifications": (
+        "django_comments_ink.views.commenting.send_queued_followup_notifications"
+    ),
+    "removal_suggestion": (
+        "django_comments_ink.moderation.send_queued_removal_suggestion"
+    ),
+}
+
+
+def is_enabled():
+    return getattr(settings, "COMMENTS_INK_OUTBOX", False)
+
+
+def enqueue(kind, payload, using=None):
+    """
+    Writes a task of the given kind to the outbox. Call it within the
+    transaction that creates the object the task refers to.
+    """
+    if kind not in TASK_HANDLERS:
+        raise ValueError("Unknown outbox task kind: %s" % kind)
+    using = using or router.db_for_write(OutboxTask)
+    return OutboxTask.objects.using(using).create(kind=kind, payload=payload)
+
+
+def claim(worker_id, batch_size=100, lease=300, using="default"):
+    """
+    Locks up to `batch_size` pending tasks for `lease` seconds on behalf of
+    `worker_id`, and returns them.
+
+    Where the database supports SELECT ... FOR UPDATE SKIP LOCKED, workers
+    skip the rows being claimed by others. Otherwise (SQLite) the claim is
+    a single conditional UPDATE, that only succeeds for unclaimed rows.
+    """
+    current_time = now()
+    available = Q(status=OutboxTask.PENDING, available_at__lte=current_time)
+    available &= Q(locked_until=None) | Q(locked_until__lt=current_time)
+    qs = OutboxTask.objects.using(using)
+    with transaction.atomic(using=using):
+        candidates = qs.filter(available).order_by("available_at", "id")
+        if connections[using].features.has_select_for_update_skip_locked:
+            candidates = candidates.select_for_update(skip_locked=True)
+        ids = list(candidates.values_list("pk", flat=True)[:batch_size])
+        if not len(ids):
+            return []
+        qs.filter(available, pk__in=ids).update(
+            locked_by=worker_id,
+            locked_until=current_time + timedelta(seconds=lease),
+        )
+    return list(qs.filter(pk__in=ids, locked_by=worker_id))
+
+
+def run(task, max_attempts=5, retry_delay=60, using="default"):
+    """
+    Runs the handler of `task`, sending its emails before returning. The
+    task is deleted if it succeeds. Otherwise it's retried after a delay
+    that doubles with every attempt, and marked as failed after
+    `max_attempts` attempts.
+
+    Returns True if the task succeeded.
+    """
+    qs = OutboxTask.objects.using(using).filter(
+        pk=task.pk, locked_by=task.locked_by
+    )
+    try:
+        handler = import_string(TASK_HANDLERS[task.kind])
+        with utils.sending_synchronously():
+            handler(task.payload)
+    except Exception:
+        attempts = task.attempts + 1
+        logger.exception("Outbox task %s failed.", task)
+        qs.update(
+            attempts=attempts,
+            status=(
+                OutboxTask.FAILED
+                if attempts >= max_attempts
+                else OutboxTask.PENDING
+            ),
+            available_at=now()
+            + timedelta(seconds=retry_delay * 2 ** (attempts - 1)),
+            locked_by="",
+            locked_until=None,
+            last_error=traceback.format_exc(),
+        )
+        return False
+    qs.delete()
+    return True
+
+
+def get_worker_id():
+    return uuid.uuid4().hex
@@ -59,19 +59,183 @@ Example 3:
 """
 
 import logging
+from base64 import b64decode, b64encode
+from bisect import bisect_right
+from urllib.parse import parse_qs, urlencode
 
 from django.apps import apps
+from django.core.exceptions import ImproperlyConfigured
 from django.core.paginator import Page, Paginator
 from django.db.models.query import QuerySet
 from django.utils.functional import cached_property
+from django.utils.translation import gettext_lazy as _
 
 from django_comments_ink import caching
 from django_comments_ink.conf import settings
+from django_comments_ink.snapshot import CommentsSnapshot
 
 
 logger = logging.getLogger(__name__)
 
 
+def get_subkey_cache(dci_cache, ckey_prefix, subkey):
+    # If the key <sub_ckey> does exist as a key in
+    # the set stored in the <ckey_prefix> in the cache, then
+    # access the combined <ckey_prefix>/<sub_ckey>
+    # to get the previously computed object_list.
+    sub_keys_set = dci_cache.get(ckey_prefix)
+    if sub_keys_set and subkey in sub_keys_set:
+        composed_key = f"{ckey_prefix}/{subkey}"
+        result = dci_cache.get(composed_key)
+        if result != None:
+            return result
+
+
+def set_subkey_cache(dci_cache, ckey_prefix, subkey, value):
+    # Save the object_list in cache.
+    sub_keys_set = dci_cache.get(ckey_prefix)
+    if sub_keys_set != None:
+        if not subkey in sub_keys_set:
+            sub_keys_set.add(subkey)
+    else:
+        sub_keys_set = {subkey}
+    logger.debug("Caching key %s, value %s", ckey_prefix, sub_keys_set)
+    dci_cache.set(ckey_prefix, sub_keys_set, timeout=None)
+
+    # Store the object_list in cache using a composed key.
+    composed_key = f"{ckey_prefix}/{subkey}"
+    logger.debug("Adding %s to the cache", composed_key)
+    dci_cache.set(composed_key, value, timeout=None)
+
+
+class CommentsLayout:
+    """
+    Distribution of the comment threads of a list of comments in pages.
+
+    `counts` contains, in the order in which threads are listed, the number
+    of comments each thread displays, and `thread_index` maps the ID of each
+    thread to its index in `counts`. `in_page` contains the number of
+    comments of each page, and `page_start` the index of the first thread of
+    each page, so that the page of a thread is found with a binary search.
+    """
+
+    def __init__(self, thread_ids, counts, per_page, orphans):
+        self.thread_index = {tid: index for index, tid in enumerate(thread_ids)}
+        self.counts = list(counts)
+        self.per_page = per_page
+        self.orphans = orphans
+        self.in_page = []
+        self.page_start = []
+        self.compute()
+
+    def __repr__(self):
+        return "<CommentsLayout of %d threads in pages %s>" % (
+            len(self.counts),
+            self.in_page,
+        )
+
+    def compute(self, from_page=0):
+        """
+        Compute the pages from `from_page` onward, keeping the previous ones.
+        """
+        start = self.page_start[from_page] if from_page else 0
+        del self.in_page[from_page:]
+        del self.page_start[from_page:]
+
+        # rest[index - start] is the number of comments from the thread at
+        # `index` to the end of the list.
+        counts = self.counts
+        rest = [0] * (len(counts) - start + 1)
+        for index in range(len(counts) - 1, start - 1, -1):
+            rest[index - start] = rest[index - start + 1] + counts[index]
+
+        ptotal = 0  # Page total number of comments.
+        first = start  # Index of the first thread in the page.
+        for index in range(start, len(counts)):
+            group_count = counts[index]
+            if ptotal > 0 and ptotal + group_count > self.per_page:
+                if ptotal + rest[index - start] > self.per_page + self.orphans:
+                    # All comments are too many to be in this page.
+                    self.in_page.append(ptotal)
+                    self.page_start.append(first)
+                    ptotal = group_count
+                    first = index
+                else:
+                    ptotal += rest[index - start]
+                    break
+            else:
+                ptotal += group_count
+        if ptotal:
+            self.in_page.append(ptotal)
+            self.page_start.append(first)
+
+    def add_comments(self, thread_id, count=1):
+        """
+        Account for `count` new comments in the thread `thread_id`.
+
+        Adding comments to a thread can only push threads forward, so the
+        pages before the one containing the thread do not change. Only the
+        following pages are computed again. Returns False if the thread is
+        not in the layout.
+        """
+        index = self.thread_index.get(thread_id)
+        if index == None:
+            return False
+        self.counts[index] += count
+        self.compute(from_page=bisect_right(self.page_start, index) - 1)
+        return True
+
+    def get_page_number(self, thread_id):
+        """
+        Return the number of the page that lists the thread `thread_id`, or
+        None if the thread is not in the layout.
+        """
+        index = self.thread_index.get(thread_id)
+        if index == None:
+            return None
+        return bisect_right(self.page_start, index)
+
+
+def carry_layout_over(
+    content_type_id,
+    object_pk,
+    site_id,
+    generation,
+    thread_id,
+    prev_generation=None,
+):
+    """
+    Update the cached layout of the unfolded list of comments to an object
+    after a new reply to the thread `thread_id`.
+
+    The reply moved the comments' cache to `generation`. Instead of computing
+    the layout again from scratch when the list is requested, the layout of
+    the previous generation, `generation - 1` unless `prev_generation` is
+    given, gets the reply and is stored with the new one.
+    """
+    if prev_generation == None:
+        prev_generation = generation - 1
+    dci_cache = caching.get_cache()
+    if dci_cache == None:
+        return False
+
+    ckey_ptn = settings.COMMENTS_INK_CACHE_KEYS["comments_paged"]
+    kwargs = {
+        "ctype_pk": content_type_id,
+        "object_pk": object_pk,
+        "site_id": site_id,
+    }
+    subkey = CommentsPaginator.get_sub_ckey(None, {}) + ":layout"
+    prev_prefix = ckey_ptn.format(gen=prev_generation, **kwargs)
+    layout = get_subkey_cache(dci_cache, prev_prefix, subkey)
+    if layout == None or not layout.add_comments(thread_id):
+        return False
+    prefix = ckey_ptn.format(gen=generation, **kwargs)
+    set_subkey_cache(dci_cache, prefix, subkey, layout)
+    logger.debug("Carry layout over to %s: %s", prefix, layout)
+    return True
+
+
 class CommentsPage(Page):
     def __init__(self, object_list, number, paginator, cache_key):
         super().__init__(object_list, number, paginator)
@@ -85,6 +249,8 @@ class CommentsPaginator(Paginator):
     Given an `object_list` of comments, it checks how many threads fit per page.
     If a thread has more comments than the given `per_page` limit it ignores the
     limit so that the thread is not cut in several pages.
+
+    The `object_list` can be either a QuerySet or a CommentsSnapshot.
     """
 
     def __init__(self, *args, **kwargs):
@@ -101,48 +267,29 @@ class CommentsPaginator(Paginator):
                 )
 
         super().__init__(*args, **kwargs)
-        if type(self.object_list) is not QuerySet:
-            raise TypeError("'object_list' is not a QuerySet.")
+        if type(self.object_list) not in (QuerySet, CommentsSnapshot):
+            raise TypeError(
+                "'object_list' is neither a QuerySet nor a CommentsSnapshot."
+            )
 
     def get_subkey_cache(self, subkey):
         if self.dci_cache == None or self.ckey_prefix == "":
             return
-        # If the key <sub_ckey> does exist as a key in
-        # the set stored in the <ckey_prefix> in the cache, then
-        # access the combined <self.ckey_prefix>/<sub_ckey>
-        # to get the previously computed object_list.
-        sub_keys_set = self.dci_cache.get(self.ckey_prefix)
-        if sub_keys_set and subkey in sub_keys_set:
-            composed_key = f"{self.ckey_prefix}/{subkey}"
-            result = self.dci_cache.get(composed_key)
-            if result != None:
-                return result
+        return get_subkey_cache(self.dci_cache, self.ckey_prefix, subkey)
 
     def set_subkey_cache(self, subkey, value):
         if self.dci_cache == None or self.ckey_prefix == "":
             return
-        # Save the object_list in cache.
-        sub_keys_set = self.dci_cache.get(self.ckey_prefix)
-        if sub_keys_set != None:
-            if not subkey in sub_keys_set:
-                sub_keys_set.add(subkey)
-        else:
-            sub_keys_set = {subkey}
-        logger.debug("Caching key %s, value %s", self.ckey_prefix, sub_keys_set)
-        self.dci_cache.set(self.ckey_prefix, sub_keys_set, timeout=None)
+        set_subkey_cache(self.dci_cache, self.ckey_prefix, subkey, value)
 
-        # Store the object_list in cache using a composed key.
-        composed_key = f"{self.ckey_prefix}/{subkey}"
-        logger.debug("Adding %s to the cache", composed_key)
-        self.dci_cache.set(composed_key, value, timeout=None)
-
-    def get_count_in_thread(self, comment):
-        if self.comments_folded and comment.id in self.comments_folded:
+    def get_count_in_thread(self, comment_id, nested_count):
+        if self.comments_folded and comment_id in self.comments_folded:
             return 1
         else:
-            return comment.nested_count + 1
+            return nested_count + 1
 
-    def get_sub_ckey(self, page, fold):
+    @staticmethod
+    def get_sub_ckey(page, fold):
         page_part = "all-pages" if page == None else f"page-{str(page)}"
         if fold:
             fold_part = f"folded-{','.join([str(cid) for cid in fold])}"
@@ -150,6 +297,38 @@ class CommentsPaginator(Paginator):
             fold_part = "all-unfolded"
         return page_part + "-" + fold_part
 
+    @cached_property
+    def layout(self):
+        """
+        Return the CommentsLayout of the `object_list`, from the cache when
+        possible.
+        """
+        layout_subkey = self.get_sub_ckey(None, self.comments_folded)
+        layout_subkey += ":layout"
+        layout = self.get_subkey_cache(layout_subkey)
+        if (
+            layout != None
+            and layout.per_page == self.per_page
+            and layout.orphans == self.orphans
+        ):
+            logger.debug("layout from cache %s: %s", self.ckey_prefix, layout)
+            return layout
+
+        if isinstance(self.object_list, CommentsSnapshot):
+            top_level = self.object_list.top_level()
+        else:
+            top_level = self.object_list.filter(level=0).values_list(
+                "id", "nested_count"
+            )
+        thread_ids, counts = [], []
+        for cm_id, nested_count in top_level:
+            thread_ids.append(cm_id)
+            counts.append(self.get_count_in_thread(cm_id, nested_count))
+        layout = CommentsLayout(thread_ids, counts, self.per_page, self.orphans)
+        self.set_subkey_cache(layout_subkey, layout)  # Store it in cache.
+        logger.debug("layout computed %s: %s", self.ckey_prefix, layout)
+        return layout
+
     @cached_property
     def in_page(self):
         """
@@ -158,45 +337,7 @@ class CommentsPaginator(Paginator):
         Returns a list. Each index item represents the number of comments to
         display in the page index + 1.
         """
-        inpage_subkey = (
-            self.get_sub_ckey(None, self.comments_folded) + ":in_page_list"
-        )
-        inpage = self.get_subkey_cache(inpage_subkey)
-        if inpage != None:
-            logger.debug("in_page from cache %s: %s", self.ckey_prefix, inpage)
-            return inpage
-
-        ptotal = 0  # Page total number of comments.
-        inpage = []
-
-        cgroups = [
-            self.get_count_in_thread(cm)
-            for cm in self.object_list.filter(level=0)
-        ]
-        for index, group_count in enumerate(cgroups):
-            if ptotal > 0 and ptotal + group_count > self.per_page:
-                if sum(cgroups[index:], ptotal) > self.per_page + self.orphans:
-                    # All comments are too many to be in this page.
-                    inpage.append(ptotal)
-                    ptotal = group_count
-                else:
-                    inpage.append(sum(cgroups[index:], ptotal))
-                    ptotal = 0
-                    break
-            else:
-                ptotal += group_count
-        if ptotal:
-            inpage.append(ptotal)
-        self.set_subkey_cache(inpage_subkey, inpage)  # Store it in cache.
-        if self.dci_cache:
-            logger.debug(
-                "in_page computed (saved in cache) %s: %s",
-                self.ckey_prefix,
-                inpage,
-            )
-        else:
-            logger.debug("in_page computed: %s", inpage)
-        return inpage
+        return self.layout.in_page
 
     def _get_page(self, *args, **kwargs):
         """
@@ -221,6 +362,9 @@ class CommentsPaginator(Paginator):
             bottom = sum(self.in_page[0 : number - 1])
         top = bottom + self.in_page[number - 1]
         object_list = self.object_list[bottom:top]
+        if isinstance(object_list, CommentsSnapshot):
+            # Fetch the comments in the page, to store them in the cache.
+            object_list.materialize()
 
         # Store it in cache.
         self.set_subkey_cache(sub_ckey, object_list)
@@ -245,10 +389,184 @@ class CommentsPaginator(Paginator):
         return len(self.in_page)
 
 
+def get_list_order_directions():
+    """
+    Return whether the thread ID and the order of the comments are sorted
+    in descending order in COMMENTS_INK_LIST_ORDER.
+    """
+    list_order = tuple(settings.COMMENTS_INK_LIST_ORDER)
+    fields = tuple(field.lstrip("-") for field in list_order)
+    if fields != ("thread__id", "order"):
+        raise ImproperlyConfigured(
+            "Cursor pagination requires COMMENTS_INK_LIST_ORDER to be on "
+            "('thread__id', 'order'), not %s." % (list_order,)
+        )
+    return tuple(field.startswith("-") for field in list_order)
+
+
 if apps.is_installed("rest_framework"):
-    from rest_framework.pagination import PageNumberPagination
+    from rest_framework.exceptions import NotFound
+    from rest_framework.pagination import BasePagination, PageNumberPagination
+    from rest_framework.response import Response
+    from rest_framework.utils.urls import replace_query_param
 
     class DRFCommentsPaginator(PageNumberPagination):
         django_paginator_class = CommentsPaginator
         page_size = settings.COMMENTS_INK_COMMENTS_PER_PAGE
         page_query_param = settings.COMMENTS_INK_PAGE_QUERY_STRING_PARAM
+
+    class DRFCommentsCursorPaginator(BasePagination):
+        """
+        Cursor pagination for comments.
+
+        Like CommentsPaginator, pages contain whole threads, even if a thread
+        has more comments than `page_size`. The cursor holds the ID of the
+        thread at the edge of the page, so each page is read with a range
+        scan over the index on (thread, order), no matter how deep it is.
+        Comments are listed in COMMENTS_INK_LIST_ORDER, which must be on
+        ("thread__id", "order"), either ascending or descending.
+        """
+
+        cursor_query_param = "cursor"
+        invalid_cursor_message = _("Invalid cursor")
+
+        def get_page_size(self, request):
+            page_size = settings.COMMENTS_INK_API_COMMENTS_PER_PAGE
+            if page_size <= 0:
+                page_size = settings.COMMENTS_INK_COMMENTS_PER_PAGE
+            return page_size
+
+        def decode_cursor(self, request):
+            """
+            Return the pair (thread_id, reverse) in the cursor of the
+            request, or None if there is no cursor.
+            """
+            encoded = request.query_params.get(self.cursor_query_param)
+            if encoded == None:
+                return None
+            try:
+                querystring = b64decode(encoded.encode("ascii")).decode("ascii")
+                tokens = parse_qs(querystring, keep_blank_values=True)
+                thread_id = int(tokens["t"][0])
+                reverse = bool(int(tokens.get("r", ["0"])[0]))
+            except (TypeError, ValueError, KeyError, UnicodeError):
+                raise NotFound(self.invalid_cursor_message)
+            return thread_id, reverse
+
+        def encode_cursor(self, thread_id, reverse):
+            tokens = {"t": thread_id}
+            if reverse:
+                tokens["r"] = "1"
+            querystring = urlencode(tokens, doseq=True)
+            encoded = b64encode(querystring.encode("ascii")).decode("ascii")
+            return replace_query_param(
+                self.base_url, self.cursor_query_param, encoded
+            )
+
+        def fetch_threads(self, queryset, thread_id, reverse):
+            """
+            Return the comments of the threads that come after `thread_id`,
+            or before it when `reverse` is True, up to `page_size`
+            comments, and whether there are more threads to fetch.
+            The comments are returned in the order of the fetch.
+            """
+            thread_desc, order_desc = get_list_order_directions()
+            # Going backwards means reading both fields in reverse order.
+            if reverse:
+                thread_desc, order_desc = not thread_desc, not order_desc
+            queryset = queryset.order_by(
+                "-thread__id" if thread_desc else "thread__id",
+                "-order" if order_desc else "order",
+            )
+            thread_lookup = "thread_id__lt" if thread_desc else "thread_id__gt"
+            order_lookup = "order__lt" if order_desc else "order__gt"
+
+            qs = queryset
+            if thread_id != None:
+                qs = qs.filter(**{thread_lookup: thread_id})
+            comments = list(qs[: self.page_size + 1])
+            if len(comments) <= self.page_size:
+                return comments, False
+
+            comments, following = comments[:-1], comments[-1]
+            last_thread_id = comments[-1].thread_id
+            if following.thread_id != last_thread_id:
+                return comments, True
+            if comments[0].thread_id != last_thread_id:
+                # Leave the last thread, that does not fit entirely in the
+                # page, for the next one.
+                while comments[-1].thread_id == last_thread_id:
+                    comments.pop()
+                return comments, True
+            # The page has only one thread, longer than page_size.
+            comments.extend(
+                queryset.filter(
+                    **{
+                        "thread_id": last_thread_id,
+                        order_lookup: comments[-1].order,
+                    }
+                )
+            )
+            has_more = queryset.filter(**{thread_lookup: last_thread_id})
+            return comments, has_more.exists()
+
+        def paginate_queryset(self, queryset, request, view=None):
+            self.page_size = self.get_page_size(request)
+            if self.page_size <= 0:
+                return None
+
+            self.base_url = request.build_absolute_uri()
+            cursor = self.decode_cursor(request)
+            thread_id, reverse = cursor if cursor != None else (None, False)
+            comments, has_more = self.fetch_threads(
+                queryset, thread_id, reverse
+            )
+            if reverse:
+                comments.reverse()
+                self.has_previous, self.has_next = has_more, True
+            else:
+                self.has_previous, self.has_next = thread_id != None, has_more
+            if not comments:
+                self.has_previous = self.has_next = False
+            self.page = comments
+            return comments
+
+        def get_next_link(self):
+            if not self.has_next:
+                return None
+            return self.encode_cursor(self.page[-1].thread_id, False)
+
+        def get_previous_link(self):
+            if not self.has_previous:
+                return None
+            return self.encode_cursor(self.page[0].thread_id, True)
+
+        def get_paginated_response(self, data):
+            return Response(
+                {
+                    "next": self.get_next_link(),
+                    "previous": self.get_previous_link(),
+                    "results": data,
+                }
+            )
+
+        def get_paginated_response_schema(self, schema):
+            return {
+                "type": "object",
+                "properties": {
+                    "next": {"type": "string", "nullable": True},
+                    "previous": {"type": "string", "nullable": True},
+                    "results": schema,
+                },
+            }
+
+        def get_schema_operation_parameters(self, view):
+            return [
+                {
+                    "name": self.cursor_query_param,
+                    "required": False,
+                    "in": "query",
+                    "description": "The pagination cursor value.",
+                    "schema": {"type": "string"},
+                }
+            ]
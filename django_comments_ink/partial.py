@@ -3,12 +3,15 @@ import logging
 from django.db.models import Q
 from django.template import loader
 from django.utils.encoding import smart_str
-from django.utils.module_loading import import_string
+from django.utils.html import json_script
 from django.utils.translation import gettext_lazy as _
+from django_comments.models import CommentFlag
 
 from django_comments_ink import caching, get_model, utils
 from django_comments_ink.conf import settings
+from django_comments_ink.models import CommentVote, prefetch_comment_feedback
 from django_comments_ink.paginator import CommentsPaginator
+from django_comments_ink.snapshot import CommentsSnapshot
 from django_comments_ink.views.templates import f_templates
 
 
@@ -31,6 +34,7 @@ class PartialTemplate:
         self.site_id = site_id
         self.cpage = cpage
         self.cfolded = cfolded
+        self.is_authenticated = is_authenticated
 
         try:
             self.comments_page = int(cpage) if cpage != "last" else "last"
@@ -58,10 +62,14 @@ class PartialTemplate:
         self.comment_list = []
         self.cache_key = ""
 
+        self.generation = caching.get_generation(
+            self.content_type.pk, self.object_pk, self.site_id
+        )
         kwargs = {
             "ctype_pk": self.content_type.pk,
             "object_pk": self.object_pk,
             "site_id": self.site_id,
+            "gen": self.generation,
         }
         comment_qs_ptn = cache_keys["comment_qs"]
         self.ckey_comment_qs = comment_qs_ptn.format(**kwargs)
@@ -69,29 +77,35 @@ class PartialTemplate:
         self.ckey_comments_paged = comments_paged_ptn.format(**kwargs)
         self.max_thread_level = utils.get_max_thread_level(self.content_type)
         if is_authenticated:
-            self.cmlist_ptn = cache_keys["comment_list_auth"]
+            self.cmlist_key_name = "comment_list_auth"
         else:
-            self.cmlist_ptn = cache_keys["comment_list_anon"]
+            self.cmlist_key_name = "comment_list_anon"
+        self.cmlist_ptn = cache_keys[self.cmlist_key_name]
 
         self.options = utils.get_app_model_options(
             content_type=self.content_type
         )
         check_input_allowed_str = self.options.pop("check_input_allowed")
-        check_func = import_string(check_input_allowed_str)
+        check_func = utils.get_check_input_allowed(check_input_allowed_str)
         target_obj = content_type.get_object_for_this_type(pk=object_pk)
         self.options["is_input_allowed"] = check_func(target_obj)
 
     def get_queryset(self):
-        # Check whether there is already a qs in the dci cache.
+        """
+        Returns a CommentsSnapshot with the comments to list.
+
+        The snapshot, not the QuerySet, is what gets stored in the cache.
+        """
+        # Check whether there is already a snapshot in the dci cache.
         qs = None
         dci_cache = caching.get_cache()
         if dci_cache != None and self.ckey_comment_qs != "":
             cached = dci_cache.get(self.ckey_comment_qs)
-            if cached:
+            if cached != None:
                 logger.debug("Get %s from the cache", self.ckey_comment_qs)
                 qs = cached
 
-        if not qs:
+        if qs == None:
             qs = get_model().objects.filter(
                 content_type=self.content_type,
                 object_pk=smart_str(self.object_pk),
@@ -113,6 +127,7 @@ class PartialTemplate:
                 qs = qs.filter(is_removed=False)
             if "user" in field_names:
                 qs = qs.select_related("user")
+            qs = CommentsSnapshot.from_queryset(qs)
 
             if dci_cache != None and self.ckey_comment_qs != "":
                 logger.debug("Adding %s to the cache", self.ckey_comment_qs)
@@ -123,6 +138,8 @@ class PartialTemplate:
     def filter_folded_comments(self, qs):
         if not len(self.comments_folded):
             return qs
+        if isinstance(qs, CommentsSnapshot):
+            return qs.fold(self.comments_folded)
         return qs.filter(~Q(level__gt=0, thread_id__in=self.comments_folded))
 
     def paginate_queryset(self, queryset):
@@ -170,19 +187,14 @@ class PartialTemplate:
         context_dict.update(self.options)
         return context_dict
 
-    def render(self, context):
-        ckey_cmlist = ""
-        req = context.get("request", None)
-        if req:
-            ckey_cmlist = self.cmlist_ptn.format(path=req.get_full_path())
-
-        dci_cache = caching.get_cache()
-        if dci_cache != None and ckey_cmlist != "":
-            cached = dci_cache.get(ckey_cmlist)
-            if cached:
-                logger.debug("Get %s from the cache", ckey_cmlist)
-                return cached
+    def render_to_string(self, context):
+        """
+        Returns a tuple with the list of comments rendered, and the IDs of
+        the comments in the list.
 
+        For authenticated users the list doesn't include the votes and flags
+        of the user. They go into the user overlay (see get_user_overlay).
+        """
         template_list = f_templates(
             "list",
             app_label=self.content_type.app_label,
@@ -192,8 +204,110 @@ class PartialTemplate:
         qs = self.get_queryset()
         qs = self.filter_folded_comments(qs)
         self.paginate_queryset(qs)
+        prefetch_comment_feedback(self.comment_list)
 
         context = self.get_context(context)
-        result = loader.render_to_string(template_list, context)
-        dci_cache.set(ckey_cmlist, result, timeout=None)
-        return result
+        context["user_overlay"] = self.is_authenticated
+        html = loader.render_to_string(template_list, context)
+        return html, [cm.pk for cm in self.comment_list]
+
+    def get_user_overlay(self, context, comment_ids):
+        """
+        Returns a dictionary with the votes and flags of the user for the
+        comments in `comment_ids`, and the HTML of the elements that have to
+        be replaced in the cached list, keyed by their HTML id.
+        """
+        req = context.get("request", None)
+        user = getattr(req, "user", None) or context.get("user", None)
+        overlay = {"votes": {}, "flags": [], "html": {}}
+        if user == None or not user.is_authenticated or not len(comment_ids):
+            return overlay
+
+        if self.options.get("comment_votes_enabled", False):
+            overlay["votes"] = dict(
+                CommentVote.objects.filter(
+                    comment__in=comment_ids, author=user
+                ).values_list("comment_id", "vote")
+            )
+
+        flags_ids = set()
+        is_flagging_enabled = self.options.get(
+            "comment_flagging_enabled", False
+        )
+        if is_flagging_enabled and self.options["is_input_allowed"]:
+            flags_qs = CommentFlag.objects.filter(
+                comment__in=comment_ids, flag=CommentFlag.SUGGEST_REMOVAL
+            )
+            overlay["flags"] = sorted(
+                flags_qs.filter(user=user).values_list("comment_id", flat=True)
+            )
+            flags_ids.update(overlay["flags"])
+            # Same check as 'perms.comments.can_moderate' in the template.
+            if user.has_perm("comments.can_moderate"):
+                flags_ids.update(flags_qs.values_list("comment_id", flat=True))
+
+        votes_ids = set(overlay["votes"])
+        if not len(votes_ids | flags_ids):
+            return overlay
+
+        comments = get_model().objects.filter(pk__in=votes_ids | flags_ids)
+        if "thread" in [f.name for f in get_model()._meta.fields]:
+            comments = comments.select_related("thread")
+        comments = prefetch_comment_feedback(comments, user=user)
+
+        votes_templates = f_templates(
+            "voted_js",
+            app_label=self.content_type.app_label,
+            model=self.content_type.model,
+        )
+        context = self.get_context(context)
+        context["user"] = user
+        for comment in comments:
+            if getattr(comment, "is_removed", False):
+                continue
+            cm_abs_url = comment.get_absolute_url()
+            context["comment"] = comment
+            context["anchor"] = cm_abs_url[cm_abs_url.find("#") + 1 :]
+            if comment.pk in votes_ids and comment.level == 0:
+                overlay["html"][f"cm-votes-{comment.pk}"] = (
+                    loader.render_to_string(votes_templates, context)
+                )
+            if comment.pk in flags_ids:
+                overlay["html"][f"cm-flags-{comment.pk}"] = (
+                    loader.render_to_string(
+                        "comments/comment_flags.html", context
+                    )
+                )
+        return overlay
+
+    def render(self, context):
+        ckey_cmlist = ckey_stale = ""
+        req = context.get("request", None)
+        if req:
+            ckey_cmlist = self.cmlist_ptn.format(
+                path=req.get_full_path(), gen=self.generation
+            )
+            # Holds the latest rendered list, whatever its generation, for
+            # the same object, page and folded comments.
+            stale = "stale/%s/%s/%s/%s/%s" % (
+                self.content_type.pk,
+                self.object_pk,
+                self.site_id,
+                self.cpage,
+                self.cfolded,
+            )
+            ckey_stale = self.cmlist_ptn.format(
+                path=req.get_full_path(), gen=stale
+            )
+
+        html, comment_ids = caching.get_or_rebuild(
+            self.cmlist_key_name,
+            ckey_cmlist,
+            ckey_stale,
+            self.generation,
+            lambda: self.render_to_string(context),
+        )
+        if self.is_authenticated:
+            overlay = self.get_user_overlay(context, comment_ids)
+            html += json_script(overlay, "dci-user-overlay")
+        return html
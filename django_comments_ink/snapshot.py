@@ -0,0 +1,163 @@
+"""
+Compact representation of the list of comments sent to an object.
+
+A `CommentsSnapshot` replaces the QuerySet of comments as the value stored
+in the cache. Pickling a QuerySet pickles its query tree and, once evaluated,
+every model instance in its result cache. A snapshot instead holds:
+
+ * `rows`: a tuple with one small tuple per comment, in list order, with the
+   columns in `CommentsSnapshot.fields` (the columns needed to paginate and
+   fold comment threads). It's built with a single `values_list` query.
+
+ * `details`: only for the comments that are actually displayed (a page), a
+   tuple with the values of the concrete fields of the comment model, plus
+   the user info and the score of the thread, so that model instances can be
+   rebuilt without hitting the database.
+
+Iterating over a snapshot returns model instances. If the snapshot has no
+details yet, they are fetched with one query and kept in the snapshot. The
+users who posted the comments are not part of the details: when rebuilt from
+them, the users of all the comments are fetched at once, with one query.
+"""
+
+from django.contrib.contenttypes.models import ContentType
+
+
+class CommentsSnapshot:
+    fields = ("id", "thread_id", "parent_id", "level", "order", "nested_count")
+
+    def __init__(self, model, rows, details=None, detail_fields=None):
+        self.model = model
+        self.rows = rows
+        self.details = details
+        self.detail_fields = detail_fields
+        self._instances = None
+
+    @classmethod
+    def from_queryset(cls, queryset):
+        return cls(queryset.model, tuple(queryset.values_list(*cls.fields)))
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_instances"] = None
+        return state
+
+    def __len__(self):
+        return len(self.rows)
+
+    def count(self):
+        return len(self.rows)
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            details = self.details[key] if self.details != None else None
+            return CommentsSnapshot(
+                self.model, self.rows[key], details, self.detail_fields
+            )
+        return self.get_instances()[key]
+
+    def __iter__(self):
+        return iter(self.get_instances())
+
+    def __repr__(self):
+        return "<CommentsSnapshot of %d %s>" % (
+            len(self.rows),
+            self.model._meta.label,
+        )
+
+    @property
+    def ids(self):
+        return [row[0] for row in self.rows]
+
+    def top_level(self):
+        """Return a list of (id, nested_count) for comments of level 0."""
+        return [(row[0], row[5]) for row in self.rows if row[3] == 0]
+
+    def fold(self, comments_folded):
+        """
+        Return a new snapshot without the nested comments of the threads
+        given in `comments_folded`.
+        """
+        if not len(comments_folded):
+            return self
+        keep = [
+            index
+            for index, row in enumerate(self.rows)
+            if row[3] == 0 or row[1] not in comments_folded
+        ]
+        details = None
+        if self.details != None:
+            details = tuple(self.details[index] for index in keep)
+        return CommentsSnapshot(
+            self.model,
+            tuple(self.rows[index] for index in keep),
+            details,
+            self.detail_fields,
+        )
+
+    def materialize(self):
+        """Fetch the details of the comments in the snapshot, if missing."""
+        if self.details != None:
+            return self
+        if not len(self.rows):
+            self.details = ()
+            return self
+
+        ids = self.ids
+        qs = self.model.objects.filter(pk__in=ids).select_related("user")
+        field_names = [f.name for f in self.model._meta.fields]
+        if "thread" in field_names:
+            qs = qs.select_related("thread")
+        by_id = {obj.pk: obj for obj in qs}
+        self._instances = [by_id[cid] for cid in ids if cid in by_id]
+
+        self.detail_fields = tuple(
+            f.attname for f in self.model._meta.concrete_fields
+        )
+        self.details = tuple(self._dump(obj) for obj in self._instances)
+        return self
+
+    def get_instances(self):
+        if self._instances == None:
+            if self.details == None:
+                self.materialize()
+            else:
+                self._instances = [self._load(row) for row in self.details]
+                self._load_users(self._instances)
+        return self._instances
+
+    def _dump(self, obj):
+        values = tuple(getattr(obj, attname) for attname in self.detail_fields)
+        thread = getattr(obj, "thread", None)
+        return values + (
+            obj.name,
+            obj.email,
+            obj.url,
+            thread.score if thread else None,
+            thread.rating if thread else None,
+        )
+
+    def _load(self, row):
+        num_fields = len(self.detail_fields)
+        obj = self.model.from_db(None, self.detail_fields, row[:num_fields])
+        name, email, url, score, rating = row[num_fields:]
+        # Comment._get_userinfo caches its result in '_userinfo'. Prefilling
+        # it avoids fetching the user to compute the comment's name.
+        obj._userinfo = {"name": name, "email": email, "url": url}
+        obj.content_type = ContentType.objects.get_for_id(obj.content_type_id)
+        if score != None:
+            thread_model = obj._meta.get_field("thread").related_model
+            obj.thread = thread_model.from_db(
+                None, ("id", "score", "rating"), (obj.thread_id, score, rating)
+            )
+        return obj
+
+    def _load_users(self, instances):
+        user_ids = {obj.user_id for obj in instances if obj.user_id != None}
+        if not len(user_ids):
+            return
+        user_model = self.model._meta.get_field("user").related_model
+        users = user_model._default_manager.in_bulk(user_ids)
+        for obj in instances:
+            if obj.user_id in users:
+                obj.user = users[obj.user_id]
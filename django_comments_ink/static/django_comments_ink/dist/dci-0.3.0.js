@@ -1054,6 +1054,42 @@ class ReplyFormsHandler {
 }
 
 
+/***/ }),
+
+/***/ "./django_comments_ink/static/django_comments_ink/js/user_overlay.js":
+/*!***************************************************************************!*\
+  !*** ./django_comments_ink/static/django_comments_ink/js/user_overlay.js ***!
+  \***************************************************************************/
+/***/ ((__unused_webpack_module, __webpack_exports__, __webpack_require__) => {
+
+__webpack_require__.r(__webpack_exports__);
+/* harmony export */ __webpack_require__.d(__webpack_exports__, {
+/* harmony export */   "init_user_overlay": () => (/* binding */ init_user_overlay)
+/* harmony export */ });
+/*
+ * The list of comments is cached and shared by all authenticated users.
+ * The votes and flags of the current user come in a JSON script element,
+ * with the HTML of the elements that have to be replaced in the list.
+ */
+function init_user_overlay() {
+    const overlay_el = document.getElementById("dci-user-overlay");
+    if (overlay_el === null || window.djCommentsInk === null) {
+        return;
+    }
+
+    const overlay = JSON.parse(overlay_el.textContent);
+    window.djCommentsInk.user_overlay = overlay;
+    for (const [element_id, html] of Object.entries(overlay.html)) {
+        const element = document.getElementById(element_id);
+        if (element) {
+            element.innerHTML = html;
+        }
+    }
+}
+
+
+
+
 /***/ }),
 
 /***/ "./django_comments_ink/static/django_comments_ink/js/utils.js":
@@ -1313,6 +1349,8 @@ __webpack_require__.r(__webpack_exports__);
 /* harmony import */ var _comments_js__WEBPACK_IMPORTED_MODULE_0__ = __webpack_require__(/*! ./comments.js */ "./django_comments_ink/static/django_comments_ink/js/comments.js");
 /* harmony import */ var _reactions_js__WEBPACK_IMPORTED_MODULE_1__ = __webpack_require__(/*! ./reactions.js */ "./django_comments_ink/static/django_comments_ink/js/reactions.js");
 /* harmony import */ var _flagging_js__WEBPACK_IMPORTED_MODULE_2__ = __webpack_require__(/*! ./flagging.js */ "./django_comments_ink/static/django_comments_ink/js/flagging.js");
+/* harmony import */ var _user_overlay_js__WEBPACK_IMPORTED_MODULE_3__ = __webpack_require__(/*! ./user_overlay.js */ "./django_comments_ink/static/django_comments_ink/js/user_overlay.js");
+
 
 
 
@@ -1320,10 +1358,13 @@ __webpack_require__.r(__webpack_exports__);
 window.djCommentsInk = {
     init_comments: _comments_js__WEBPACK_IMPORTED_MODULE_0__.init_comments,
     init_reactions: _reactions_js__WEBPACK_IMPORTED_MODULE_1__.init_reactions,
-    init_flagging: _flagging_js__WEBPACK_IMPORTED_MODULE_2__.init_flagging
+    init_flagging: _flagging_js__WEBPACK_IMPORTED_MODULE_2__.init_flagging,
+    init_user_overlay: _user_overlay_js__WEBPACK_IMPORTED_MODULE_3__.init_user_overlay
 };
 
 window.addEventListener("DOMContentLoaded", (_) => {
+    // Before the handlers attach their listeners to the list elements.
+    (0,_user_overlay_js__WEBPACK_IMPORTED_MODULE_3__.init_user_overlay)();
     (0,_comments_js__WEBPACK_IMPORTED_MODULE_0__.init_comments)();
     (0,_reactions_js__WEBPACK_IMPORTED_MODULE_1__.init_reactions)();
     (0,_flagging_js__WEBPACK_IMPORTED_MODULE_2__.init_flagging)();
@@ -1,2 +1,96 @@
-(()=>{"use strict";class CommentForm{constructor(e){this.formWrapper=e,this.init()}click_on_post(e){return this.post("post")}click_on_preview(e){return this.post("preview")}init(){this.formWrapperEl=document.querySelector(this.formWrapper),this.formEl=this.formWrapperEl.querySelector("form");const e=this.formEl.elements.post,t=this.formEl.elements.preview;e.addEventListener("click",(e=>this.post("post"))),t.addEventListener("click",(e=>this.post("preview"))),e.type="button",t.type="button"}disable_btns(e){this.formEl.elements.post.disabled=e,this.formEl.elements.preview.disabled=e}is_valid(){for(const e of this.formEl.querySelectorAll("[required]"))if(!e.reportValidity())return e.focus(),!1;return!0}post(e){if(!this.is_valid())return;this.disable_btns(!0);const t=this.formWrapperEl.querySelector("[data-dci=preview]");t&&t.remove();const n=new FormData(this.formEl);return void 0!==e&&n.append(e,1),fetch(this.formEl.action,{method:"POST",headers:{"X-Requested-With":"XMLHttpRequest"},body:n}).then((t=>{"preview"===e?this.handle_preview_comment_response(t):"post"===e&&this.handle_post_comment_response(t)})),this.disable_btns(!1),!1}async handle_preview_comment_response(e){const t=await e.json();200===e.status?(this.formWrapperEl.innerHTML=t.html,this.init(),t.field_focus&&this.formEl.querySelector(`[name=${t.field_focus}]`).focus()):400===e.status&&(this.formEl.innerHTML=t.html)}async handle_post_comment_response(e){const t=await e.json();200===e.status?(this.formWrapperEl.innerHTML=t.html,this.init(),t.field_focus&&this.formEl.querySelector(`[name=${t.field_focus}]`).focus()):201===e.status||202===e.status||400===e.status?this.formEl.innerHTML=t.html:e.status>400&&alert("Something went wrong and your comment could not be processed. Please, reload the page and try again.")}}class ReplyFormsHandler{constructor(e,t){this.replyFormBase=document.querySelector(e),this.replyMap=new Map;const n=window.djCommentsInk.page_param||"cpage";for(const s of document.querySelectorAll(t)){const e=s.querySelector("form");if(null===e)return void console.error(`Could not find a reply form within one of the elements retrieved with ${t}.`);const i=e.elements.reply_to.value,o=e.elements[n]?e.elements[n].value:null,l=this.replyFormBase.cloneNode(!0);l.dataset.dci=`reply-form-${i}`;const r=l.querySelector("form");r.elements.reply_to.value=i,o&&(r.elements[n].value=o);const a=s.parentNode;s.replaceWith(l),this.init(i),this.replyMap.set(i,a)}}init(e,t){const n=`[data-dci=reply-form-${e}]`,s=document.querySelector(n),i=s.querySelector("form");i.elements.post.addEventListener("click",this.send_clicked(e));i.elements.preview.addEventListener("click",this.preview_clicked(e));i.elements.cancel.addEventListener("click",this.cancel_clicked(e)),i.style.display="none";const o=s.querySelector("[data-dci=reply-textarea]");o.querySelector("textarea").addEventListener("focus",this.textarea_focus(e)),!0===t&&(s.classList.add("active"),o.style.display="none",i.style="",i.elements.comment.focus())}get_map_item(e){const t=this.replyMap.get(e);if(void 0===t){const t=`replyMap doesn't have a key ${e}`;throw console.error(t),t}return t}disable_buttons(e,t){e.elements.post.disabled=t,e.elements.preview.disabled=t}is_valid(e){for(const t of e.querySelectorAll("[required]"))if(!t.reportValidity())return t.focus(),!1;return!0}textarea_focus(e){return t=>{const n=this.get_map_item(e),s=`[data-dci=reply-form-${e}`,i=n.querySelector(s),o=i.querySelector("form"),l=i.querySelector("[data-dci=reply-textarea]");i.classList.toggle("active"),l.style.display="none",o.style="",o.elements.comment.focus()}}cancel_clicked(e){return t=>{const n=this.get_map_item(e),s=`[data-dci=reply-form-${e}`,i=n.querySelector(s),o=i.querySelector("form"),l=i.querySelector("[data-dci=reply-textarea]"),r=o.elements.comment.value;l.querySelector("textarea").value=r,i.classList.toggle("active"),o.style.display="none",l.style="";const a=n.querySelector("[data-dci=preview]");a&&a.remove()}}preview_clicked(e){return t=>{this.post("preview",e)}}send_clicked(e){return t=>{this.post("post",e)}}post(e,t){const n=this.get_map_item(t),s=n.querySelector("form");if(!this.is_valid(s))return;this.disable_buttons(s,!0);const i=n.querySelector("[data-dci=preview]");i&&i.remove();const o=new FormData(s);return void 0!==e&&o.append(e,1),fetch(s.action,{method:"POST",headers:{"X-Requested-With":"XMLHttpRequest"},body:o}).then((n=>{"preview"===e?this.handle_preview_comment_response(n,t):"post"===e&&this.handle_post_comment_response(n,t)})),this.disable_buttons(s,!1),!1}handle_http_200(e,t,n){e.innerHTML=t.html,this.init(n,!0),t.field_focus&&e.querySelector(`[name=${t.field_focus}]`).focus()}handle_http_201_202_400(e,t){e.querySelector("form").innerHTML=t.html}async handle_preview_comment_response(e,t){const n=this.get_map_item(t),s=await e.json();200===e.status?this.handle_http_200(n,s,t):400===e.status&&this.handle_http_201_202_400(n,s)}async handle_post_comment_response(e,t){const n=this.get_map_item(t),s=await e.json();200===e.status?this.handle_http_200(n,s,t):201===e.status||202===e.status||400===e.status?this.handle_http_201_202_400(n,s):e.status>400&&alert("Something went wrong and your comment could not be processed. Please, reload the page and try again.")}}class FoldingHandler{constructor(e){this.dir=e,this.target_comment=void 0,this.comment_replies=-1;const t=`[data-dci-action=${this.dir}]`,n=document.querySelectorAll(t),s=this.on_click.bind(this);n.forEach((t=>{"fold"===e&&t.classList.remove("hide"),t.addEventListener("click",s)}))}on_click(e){e.preventDefault(),this.target_comment=e.target.closest(".comment").parentNode,this.comment_replies=parseInt(e.target.dataset.dciReplies),this.fold_or_unfold_siblings();const t=this.target_comment.getAttribute("id").split("-");console.assert(2===t.length&&"comment"===t[0]);const n=parseInt(t[1]);this.turn_links(n)}turn_links(e){const t=`${this.dir}-${e}`,n=document.getElementById(t);null!==n&&n.classList.add("hide");const s=("fold"===this.dir?"unfold":"fold")+`-${e}`,i=document.getElementById(s);null!==i&&i.classList.remove("hide")}fold_or_unfold_siblings(){let e=0,t=this.target_comment.nextElementSibling;for(;t&&e<this.comment_replies;){const n=t.getAttribute("id").split("-");if(3!==n.length||"reply"!==n[0]||"to"!==n[1]){if(2===n.length&&"comment"===n[0]){const s=parseInt(n[1]),i=`reply-to-${s}`,o=document.getElementById(i);o&&this.toggle(o),this.turn_links(s),this.toggle(t),t=t.nextElementSibling,e++}}else t=t.nextElementSibling}}toggle(e){"fold"===this.dir?e.classList.add("hide"):"unfold"===this.dir&&e.classList.remove("hide")}}function init_comments(){if(null===window.djCommentsInk)return;if(void 0===window.djCommentsInk.page_param){const e=document.querySelector("[data-dci=config]");e&&(window.djCommentsInk.page_param=e.getAttribute("data-page-qs-param"))}window.djCommentsInk.comment_form=null,window.djCommentsInk.reply_forms_handler=null,window.djCommentsInk.folding_handler=null,window.djCommentsInk.unfolding_handler=null;const e="[data-dci=comment-form]";null===window.djCommentsInk.comment_form&&document.querySelector(e)&&(window.djCommentsInk.comment_form=new CommentForm(e));const t="[data-dci=reply-form-template]",n="[data-dci=reply-form]";null===window.djCommentsInk.reply_forms_handler&&document.querySelector(t)&&document.querySelectorAll(n)&&(window.djCommentsInk.reply_forms_handler=new ReplyFormsHandler(t,n)),null===window.djCommentsInk.folding_handler&&null===window.djCommentsInk.unfolding_handler&&(window.djCommentsInk.folding_handler=new FoldingHandler("fold"),window.djCommentsInk.unfolding_handler=new FoldingHandler("unfold"))}function get_cookie(e){let t=null;if(document.cookie&&""!==document.cookie){const n=document.cookie.split(";");for(let s=0;s<n.length;s++){const i=n[s].trim();if(i.substring(0,e.length+1)===e+"="){t=decodeURIComponent(i.substring(e.length+1));break}}}return t}function get_login_url(e,t){const n=e.dataset.loginUrl;if((null===n||0===n.length)&&t)throw new Error("Cannot initialize reactions panel => The [data-login-url] attribute does not exist or is empty.");return n}class ReactionsPanel{constructor({panel_el:e,is_guest:t,login_url:n,react_url:s}=opts){this.panel_el=e,this.arrow_el=e.querySelector(".arrow"),this.is_guest=t,this.login_url=n,this.react_url=s,this.panel_title="",this.panel_title_elem=this.panel_el.querySelector(".title"),this.panel_title_elem&&(this.panel_title=this.panel_title_elem.textContent),this.comment_id=0,this.next_url="",this.on_react_btn_click=this.on_react_btn_click.bind(this),this.on_react_btn_mouseover=this.on_react_btn_mouseover.bind(this),this.on_react_btn_mouseout=this.on_react_btn_mouseout.bind(this),this.add_event_listeners()}add_event_listeners(){const e=this.panel_el.querySelectorAll("button");for(const t of Array.from(e))t.addEventListener("click",this.on_react_btn_click),t.addEventListener("mouseover",this.on_react_btn_mouseover),t.addEventListener("mouseout",this.on_react_btn_mouseout)}on_react_btn_click(e){if(this.is_guest)window.location.href=`${this.login_url}?next=${this.next_url}`;else{const t=e.target.dataset.code,n=this.react_url.replace("0",this.comment_id),s=new FormData;s.append("reaction",t),s.append("csrfmiddlewaretoken",get_cookie("csrftoken")),fetch(n,{method:"POST",cache:"no-cache",credentials:"same-origin",headers:{"X-Requested-With":"XMLHttpRequest"},body:s}).then((e=>this.handle_reactions_response(e)))}}async handle_reactions_response(e){const t=await e.json();if(200===e.status||201===e.status){const e=`#cm-reactions-${this.comment_id}`,n=document.querySelector(e);n&&(n.innerHTML=t.html)}else e.status>400&&alert("Something went wrong and your comment reaction could not be processed. Please, reload the page and try again.")}on_react_btn_mouseover(e){this.panel_title_elem&&(this.panel_title_elem.textContent=e.target.dataset.title)}on_react_btn_mouseout(e){this.panel_title_elem.textContent=this.panel_title}set_position(e){this.panel_el.style.display="block";const t=this.get_absolute_coords(this.panel_el),n=this.get_absolute_coords(e),s=t.width,i=t.height,o=t.top,l=t.left,r=n.width,a=n.top,c=n.left,d=c-l+(r/2-s/2),_=a-o-i-8,h=_+10;if(this.panel_el.dataset.fromLeft=d,this.panel_el.dataset.fromTop=h,this.panel_el.dataset.left=d,this.panel_el.dataset.top=_,this.arrow_el){let e=0;e=r/2+c-(d+l);const t=`translate3d(${e}px, 0px, 0)`;this.arrow_el.style.transform=t}}hide(){clearTimeout(this.enter_delay_timeout),this.exit_delat_timeout=setTimeout((()=>{if(this.panel_el){const e=`translate3d(${this.panel_el.dataset.fromLeft}px, ${this.panel_el.dataset.fromTop}px, 0)`;this.panel_el.style.transform=e,this.panel_el.style.opacity=0,this.panel_el.style.display="none",this.panel_el.style.zIndex=0}}),0)}show(e,t){this.comment_id=t,this.next_url=e.dataset.loginNext||"",this.panel_el.style.transform="none",this.set_position(e),this.enter_delay_timeout=setTimeout((()=>{const e=`translate3d(${this.panel_el.dataset.left}px, ${this.panel_el.dataset.top}px, 0)`;this.panel_el.style.zIndex=1,this.panel_el.style.display="block",this.panel_el.style.transform=e,this.panel_el.style.opacity=1}),0)}get_absolute_coords(e){if(!e)return;const t=e.getBoundingClientRect(),n=window.pageXOffset,s=window.pageYOffset;return{width:t.width,height:t.height,top:t.top+s,right:t.right+n,bottom:t.bottom+s,left:t.left+n}}}class ReactionsHandler{constructor(e){if(this.cfg_el=e,this.is_guest="1"===this.cfg_el.dataset.guestUser,this.is_input_allowed="1"===this.cfg_el.dataset.inputAllowed,this.login_url=get_login_url(this.cfg_el,this.is_guest),this.react_url=function get_react_url(e,t){const n=e.dataset.reactUrl;if(null===n||0===n.length){if(!t)throw new Error("Cannot initialize reactions panel => The [data-react-url] attribute does not exist or is empty.");console.info("Couldn't find the data-react-url attribute, but the user is anonymous. She has to login first in order to post comment reactions.")}return n}(this.cfg_el,this.is_guest),this.links=document.querySelectorAll("[data-dci=reactions-panel]"),0===this.links.length&&this.is_input_allowed)throw new Error("Cannot initialize reactions panel => There are no elements with [data-dci=reactions-panel].");this.active_visible_panel="0",this.panels_visibility=new Map,this.event_handlers=[],this.add_event_listeners(),this.listen_to_click_on_links();if(this.panel_el=document.querySelector("[data-dci=reactions-panel-template]"),void 0===this.panel_el)throw new Error("Cannot find element with ${qs_panel}.");const t={panel_el:this.panel_el,is_guest:this.is_guest,login_url:this.login_url,react_url:this.react_url};this.reactions_panel=new ReactionsPanel(t)}on_document_click(e){const t=e.target.getAttribute("data-dci");t&&"reactions-panel"===t||(this.reactions_panel.hide(),"0"!==this.active_visible_panel&&(this.panels_visibility.set(this.active_visible_panel,!1),this.active_visible_panel="0"))}on_document_key_up(e){"Escape"===e.key&&(this.reactions_panel.hide(),"0"!==this.active_visible_panel&&(this.panels_visibility.set(this.active_visible_panel,!1),this.active_visible_panel="0"))}add_event_listeners(){const e=this.on_document_click.bind(this),t=this.on_document_key_up.bind(this);window.document.addEventListener("click",e),window.document.addEventListener("keyup",t),this.event_handlers.push({elem:window.document,event:"click",handler:this.on_document_click}),this.event_handlers.push({elem:window.document,event:"keyup",handler:this.on_document_key_up})}remove_event_listeners(){for(const e of this.event_handlers)e.elem.removeEventListener(e.event,e.handler)}listen_to_click_on_links(){for(const e of Array.from(this.links)){const t=e.getAttribute("data-comment");if(null===t)continue;const n=this.toggle_reactions_panel(t);e.addEventListener("click",n),this.event_handlers.push({elem:e,event:"click",handler:n}),this.panels_visibility.set(t,!1)}}toggle_reactions_panel(e){return t=>{t.preventDefault();const n=this.panels_visibility.get(e);n?(this.active_visible_panel="0",this.reactions_panel.hide()):(this.active_visible_panel=e,this.reactions_panel.show(t.target,e)),this.panels_visibility.set(e,!n)}}}class VotingHandler{constructor(e){this.cfg_el=e,this.is_guest="1"===this.cfg_el.dataset.guestUser,this.login_url=get_login_url(this.cfg_el,this.is_guest),this.vote_url=function get_vote_url(e,t){const n=e.dataset.voteUrl;if(null===n||0===n.length){if(!t)throw new Error("Cannot initialize comment voting => The [data-vote-url] attribute does not exist or is empty.");console.info("Couldn't find the data-vote-url attribute, but the user is anonymous. She has to login first in order to vote for comments.")}return n}(this.cfg_el,this.is_guest),this.qs_up='[data-dci-action="vote-up"]',this.qs_down='[data-dci-action="vote-down"]';const t=document.querySelectorAll(this.qs_up),n=document.querySelectorAll(this.qs_down);this.on_click=this.on_click.bind(this),t.forEach((e=>e.addEventListener("click",this.on_click))),n.forEach((e=>e.addEventListener("click",this.on_click)))}on_click(e){e.preventDefault();const t=e.target;if(this.is_guest){const e=t.dataset.loginNext;window.location.href=`${this.login_url}?next=${e}`}else{this.comment_id=t.dataset.comment;const e=this.vote_url.replace("0",this.comment_id),n=t.dataset.code,s=new FormData;s.append("vote",n),s.append("csrfmiddlewaretoken",get_cookie("csrftoken")),fetch(e,{method:"POST",cache:"no-cache",credentials:"same-origin",headers:{"X-Requested-With":"XMLHttpRequest"},body:s}).then((e=>this.handle_vote_response(e)))}}async handle_vote_response(e){const t=await e.json();if(200===e.status||201===e.status){const e=`#cm-votes-${this.comment_id}`,n=document.querySelector(e);if(n){n.innerHTML=t.html;const e=n.querySelector(this.qs_up);e&&e.addEventListener("click",this.on_click);const s=n.querySelector(this.qs_down);s&&s.addEventListener("click",this.on_click)}}else e.status>400&&alert("Something went wrong and your comment vote could not be processed. Please, reload the page and try again.")}}function init_reactions(){const e=document.querySelector("[data-dci=config]");null!==e&&null!==window.djCommentsInk&&(window.djCommentsInk.reactions_handler=null,window.djCommentsInk.voting_handler=null,null===window.djCommentsInk.reactions_handler&&(window.djCommentsInk.reactions_handler=new ReactionsHandler(e),window.addEventListener("beforeunload",(e=>{window.djCommentsInk.reactions_handler.remove_event_listeners()}))),null===window.djCommentsInk.voting_handler&&(window.djCommentsInk.voting_handler=new VotingHandler(e)))}window.djCommentsInk={init_comments:init_comments,init_reactions:init_reactions},window.addEventListener("DOMContentLoaded",(e=>{init_comments(),init_reactions()}))})();
-//# sourceMappingURL=dci-0.3.0.min.js.map
\ No newline at end of file
+(()=>{"use strict";var __webpack_modules__=({"./django_comments_ink/static/django_comments_ink/js/comment_form.js":((__unused_webpack_module,__webpack_exports__,__webpack_require__)=>{__webpack_require__.r(__webpack_exports__);__webpack_require__.d(__webpack_exports__,{"default":()=>(CommentForm)});class CommentForm{constructor(formWrapper){this.formWrapper=formWrapper;this.init();}
+click_on_post(_){return this.post("post");}
+click_on_preview(_){return this.post("preview");}
+init(){this.formWrapperEl=document.querySelector(this.formWrapper);this.formEl=this.formWrapperEl.querySelector("form");const post_btn=this.formEl.elements.post;const preview_btn=this.formEl.elements.preview;post_btn.addEventListener("click",(_)=>this.post("post"));preview_btn.addEventListener("click",(_)=>this.post("preview"));post_btn.type="button";preview_btn.type="button";}
+disable_btns(value){this.formEl.elements.post.disabled=value;this.formEl.elements.preview.disabled=value;}
+is_valid(){for(const el of this.formEl.querySelectorAll("[required]")){if(!el.reportValidity()){el.focus();return false;}}
+return true;}
+post(submit_button_name){if(!this.is_valid()){return;}
+this.disable_btns(true);const preview=this.formWrapperEl.querySelector("[data-dci=preview]");if(preview){preview.remove();}
+const formData=new FormData(this.formEl);if(submit_button_name!==undefined){formData.append(submit_button_name,1);}
+fetch(this.formEl.action,{method:'POST',headers:{"X-Requested-With":"XMLHttpRequest",},body:formData}).then(response=>{if(submit_button_name==="preview"){this.handle_preview_comment_response(response);}else if(submit_button_name==="post"){this.handle_post_comment_response(response);}});this.disable_btns(false);return false;}
+async handle_preview_comment_response(response){const data=await response.json();if(response.status===200){this.formWrapperEl.innerHTML=data.html;this.init();if(data.field_focus){this.formEl.querySelector(`[name=${data.field_focus}]`).focus();}}else if(response.status===400){this.formEl.innerHTML=data.html;}}
+async handle_post_comment_response(response){const data=await response.json();if(response.status===200){this.formWrapperEl.innerHTML=data.html;this.init();if(data.field_focus){this.formEl.querySelector(`[name=${data.field_focus}]`).focus();}}
+else if(response.status===201||response.status===202||response.status===400){this.formEl.innerHTML=data.html;}
+else if(response.status>400){alert("Something went wrong and your comment could not be "+"processed. Please, reload the page and try again.");}}}}),"./django_comments_ink/static/django_comments_ink/js/comments.js":((__unused_webpack_module,__webpack_exports__,__webpack_require__)=>{__webpack_require__.r(__webpack_exports__);__webpack_require__.d(__webpack_exports__,{"init_comments":()=>(init_comments)});var _comment_form_js__WEBPACK_IMPORTED_MODULE_0__=__webpack_require__("./django_comments_ink/static/django_comments_ink/js/comment_form.js");var _reply_forms_js__WEBPACK_IMPORTED_MODULE_1__=__webpack_require__("./django_comments_ink/static/django_comments_ink/js/reply_forms.js");var _folding_js__WEBPACK_IMPORTED_MODULE_2__=__webpack_require__("./django_comments_ink/static/django_comments_ink/js/folding.js");function init_comments(){if(window.djCommentsInk===null){return;}
+if(window.djCommentsInk.page_param===undefined){const rroot=document.querySelector("[data-dci=config]");if(rroot){window.djCommentsInk.page_param=rroot.getAttribute("data-page-qs-param");}}
+window.djCommentsInk.comment_form=null;window.djCommentsInk.reply_forms_handler=null;window.djCommentsInk.folding_handler=null;window.djCommentsInk.unfolding_handler=null;const qs_cform="[data-dci=comment-form]";if(window.djCommentsInk.comment_form===null&&document.querySelector(qs_cform)){window.djCommentsInk.comment_form=new _comment_form_js__WEBPACK_IMPORTED_MODULE_0__["default"](qs_cform);}
+const qs_rform_base="[data-dci=reply-form-template]";const qs_rforms="[data-dci=reply-form]";if(window.djCommentsInk.reply_forms_handler===null&&document.querySelector(qs_rform_base)&&document.querySelectorAll(qs_rforms)){window.djCommentsInk.reply_forms_handler=new _reply_forms_js__WEBPACK_IMPORTED_MODULE_1__["default"](qs_rform_base,qs_rforms);}
+if(window.djCommentsInk.folding_handler===null&&window.djCommentsInk.unfolding_handler===null){window.djCommentsInk.folding_handler=new _folding_js__WEBPACK_IMPORTED_MODULE_2__["default"]("fold");window.djCommentsInk.unfolding_handler=new _folding_js__WEBPACK_IMPORTED_MODULE_2__["default"]("unfold");}}}),"./django_comments_ink/static/django_comments_ink/js/flagging.js":((__unused_webpack_module,__webpack_exports__,__webpack_require__)=>{__webpack_require__.r(__webpack_exports__);__webpack_require__.d(__webpack_exports__,{"default":()=>(FlaggingHandler),"init_flagging":()=>(init_flagging)});var _utils__WEBPACK_IMPORTED_MODULE_0__=__webpack_require__("./django_comments_ink/static/django_comments_ink/js/utils.js");class FlaggingHandler{constructor(configEl){this.cfg_el=configEl;this.is_guest=this.cfg_el.dataset.guestUser==="1";this.login_url=(0,_utils__WEBPACK_IMPORTED_MODULE_0__.get_login_url)(this.cfg_el,this.is_guest);this.flag_url=(0,_utils__WEBPACK_IMPORTED_MODULE_0__.get_flag_url)(this.cfg_el,this.is_guest);this.qs_flag='[data-dci-action="flag"]';const qs_flag=document.querySelectorAll(this.qs_flag);this.on_click=this.on_click.bind(this);qs_flag.forEach(el=>el.addEventListener("click",this.on_click));}
+on_click(event){event.preventDefault();const target=event.target;if(!this.is_guest){this.comment_id=target.dataset.comment;const flag_url=this.flag_url.replace("0",this.comment_id);const code=target.dataset.code;const form_data=new FormData();form_data.append("flag",code);form_data.append("csrfmiddlewaretoken",(0,_utils__WEBPACK_IMPORTED_MODULE_0__.get_cookie)("csrftoken"));fetch(flag_url,{method:"POST",cache:"no-cache",credentials:"same-origin",headers:{"X-Requested-With":"XMLHttpRequest",},body:form_data}).then(response=>this.handle_flag_response(response));}
+else{const next_url=target.dataset.loginNext;window.location.href=`${this.login_url}?next=${next_url}`;}}
+async handle_flag_response(response){const data=await response.json();if(response.status===200||response.status===201){const cm_flags_qs=`#cm-flags-${this.comment_id}`;const cm_flags_el=document.querySelector(cm_flags_qs);if(cm_flags_el){cm_flags_el.innerHTML=data.html;const qs_flags=cm_flags_el.querySelector(this.qs_flag);if(qs_flags){qs_flags.addEventListener("click",this.on_click);}}}else if(response.status>400){alert("Something went wrong and the flagging of the comment could not "+"be processed. Please, reload the page and try again.");}}}
+function init_flagging(){const cfg=document.querySelector("[data-dci=config]");if(cfg===null||window.djCommentsInk===null){return;}
+window.djCommentsInk.flagging_handler=null;if(window.djCommentsInk.flagging_handler===null){window.djCommentsInk.flagging_handler=new FlaggingHandler(cfg);}}}),"./django_comments_ink/static/django_comments_ink/js/folding.js":((__unused_webpack_module,__webpack_exports__,__webpack_require__)=>{__webpack_require__.r(__webpack_exports__);__webpack_require__.d(__webpack_exports__,{"default":()=>(FoldingHandler)});class FoldingHandler{constructor(direction){this.dir=direction;this.target_comment=undefined;this.comment_replies=-1;const qs=`[data-dci-action=${this.dir}]`;const qs_links=document.querySelectorAll(qs);const onLinkClickHandler=this.on_click.bind(this);qs_links.forEach(elem=>{if(direction==="fold"){elem.classList.remove("hide");}
+elem.addEventListener("click",onLinkClickHandler);});}
+on_click(event){event.preventDefault();this.target_comment=event.target.closest(".comment").parentNode;this.comment_replies=parseInt(event.target.dataset.dciReplies);this.fold_or_unfold_siblings();const bits=this.target_comment.getAttribute("id").split("-");console.assert(bits.length===2&&bits[0]==="comment");const cm_id=parseInt(bits[1]);this.turn_links(cm_id);}
+turn_links(cm_id){const dir_lid=`${this.dir}-${cm_id}`;const direct_link=document.getElementById(dir_lid);if(direct_link!==null){direct_link.classList.add("hide");}
+const inv_lid=(this.dir==='fold'?'unfold':'fold')+`-${cm_id}`;const inverse_link=document.getElementById(inv_lid);if(inverse_link!==null){inverse_link.classList.remove("hide");}}
+fold_or_unfold_siblings(){let num_processed=0;let next_node=this.target_comment.nextElementSibling;while(next_node&&(num_processed<this.comment_replies)){const cm_attr_id=next_node.getAttribute("id");const bits=cm_attr_id.split("-");if((bits.length===3)&&(bits[0]==="reply")&&(bits[1]==="to")){next_node=next_node.nextElementSibling;continue;}
+else if((bits.length===2)&&(bits[0]==="comment")){const cm_id=parseInt(bits[1]);const reply_id=`reply-to-${cm_id}`;const reply_node=document.getElementById(reply_id);if(reply_node){this.toggle(reply_node);}
+this.turn_links(cm_id);this.toggle(next_node);next_node=next_node.nextElementSibling;num_processed++;}}}
+toggle(node){if(this.dir==="fold"){node.classList.add("hide");}else if(this.dir==="unfold"){node.classList.remove("hide");}}}}),"./django_comments_ink/static/django_comments_ink/js/reactions.js":((__unused_webpack_module,__webpack_exports__,__webpack_require__)=>{__webpack_require__.r(__webpack_exports__);__webpack_require__.d(__webpack_exports__,{"init_reactions":()=>(init_reactions)});var _reactions_handler__WEBPACK_IMPORTED_MODULE_0__=__webpack_require__("./django_comments_ink/static/django_comments_ink/js/reactions_handler.js");var _voting_js__WEBPACK_IMPORTED_MODULE_1__=__webpack_require__("./django_comments_ink/static/django_comments_ink/js/voting.js");function init_reactions(){const cfg=document.querySelector("[data-dci=config]");if(cfg===null||window.djCommentsInk===null){return;}
+window.djCommentsInk.reactions_handler=null;window.djCommentsInk.voting_handler=null;if(window.djCommentsInk.reactions_handler===null){window.djCommentsInk.reactions_handler=new _reactions_handler__WEBPACK_IMPORTED_MODULE_0__["default"](cfg);window.addEventListener("beforeunload",(_)=>{window.djCommentsInk.reactions_handler.remove_event_listeners();});}
+if(window.djCommentsInk.voting_handler===null){window.djCommentsInk.voting_handler=new _voting_js__WEBPACK_IMPORTED_MODULE_1__["default"](cfg);}}}),"./django_comments_ink/static/django_comments_ink/js/reactions_handler.js":((__unused_webpack_module,__webpack_exports__,__webpack_require__)=>{__webpack_require__.r(__webpack_exports__);__webpack_require__.d(__webpack_exports__,{"default":()=>(ReactionsHandler)});var _reactions_panel__WEBPACK_IMPORTED_MODULE_0__=__webpack_require__("./django_comments_ink/static/django_comments_ink/js/reactions_panel.js");var _utils__WEBPACK_IMPORTED_MODULE_1__=__webpack_require__("./django_comments_ink/static/django_comments_ink/js/utils.js");class ReactionsHandler{constructor(configEl){this.cfg_el=configEl;this.is_guest=this.cfg_el.dataset.guestUser==="1";this.is_input_allowed=this.cfg_el.dataset.inputAllowed==="1";this.login_url=(0,_utils__WEBPACK_IMPORTED_MODULE_1__.get_login_url)(this.cfg_el,this.is_guest);this.react_url=(0,_utils__WEBPACK_IMPORTED_MODULE_1__.get_react_url)(this.cfg_el,this.is_guest);this.links=document.querySelectorAll("[data-dci=reactions-panel]");if(this.links.length===0&&this.is_input_allowed){throw new Error("Cannot initialize reactions panel => There are "+"no elements with [data-dci=reactions-panel].");}
+this.active_visible_panel="0";this.panels_visibility=new Map();this.event_handlers=[];this.add_event_listeners();this.listen_to_click_on_links();const qs_panel="[data-dci=reactions-panel-template]";this.panel_el=document.querySelector(qs_panel);if(this.panel_el===undefined){throw new Error("Cannot find element with ${qs_panel}.");}
+const opts={panel_el:this.panel_el,is_guest:this.is_guest,login_url:this.login_url,react_url:this.react_url};this.reactions_panel=new _reactions_panel__WEBPACK_IMPORTED_MODULE_0__["default"](opts);}
+on_document_click(event){const data_attr=event.target.getAttribute("data-dci");if(!data_attr||data_attr!=="reactions-panel"){this.reactions_panel.hide();if(this.active_visible_panel!=="0"){this.panels_visibility.set(this.active_visible_panel,false);this.active_visible_panel="0";}}}
+on_document_key_up(event){if(event.key==="Escape"){this.reactions_panel.hide();if(this.active_visible_panel!=="0"){this.panels_visibility.set(this.active_visible_panel,false);this.active_visible_panel="0";}}}
+add_event_listeners(){const onDocumentClickHandler=this.on_document_click.bind(this);const onDocumentKeyUpHandler=this.on_document_key_up.bind(this);window.document.addEventListener('click',onDocumentClickHandler);window.document.addEventListener('keyup',onDocumentKeyUpHandler);this.event_handlers.push({elem:window.document,event:'click',handler:this.on_document_click,});this.event_handlers.push({elem:window.document,event:'keyup',handler:this.on_document_key_up,});}
+remove_event_listeners(){for(const item of this.event_handlers){item.elem.removeEventListener(item.event,item.handler);}}
+listen_to_click_on_links(){for(const elem of Array.from(this.links)){const comment_id=elem.getAttribute("data-comment");if(comment_id===null){continue;}
+const click_handler=this.toggle_reactions_panel(comment_id);elem.addEventListener("click",click_handler);this.event_handlers.push({'elem':elem,'event':'click','handler':click_handler});this.panels_visibility.set(comment_id,false);}}
+toggle_reactions_panel(comment_id){return(event)=>{event.preventDefault();const is_visible=this.panels_visibility.get(comment_id);if(!is_visible){this.active_visible_panel=comment_id;this.reactions_panel.show(event.target,comment_id);}else{this.active_visible_panel="0";this.reactions_panel.hide();}
+this.panels_visibility.set(comment_id,!is_visible);};}}}),"./django_comments_ink/static/django_comments_ink/js/reactions_panel.js":((__unused_webpack_module,__webpack_exports__,__webpack_require__)=>{__webpack_require__.r(__webpack_exports__);__webpack_require__.d(__webpack_exports__,{"default":()=>(ReactionsPanel)});var _utils__WEBPACK_IMPORTED_MODULE_0__=__webpack_require__("./django_comments_ink/static/django_comments_ink/js/utils.js");const enter_delay=0;const exit_delay=0;class ReactionsPanel{constructor({panel_el,is_guest,login_url,react_url}=opts){this.panel_el=panel_el;this.arrow_el=panel_el.querySelector(".arrow");this.is_guest=is_guest;this.login_url=login_url;this.react_url=react_url;this.panel_title="";this.panel_title_elem=this.panel_el.querySelector(".title");if(this.panel_title_elem){this.panel_title=this.panel_title_elem.textContent;}
+this.comment_id=0;this.next_url="";this.on_react_btn_click=this.on_react_btn_click.bind(this);this.on_react_btn_mouseover=this.on_react_btn_mouseover.bind(this);this.on_react_btn_mouseout=this.on_react_btn_mouseout.bind(this);this.add_event_listeners();}
+add_event_listeners(){const buttons=this.panel_el.querySelectorAll("button");for(const btn of Array.from(buttons)){btn.addEventListener("click",this.on_react_btn_click);btn.addEventListener("mouseover",this.on_react_btn_mouseover);btn.addEventListener("mouseout",this.on_react_btn_mouseout);}}
+on_react_btn_click(event){if(!this.is_guest){const code=event.target.dataset.code;const react_url=this.react_url.replace("0",this.comment_id);const formData=new FormData();formData.append("reaction",code);formData.append("csrfmiddlewaretoken",(0,_utils__WEBPACK_IMPORTED_MODULE_0__.get_cookie)("csrftoken"));fetch(react_url,{method:"POST",cache:"no-cache",credentials:"same-origin",headers:{"X-Requested-With":"XMLHttpRequest",},body:formData}).then(response=>this.handle_reactions_response(response));}else{window.location.href=`${this.login_url}?next=${this.next_url}`;}}
+async handle_reactions_response(response){const data=await response.json();if(response.status===200|| response.status===201){const cm_reactions_qs=`#cm-reactions-${this.comment_id}`;const cm_reactions_el=document.querySelector(cm_reactions_qs);if(cm_reactions_el){cm_reactions_el.innerHTML=data.html;}}else if(response.status>400){alert("Something went wrong and your comment reaction could not "+"be processed. Please, reload the page and try again.");}}
+on_react_btn_mouseover(event){if(this.panel_title_elem){this.panel_title_elem.textContent=event.target.dataset.title;}}
+on_react_btn_mouseout(_){this.panel_title_elem.textContent=this.panel_title;}
+set_position(trigger_elem){this.panel_el.style.display="block";const panel_elem_coords=this.get_absolute_coords(this.panel_el);const trigger_elem_coords=this.get_absolute_coords(trigger_elem);const panel_elem_width=panel_elem_coords.width;const panel_elem_height=panel_elem_coords.height;const panel_elem_top=panel_elem_coords.top;const panel_elem_left=panel_elem_coords.left;const trigger_elem_width=trigger_elem_coords.width;const trigger_elem_top=trigger_elem_coords.top;const trigger_elem_left=trigger_elem_coords.left;const top_diff=trigger_elem_top-panel_elem_top;const left_diff=trigger_elem_left-panel_elem_left;const margin=8;const width_center=trigger_elem_width/2-panel_elem_width/2;const left=left_diff+width_center;const top=top_diff-panel_elem_height-margin;const from_top=top+10;this.panel_el.dataset.fromLeft=left;this.panel_el.dataset.fromTop=from_top;this.panel_el.dataset.left=left;this.panel_el.dataset.top=top;if(this.arrow_el){let arrow_left=0;const full_left=left+panel_elem_left;const t_width_center=trigger_elem_width/2+trigger_elem_left;arrow_left=t_width_center-full_left;const transform_text=`translate3d(${arrow_left}px, 0px, 0)`;this.arrow_el.style.transform=transform_text;}}
+hide(){clearTimeout(this.enter_delay_timeout);this.exit_delat_timeout=setTimeout(()=>{if(this.panel_el){const left=this.panel_el.dataset.fromLeft;const top=this.panel_el.dataset.fromTop;const transform_text=`translate3d(${left}px, ${top}px, 0)`;this.panel_el.style.transform=transform_text;this.panel_el.style.opacity=0;this.panel_el.style.display="none";this.panel_el.style.zIndex=0;}},exit_delay);}
+show(trigger_elem,comment_id){this.comment_id=comment_id;this.next_url=trigger_elem.dataset.loginNext||"";this.panel_el.style.transform="none";this.set_position(trigger_elem);this.enter_delay_timeout=setTimeout(()=>{const left=this.panel_el.dataset.left;const top=this.panel_el.dataset.top;const transform_text=`translate3d(${left}px, ${top}px, 0)`;this.panel_el.style.zIndex=1;this.panel_el.style.display="block";this.panel_el.style.transform=transform_text;this.panel_el.style.opacity=1;},enter_delay);}
+get_absolute_coords(elem){if(!elem){return;}
+const box=elem.getBoundingClientRect();const page_x=window.pageXOffset;const page_y=window.pageYOffset;return{width:box.width,height:box.height,top:box.top+page_y,right:box.right+page_x,bottom:box.bottom+page_y,left:box.left+page_x,};}}}),"./django_comments_ink/static/django_comments_ink/js/reply_forms.js":((__unused_webpack_module,__webpack_exports__,__webpack_require__)=>{__webpack_require__.r(__webpack_exports__);__webpack_require__.d(__webpack_exports__,{"default":()=>(ReplyFormsHandler)});class ReplyFormsHandler{constructor(qsReplyFormBase,qsReplyForms){this.replyFormBase=document.querySelector(qsReplyFormBase);this.replyMap=new Map();const cpage_field=window.djCommentsInk.page_param||"cpage";for(const elem of document.querySelectorAll(qsReplyForms)){const rFormEl=elem.querySelector("form");if(rFormEl===null){console.error(`Could not find a reply form within one of `+`the elements retrieved with ${qsReplyForms}.`);return;}
+const reply_to=rFormEl.elements.reply_to.value;const cpage=rFormEl.elements[cpage_field]?rFormEl.elements[cpage_field].value:null;const section=this.replyFormBase.cloneNode(true);section.dataset.dci=`reply-form-${reply_to}`;const newForm=section.querySelector("form");newForm.elements.reply_to.value=reply_to;if(cpage){newForm.elements[cpage_field].value=cpage;}
+const elemParent=elem.parentNode;elem.replaceWith(section);this.init(reply_to);this.replyMap.set(reply_to,elemParent);}}
+init(reply_to,is_active){const qs_section=`[data-dci=reply-form-${reply_to}]`;const section=document.querySelector(qs_section);const newForm=section.querySelector("form");const post_btn=newForm.elements.post;post_btn.addEventListener("click",this.send_clicked(reply_to));const preview_btn=newForm.elements.preview;preview_btn.addEventListener("click",this.preview_clicked(reply_to));const cancel_btn=newForm.elements.cancel;cancel_btn.addEventListener("click",this.cancel_clicked(reply_to));newForm.style.display="none";const divta=section.querySelector("[data-dci=reply-textarea]");const ta=divta.querySelector("textarea");ta.addEventListener("focus",this.textarea_focus(reply_to));if(is_active===true){section.classList.add("active");divta.style.display="none";newForm.style="";newForm.elements.comment.focus();}}
+get_map_item(reply_to){const item=this.replyMap.get(reply_to);if(item===undefined){const msg=`replyMap doesn't have a key ${reply_to}`;console.error(msg);throw msg;}
+return item;}
+disable_buttons(formEl,value){formEl.elements.post.disabled=value;formEl.elements.preview.disabled=value;}
+is_valid(formEl){for(const el of formEl.querySelectorAll("[required]")){if(!el.reportValidity()){el.focus();return false;}}
+return true;}
+textarea_focus(reply_to){return(_)=>{const item=this.get_map_item(reply_to);const qs_section=`[data-dci=reply-form-${reply_to}`;const section=item.querySelector(qs_section);const form=section.querySelector("form");const divta=section.querySelector("[data-dci=reply-textarea]");section.classList.toggle("active");divta.style.display="none";form.style="";form.elements.comment.focus();};}
+cancel_clicked(reply_to){return(_)=>{const item=this.get_map_item(reply_to);const qs_section=`[data-dci=reply-form-${reply_to}`;const section=item.querySelector(qs_section);const form=section.querySelector("form");const divta=section.querySelector("[data-dci=reply-textarea]");const comment_value=form.elements.comment.value;divta.querySelector("textarea").value=comment_value;section.classList.toggle("active");form.style.display="none";divta.style="";const previewEl=item.querySelector("[data-dci=preview]");if(previewEl){previewEl.remove();}};}
+preview_clicked(reply_to){return(_)=>{this.post("preview",reply_to);};}
+send_clicked(reply_to){return(_)=>{this.post("post",reply_to);};}
+post(submit_button_name,reply_to){const item=this.get_map_item(reply_to);const formEl=item.querySelector("form");if(!this.is_valid(formEl)){return;}
+this.disable_buttons(formEl,true);const previewEl=item.querySelector("[data-dci=preview]");if(previewEl){previewEl.remove();}
+const formData=new FormData(formEl);if(submit_button_name!==undefined){formData.append(submit_button_name,1);}
+fetch(formEl.action,{method:"POST",headers:{"X-Requested-With":"XMLHttpRequest",},body:formData}).then(response=>{if(submit_button_name==="preview"){this.handle_preview_comment_response(response,reply_to);}else if(submit_button_name==="post"){this.handle_post_comment_response(response,reply_to);}});this.disable_buttons(formEl,false);return false;}
+handle_http_200(item,data,reply_to){item.innerHTML=data.html;this.init(reply_to,true);if(data.field_focus){item.querySelector(`[name=${data.field_focus}]`).focus();}}
+handle_http_201_202_400(item,data){const form=item.querySelector("form");form.innerHTML=data.html;}
+async handle_preview_comment_response(response,reply_to){const item=this.get_map_item(reply_to);const data=await response.json();if(response.status===200){this.handle_http_200(item,data,reply_to);}else if(response.status===400){this.handle_http_201_202_400(item,data);}}
+async handle_post_comment_response(response,reply_to){const item=this.get_map_item(reply_to);const data=await response.json();if(response.status===200){this.handle_http_200(item,data,reply_to);}
+else if(response.status===201||response.status===202||response.status===400){this.handle_http_201_202_400(item,data);}
+else if(response.status>400){alert("Something went wrong and your comment could not be "+"processed. Please, reload the page and try again.");}}}}),"./django_comments_ink/static/django_comments_ink/js/user_overlay.js":((__unused_webpack_module,__webpack_exports__,__webpack_require__)=>{__webpack_require__.r(__webpack_exports__);__webpack_require__.d(__webpack_exports__,{"init_user_overlay":()=>(init_user_overlay)});function init_user_overlay(){const overlay_el=document.getElementById("dci-user-overlay");if(overlay_el===null||window.djCommentsInk===null){return;}
+const overlay=JSON.parse(overlay_el.textContent);window.djCommentsInk.user_overlay=overlay;for(const[element_id,html]of Object.entries(overlay.html)){const element=document.getElementById(element_id);if(element){element.innerHTML=html;}}}}),"./django_comments_ink/static/django_comments_ink/js/utils.js":((__unused_webpack_module,__webpack_exports__,__webpack_require__)=>{__webpack_require__.r(__webpack_exports__);__webpack_require__.d(__webpack_exports__,{"get_cookie":()=>(get_cookie),"get_flag_url":()=>(get_flag_url),"get_login_url":()=>(get_login_url),"get_obj_react_url":()=>(get_obj_react_url),"get_react_url":()=>(get_react_url),"get_vote_url":()=>(get_vote_url)});function get_cookie(name){let cookieValue=null;if(document.cookie&&document.cookie!==''){const cookies=document.cookie.split(';');for(let i=0;i<cookies.length;i++){const cookie=cookies[i].trim();if(cookie.substring(0,name.length+1)===(name+'=')){cookieValue=decodeURIComponent(cookie.substring(name.length+1));break;}}}
+return cookieValue;}
+function get_login_url(configEl,isGuest){const url=configEl.getAttribute("data-login-url");if(url===null||url.length===0){if(isGuest){throw new Error("Cannot find the [data-login-url] attribute.");}}
+return url;}
+function get_react_url(configEl,isGuest){const url=configEl.getAttribute("data-react-url");if(url===null||url.length===0){if(!isGuest){throw new Error("Cannot initialize reactions panel => The "+"[data-react-url] attribute does not exist or is empty.");}else{console.info("Couldn't find the data-react-url attribute, "+"but the user is anonymous. She has to login first in "+"order to post comment reactions.");}}
+return url;}
+function get_obj_react_url(configEl,isGuest){const url=configEl.getAttribute("data-obj-react-url");if(url===null||url.length===0){if(!isGuest){throw new Error("Cannot initialize reactions panel => The "+"[data-obj-react-url] attribute does not exist or is empty.");}else{console.info("Couldn't find the data-obj-react-url attribute, "+"but the user is anonymous. She has to login first in "+"order to post object reactions.");}}
+return url;}
+function get_vote_url(configEl,isGuest){const url=configEl.getAttribute("data-vote-url");if(url===null||url.length===0){if(!isGuest){throw new Error("Cannot initialize comment voting => The "+"[data-vote-url] attribute does not exist or is empty.");}else{console.info("Couldn't find the data-vote-url attribute, "+"but the user is anonymous. She has to login first in "+"order to vote for comments.");}}
+return url;}
+function get_flag_url(configEl,isGuest){const url=configEl.getAttribute("data-flag-url");if(url===null||url.length===0){if(!isGuest){throw new Error("Cannot initialize comment flagging => The "+"[data-flag-url] attribute does not exist or is empty.");}else{console.info("Couldn't find the data-flag-url attribute, "+"but the user is anonymous. She has to login first in "+"order to flag comments.");}}
+return url;}}),"./django_comments_ink/static/django_comments_ink/js/voting.js":((__unused_webpack_module,__webpack_exports__,__webpack_require__)=>{__webpack_require__.r(__webpack_exports__);__webpack_require__.d(__webpack_exports__,{"default":()=>(VotingHandler)});var _utils__WEBPACK_IMPORTED_MODULE_0__=__webpack_require__("./django_comments_ink/static/django_comments_ink/js/utils.js");class VotingHandler{constructor(configEl){this.cfg_el=configEl;this.is_guest=this.cfg_el.dataset.guestUser==="1";this.login_url=(0,_utils__WEBPACK_IMPORTED_MODULE_0__.get_login_url)(this.cfg_el,this.is_guest);this.vote_url=(0,_utils__WEBPACK_IMPORTED_MODULE_0__.get_vote_url)(this.cfg_el,this.is_guest);this.qs_up='[data-dci-action="vote-up"]';this.qs_down='[data-dci-action="vote-down"]';const qs_vote_up=document.querySelectorAll(this.qs_up);const qs_vote_down=document.querySelectorAll(this.qs_down);this.on_click=this.on_click.bind(this);qs_vote_up.forEach(el=>el.addEventListener("click",this.on_click));qs_vote_down.forEach(el=>el.addEventListener("click",this.on_click));}
+on_click(event){event.preventDefault();const target=event.target;if(!this.is_guest){this.comment_id=target.dataset.comment;const vote_url=this.vote_url.replace("0",this.comment_id);const code=target.dataset.code;const form_data=new FormData();form_data.append("vote",code);form_data.append("csrfmiddlewaretoken",(0,_utils__WEBPACK_IMPORTED_MODULE_0__.get_cookie)("csrftoken"));fetch(vote_url,{method:"POST",cache:"no-cache",credentials:"same-origin",headers:{"X-Requested-With":"XMLHttpRequest",},body:form_data}).then(response=>this.handle_vote_response(response));}
+else{const next_url=target.dataset.loginNext;window.location.href=`${this.login_url}?next=${next_url}`;}}
+async handle_vote_response(response){const data=await response.json();if(response.status===200||response.status===201){const cm_votes_qs=`#cm-votes-${this.comment_id}`;const cm_votes_el=document.querySelector(cm_votes_qs);if(cm_votes_el){cm_votes_el.innerHTML=data.html;const qs_vote_up=cm_votes_el.querySelector(this.qs_up);if(qs_vote_up){qs_vote_up.addEventListener("click",this.on_click);}
+const qs_vote_down=cm_votes_el.querySelector(this.qs_down);if(qs_vote_down){qs_vote_down.addEventListener("click",this.on_click);}}}else if(response.status>400){alert("Something went wrong and your comment vote could not "+"be processed. Please, reload the page and try again.");}}}})});var __webpack_module_cache__={};function __webpack_require__(moduleId){var cachedModule=__webpack_module_cache__[moduleId];if(cachedModule!==undefined){return cachedModule.exports;}
+var module=__webpack_module_cache__[moduleId]={exports:{}};__webpack_modules__[moduleId](module,module.exports,__webpack_require__);return module.exports;}
+(()=>{__webpack_require__.d=(exports,definition)=>{for(var key in definition){if(__webpack_require__.o(definition,key)&&!__webpack_require__.o(exports,key)){Object.defineProperty(exports,key,{enumerable:true,get:definition[key]});}}};})();(()=>{__webpack_require__.o=(obj,prop)=>(Object.prototype.hasOwnProperty.call(obj,prop))})();(()=>{__webpack_require__.r=(exports)=>{if(typeof Symbol!=='undefined'&&Symbol.toStringTag){Object.defineProperty(exports,Symbol.toStringTag,{value:'Module'});}
+Object.defineProperty(exports,'__esModule',{value:true});};})();var __webpack_exports__={};(()=>{__webpack_require__.r(__webpack_exports__);var _comments_js__WEBPACK_IMPORTED_MODULE_0__=__webpack_require__("./django_comments_ink/static/django_comments_ink/js/comments.js");var _reactions_js__WEBPACK_IMPORTED_MODULE_1__=__webpack_require__("./django_comments_ink/static/django_comments_ink/js/reactions.js");var _flagging_js__WEBPACK_IMPORTED_MODULE_2__=__webpack_require__("./django_comments_ink/static/django_comments_ink/js/flagging.js");var _user_overlay_js__WEBPACK_IMPORTED_MODULE_3__=__webpack_require__("./django_comments_ink/static/django_comments_ink/js/user_overlay.js");window.djCommentsInk={init_comments:_comments_js__WEBPACK_IMPORTED_MODULE_0__.init_comments,init_reactions:_reactions_js__WEBPACK_IMPORTED_MODULE_1__.init_reactions,init_flagging:_flagging_js__WEBPACK_IMPORTED_MODULE_2__.init_flagging,init_user_overlay:_user_overlay_js__WEBPACK_IMPORTED_MODULE_3__.init_user_overlay};window.addEventListener("DOMContentLoaded",(_)=>{(0,_user_overlay_js__WEBPACK_IMPORTED_MODULE_3__.init_user_overlay)();(0,_comments_js__WEBPACK_IMPORTED_MODULE_0__.init_comments)();(0,_reactions_js__WEBPACK_IMPORTED_MODULE_1__.init_reactions)();(0,_flagging_js__WEBPACK_IMPORTED_MODULE_2__.init_flagging)();});})();})();
@@ -1,14 +1,18 @@
 import { init_comments } from "./comments.js";
 import { init_reactions } from "./reactions.js";
 import { init_flagging } from "./flagging.js";
+import { init_user_overlay } from "./user_overlay.js";
 
 window.djCommentsInk = {
     init_comments: init_comments,
     init_reactions: init_reactions,
-    init_flagging: init_flagging
+    init_flagging: init_flagging,
+    init_user_overlay: init_user_overlay
 };
 
 window.addEventListener("DOMContentLoaded", (_) => {
+    // Before the handlers attach their listeners to the list elements.
+    init_user_overlay();
     init_comments();
     init_reactions();
     init_flagging();
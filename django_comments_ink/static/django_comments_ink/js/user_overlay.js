@@ -0,0 +1,22 @@
+/*
+ * The list of comments is cached and shared by all authenticated users.
+ * The votes and flags of the current user come in a JSON script element,
+ * with the HTML of the elements that have to be replaced in the list.
+ */
+function init_user_overlay() {
+    const overlay_el = document.getElementById("dci-user-overlay");
+    if (overlay_el === null || window.djCommentsInk === null) {
+        return;
+    }
+
+    const overlay = JSON.parse(overlay_el.textContent);
+    window.djCommentsInk.user_overlay = overlay;
+    for (const [element_id, html] of Object.entries(overlay.html)) {
+        const element = document.getElementById(element_id);
+        if (element) {
+            element.innerHTML = html;
+        }
+    }
+}
+
+export { init_user_overlay };
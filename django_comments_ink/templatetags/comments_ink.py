@@ -19,7 +19,6 @@ from django.template import (
 )
 from django.urls import reverse
 from django.urls.exceptions import NoReverseMatch
-from django.utils.module_loading import import_string
 from django.utils.safestring import mark_safe
 from django.utils.translation import gettext as _
 from django_comments.templatetags.comments import (
@@ -36,10 +35,13 @@ from django_comments_ink import (
 from django_comments_ink.api import frontend
 from django_comments_ink.conf import settings
 from django_comments_ink.models import (
+    get_comment_counts,
     get_object_reactions,
+    get_objects_reactions as get_objects_reactions_summaries,
     max_thread_level_for_content_type,
 )
 from django_comments_ink.paginator import CommentsPaginator
+from django_comments_ink.snapshot import CommentsSnapshot
 from django_comments_ink.views.templates import (
     f_templates,
     theme_dir,
@@ -146,6 +148,7 @@ class BaseInkCommentNode(BaseCommentNode):
             "ctype_pk": ctype.pk,
             "object_pk": object_pk,
             "site_id": site_id,
+            "gen": caching.get_generation(ctype.pk, object_pk, site_id),
         }
         comment_qs_ptn = settings.COMMENTS_INK_CACHE_KEYS["comment_qs"]
         comment_count_ptn = settings.COMMENTS_INK_CACHE_KEYS["comment_count"]
@@ -154,18 +157,19 @@ class BaseInkCommentNode(BaseCommentNode):
         self.ckey_comment_count = comment_count_ptn.format(**kwargs)
         self.ckey_comments_paged = comments_paged_ptn.format(**kwargs)
 
-        # Check whether there is already a qs in the dci cache.
+        # Check whether there is already a snapshot in the dci cache.
         qs = None
         dci_cache = caching.get_cache()
         if dci_cache != None and self.ckey_comment_qs != "":
             cached = dci_cache.get(self.ckey_comment_qs)
-            if cached:
+            if cached != None:
                 logger.debug("Get %s from the cache", self.ckey_comment_qs)
                 qs = cached
 
-        if not qs:
+        if qs == None:
             mtl = utils.get_max_thread_level(ctype)
             qs = super().get_queryset(context).filter(level__lte=mtl)
+            qs = CommentsSnapshot.from_queryset(qs)
 
             if dci_cache != None and self.ckey_comment_qs != "":
                 logger.debug("Adding %s to the cache", self.ckey_comment_qs)
@@ -278,15 +282,18 @@ class InkCommentCountNode(BaseInkCommentNode):
         result = None
         dci_cache = caching.get_cache()
         key = settings.COMMENTS_INK_CACHE_KEYS["comment_count"].format(
-            ctype_pk=ctype.pk, object_pk=object_pk, site_id=site_id
+            ctype_pk=ctype.pk,
+            object_pk=object_pk,
+            site_id=site_id,
+            gen=caching.get_generation(ctype.pk, object_pk, site_id),
         )
         if dci_cache != None and key != "":
             cached = dci_cache.get(key)
-            if cached:
+            if cached != None:
                 logger.debug("Fetching %s from the cache", key)
                 result = cached
 
-        if not result:
+        if result == None:
             qs = self.get_queryset(context)
             result = self.get_context_value_from_queryset(context, qs)
             if dci_cache != None and key != "":
@@ -319,6 +326,55 @@ def get_inkcomment_count(parser, token):
     return InkCommentCountNode.handle_token(parser, token)
 
 
+class InkCommentCountsNode(Node):
+    """Insert the comment counts of a list of objects into the context."""
+
+    def __init__(self, objects_expr, as_varname):
+        self.objects_expr = objects_expr
+        self.as_varname = as_varname
+
+    def render(self, context):
+        objects = [obj for obj in self.objects_expr.resolve(context) or []]
+        site_id = utils.get_current_site_id(context.get("request", None))
+        targets = [
+            (ContentType.objects.get_for_model(obj), obj.pk) for obj in objects
+        ]
+        counts = get_comment_counts(targets, site_id)
+        context[self.as_varname] = [
+            (obj, counts[(ctype.pk, str(object_pk))])
+            for obj, (ctype, object_pk) in zip(objects, targets)
+        ]
+        return ""
+
+
+@register.tag
+def get_inkcomment_counts(parser, token):
+    """
+    Gets the comment count of each object in the given list, and populates
+    the template context with a variable, whose name is defined by the 'as'
+    clause, containing a list of (object, count) pairs. Counts are computed
+    at once for all the objects, and cached as with
+    {% get_inkcomment_count %}.
+
+    Syntax::
+
+        {% get_inkcomment_counts for [objects] as [varname] %}
+
+    Example usage::
+
+        {% get_inkcomment_counts for object_list as comment_counts %}
+        {% for event, count in comment_counts %}...{% endfor %}
+
+    """
+    tokens = token.split_contents()
+    if len(tokens) != 5 or tokens[1] != "for" or tokens[3] != "as":
+        raise TemplateSyntaxError(
+            "%r tag requires the syntax "
+            "'for [objects] as [varname]'" % tokens[0]
+        )
+    return InkCommentCountsNode(parser.compile_filter(tokens[2]), tokens[4])
+
+
 # ---------------------------------------------------------------------
 class RenderInkCommentFormNode(RenderCommentFormNode):
     """
@@ -835,15 +891,26 @@ class GetUserVoteNode(Node):
         comment = self.comment.resolve(context)
         request = context.get("request", None)
 
+        # The user's vote is not part of lists shared by all users.
+        if context.get("user_overlay", False):
+            context[self.varname] = ""
+            return ""
+
         if not request.user.is_authenticated:
             context[self.varname] = ""
             return ""
 
-        qs = comment.votes.filter(author=request.user)
-        if qs.count() == 0:
+        # Attached to the comment by prefetch_comment_feedback.
+        user_vote = getattr(comment, "_user_vote", None)
+        if user_vote != None and user_vote[0] == request.user.pk:
+            context[self.varname] = user_vote[1]
+            return ""
+
+        votes = list(comment.votes.filter(author=request.user)[:2])
+        if len(votes) == 0:
             context[self.varname] = ""
-        elif qs.count() == 1:
-            context[self.varname] = qs[0].vote
+        elif len(votes) == 1:
+            context[self.varname] = votes[0].vote
         else:
             logger.error(
                 "More than one CommentVote for comment ID %d and user %s."
@@ -985,7 +1052,7 @@ class BaseObjectReactionsNode(Node):
 
         self.object = self.ctype.get_object_for_this_type(pk=self.object_pk)
         check_input_allowed_str = options.pop("check_input_allowed")
-        check_func = import_string(check_input_allowed_str)
+        check_func = utils.get_check_input_allowed(check_input_allowed_str)
         self.is_input_allowed = check_func(self.object)
 
     @property
@@ -1088,6 +1155,65 @@ def render_object_reactions_form(parser, token):
     return RenderObjectReactionsForm.handle_token(parser, token)
 
 
+class GetObjectsReactionsNode(Node):
+    """Insert the reactions to a list of objects into the context."""
+
+    def __init__(self, objects_expr, as_varname):
+        self.objects_expr = objects_expr
+        self.as_varname = as_varname
+
+    def render(self, context):
+        objects = [obj for obj in self.objects_expr.resolve(context) or []]
+        site_id = utils.get_current_site_id(context.get("request", None))
+        ctypes = [ContentType.objects.get_for_model(obj) for obj in objects]
+        object_pks = {}  # Lists of object_pks by content type.
+        for ctype, obj in zip(ctypes, objects):
+            object_pks.setdefault(ctype, []).append(obj.pk)
+
+        reactions = {}  # Object reactions by content type and object_pk.
+        for ctype, pks in object_pks.items():
+            options = utils.get_app_model_options(content_type=ctype)
+            if options["object_reactions_enabled"]:
+                reactions[ctype] = get_objects_reactions_summaries(
+                    ctype, pks, site_id
+                )
+            else:
+                reactions[ctype] = {}
+        context[self.as_varname] = [
+            (obj, reactions[ctype].get(str(obj.pk), []))
+            for ctype, obj in zip(ctypes, objects)
+        ]
+        return ""
+
+
+@register.tag
+def get_objects_reactions(parser, token):
+    """
+    Gets the reactions to each object in the given list, and populates the
+    template context with a variable, whose name is defined by the 'as'
+    clause, containing a list of (object, object_reactions) pairs. The
+    reactions of all the objects are fetched at once. Objects whose model
+    does not have object reactions enabled get an empty list.
+
+    Syntax::
+
+        {% get_objects_reactions for [objects] as [varname] %}
+
+    Example usage::
+
+        {% get_objects_reactions for object_list as reactions_list %}
+        {% for post, object_reactions in reactions_list %}...{% endfor %}
+
+    """
+    tokens = token.split_contents()
+    if len(tokens) != 5 or tokens[1] != "for" or tokens[3] != "as":
+        raise TemplateSyntaxError(
+            "%r tag requires the syntax "
+            "'for [objects] as [varname]'" % tokens[0]
+        )
+    return GetObjectsReactionsNode(parser.compile_filter(tokens[2]), tokens[4])
+
+
 @register.simple_tag
 def object_reactions_form_target(object):
     """
@@ -7,16 +7,23 @@ import pytest
 from django.contrib.auth.models import User
 from django.contrib.contenttypes.models import ContentType
 from django.contrib.sites.models import Site
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connection
 from django.db.models.signals import pre_save
 from django.test import TestCase as DjangoTestCase
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from django_comments.models import CommentFlag
 from rest_framework import status
 from rest_framework.exceptions import PermissionDenied
-from django_comments_ink import get_model
+from django_comments_ink import caching, get_comment_reactions_enum, get_model
 from django_comments_ink.api import views
 from django_comments_ink.conf import settings
 from django_comments_ink.models import (
+    CommentReaction,
     InkComment,
+    get_object_reactions_generation_key,
     publish_or_withhold_on_pre_save,
 )
 from django_comments_ink.tests.models import Article, MyComment
@@ -196,9 +203,7 @@ class CommentCountTestCase(APITestCase):
         self.assertEqual(resp.status_code, 200)
         self.assertEqual(resp.rendered_content, b'{"count":2}')
 
-    @patch.multiple(
-        "django_comments_ink.conf.settings", COMMENTS_INK_MODEL=_ink_model
-    )
+    @override_settings(COMMENTS_INK_MODEL=_ink_model)
     def test_get_count_for_custom_comment_model_shall_be_2(self):
         thread_test_step_1(
             self.article, model=MyComment, title="Can't be empty 1"
@@ -229,8 +234,8 @@ class CommentCountTestCase(APITestCase):
         # Previous two lines create the following comments:
         #  content ->    cmt.id  thread_id  parent_id  level  order
         #   cm1,   ->     1         1          1        0      1
-        #   cm3,   ->     3         1          1        1      2
-        #   cm4,   ->     4         1          1        1      3
+        #   cm3,   ->     3         1          1        1   1025
+        #   cm4,   ->     4         1          1        1   2049
         #   cm2,   ->     2         2          2        0      1
         cm1 = InkComment.objects.get(pk=1)
         cm1.is_removed = True
@@ -252,8 +257,8 @@ class CommentCountTestCase(APITestCase):
         # These two lines create the following comments:
         # (  # content ->    cmt.id  thread_id  parent_id  level  order
         #     cm1,   # ->     1         1          1        0      1
-        #     cm3,   # ->     3         1          1        1      2
-        #     cm4,   # ->     4         1          1        1      3
+        #     cm3,   # ->     3         1          1        1   1025
+        #     cm4,   # ->     4         1          1        1   2049
         #     cm2,   # ->     2         2          2        0      1
         # ) = InkComment.objects.all()
         #
@@ -289,8 +294,8 @@ class CommentCountTestCase(APITestCase):
         #
         # (  # content ->    cmt.id  thread_id  parent_id  level  order
         #     cm1,   # ->     1         1          1        0      1
-        #     cm3,   # ->     3         1          1        1      2
-        #     cm4,   # ->     4         1          1        1      3
+        #     cm3,   # ->     3         1          1        1   1025
+        #     cm4,   # ->     4         1          1        1   2049
         #     cm2,   # ->     2         2          2        0      1
         # ) = InkComment.objects.all()
 
@@ -327,10 +332,10 @@ class CommentListTestCase(APITestCase):
         thread_test_step_3(self.article)  # Sends 1 comment.
         # -> content:   cmt.id  thread_id  parent_id  level  order
         # cm1,   # ->      1         1          1        0      1
-        # cm3,   # ->      3         1          1        1      2
-        # cm4,   # ->      4         1          1        1      3
+        # cm3,   # ->      3         1          1        1   1025
+        # cm4,   # ->      4         1          1        1   2049
         # cm2,   # ->      2         2          2        0      1
-        # cm5    # ->      5         2          2        1      2
+        # cm5    # ->      5         2          2        1   1025
         resp = self._send_request()
         self.assertEqual(resp.status_code, 200)
         data = json.loads(resp.rendered_content)
@@ -372,8 +377,8 @@ class CommentListTestCase(APITestCase):
         # Previous two lines create the following comments:
         #  content ->    cmt.id  thread_id  parent_id  level  order
         #   cm1,   ->     1         1          1        0      1
-        #   cm3,   ->     3         1          1        1      2
-        #   cm4,   ->     4         1          1        1      3
+        #   cm3,   ->     3         1          1        1   1025
+        #   cm4,   ->     4         1          1        1   2049
         #   cm2,   ->     2         2          2        0      1
         cm1 = InkComment.objects.get(pk=1)
         cm1.is_removed = True
@@ -397,8 +402,8 @@ class CommentListTestCase(APITestCase):
         # These two lines create the following comments:
         # (  # content ->    cmt.id  thread_id  parent_id  level  order
         #     cm1,   # ->     1         1          1        0      1
-        #     cm3,   # ->     3         1          1        1      2
-        #     cm4,   # ->     4         1          1        1      3
+        #     cm3,   # ->     3         1          1        1   1025
+        #     cm4,   # ->     4         1          1        1   2049
         #     cm2,   # ->     2         2          2        0      1
         # ) = InkComment.objects.all()
         #
@@ -435,8 +440,8 @@ class CommentListTestCase(APITestCase):
         # These two lines create the following comments:
         # (  # content ->    cmt.id  thread_id  parent_id  level  order
         #     cm1,   # ->     1         1          1        0      1
-        #     cm3,   # ->     3         1          1        1      2
-        #     cm4,   # ->     4         1          1        1      3
+        #     cm3,   # ->     3         1          1        1   1025
+        #     cm4,   # ->     4         1          1        1   2049
         #     cm2,   # ->     2         2          2        0      1
         # ) = InkComment.objects.all()
         cm1 = InkComment.objects.get(pk=1)
@@ -561,6 +566,35 @@ def test_PostObjectReaction_twice_removes_the_reaction(a_diary_entry, an_user):
     assert response.status_code == 200
 
 
+@pytest.mark.django_db
+def test_PostObjectReaction_increments_generation_again_on_commit(
+    a_diary_entry, an_user, django_capture_on_commit_callbacks
+):
+    ctype = ContentType.objects.get_for_model(a_diary_entry)
+    site_id = get_current_site_id()
+    data = {
+        "reaction": "+",
+        "content_type": ctype.pk,
+        "object_pk": a_diary_entry.pk,
+        "site": site_id,
+    }
+    key = get_object_reactions_generation_key(
+        ctype.pk, a_diary_entry.pk, site_id
+    )
+    request = factory.post(reverse("comments-ink-api-react-to-object"), data)
+    force_authenticate(request, user=an_user)
+    views.PostObjectReaction.as_view()(request)
+
+    # Remove the reaction.
+    generation = caching.get_generation_from_key(key)
+    with django_capture_on_commit_callbacks(execute=True) as callbacks:
+        response = views.PostObjectReaction.as_view()(request)
+        assert caching.get_generation_from_key(key) == generation + 1
+    assert response.status_code == 200
+    assert len(callbacks) == 1
+    assert caching.get_generation_from_key(key) == generation + 2
+
+
 @pytest.mark.django_db
 def test_PostObjectReaction_twice_does_not_remove_the_reaction(
     a_diary_entry, an_user, an_user_2
@@ -629,3 +663,366 @@ def test_CommentReactionAuthorList(
         {"id": 1, "author": "joe"},
     ]
     assert data["results"] == results
+
+
+# ---------------------------------------------------------------------
+def send_comments_with_reactions(article, users, num_comments):
+    article_ct = ContentType.objects.get_for_model(article)
+    reaction = get_comment_reactions_enum().LIKE_IT
+    for index in range(num_comments):
+        comment = InkComment.objects.create(
+            content_type=article_ct,
+            object_pk=article.pk,
+            site=Site.objects.get(pk=1),
+            comment="Comment %d to the article." % index,
+            submit_date=datetime.now(),
+        )
+        cmr = CommentReaction.objects.create(
+            reaction=reaction, comment=comment, counter=len(users)
+        )
+        cmr.authors.add(*users)
+        CommentFlag.objects.create(
+            comment=comment,
+            user=users[index % len(users)],
+            flag=CommentFlag.SUGGEST_REMOVAL,
+        )
+
+
+def get_comment_list(article):
+    kwargs = {"content_type": "tests-article", "object_pk": str(article.pk)}
+    request = factory.get(reverse("comments-ink-api-list", kwargs=kwargs))
+    response = views.CommentList.as_view()(request, **kwargs)
+    response.render()
+    return json.loads(response.rendered_content)
+
+
+@pytest.mark.django_db
+def test_CommentList_runs_a_fixed_number_of_queries(monkeypatch, an_article):
+    monkeypatch.setattr(settings, "COMMENTS_INK_MAX_USERS_IN_TOOLTIP", 2)
+    users = [
+        User.objects.create_user("user%d" % index, "user%d@example.com" % index)
+        for index in range(4)
+    ]
+    send_comments_with_reactions(an_article, users, 1)
+    with CaptureQueriesContext(connection) as one_comment:
+        get_comment_list(an_article)
+
+    send_comments_with_reactions(an_article, users, 9)
+    with CaptureQueriesContext(connection) as ten_comments:
+        data = get_comment_list(an_article)
+    assert len(data) == 10
+    assert len(ten_comments) == len(one_comment)
+
+    # Authors in COMMENTS_INK_USERS_REACTED_LIST_ORDER, up to the limit.
+    authors = data[0]["reactions"][0]["authors"]
+    assert [author["id"] for author in authors] == [users[0].id, users[1].id]
+    assert data[0]["reactions"][0]["counter"] == 4
+    assert len(data[0]["flags"]) == 1
+    comment = InkComment.objects.get(pk=data[0]["id"])
+    assert data[0]["permalink"] == comment.get_absolute_url()
+
+
+# ---------------------------------------------------------------------
+def send_threads(article, replies_per_thread):
+    article_ct = ContentType.objects.get_for_model(article)
+    site = Site.objects.get(pk=1)
+    threads = []
+    for num_replies in replies_per_thread:
+        kwargs = {
+            "content_type": article_ct,
+            "object_pk": article.pk,
+            "site": site,
+            "submit_date": datetime.now(),
+        }
+        comment = InkComment.objects.create(comment="Comment", **kwargs)
+        for index in range(num_replies):
+            InkComment.objects.create(
+                comment="Reply %d" % index, parent_id=comment.pk, **kwargs
+            )
+        threads.append(comment.pk)
+    return threads
+
+
+def get_comment_list_page(article, url=None):
+    kwargs = {
+        "content_type": "tests-article",
+        "object_pk": str(article.pk),
+        "override_drf_defaults": True,
+    }
+    if url == None:
+        url = reverse("comments-ink-api-list", kwargs=kwargs)
+    request = factory.get(url)
+    response = views.CommentList.as_view()(request, **kwargs)
+    response.render()
+    return response
+
+
+def thread_sizes(results):
+    sizes = {}
+    for comment in results:
+        thread_id = InkComment.objects.get(pk=comment["id"]).thread_id
+        sizes[thread_id] = sizes.get(thread_id, 0) + 1
+    return list(sizes.values())
+
+
+@pytest.mark.django_db
+def test_CommentList_is_paginated_with_a_cursor(monkeypatch, an_article):
+    monkeypatch.setattr(settings, "COMMENTS_INK_API_COMMENTS_PER_PAGE", 5)
+    send_threads(an_article, [1, 2, 6, 0, 0, 3])
+
+    pages, url = [], None
+    while True:
+        data = json.loads(get_comment_list_page(an_article, url).content)
+        pages.append(thread_sizes(data["results"]))
+        url = data["next"]
+        if url == None:
+            break
+    # Threads are never cut, the one with 7 comments fills a page alone.
+    assert pages == [[2, 3], [7], [1, 1], [4]]
+
+    # Go back to the first page from the last one.
+    pages = []
+    while data["previous"] != None:
+        data = json.loads(
+            get_comment_list_page(an_article, data["previous"]).content
+        )
+        pages.append(thread_sizes(data["results"]))
+    assert pages == [[1, 1], [7], [2, 3]]
+    assert data["next"] != None
+
+
+@pytest.mark.django_db
+def test_CommentList_cursor_pages_take_one_query(monkeypatch, an_article):
+    monkeypatch.setattr(settings, "COMMENTS_INK_API_COMMENTS_PER_PAGE", 4)
+    send_threads(an_article, [1] * 20)
+    data = json.loads(get_comment_list_page(an_article).content)
+    with CaptureQueriesContext(connection) as first_page:
+        get_comment_list_page(an_article)
+    for _ in range(5):
+        data = json.loads(
+            get_comment_list_page(an_article, data["next"]).content
+        )
+    with CaptureQueriesContext(connection) as deep_page:
+        get_comment_list_page(an_article, data["next"])
+    assert len(deep_page) == len(first_page)
+    assert not any("OFFSET" in query["sql"] for query in deep_page)
+
+
+@pytest.mark.django_db
+def test_CommentList_with_an_invalid_cursor(monkeypatch, an_article):
+    monkeypatch.setattr(settings, "COMMENTS_INK_API_COMMENTS_PER_PAGE", 4)
+    send_threads(an_article, [1])
+    kwargs = {"content_type": "tests-article", "object_pk": str(an_article.pk)}
+    url = reverse("comments-ink-api-list", kwargs=kwargs) + "?cursor=a"
+    response = get_comment_list_page(an_article, url)
+    assert response.status_code == 404
+
+
+@pytest.mark.django_db
+def test_CommentList_cursor_requires_thread_and_order(monkeypatch, an_article):
+    monkeypatch.setattr(settings, "COMMENTS_INK_API_COMMENTS_PER_PAGE", 4)
+    monkeypatch.setattr(settings, "COMMENTS_INK_LIST_ORDER", ("-submit_date",))
+    with pytest.raises(ImproperlyConfigured):
+        get_comment_list_page(an_article)
+
+
+# ---------------------------------------------------------------------
+def send_conditional_get(view_class, url_name, kwargs, **headers):
+    request = factory.get(reverse(url_name, kwargs=kwargs), **headers)
+    response = view_class.as_view()(request, **kwargs)
+    if hasattr(response, "render"):
+        response.render()
+    return response
+
+
+@pytest.mark.django_db
+def test_CommentList_answers_304_when_not_modified(an_articles_comment):
+    kwargs = {"content_type": "tests-article", "object_pk": "1"}
+    url_name = "comments-ink-api-list"
+    response = send_conditional_get(views.CommentList, url_name, kwargs)
+    assert response.status_code == 200
+    etag = response["ETag"]
+
+    with CaptureQueriesContext(connection) as queries:
+        response = send_conditional_get(
+            views.CommentList, url_name, kwargs, HTTP_IF_NONE_MATCH=etag
+        )
+    assert response.status_code == 304
+    assert response["ETag"] == etag
+    assert len(queries) == 0
+
+    # A reply to the comment changes the ETag.
+    InkComment.objects.create(
+        content_type=an_articles_comment.content_type,
+        object_pk=an_articles_comment.object_pk,
+        site=an_articles_comment.site,
+        comment="A reply.",
+        parent_id=an_articles_comment.pk,
+    )
+    response = send_conditional_get(
+        views.CommentList, url_name, kwargs, HTTP_IF_NONE_MATCH=etag
+    )
+    assert response.status_code == 200
+    assert response["ETag"] != etag
+    assert len(json.loads(response.rendered_content)) == 2
+
+
+@pytest.mark.django_db
+def test_CommentList_changes_ETag_when_a_comment_is_flagged(
+    an_articles_comment, an_user
+):
+    kwargs = {"content_type": "tests-article", "object_pk": "1"}
+    url_name = "comments-ink-api-list"
+    response = send_conditional_get(views.CommentList, url_name, kwargs)
+    etag = response["ETag"]
+    CommentFlag.objects.create(
+        comment=an_articles_comment,
+        user=an_user,
+        flag=CommentFlag.SUGGEST_REMOVAL,
+    )
+    response = send_conditional_get(
+        views.CommentList, url_name, kwargs, HTTP_IF_NONE_MATCH=etag
+    )
+    assert response.status_code == 200
+    assert json.loads(response.rendered_content)[0]["flags"] != []
+
+
+@pytest.mark.django_db
+def test_CommentCount_answers_304_when_not_modified(an_articles_comment):
+    kwargs = {"content_type": "tests-article", "object_pk": "1"}
+    url_name = "comments-ink-api-count"
+    response = send_conditional_get(views.CommentCount, url_name, kwargs)
+    assert response.status_code == 200
+    last_modified = response["Last-Modified"]
+
+    with CaptureQueriesContext(connection) as queries:
+        response = send_conditional_get(
+            views.CommentCount,
+            url_name,
+            kwargs,
+            HTTP_IF_MODIFIED_SINCE=last_modified,
+        )
+    assert response.status_code == 304
+    assert len(queries) == 0
+
+
+@pytest.mark.django_db
+def test_ObjectReactionAuthorList_answers_304_when_not_modified(
+    a_diary_entry, an_user
+):
+    ctype = ContentType.objects.get_for_model(a_diary_entry)
+    kwargs = {
+        "content_type": "tests-diary",
+        "object_pk": str(a_diary_entry.pk),
+        "reaction_value": "+",
+    }
+    url_name = "comments-ink-api-object-reaction-authors"
+    response = send_conditional_get(
+        views.ObjectReactionAuthorList, url_name, kwargs
+    )
+    etag = response["ETag"]
+    response = send_conditional_get(
+        views.ObjectReactionAuthorList,
+        url_name,
+        kwargs,
+        HTTP_IF_NONE_MATCH=etag,
+    )
+    assert response.status_code == 304
+
+    # Reacting to the object changes the ETag.
+    data = {
+        "reaction": "+",
+        "content_type": ctype.pk,
+        "object_pk": a_diary_entry.pk,
+        "site": get_current_site_id(),
+    }
+    request = factory.post(reverse("comments-ink-api-react-to-object"), data)
+    force_authenticate(request, user=an_user)
+    assert views.PostObjectReaction.as_view()(request).status_code == 201
+    response = send_conditional_get(
+        views.ObjectReactionAuthorList,
+        url_name,
+        kwargs,
+        HTTP_IF_NONE_MATCH=etag,
+    )
+    assert response.status_code == 200
+    assert json.loads(response.rendered_content)["count"] == 1
+
+
+# ---------------------------------------------------------------------
+def get_comment_counts(objects):
+    url = reverse("comments-ink-api-count-list") + "?objects=" + objects
+    response = views.CommentCountList.as_view()(factory.get(url))
+    response.render()
+    return response
+
+
+@pytest.mark.django_db
+def test_CommentCountList(an_articles_comment, a_diary_entry):
+    objects = "tests-article:%s,tests-article:0,tests-diary:%s" % (
+        an_articles_comment.object_pk,
+        a_diary_entry.pk,
+    )
+    with CaptureQueriesContext(connection) as queries:
+        response = get_comment_counts(objects)
+    assert response.status_code == 200
+    assert json.loads(response.rendered_content) == {
+        "counts": {
+            "tests-article:%s" % an_articles_comment.object_pk: 1,
+            "tests-article:0": 0,
+            "tests-diary:%s" % a_diary_entry.pk: 0,
+        }
+    }
+    # One query per content type.
+    assert len(queries) == 2
+
+    # Zeros are cached too.
+    with CaptureQueriesContext(connection) as queries:
+        response = get_comment_counts(objects)
+    assert len(queries) == 0
+
+
+@pytest.mark.django_db
+def test_CommentCountList_rejects_invalid_objects(monkeypatch):
+    assert get_comment_counts("tests-article").status_code == 400
+    assert get_comment_counts("this-that:1").status_code == 400
+    monkeypatch.setattr(views.CommentCountList, "max_objects", 2)
+    objects = "tests-article:1,tests-article:2,tests-article:3"
+    assert get_comment_counts(objects).status_code == 400
+
+
+# ---------------------------------------------------------------------
+def get_object_reactions_list(content_type, object_pks):
+    kwargs = {"content_type": content_type}
+    url = reverse("comments-ink-api-object-reactions", kwargs=kwargs)
+    request = factory.get(url + "?object_pks=" + object_pks)
+    response = views.ObjectReactionList.as_view()(request, **kwargs)
+    response.render()
+    return response
+
+
+@pytest.mark.django_db
+def test_ObjectReactionList(an_object_reaction_2):
+    object_pk = str(an_object_reaction_2.object_pk)
+    with CaptureQueriesContext(connection) as queries:
+        response = get_object_reactions_list("tests-diary", "%s,0" % object_pk)
+    assert response.status_code == 200
+    reactions = json.loads(response.rendered_content)["reactions"]
+    assert list(reactions) == [object_pk, "0"]
+    assert reactions[object_pk][0]["counter"] == 2
+    assert reactions[object_pk][0]["authors"] == ["alice", "joe"]
+    assert [item["counter"] for item in reactions["0"]] == [0, 0]
+    assert len(queries) == 2
+
+    with CaptureQueriesContext(connection) as queries:
+        get_object_reactions_list("tests-diary", "%s,0" % object_pk)
+    assert len(queries) == 0
+
+
+@pytest.mark.django_db
+def test_ObjectReactionList_rejects_invalid_requests(monkeypatch):
+    assert get_object_reactions_list("this-that", "1").status_code == 400
+    # Object reactions are not enabled for articles.
+    assert get_object_reactions_list("tests-article", "1").status_code == 403
+    monkeypatch.setattr(views.ObjectReactionList, "max_objects", 2)
+    assert get_object_reactions_list("tests-diary", "1,2,3").status_code == 400
@@ -0,0 +1,121 @@
+import pytest
+from django.core.cache.backends.filebased import FileBasedCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from django_comments_ink import blacklist, caching
+from django_comments_ink.models import BlackListedDomain
+
+
+@pytest.fixture
+def shared_cache(monkeypatch, tmp_path):
+    # A cache that, unlike LocMemCache, is shared among processes.
+    monkeypatch.setattr(caching, "dci_cache", FileBasedCache(str(tmp_path), {}))
+
+
+@pytest.fixture
+def blacklisted(db):
+    blacklist.invalidate()
+    BlackListedDomain.objects.bulk_create(
+        [
+            BlackListedDomain(domain="spam.tld"),
+            BlackListedDomain(domain="junk.example.com"),
+        ]
+    )
+    blacklist.invalidate()
+
+
+def test_domain_matcher_matches_subdomains():
+    matcher = blacklist.DomainMatcher(["spam.tld", "junk.example.com", ""])
+    assert len(matcher) == 2
+    assert matcher.match("spam.tld")
+    assert matcher.match("mail.spam.tld")
+    assert matcher.match("a.b.SPAM.tld.")
+    assert "x.junk.example.com" in matcher
+    assert not matcher.match("example.com")
+    assert not matcher.match("notspam.tld")
+    assert not matcher.match("spam.tld.org")
+    assert not matcher.match("tld")
+
+
+def test_get_suffixes():
+    assert blacklist.get_suffixes("Mail.Spam.tld") == [
+        "mail.spam.tld",
+        "spam.tld",
+        "tld",
+    ]
+
+
+def test_is_blacklisted_does_not_query_the_db(shared_cache, blacklisted):
+    assert blacklist.is_blacklisted("mail.spam.tld")
+    with CaptureQueriesContext(connection) as ctx:
+        assert blacklist.is_blacklisted("junk.example.com")
+        assert blacklist.is_blacklisted("www.junk.example.com")
+        assert not blacklist.is_blacklisted("example.com")
+    assert len(ctx.captured_queries) == 0
+
+
+def test_blacklist_is_reloaded_after_changes(shared_cache, blacklisted):
+    assert not blacklist.is_blacklisted("mail.example.org")
+    domain = BlackListedDomain.objects.create(domain="example.org")
+    assert blacklist.is_blacklisted("mail.example.org")
+    domain.delete()
+    assert not blacklist.is_blacklisted("mail.example.org")
+
+
+def test_bulk_changes_do_not_reload_the_blacklist(shared_cache, blacklisted):
+    assert blacklist.is_blacklisted("mail.spam.tld")
+    with blacklist.bulk_changes():
+        BlackListedDomain.objects.filter(domain="spam.tld").delete()
+        BlackListedDomain.objects.create(domain="example.org")
+    assert blacklist.is_blacklisted("mail.spam.tld")
+    assert not blacklist.is_blacklisted("mail.example.org")
+    blacklist.invalidate()
+    assert not blacklist.is_blacklisted("mail.spam.tld")
+    assert blacklist.is_blacklisted("mail.example.org")
+
+
+def test_is_blacklisted_queries_the_db_without_cache(monkeypatch, blacklisted):
+    monkeypatch.setattr(caching, "dci_cache", None)
+    monkeypatch.setattr(caching, "caches", {"dci": None})
+    assert blacklist.get_matcher() == None
+    with CaptureQueriesContext(connection) as ctx:
+        assert blacklist.is_blacklisted("mail.spam.tld")
+        assert not blacklist.is_blacklisted("example.com")
+    assert len(ctx.captured_queries) == 2
+
+
+def test_is_blacklisted_queries_the_db_with_a_local_cache(
+    monkeypatch, blacklisted
+):
+    monkeypatch.setattr(caching, "dci_cache", LocMemCache("dci", {}))
+    assert blacklist.get_matcher() == None
+    with CaptureQueriesContext(connection) as ctx:
+        assert blacklist.is_blacklisted("www.junk.example.com")
+    assert len(ctx.captured_queries) == 1
+
+
+def test_blacklisted_domains_are_saved_normalized(monkeypatch, db):
+    monkeypatch.setattr(caching, "dci_cache", None)
+    monkeypatch.setattr(caching, "caches", {"dci": None})
+    domain = BlackListedDomain.objects.create(domain=" Junk.Example.COM. ")
+    assert domain.domain == "junk.example.com"
+    with CaptureQueriesContext(connection) as ctx:
+        assert blacklist.is_blacklisted("junk.example.com")
+        assert blacklist.is_blacklisted("Mail.JUNK.example.com.")
+        assert not blacklist.is_blacklisted("example.com")
+    # The lookup compares the stored values as they are, using the index.
+    assert "LOWER" not in ctx.captured_queries[0]["sql"].upper()
+
+
+def test_load_reads_from_the_database_of_the_router(monkeypatch, blacklisted):
+    models = []
+
+    def db_for_read(model, **hints):
+        models.append(model)
+        return "default"
+
+    monkeypatch.setattr(blacklist.router, "db_for_read", db_for_read)
+    assert len(blacklist.load()) == 2
+    assert models == [BlackListedDomain]
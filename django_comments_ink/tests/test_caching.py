@@ -1,5 +1,7 @@
+import pytest
 from django.core.cache.backends.base import BaseCache
 from django_comments_ink import caching
+from django_comments_ink.conf import settings
 
 
 def test_get_cache_returns_a_cache(monkeypatch):
@@ -27,6 +29,241 @@ def test_clear_comment_cache_returns_False(monkeypatch):
     assert caching.clear_comment_cache(1, 2, 3) == False
 
 
+@pytest.mark.django_db
 def test_clear_comment_cache_returns_True(monkeypatch):
     monkeypatch.setattr(caching, "dci_cache", None)
     assert caching.clear_comment_cache(1, 2, 3) == True
+
+
+def test_get_generation_returns_0_when_cache_is_none(monkeypatch):
+    my_cache = {"dci": None}
+    monkeypatch.setattr(caching, "dci_cache", None)
+    monkeypatch.setattr(caching, "caches", my_cache)
+    assert caching.get_generation(1, 2, 3) == 0
+
+
+@pytest.mark.django_db
+def test_get_generation_is_stable_until_cache_is_cleared(monkeypatch):
+    monkeypatch.setattr(caching, "dci_cache", None)
+    caching.get_cache().clear()
+    generation = caching.get_generation(1, 2, 3)
+    assert generation > 0
+    assert caching.get_generation(1, 2, 3) == generation
+    # Other objects have their own generation.
+    caching.clear_comment_cache(1, 4, 3)
+    assert caching.get_generation(1, 2, 3) == generation
+    caching.clear_comment_cache(1, 2, 3)
+    assert caching.get_generation(1, 2, 3) == generation + 1
+
+
+class CountingCache:
+    def __init__(self, cache):
+        self.cache = cache
+        self.calls = []
+
+    def __getattr__(self, name):
+        self.calls.append(name)
+        return getattr(self.cache, name)
+
+
+def test_get_generations_creates_the_missing_ones_at_once(monkeypatch):
+    monkeypatch.setattr(caching, "dci_cache", None)
+    caching.get_cache().clear()
+    generation = caching.get_generation(1, "2", 3)
+    counting_cache = CountingCache(caching.get_cache())
+    monkeypatch.setattr(caching, "dci_cache", counting_cache)
+    pks = ["2"] + [str(pk) for pk in range(10, 20)]
+    generations = caching.get_generations(1, pks, 3)
+    assert counting_cache.calls == ["get_many", "set_many", "get_many"]
+    assert generations["2"] == generation
+    assert all(generations[pk] > 0 for pk in pks)
+
+    # Once created, they are read with one call, and don't change.
+    counting_cache.calls = []
+    assert caching.get_generations(1, pks, 3) == generations
+    assert counting_cache.calls == ["get_many"]
+    assert caching.get_generation(1, "15", 3) == generations["15"]
+
+
+@pytest.mark.django_db
+def test_clear_comment_cache_makes_keys_unreachable(monkeypatch):
+    monkeypatch.setattr(caching, "dci_cache", None)
+    dci_cache = caching.get_cache()
+    dci_cache.clear()
+    key_ptn = settings.COMMENTS_INK_CACHE_KEYS["comment_list_anon"]
+    key = key_ptn.format(path="/x/", gen=caching.get_generation(1, 2, 3))
+    dci_cache.set(key, "html", timeout=None)
+
+    assert caching.clear_comment_cache(1, 2, 3) == True
+    new_key = key_ptn.format(path="/x/", gen=caching.get_generation(1, 2, 3))
+    assert new_key != key
+    assert dci_cache.get(new_key) == None
+
+
+@pytest.mark.django_db
+def test_clear_comment_cache_without_generation_key(monkeypatch):
+    monkeypatch.setattr(caching, "dci_cache", None)
+    dci_cache = caching.get_cache()
+    dci_cache.clear()
+    assert caching.clear_comment_cache(1, 2, 3) == True
+    key = caching.get_generation_key(1, 2, 3)
+    assert dci_cache.get(key) > 0
+
+
+@pytest.mark.django_db
+def test_clear_comment_cache_increments_generation_again_on_commit(
+    monkeypatch, django_capture_on_commit_callbacks
+):
+    monkeypatch.setattr(caching, "dci_cache", None)
+    caching.get_cache().clear()
+    generation = caching.get_generation(1, 2, 3)
+    with django_capture_on_commit_callbacks(execute=True) as callbacks:
+        caching.clear_comment_cache(1, 2, 3)
+        assert caching.get_generation(1, 2, 3) == generation + 1
+    assert len(callbacks) == 1
+    assert caching.get_generation(1, 2, 3) == generation + 2
+
+
+def test_incr_generation_returns_the_new_generation(monkeypatch):
+    monkeypatch.setattr(caching, "dci_cache", None)
+    caching.get_cache().clear()
+    generation = caching.incr_generation(1, 2, 3)
+    assert generation == caching.get_generation(1, 2, 3)
+    assert caching.incr_generation(1, 2, 3) == generation + 1
+
+
+def test_incr_generation_returns_None_without_cache(monkeypatch):
+    my_cache = {"dci": None}
+    monkeypatch.setattr(caching, "dci_cache", None)
+    monkeypatch.setattr(caching, "caches", my_cache)
+    assert caching.incr_generation(1, 2, 3) == None
+
+
+def rebuild_counter(value):
+    calls = []
+
+    def rebuild():
+        calls.append(1)
+        return value
+
+    return rebuild, calls
+
+
+def test_get_or_rebuild_caches_the_value(monkeypatch):
+    monkeypatch.setattr(caching, "dci_cache", None)
+    dci_cache = caching.get_cache()
+    dci_cache.clear()
+    rebuild, calls = rebuild_counter("<p>1</p>")
+    args = ("comment_list_anon", "/list|anon|1", "/list|anon|stale", 1)
+    assert caching.get_or_rebuild(*args, rebuild) == "<p>1</p>"
+    assert caching.get_or_rebuild(*args, rebuild) == "<p>1</p>"
+    assert len(calls) == 1
+    assert dci_cache.get("/list|anon|1|lock") == None
+    assert dci_cache.get("/list|anon|stale") == (1, "<p>1</p>", None)
+
+
+def test_get_or_rebuild_returns_stale_value_while_locked(monkeypatch):
+    monkeypatch.setattr(caching, "dci_cache", None)
+    dci_cache = caching.get_cache()
+    dci_cache.clear()
+    rebuild, calls = rebuild_counter("<p>1</p>")
+    caching.get_or_rebuild(
+        "comment_list_anon", "/list|anon|1", "/list|anon|stale", 1, rebuild
+    )
+
+    # Another request is rebuilding the generation 2.
+    dci_cache.add("/list|anon|2|lock", 1)
+    rebuild, calls = rebuild_counter("<p>2</p>")
+    args = ("comment_list_anon", "/list|anon|2", "/list|anon|stale", 2)
+    assert caching.get_or_rebuild(*args, rebuild) == "<p>1</p>"
+    assert len(calls) == 0
+    stale_gen, _, outdated_since = dci_cache.get("/list|anon|stale")
+    assert stale_gen == 1 and outdated_since != None
+
+    # Once the grace period is over, the value is rebuilt.
+    monkeypatch.setattr(caching.time, "time", lambda: outdated_since + 61)
+    assert caching.get_or_rebuild(*args, rebuild) == "<p>2</p>"
+    assert len(calls) == 1
+
+
+def test_get_or_rebuild_waits_for_the_lock_holder(monkeypatch):
+    monkeypatch.setattr(caching, "dci_cache", None)
+    dci_cache = caching.get_cache()
+    dci_cache.clear()
+    dci_cache.add("/list|anon|1|lock", 1)
+    sleeps = []
+
+    def sleep(seconds):
+        # The request holding the lock stores the value meanwhile.
+        sleeps.append(seconds)
+        if len(sleeps) == 2:
+            dci_cache.set("/list|anon|1", "<p>1</p>")
+            dci_cache.delete("/list|anon|1|lock")
+
+    monkeypatch.setattr(caching.time, "sleep", sleep)
+    rebuild, calls = rebuild_counter("<p>rebuilt</p>")
+    args = ("comment_list_anon", "/list|anon|1", "/list|anon|stale", 1)
+    assert caching.get_or_rebuild(*args, rebuild) == "<p>1</p>"
+    assert len(sleeps) == 2
+    assert len(calls) == 0
+
+
+def test_get_or_rebuild_after_the_lock_holder_failed(monkeypatch):
+    monkeypatch.setattr(caching, "dci_cache", None)
+    dci_cache = caching.get_cache()
+    dci_cache.clear()
+    dci_cache.add("/list|anon|1|lock", 1)
+    monkeypatch.setattr(
+        caching.time, "sleep", lambda s: dci_cache.delete("/list|anon|1|lock")
+    )
+    rebuild, calls = rebuild_counter("<p>1</p>")
+    args = ("comment_list_anon", "/list|anon|1", "/list|anon|stale", 1)
+    assert caching.get_or_rebuild(*args, rebuild) == "<p>1</p>"
+    assert len(calls) == 1
+    # Only the request holding the lock stores the value.
+    assert dci_cache.get("/list|anon|1") == None
+
+
+def test_get_or_rebuild_without_stale_value(monkeypatch):
+    monkeypatch.setattr(
+        settings,
+        "COMMENTS_INK_CACHE_REBUILD",
+        {"comment_list_anon": {"wait_timeout": 0}},
+    )
+    monkeypatch.setattr(caching, "dci_cache", None)
+    dci_cache = caching.get_cache()
+    dci_cache.clear()
+    dci_cache.add("/list|anon|1|lock", 1)
+    rebuild, calls = rebuild_counter("<p>1</p>")
+    args = ("comment_list_anon", "/list|anon|1", "/list|anon|stale", 1)
+    assert caching.get_or_rebuild(*args, rebuild) == "<p>1</p>"
+    assert len(calls) == 1
+    assert dci_cache.get("/list|anon|1") == None
+
+
+def test_get_or_rebuild_options_per_key(monkeypatch):
+    monkeypatch.setattr(
+        settings,
+        "COMMENTS_INK_CACHE_REBUILD",
+        {"comment_list_auth": {"stale_timeout": 5}},
+    )
+    assert caching.get_rebuild_options("comment_list_auth") == {
+        "lock_timeout": 30,
+        "stale_timeout": 5,
+        "wait_timeout": 5,
+    }
+    assert caching.get_rebuild_options("comment_qs") == {
+        "lock_timeout": 30,
+        "stale_timeout": 0,
+        "wait_timeout": 5,
+    }
+
+
+def test_get_or_rebuild_without_cache(monkeypatch):
+    monkeypatch.setattr(caching, "dci_cache", None)
+    monkeypatch.setattr(caching, "caches", {"dci": None})
+    rebuild, calls = rebuild_counter("<p>1</p>")
+    args = ("comment_list_anon", "/list|anon|1", "/list|anon|stale", 1)
+    assert caching.get_or_rebuild(*args, rebuild) == "<p>1</p>"
+    assert caching.get_or_rebuild(*args, rebuild) == "<p>1</p>"
+    assert len(calls) == 2
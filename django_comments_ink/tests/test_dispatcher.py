@@ -0,0 +1,114 @@
+import threading
+
+import pytest
+
+from django_comments_ink import dispatcher
+from django_comments_ink.dispatcher import MailDispatcher
+
+
+class Job:
+    def __init__(self, failures=0, event=None):
+        self.failures = failures
+        self.event = event
+        self.calls = 0
+        self.thread = None
+
+    def __call__(self):
+        self.calls += 1
+        self.thread = threading.current_thread()
+        if self.event:
+            self.event.wait(5)
+        if self.calls <= self.failures:
+            raise ConnectionError("SMTP server gone")
+
+
+def test_dispatcher_runs_jobs_in_its_workers():
+    mailer = MailDispatcher(workers=2, queue_size=10)
+    jobs = [Job() for _ in range(5)]
+    for job in jobs:
+        assert mailer.submit(job) == True
+    mailer.join()
+    assert all(job.calls == 1 for job in jobs)
+    assert {job.thread for job in jobs} <= set(mailer.workers)
+    stats = mailer.stats()
+    assert stats["queued"] == 5
+    assert stats["sent"] == 5
+    assert stats["failed"] == 0
+    assert stats["pending"] == 0
+    assert stats["latency_max"] >= stats["latency_avg"] > 0
+    mailer.shutdown()
+    assert mailer.workers == []
+
+
+def test_dispatcher_retries_with_exponential_backoff(monkeypatch):
+    delays = []
+    monkeypatch.setattr(dispatcher.time, "sleep", delays.append)
+    mailer = MailDispatcher(workers=1, retries=3, retry_delay=0.5)
+    job = Job(failures=2)
+    mailer.submit(job)
+    failing_job = Job(failures=10)
+    mailer.submit(failing_job)
+    mailer.join()
+    mailer.shutdown()
+    assert job.calls == 3
+    assert failing_job.calls == 4
+    assert delays == [0.5, 1.0, 0.5, 1.0, 2.0]
+    stats = mailer.stats()
+    assert stats["sent"] == 1
+    assert stats["failed"] == 1
+    assert stats["retried"] == 5
+
+
+@pytest.mark.parametrize("when_full", ["drop", "sync"])
+def test_dispatcher_when_the_queue_is_full(when_full):
+    release = threading.Event()
+    mailer = MailDispatcher(workers=1, queue_size=1, when_full=when_full)
+    busy_job = Job(event=release)
+    mailer.submit(busy_job)
+    while busy_job.calls == 0:  # Wait until the worker runs it.
+        pass
+    waiting_job = Job()
+    assert mailer.submit(waiting_job) == True
+    extra_job = Job()
+    assert mailer.submit(extra_job) == (when_full == "sync")
+    if when_full == "sync":
+        assert extra_job.thread == threading.current_thread()
+    else:
+        assert mailer.stats()["dropped"] == 1
+    release.set()
+    mailer.shutdown()
+    assert waiting_job.calls == 1
+
+
+def test_dispatcher_drains_the_queue_on_shutdown():
+    mailer = MailDispatcher(workers=1, queue_size=100)
+    jobs = [Job() for _ in range(20)]
+    for job in jobs:
+        mailer.submit(job)
+    mailer.shutdown()
+    assert all(job.calls == 1 for job in jobs)
+    # Workers start again for the next job.
+    job = Job()
+    mailer.submit(job)
+    mailer.join()
+    mailer.shutdown()
+    assert job.calls == 1
+
+
+def test_get_dispatcher_options(monkeypatch):
+    monkeypatch.setattr(
+        dispatcher.settings,
+        "COMMENTS_INK_MAIL_DISPATCHER",
+        {"workers": 4},
+    )
+    options = dispatcher.get_dispatcher_options()
+    assert options["workers"] == 4
+    assert options["when_full"] == "block"
+
+    monkeypatch.setattr(
+        dispatcher.settings,
+        "COMMENTS_INK_MAIL_DISPATCHER",
+        {"when_full": "ignore"},
+    )
+    with pytest.raises(ValueError):
+        dispatcher.get_dispatcher_options()
@@ -1,6 +1,56 @@
+from django.test import override_settings
 from django.urls import reverse
-from django_comments_ink import get_form_target
+from django.utils.module_loading import import_string
+
+import django_comments_ink
+from django_comments_ink import (
+    get_comment_reactions_enum,
+    get_form,
+    get_form_target,
+    get_model,
+)
+from django_comments_ink.forms import InkCommentForm
+from django_comments_ink.models import InkComment, ReactionEnum
+from django_comments_ink.tests.models import MyComment
+
+
+class AnotherForm(InkCommentForm):
+    pass
 
 
 def test_get_form_target():
     assert get_form_target() == reverse("comments-ink-post")
+
+
+def test_get_model_imports_the_model_once(monkeypatch):
+    imported = []
+
+    def counting_import_string(path):
+        imported.append(path)
+        return import_string(path)
+
+    monkeypatch.setattr(
+        django_comments_ink, "import_string", counting_import_string
+    )
+    for _ in range(3):
+        assert get_model() is InkComment
+        assert get_comment_reactions_enum() is ReactionEnum
+    assert imported == []
+
+
+def test_get_model_is_refreshed_on_setting_changed():
+    with override_settings(
+        COMMENTS_INK_MODEL="django_comments_ink.tests.models.MyComment"
+    ):
+        assert get_model() is MyComment
+    assert get_model() is InkComment
+
+
+def test_get_form_is_refreshed_on_setting_changed(settings):
+    form_class = "django_comments_ink.tests.test_init.AnotherForm"
+    settings.COMMENTS_INK_FORM_CLASS = form_class
+    assert get_form() is AnotherForm
+    settings.COMMENTS_INK_FORM_CLASS = (
+        "django_comments_ink.forms.InkCommentForm"
+    )
+    assert get_form() is InkCommentForm
@@ -0,0 +1,120 @@
+from io import StringIO
+
+import pytest
+from django.core.management import CommandError, call_command
+
+from django_comments_ink import blacklist
+from django_comments_ink.management.commands import load_blacklist
+from django_comments_ink.models import BlackListedDomain
+
+BLACKLIST_FILE = """# Blacklisted domains
+spam.tld
+SPAM.tld.
+junk.example.com;2022-05-14
+spammer@bulk.example.org, 127.0.0.1
+not a domain
+exämple.net
+
+spam.tld
+"""
+
+
+def get_domains():
+    return sorted(BlackListedDomain.objects.values_list("domain", flat=True))
+
+
+def test_parse_domain():
+    assert load_blacklist.parse_domain("  Mail.Spam.TLD.\n") == "mail.spam.tld"
+    assert load_blacklist.parse_domain("spam.tld 127.0.0.1") == "spam.tld"
+    assert load_blacklist.parse_domain("joe@spam.tld") == "spam.tld"
+    assert load_blacklist.parse_domain("bücher.de") == "xn--bcher-kva.de"
+    assert load_blacklist.parse_domain("# A comment") == ""
+    assert load_blacklist.parse_domain("\n") == ""
+    assert load_blacklist.parse_domain("spam/.tld") == None
+    assert load_blacklist.parse_domain("localhost") == None
+    assert load_blacklist.parse_domain("a" * 201) == None
+
+
+def test_external_sorter_merges_runs():
+    sorter = load_blacklist.ExternalSorter(chunk_size=2)
+    for domain, pk in [("c", 0), ("a", 3), ("b", 0), ("a", 0), ("c", 0)]:
+        sorter.add(domain, pk)
+    assert len(sorter.runs) == 2
+    assert list(sorter) == [("a", 0), ("a", 3), ("b", 0), ("c", 0), ("c", 0)]
+    sorter.close()
+
+
+@pytest.mark.django_db
+def test_load_blacklist_applies_the_diff(
+    tmp_path, django_capture_on_commit_callbacks
+):
+    BlackListedDomain.objects.bulk_create(
+        [
+            BlackListedDomain(domain=domain)
+            for domain in ["spam.tld", "spam.tld", "old.tld", "not valid"]
+        ]
+    )
+    kept_pk = BlackListedDomain.objects.filter(domain="spam.tld").first().pk
+    path = tmp_path / "blacklist.txt"
+    path.write_text(BLACKLIST_FILE)
+    output = StringIO()
+    with django_capture_on_commit_callbacks(execute=True) as callbacks:
+        call_command(
+            "load_blacklist",
+            str(path),
+            chunk_size=2,
+            batch_size=1,
+            stdout=output,
+        )
+    assert output.getvalue() == (
+        "Read 9 lines, 1 invalid, with 4 domains: "
+        "3 added, 3 deleted, 1 kept.\n"
+    )
+    assert get_domains() == [
+        "bulk.example.org",
+        "junk.example.com",
+        "spam.tld",
+        "xn--exmple-cua.net",
+    ]
+    assert BlackListedDomain.objects.filter(pk=kept_pk).exists()
+    assert len(callbacks) == 1
+    assert blacklist.is_blacklisted("mail.junk.example.com")
+
+    # Loading the same file again changes nothing.
+    output = StringIO()
+    with django_capture_on_commit_callbacks(execute=True) as callbacks:
+        call_command("load_blacklist", str(path), stdout=output)
+    assert output.getvalue() == (
+        "Read 9 lines, 1 invalid, with 4 domains: "
+        "0 added, 0 deleted, 4 kept.\n"
+    )
+    assert len(callbacks) == 0
+
+
+@pytest.mark.django_db
+def test_load_blacklist_dry_run_and_no_delete(tmp_path):
+    BlackListedDomain.objects.create(domain="old.tld")
+    path = tmp_path / "blacklist.txt"
+    path.write_text("spam.tld\n")
+
+    output = StringIO()
+    call_command("load_blacklist", str(path), dry_run=True, stdout=output)
+    assert output.getvalue() == (
+        "Read 1 lines, 0 invalid, with 1 domains: "
+        "1 added, 1 deleted, 0 kept.\n"
+        "Dry run, the blacklist was not modified.\n"
+    )
+    assert get_domains() == ["old.tld"]
+
+    output = StringIO()
+    call_command("load_blacklist", str(path), no_delete=True, stdout=output)
+    assert output.getvalue() == (
+        "Read 1 lines, 0 invalid, with 1 domains: "
+        "1 added, 0 deleted, 1 kept.\n"
+    )
+    assert get_domains() == ["old.tld", "spam.tld"]
+
+
+def test_load_blacklist_file_does_not_exist():
+    with pytest.raises(CommandError):
+        call_command("load_blacklist", "/does/not/exist.txt")
@@ -2,15 +2,31 @@ from datetime import datetime
 from unittest.mock import patch
 
 import pytest
+from django import VERSION as DJANGO_VERSION
 from django.contrib.contenttypes.models import ContentType
 from django.contrib.sites.models import Site
+from django.db import DatabaseError, connection
+from django.db.models import QuerySet
 from django.db.models.signals import pre_save
 from django.test import TestCase as DjangoTestCase
-from django_comments_ink import get_form, get_model
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.contrib.auth.models import User
+from django_comments.models import CommentFlag
+
+from django_comments_ink import blacklist, caching, get_form, get_model
+from django_comments_ink import get_comment_reactions_enum, models
 from django_comments_ink.models import (
     BlackListedDomain,
+    CommentReaction,
+    CommentThread,
+    CommentVote,
     InkComment,
     MaxThreadLevelExceededException,
+    get_comment_ancestors,
+    get_nested_comment_ids,
+    prefetch_comment_feedback,
+    publish_or_withhold_nested_comments,
     publish_or_withhold_on_pre_save,
 )
 from django_comments_ink.moderation import SpamModerator, moderator
@@ -305,8 +321,8 @@ class ThreadStep2TestCase(ArticleBaseTestCase):
         thread_test_step_2(self.article_1)
         (  # content ->    cmt.id  thread_id  parent_id  level  order  nested
             self.c1,  # ->   1         1          1        0      1      2
-            self.c3,  # ->   3         1          1        1      2      0
-            self.c4,  # ->   4         1          1        1      3      0
+            self.c3,  # ->   3         1          1        1   1025      0
+            self.c4,  # ->   4         1          1        1   2049      0
             self.c2,  # ->   2         2          2        0      1      0
         ) = InkComment.objects.all()
 
@@ -323,11 +339,11 @@ class ThreadStep2TestCase(ArticleBaseTestCase):
     def test_threaded_comments_step_2_level_1(self):
         # comment 3
         self.assertTrue(self.c3.parent_id == 1 and self.c3.thread_id == 1)
-        self.assertTrue(self.c3.level == 1 and self.c3.order == 2)
+        self.assertTrue(self.c3.level == 1 and self.c3.order == 1025)
         self.assertEqual(self.c3.nested_count, 0)
         # comment 4
         self.assertTrue(self.c4.parent_id == 1 and self.c4.thread_id == 1)
-        self.assertTrue(self.c4.level == 1 and self.c4.order == 3)
+        self.assertTrue(self.c4.level == 1 and self.c4.order == 2049)
         self.assertEqual(self.c4.nested_count, 0)
 
 
@@ -340,10 +356,10 @@ class ThreadStep3TestCase(ArticleBaseTestCase):
 
         (  # -> content:   cmt.id  thread_id  parent_id  level  order  nested
             self.c1,  # ->   1         1          1        0      1      2
-            self.c3,  # ->   3         1          1        1      2      0
-            self.c4,  # ->   4         1          1        1      3      0
+            self.c3,  # ->   3         1          1        1   1025      0
+            self.c4,  # ->   4         1          1        1   2049      0
             self.c2,  # ->   2         2          2        0      1      1
-            self.c5,  # ->   5         2          2        1      2      0
+            self.c5,  # ->   5         2          2        1   1025      0
         ) = InkComment.objects.all()
 
     def test_threaded_comments_step_3_level_0(self):
@@ -359,15 +375,15 @@ class ThreadStep3TestCase(ArticleBaseTestCase):
     def test_threaded_comments_step_3_level_1(self):
         # comment 3
         self.assertTrue(self.c3.parent_id == 1 and self.c3.thread_id == 1)
-        self.assertTrue(self.c3.level == 1 and self.c3.order == 2)
+        self.assertTrue(self.c3.level == 1 and self.c3.order == 1025)
         self.assertEqual(self.c3.nested_count, 0)
         # comment 4
         self.assertTrue(self.c4.parent_id == 1 and self.c4.thread_id == 1)
-        self.assertTrue(self.c4.level == 1 and self.c4.order == 3)
+        self.assertTrue(self.c4.level == 1 and self.c4.order == 2049)
         self.assertEqual(self.c4.nested_count, 0)
         # comment 5
         self.assertTrue(self.c5.parent_id == 2 and self.c5.thread_id == 2)
-        self.assertTrue(self.c5.level == 1 and self.c5.order == 2)
+        self.assertTrue(self.c5.level == 1 and self.c5.order == 1025)
         self.assertEqual(self.c5.nested_count, 0)
 
 
@@ -381,12 +397,12 @@ class ThreadStep4TestCase(ArticleBaseTestCase):
 
         (  # content ->    cmt.id  thread_id  parent_id  level  order  nested
             self.c1,  # ->   1         1          1        0      1      3
-            self.c3,  # ->   3         1          1        1      2      0
-            self.c4,  # ->   4         1          1        1      3      1
-            self.c7,  # ->   7         1          4        2      4      0
+            self.c3,  # ->   3         1          1        1   1025      0
+            self.c4,  # ->   4         1          1        1   2049      1
+            self.c7,  # ->   7         1          4        2   3073      0
             self.c2,  # ->   2         2          2        0      1      2
-            self.c5,  # ->   5         2          2        1      2      1
-            self.c6,  # ->   6         2          5        2      3      0
+            self.c5,  # ->   5         2          2        1   1025      1
+            self.c6,  # ->   6         2          5        2   2049      0
         ) = InkComment.objects.all()
 
     def test_threaded_comments_step_4_level_0(self):
@@ -402,25 +418,25 @@ class ThreadStep4TestCase(ArticleBaseTestCase):
     def test_threaded_comments_step_4_level_1(self):
         # comment 3
         self.assertTrue(self.c3.parent_id == 1 and self.c3.thread_id == 1)
-        self.assertTrue(self.c3.level == 1 and self.c3.order == 2)
+        self.assertTrue(self.c3.level == 1 and self.c3.order == 1025)
         self.assertEqual(self.c3.nested_count, 0)
         # comment 4
         self.assertTrue(self.c4.parent_id == 1 and self.c4.thread_id == 1)
-        self.assertTrue(self.c4.level == 1 and self.c4.order == 3)
+        self.assertTrue(self.c4.level == 1 and self.c4.order == 2049)
         self.assertEqual(self.c4.nested_count, 1)
         # comment 5
         self.assertTrue(self.c5.parent_id == 2 and self.c5.thread_id == 2)
-        self.assertTrue(self.c5.level == 1 and self.c5.order == 2)
+        self.assertTrue(self.c5.level == 1 and self.c5.order == 1025)
         self.assertEqual(self.c5.nested_count, 1)
 
     def test_threaded_comments_step_4_level_2(self):
         # comment 6
         self.assertTrue(self.c6.parent_id == 5 and self.c6.thread_id == 2)
-        self.assertTrue(self.c6.level == 2 and self.c6.order == 3)
+        self.assertTrue(self.c6.level == 2 and self.c6.order == 2049)
         self.assertEqual(self.c6.nested_count, 0)
         # comment 7
         self.assertTrue(self.c7.parent_id == 4 and self.c7.thread_id == 1)
-        self.assertTrue(self.c7.level == 2 and self.c7.order == 4)
+        self.assertTrue(self.c7.level == 2 and self.c7.order == 3073)
         self.assertEqual(self.c7.nested_count, 0)
 
 
@@ -435,13 +451,13 @@ class ThreadStep5TestCase(ArticleBaseTestCase):
 
         (  # content ->    cmt.id  thread_id  parent_id  level  order  nested
             self.c1,  # ->   1         1          1        0      1      4
-            self.c3,  # ->   |- 3      1          1        1      2      1
-            self.c8,  # ->      |- 8   1          3        2      3      0
-            self.c4,  # ->   |- 4      1          1        1      4      1
-            self.c7,  # ->      |- 7   1          4        2      5      0
+            self.c3,  # ->   |- 3      1          1        1   1025      1
+            self.c8,  # ->      |- 8   1          3        2   1537      0
+            self.c4,  # ->   |- 4      1          1        1   2049      1
+            self.c7,  # ->      |- 7   1          4        2   3073      0
             self.c2,  # ->   2         2          2        0      1      2
-            self.c5,  # ->   |- 5      2          2        1      2      1
-            self.c6,  # ->      |- 6   2          5        2      3      0
+            self.c5,  # ->   |- 5      2          2        1   1025      1
+            self.c6,  # ->      |- 6   2          5        2   2049      0
             self.c9,  # ->   9         9          9        0      1      0
         ) = InkComment.objects.all()
 
@@ -462,29 +478,29 @@ class ThreadStep5TestCase(ArticleBaseTestCase):
     def test_threaded_comments_step_5_level_1(self):
         # comment 3
         self.assertTrue(self.c3.parent_id == 1 and self.c3.thread_id == 1)
-        self.assertTrue(self.c3.level == 1 and self.c3.order == 2)
+        self.assertTrue(self.c3.level == 1 and self.c3.order == 1025)
         self.assertEqual(self.c3.nested_count, 1)
         # comment 4
         self.assertTrue(self.c4.parent_id == 1 and self.c4.thread_id == 1)
-        self.assertTrue(self.c4.level == 1 and self.c4.order == 4)  # changed
+        self.assertTrue(self.c4.level == 1 and self.c4.order == 2049)
         self.assertEqual(self.c4.nested_count, 1)
         # comment 5
         self.assertTrue(self.c5.parent_id == 2 and self.c5.thread_id == 2)
-        self.assertTrue(self.c5.level == 1 and self.c5.order == 2)
+        self.assertTrue(self.c5.level == 1 and self.c5.order == 1025)
         self.assertEqual(self.c5.nested_count, 1)
 
     def test_threaded_comments_step_5_level_2(self):
         # comment 6
         self.assertTrue(self.c6.parent_id == 5 and self.c6.thread_id == 2)
-        self.assertTrue(self.c6.level == 2 and self.c6.order == 3)
+        self.assertTrue(self.c6.level == 2 and self.c6.order == 2049)
         self.assertEqual(self.c6.nested_count, 0)
         # comment 7
         self.assertTrue(self.c7.parent_id == 4 and self.c7.thread_id == 1)
-        self.assertTrue(self.c7.level == 2 and self.c7.order == 5)  # changed
+        self.assertTrue(self.c7.level == 2 and self.c7.order == 3073)
         self.assertEqual(self.c7.nested_count, 0)
         # comment 8
         self.assertTrue(self.c8.parent_id == 3 and self.c8.thread_id == 1)
-        self.assertTrue(self.c8.level == 2 and self.c8.order == 3)
+        self.assertTrue(self.c8.level == 2 and self.c8.order == 1537)
         self.assertEqual(self.c8.nested_count, 0)
 
     @patch.multiple(
@@ -530,15 +546,15 @@ class ThreadStep6TestCase(ArticleBaseTestCase):
 
         (  # content ->    cmt.id  thread_id  parent_id  level  order  nested
             self.c1,  # ->   1         1          1        0      1      6
-            self.c3,  # ->   3         1          1        1      2      2
-            self.c8,  # ->   8         1          3        2      3      1
-            self.c11,  # ->  11        1          8        3      4      0
-            self.c4,  # ->   4         1          1        1      5      2
-            self.c7,  # ->   7         1          4        2      6      1
-            self.c10,  # ->  10        1          7        3      7      0
+            self.c3,  # ->   3         1          1        1   1025      2
+            self.c8,  # ->   8         1          3        2   1537      1
+            self.c11,  # ->  11        1          8        3   1793      0
+            self.c4,  # ->   4         1          1        1   2049      2
+            self.c7,  # ->   7         1          4        2   3073      1
+            self.c10,  # ->  10        1          7        3   4097      0
             self.c2,  # ->   2         2          2        0      1      2
-            self.c5,  # ->   5         2          2        1      2      1
-            self.c6,  # ->   6         2          5        2      3      0
+            self.c5,  # ->   5         2          2        1   1025      1
+            self.c6,  # ->   6         2          5        2   2049      0
             self.c9,  # ->   9         9          9        0      1      0
         ) = InkComment.objects.all()
 
@@ -559,39 +575,39 @@ class ThreadStep6TestCase(ArticleBaseTestCase):
     def test_threaded_comments_step_6_level_1(self):
         # comment 3
         self.assertTrue(self.c3.parent_id == 1 and self.c3.thread_id == 1)
-        self.assertTrue(self.c3.level == 1 and self.c3.order == 2)
+        self.assertTrue(self.c3.level == 1 and self.c3.order == 1025)
         self.assertEqual(self.c3.nested_count, 2)
         # comment 4
         self.assertTrue(self.c4.parent_id == 1 and self.c4.thread_id == 1)
-        self.assertTrue(self.c4.level == 1 and self.c4.order == 5)
+        self.assertTrue(self.c4.level == 1 and self.c4.order == 2049)
         self.assertEqual(self.c4.nested_count, 2)
         # comment 5
         self.assertTrue(self.c5.parent_id == 2 and self.c5.thread_id == 2)
-        self.assertTrue(self.c5.level == 1 and self.c5.order == 2)
+        self.assertTrue(self.c5.level == 1 and self.c5.order == 1025)
         self.assertEqual(self.c5.nested_count, 1)
 
     def test_threaded_comments_step_6_level_2(self):
         # comment 8
         self.assertTrue(self.c8.parent_id == 3 and self.c8.thread_id == 1)
-        self.assertTrue(self.c8.level == 2 and self.c8.order == 3)
+        self.assertTrue(self.c8.level == 2 and self.c8.order == 1537)
         self.assertEqual(self.c8.nested_count, 1)
         # comment 7
         self.assertTrue(self.c7.parent_id == 4 and self.c7.thread_id == 1)
-        self.assertTrue(self.c7.level == 2 and self.c7.order == 6)
+        self.assertTrue(self.c7.level == 2 and self.c7.order == 3073)
         self.assertEqual(self.c7.nested_count, 1)
         # comment 6
         self.assertTrue(self.c6.parent_id == 5 and self.c6.thread_id == 2)
-        self.assertTrue(self.c6.level == 2 and self.c6.order == 3)
+        self.assertTrue(self.c6.level == 2 and self.c6.order == 2049)
         self.assertEqual(self.c6.nested_count, 0)
 
     def test_threaded_comments_step_6_level_3(self):
         # comment 10
         self.assertTrue(self.c10.parent_id == 7 and self.c10.thread_id == 1)
-        self.assertTrue(self.c10.level == 3 and self.c10.order == 7)
+        self.assertTrue(self.c10.level == 3 and self.c10.order == 4097)
         self.assertEqual(self.c10.nested_count, 0)
         # comment 11
         self.assertTrue(self.c11.parent_id == 8 and self.c11.thread_id == 1)
-        self.assertTrue(self.c11.level == 3 and self.c11.order == 4)
+        self.assertTrue(self.c11.level == 3 and self.c11.order == 1793)
         self.assertEqual(self.c11.nested_count, 0)
 
 
@@ -641,8 +657,8 @@ class PublishOrWithholdNestedComments_1_TestCase(ArticleBaseTestCase):
         #
         # (  # content ->    cmt.id  thread_id  parent_id  level  order  nested
         #     cm1,   # ->     1         1          1        0      1       2
-        #     cm3,   # ->     3         1          1        1      2       0
-        #     cm4,   # ->     4         1          1        1      3       0
+        #     cm3,   # ->     3         1          1        1   1025       0
+        #     cm4,   # ->     4         1          1        1   2049       0
         #     cm2,   # ->     2         2          2        0      1       0
         # ) = InkComment.objects.all()
 
@@ -694,8 +710,8 @@ class PublishOrWithholdNestedComments_2_TestCase(ArticleBaseTestCase):
         #
         # (  # content ->    cmt.id thread_id parent_id level order nested
         #     cm1,   # ->     1        1         1        0     1      2
-        #     cm3,   # ->     3        1         1        1     2      0
-        #     cm4,   # ->     4        1         1        1     3      0
+        #     cm3,   # ->     3        1         1        1  1025      0
+        #     cm4,   # ->     4        1         1        1  2049      0
         #     cm2,   # ->     2        2         2        0     1      0
         # ) = MyComment.objects.all()
 
@@ -704,9 +720,7 @@ class PublishOrWithholdNestedComments_2_TestCase(ArticleBaseTestCase):
             self.assertTrue(cm.is_public)
             self.assertFalse(cm.is_removed)
 
-    @patch.multiple(
-        "django_comments_ink.conf.settings", COMMENTS_INK_MODEL=_ink_model
-    )
+    @override_settings(COMMENTS_INK_MODEL=_ink_model)
     def test_removing_c1_withholds_c3_and_c4(self):
         # Register the receiver again. It was registered in apps.py, but we
         # have patched the COMMENTS_INK_MODEL, however we won't fake the
@@ -783,6 +797,8 @@ def test_blacklisted_domain_is_blocked(an_article, an_user):
 
 @pytest.mark.django_db
 def test_non_blacklisted_domain_pass(an_article, an_user):
+    # Forget the domains blacklisted by previous tests, rolled back.
+    blacklist.invalidate()
     moderator.register(Article, ArticleCommentModerator)
     form = get_form()(an_article)
     data = {
@@ -816,15 +832,15 @@ def test_nested_count_after_deleting_comment_1(an_article):
 
     # content -> cmt.id  thread_id  parent_id  level  order  nested
     #  c1   # ->    1         1          1        0      1      6
-    #  c3   # ->    3         1          1        1      2      2
-    #  c8   # ->    8         1          3        2      3      1
-    #  c11  # ->   11         1          8        3      4      0
-    #  c4   # ->    4         1          1        1      5      2
-    #  c7   # ->    7         1          4        2      6      1
-    #  c10  # ->   10         1          7        3      7      0
+    #  c3   # ->    3         1          1        1   1025      2
+    #  c8   # ->    8         1          3        2   1537      1
+    #  c11  # ->   11         1          8        3   1793      0
+    #  c4   # ->    4         1          1        1   2049      2
+    #  c7   # ->    7         1          4        2   3073      1
+    #  c10  # ->   10         1          7        3   4097      0
     #  c2   # ->    2         2          2        0      1      2
-    #  c5   # ->    5         2          2        1      2      1
-    #  c6   # ->    6         2          5        2      3      0
+    #  c5   # ->    5         2          2        1   1025      1
+    #  c6   # ->    6         2          5        2   2049      0
     #  c9   # ->    9         9          9        0      1      0
 
     cm1 = InkComment.norel_objects.get(pk=1)
@@ -850,15 +866,15 @@ def test_nested_count_after_deleting_comment_2(an_article):
 
     # content -> cmt.id  thread_id  parent_id  level  order  nested
     #  c1   # ->    1         1          1        0      1      6
-    #  c3   # ->    3         1          1        1      2      2
-    #  c8   # ->    8         1          3        2      3      1
-    #  c11  # ->   11         1          8        3      4      0
-    #  c4   # ->    4         1          1        1      5      2
-    #  c7   # ->    7         1          4        2      6      1
-    #  c10  # ->   10         1          7        3      7      0
+    #  c3   # ->    3         1          1        1   1025      2
+    #  c8   # ->    8         1          3        2   1537      1
+    #  c11  # ->   11         1          8        3   1793      0
+    #  c4   # ->    4         1          1        1   2049      2
+    #  c7   # ->    7         1          4        2   3073      1
+    #  c10  # ->   10         1          7        3   4097      0
     #  c2   # ->    2         2          2        0      1      2
-    #  c5   # ->    5         2          2        1      2      1
-    #  c6   # ->    6         2          5        2      3      0
+    #  c5   # ->    5         2          2        1   1025      1
+    #  c6   # ->    6         2          5        2   2049      0
     #  c9   # ->    9         9          9        0      1      0
 
     cm2 = InkComment.norel_objects.get(pk=2)
@@ -884,15 +900,15 @@ def test_nested_count_after_deleting_comment_3(an_article):
 
     # content -> cmt.id  thread_id  parent_id  level  order  nested
     #  c1   # ->    1         1          1        0      1      6
-    #  c3   # ->    3         1          1        1      2      2
-    #  c8   # ->    8         1          3        2      3      1
-    #  c11  # ->   11         1          8        3      4      0
-    #  c4   # ->    4         1          1        1      5      2
-    #  c7   # ->    7         1          4        2      6      1
-    #  c10  # ->   10         1          7        3      7      0
+    #  c3   # ->    3         1          1        1   1025      2
+    #  c8   # ->    8         1          3        2   1537      1
+    #  c11  # ->   11         1          8        3   1793      0
+    #  c4   # ->    4         1          1        1   2049      2
+    #  c7   # ->    7         1          4        2   3073      1
+    #  c10  # ->   10         1          7        3   4097      0
     #  c2   # ->    2         2          2        0      1      2
-    #  c5   # ->    5         2          2        1      2      1
-    #  c6   # ->    6         2          5        2      3      0
+    #  c5   # ->    5         2          2        1   1025      1
+    #  c6   # ->    6         2          5        2   2049      0
     #  c9   # ->    9         9          9        0      1      0
 
     cm3 = InkComment.norel_objects.get(pk=3)
@@ -921,15 +937,15 @@ def test_nested_count_after_deleting_comment_4(an_article):
 
     # content -> cmt.id  thread_id  parent_id  level  order  nested
     #  c1   # ->    1         1          1        0      1      6
-    #  c3   # ->    3         1          1        1      2      2
-    #  c8   # ->    8         1          3        2      3      1
-    #  c11  # ->   11         1          8        3      4      0
-    #  c4   # ->    4         1          1        1      5      2
-    #  c7   # ->    7         1          4        2      6      1
-    #  c10  # ->   10         1          7        3      7      0
+    #  c3   # ->    3         1          1        1   1025      2
+    #  c8   # ->    8         1          3        2   1537      1
+    #  c11  # ->   11         1          8        3   1793      0
+    #  c4   # ->    4         1          1        1   2049      2
+    #  c7   # ->    7         1          4        2   3073      1
+    #  c10  # ->   10         1          7        3   4097      0
     #  c2   # ->    2         2          2        0      1      2
-    #  c5   # ->    5         2          2        1      2      1
-    #  c6   # ->    6         2          5        2      3      0
+    #  c5   # ->    5         2          2        1   1025      1
+    #  c6   # ->    6         2          5        2   2049      0
     #  c9   # ->    9         9          9        0      1      0
 
     cm4 = InkComment.norel_objects.get(pk=4)
@@ -958,15 +974,15 @@ def test_nested_count_after_deleting_comment_5(an_article):
 
     # content -> cmt.id  thread_id  parent_id  level  order  nested
     #  c1   # ->    1         1          1        0      1      6
-    #  c3   # ->    3         1          1        1      2      2
-    #  c8   # ->    8         1          3        2      3      1
-    #  c11  # ->   11         1          8        3      4      0
-    #  c4   # ->    4         1          1        1      5      2
-    #  c7   # ->    7         1          4        2      6      1
-    #  c10  # ->   10         1          7        3      7      0
+    #  c3   # ->    3         1          1        1   1025      2
+    #  c8   # ->    8         1          3        2   1537      1
+    #  c11  # ->   11         1          8        3   1793      0
+    #  c4   # ->    4         1          1        1   2049      2
+    #  c7   # ->    7         1          4        2   3073      1
+    #  c10  # ->   10         1          7        3   4097      0
     #  c2   # ->    2         2          2        0      1      2
-    #  c5   # ->    5         2          2        1      2      1
-    #  c6   # ->    6         2          5        2      3      0
+    #  c5   # ->    5         2          2        1   1025      1
+    #  c6   # ->    6         2          5        2   2049      0
     #  c9   # ->    9         9          9        0      1      0
 
     cm5 = InkComment.norel_objects.get(pk=5)
@@ -995,15 +1011,15 @@ def test_nested_count_after_deleting_comment_6(an_article):
 
     # content -> cmt.id  thread_id  parent_id  level  order  nested
     #  c1   # ->    1         1          1        0      1      6
-    #  c3   # ->    3         1          1        1      2      2
-    #  c8   # ->    8         1          3        2      3      1
-    #  c11  # ->   11         1          8        3      4      0
-    #  c4   # ->    4         1          1        1      5      2
-    #  c7   # ->    7         1          4        2      6      1
-    #  c10  # ->   10         1          7        3      7      0
+    #  c3   # ->    3         1          1        1   1025      2
+    #  c8   # ->    8         1          3        2   1537      1
+    #  c11  # ->   11         1          8        3   1793      0
+    #  c4   # ->    4         1          1        1   2049      2
+    #  c7   # ->    7         1          4        2   3073      1
+    #  c10  # ->   10         1          7        3   4097      0
     #  c2   # ->    2         2          2        0      1      2
-    #  c5   # ->    5         2          2        1      2      1
-    #  c6   # ->    6         2          5        2      3      0
+    #  c5   # ->    5         2          2        1   1025      1
+    #  c6   # ->    6         2          5        2   2049      0
     #  c9   # ->    9         9          9        0      1      0
 
     cm6 = InkComment.norel_objects.get(pk=6)
@@ -1012,7 +1028,7 @@ def test_nested_count_after_deleting_comment_6(an_article):
     # It should remove comment 6, and leave the following changes:
     # content -> cmt.id  thread_id  parent_id  level  order  nested
     #  c2   # ->    2         2          2        0      1      1
-    #  c5   # ->    5         2          2        1      2      0
+    #  c5   # ->    5         2          2        1   1025      0
 
     with pytest.raises(InkComment.DoesNotExist):
         InkComment.objects.get(pk=6)
@@ -1035,15 +1051,15 @@ def test_nested_count_after_deleting_comment_7(an_article):
 
     # content -> cmt.id  thread_id  parent_id  level  order  nested
     #  c1   # ->    1         1          1        0      1      6
-    #  c3   # ->    3         1          1        1      2      2
-    #  c8   # ->    8         1          3        2      3      1
-    #  c11  # ->   11         1          8        3      4      0
-    #  c4   # ->    4         1          1        1      5      2
-    #  c7   # ->    7         1          4        2      6      1
-    #  c10  # ->   10         1          7        3      7      0
+    #  c3   # ->    3         1          1        1   1025      2
+    #  c8   # ->    8         1          3        2   1537      1
+    #  c11  # ->   11         1          8        3   1793      0
+    #  c4   # ->    4         1          1        1   2049      2
+    #  c7   # ->    7         1          4        2   3073      1
+    #  c10  # ->   10         1          7        3   4097      0
     #  c2   # ->    2         2          2        0      1      2
-    #  c5   # ->    5         2          2        1      2      1
-    #  c6   # ->    6         2          5        2      3      0
+    #  c5   # ->    5         2          2        1   1025      1
+    #  c6   # ->    6         2          5        2   2049      0
     #  c9   # ->    9         9          9        0      1      0
 
     cm7 = InkComment.norel_objects.get(pk=7)
@@ -1052,7 +1068,7 @@ def test_nested_count_after_deleting_comment_7(an_article):
     # It should remove comments 7 and 10, and leave the following changes:
     # content -> cmt.id  thread_id  parent_id  level  order  nested
     #  c1   # ->    1         1          1        0      1      4
-    #  c4   # ->    4         1          1        1      5      0
+    #  c4   # ->    4         1          1        1   2049      0
 
     for cid in [7, 10]:
         with pytest.raises(InkComment.DoesNotExist):
@@ -1076,15 +1092,15 @@ def test_nested_count_after_deleting_comment_8(an_article):
 
     # content -> cmt.id  thread_id  parent_id  level  order  nested
     #  c1   # ->    1         1          1        0      1      6
-    #  c3   # ->    3         1          1        1      2      2
-    #  c8   # ->    8         1          3        2      3      1
-    #  c11  # ->   11         1          8        3      4      0
-    #  c4   # ->    4         1          1        1      5      2
-    #  c7   # ->    7         1          4        2      6      1
-    #  c10  # ->   10         1          7        3      7      0
+    #  c3   # ->    3         1          1        1   1025      2
+    #  c8   # ->    8         1          3        2   1537      1
+    #  c11  # ->   11         1          8        3   1793      0
+    #  c4   # ->    4         1          1        1   2049      2
+    #  c7   # ->    7         1          4        2   3073      1
+    #  c10  # ->   10         1          7        3   4097      0
     #  c2   # ->    2         2          2        0      1      2
-    #  c5   # ->    5         2          2        1      2      1
-    #  c6   # ->    6         2          5        2      3      0
+    #  c5   # ->    5         2          2        1   1025      1
+    #  c6   # ->    6         2          5        2   2049      0
     #  c9   # ->    9         9          9        0      1      0
 
     cm8 = InkComment.norel_objects.get(pk=8)
@@ -1093,7 +1109,7 @@ def test_nested_count_after_deleting_comment_8(an_article):
     # It should remove comments 8 and 11, and leave the following changes:
     # content -> cmt.id  thread_id  parent_id  level  order  nested
     #  c1   # ->    1         1          1        0      1      4
-    #  c3   # ->    3         1          1        1      2      0
+    #  c3   # ->    3         1          1        1   1025      0
 
     for cid in [8, 11]:
         with pytest.raises(InkComment.DoesNotExist):
@@ -1117,15 +1133,15 @@ def test_nested_count_after_deleting_comment_10(an_article):
 
     # content -> cmt.id  thread_id  parent_id  level  order  nested
     #  c1   # ->    1         1          1        0      1      6
-    #  c3   # ->    3         1          1        1      2      2
-    #  c8   # ->    8         1          3        2      3      1
-    #  c11  # ->   11         1          8        3      4      0
-    #  c4   # ->    4         1          1        1      5      2
-    #  c7   # ->    7         1          4        2      6      1
-    #  c10  # ->   10         1          7        3      7      0
+    #  c3   # ->    3         1          1        1   1025      2
+    #  c8   # ->    8         1          3        2   1537      1
+    #  c11  # ->   11         1          8        3   1793      0
+    #  c4   # ->    4         1          1        1   2049      2
+    #  c7   # ->    7         1          4        2   3073      1
+    #  c10  # ->   10         1          7        3   4097      0
     #  c2   # ->    2         2          2        0      1      2
-    #  c5   # ->    5         2          2        1      2      1
-    #  c6   # ->    6         2          5        2      3      0
+    #  c5   # ->    5         2          2        1   1025      1
+    #  c6   # ->    6         2          5        2   2049      0
     #  c9   # ->    9         9          9        0      1      0
 
     cm10 = InkComment.norel_objects.get(pk=10)
@@ -1134,8 +1150,8 @@ def test_nested_count_after_deleting_comment_10(an_article):
     # It should remove comments 8 and 11, and leave the following changes:
     # content -> cmt.id  thread_id  parent_id  level  order  nested
     #  c1   # ->    1         1          1        0      1      5
-    #  c4   # ->    4         1          1        1      5      1
-    #  c7   # ->    7         1          4        2      6      0
+    #  c4   # ->    4         1          1        1   2049      1
+    #  c7   # ->    7         1          4        2   3073      0
 
     with pytest.raises(InkComment.DoesNotExist):
         InkComment.objects.get(pk=10)
@@ -1148,3 +1164,364 @@ def test_nested_count_after_deleting_comment_10(an_article):
 
     c7 = InkComment.norel_objects.get(pk=7)
     assert c7.nested_count == 0
+
+
+# ---------------------------------------------------------------------
+# Test the traversal of nested comments.
+
+
+def create_thread_steps_1_to_6(article):
+    thread_test_step_1(article)
+    thread_test_step_2(article)
+    thread_test_step_3(article)
+    thread_test_step_4(article)
+    thread_test_step_5(article)
+    thread_test_step_6(article)
+
+    # content -> cmt.id  thread_id  parent_id  level  order  nested
+    #  c1   # ->    1         1          1        0      1      6
+    #  c3   # ->    3         1          1        1   1025      2
+    #  c8   # ->    8         1          3        2   1537      1
+    #  c11  # ->   11         1          8        3   1793      0
+    #  c4   # ->    4         1          1        1   2049      2
+    #  c7   # ->    7         1          4        2   3073      1
+    #  c10  # ->   10         1          7        3   4097      0
+    #  c2   # ->    2         2          2        0      1      2
+    #  c5   # ->    5         2          2        1   1025      1
+    #  c6   # ->    6         2          5        2   2049      0
+    #  c9   # ->    9         9          9        0      1      0
+
+
+@pytest.mark.django_db
+def test_save_increments_generation_again_on_commit(
+    an_article, django_capture_on_commit_callbacks
+):
+    article_ct = ContentType.objects.get(app_label="tests", model="article")
+    generation = caching.get_generation(article_ct.pk, an_article.pk, 1)
+    with django_capture_on_commit_callbacks(execute=True):
+        thread_test_step_1(an_article)
+        uncommitted = caching.get_generation(article_ct.pk, an_article.pk, 1)
+        assert uncommitted > generation
+    assert caching.get_generation(article_ct.pk, an_article.pk, 1) > uncommitted
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize(
+    "comment_id, expected",
+    [
+        (1, {3, 8, 11, 4, 7, 10}),
+        (3, {8, 11}),
+        (4, {7, 10}),
+        (2, {5, 6}),
+        (9, set()),
+        (11, set()),
+    ],
+)
+def test_get_nested_comment_ids(an_article, comment_id, expected):
+    create_thread_steps_1_to_6(an_article)
+    assert set(get_nested_comment_ids(comment_id)) == expected
+
+
+@pytest.mark.django_db
+def test_get_nested_comment_ids_without_recursive_cte(an_article, monkeypatch):
+    create_thread_steps_1_to_6(an_article)
+    monkeypatch.setattr(models, "RECURSIVE_CTE_VENDORS", ())
+    assert set(get_nested_comment_ids(1)) == {3, 8, 11, 4, 7, 10}
+    assert set(get_nested_comment_ids(2)) == {5, 6}
+    assert get_nested_comment_ids(9) == []
+
+
+@pytest.mark.django_db
+def test_withhold_nested_comments_in_constant_queries(
+    an_article, django_assert_num_queries
+):
+    create_thread_steps_1_to_6(an_article)
+    cm1 = InkComment.norel_objects.get(pk=1)
+    # One query to get the nested comments, one to update their is_public
+    # field and one to update the nested_count of the comments up the tree.
+    with django_assert_num_queries(3):
+        publish_or_withhold_nested_comments(cm1, shall_be_public=False)
+    assert InkComment.norel_objects.filter(is_public=False).count() == 6
+
+
+# ---------------------------------------------------------------------
+# Test the insertion of replies in a thread.
+
+
+def post_reply(article, parent_id, comment="reply"):
+    return InkComment.objects.create(
+        content_type=ContentType.objects.get_for_model(article),
+        object_pk=article.id,
+        content_object=article,
+        site=Site.objects.get(pk=1),
+        comment=comment,
+        submit_date=datetime.now(),
+        parent_id=parent_id,
+    )
+
+
+def list_thread(thread_id):
+    return list(
+        InkComment.norel_objects.filter(thread_id=thread_id)
+        .order_by("order")
+        .values_list("comment", flat=True)
+    )
+
+
+@pytest.mark.django_db
+def test_reply_does_not_rewrite_other_comments(an_article):
+    create_thread_steps_1_to_6(an_article)
+    orders = dict(InkComment.norel_objects.values_list("pk", "order"))
+    post_reply(an_article, 3, comment="c12.c3.c1")
+    for pk, order in InkComment.norel_objects.values_list("pk", "order"):
+        if pk in orders:
+            assert orders[pk] == order
+    assert list_thread(1) == [
+        "c1",
+        "c3.c1",
+        "c8.c3.c1",
+        "c11.c8.c3.c1",
+        "c12.c3.c1",
+        "c4.c1",
+        "c7.c4.c1",
+        "c10.c7.c4.c1",
+    ]
+
+
+@pytest.mark.django_db
+def test_reply_runs_a_constant_number_of_queries(an_article):
+    thread_test_step_1(an_article)
+    with CaptureQueriesContext(connection) as ctx:
+        post_reply(an_article, 1)
+    num_queries = len(ctx.captured_queries)
+    for _ in range(10):
+        post_reply(an_article, 1)
+    with CaptureQueriesContext(connection) as ctx:
+        post_reply(an_article, 1)
+    assert len(ctx.captured_queries) == num_queries
+
+
+@pytest.mark.django_db
+def test_reply_renumbers_thread_when_gap_is_exhausted(an_article, monkeypatch):
+    monkeypatch.setattr(models, "THREAD_ORDER_GAP", 2)
+    thread_test_step_1(an_article)
+    thread_test_step_2(an_article)
+    post_reply(an_article, 3, comment="r1.c3")  # Takes the only free value.
+    post_reply(an_article, 3, comment="r2.c3")  # Forces the renumbering.
+    assert list_thread(1) == ["c1", "c3.c1", "r1.c3", "r2.c3", "c4.c1"]
+    orders = list(
+        InkComment.norel_objects.filter(thread_id=1)
+        .order_by("order")
+        .values_list("order", flat=True)
+    )
+    assert orders == [1, 3, 5, 6, 7]
+
+
+@pytest.mark.django_db
+def test_reply_locks_its_thread(an_article, monkeypatch):
+    thread_test_step_1(an_article)
+    locked = []
+    select_for_update = QuerySet.select_for_update
+
+    def spy(qs, *args, **kwargs):
+        locked.append(qs.model)
+        return select_for_update(qs, *args, **kwargs)
+
+    monkeypatch.setattr(QuerySet, "select_for_update", spy)
+    post_reply(an_article, 1)
+    assert locked == [CommentThread]
+
+
+@pytest.mark.django_db
+def test_reply_order_is_saved_with_its_thread_data(an_article):
+    thread_test_step_1(an_article)
+    saves = []
+
+    def fail_on_second_save(sender, instance, **kwargs):
+        if instance.parent_id == 1 and instance.pk != 1:
+            saves.append(instance.pk)
+            if len(saves) == 2:
+                raise DatabaseError("Lost connection")
+
+    pre_save.connect(fail_on_second_save, sender=InkComment)
+    try:
+        with pytest.raises(DatabaseError):
+            post_reply(an_article, 1)
+    finally:
+        pre_save.disconnect(fail_on_second_save, sender=InkComment)
+    # The ancestors were updated in the transaction that failed.
+    assert InkComment.norel_objects.get(pk=1).nested_count == 0
+
+
+@pytest.mark.django_db
+def test_reply_increments_nested_count_of_ancestors(an_article):
+    create_thread_steps_1_to_6(an_article)
+    post_reply(an_article, 8)
+    nested_count = dict(
+        InkComment.norel_objects.values_list("pk", "nested_count")
+    )
+    assert nested_count == {
+        1: 7,
+        3: 3,
+        8: 2,
+        11: 0,
+        4: 2,
+        7: 1,
+        10: 0,
+        2: 2,
+        5: 1,
+        6: 0,
+        9: 0,
+        12: 0,
+    }
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize("vendors", [models.RECURSIVE_CTE_VENDORS, ()])
+def test_get_comment_ancestors(an_article, monkeypatch, vendors):
+    create_thread_steps_1_to_6(an_article)
+    monkeypatch.setattr(models, "RECURSIVE_CTE_VENDORS", vendors)
+    qs = InkComment.norel_objects.all()
+    assert set(
+        qs.filter(pk__in=get_comment_ancestors(11)).values_list("pk", flat=True)
+    ) == {11, 8, 3, 1}
+    assert set(
+        qs.filter(pk__in=get_comment_ancestors(6)).values_list("pk", flat=True)
+    ) == {6, 5, 2}
+    assert set(
+        qs.filter(pk__in=get_comment_ancestors(9)).values_list("pk", flat=True)
+    ) == {9}
+
+
+def add_feedback_to_comments(users):
+    # Comments 1 and 3 get reactions, comment 4 gets flags and every user
+    # votes on comments 1 and 8.
+    enum = get_comment_reactions_enum()
+    for comment_id, reaction in [(1, enum.LIKE_IT), (1, enum.DISLIKE_IT)]:
+        item = CommentReaction.objects.create(
+            comment_id=comment_id, reaction=reaction, counter=len(users)
+        )
+        item.authors.add(*users)
+    item = CommentReaction.objects.create(
+        comment_id=3, reaction=enum.LIKE_IT, counter=1
+    )
+    item.authors.add(users[0])
+    for user in users:
+        CommentFlag.objects.create(
+            comment_id=4,
+            user=user,
+            flag=CommentFlag.SUGGEST_REMOVAL,
+        )
+        CommentVote.objects.create(
+            comment_id=1, author=user, vote=CommentVote.POSITIVE
+        )
+        CommentVote.objects.create(
+            comment_id=8, author=user, vote=CommentVote.NEGATIVE
+        )
+
+
+@pytest.mark.django_db
+def test_prefetch_comment_feedback_matches_get_reactions_and_get_flags(
+    an_article,
+):
+    caching.get_cache().clear()
+    thread_test_step_1(an_article)
+    thread_test_step_2(an_article)
+    thread_test_step_3(an_article)
+    thread_test_step_4(an_article)
+    thread_test_step_5(an_article)
+    users = [
+        User.objects.create_user("user%d" % i, "user%d@example.com" % i)
+        for i in range(3)
+    ]
+    add_feedback_to_comments(users)
+    expected = {
+        cm.pk: (cm.get_reactions(), cm.get_flags())
+        for cm in InkComment.objects.all()
+    }
+
+    caching.get_cache().clear()
+    comments = list(InkComment.objects.all())
+    with CaptureQueriesContext(connection) as ctx:
+        prefetch_comment_feedback(comments, user=users[0])
+    # Reactions, reactions' authors, flags and the user's votes.
+    assert len(ctx.captured_queries) == 4
+
+    with CaptureQueriesContext(connection) as ctx:
+        for cm in comments:
+            assert (cm.get_reactions(), cm.get_flags()) == expected[cm.pk]
+    assert len(ctx.captured_queries) == 0
+    votes = {cm.pk: cm._user_vote for cm in comments}
+    assert votes[1] == (users[0].pk, CommentVote.POSITIVE)
+    assert votes[8] == (users[0].pk, CommentVote.NEGATIVE)
+    assert votes[2] == (users[0].pk, "")
+
+    # A second page of the same comments is served from the cache.
+    comments = list(InkComment.objects.all())
+    with CaptureQueriesContext(connection) as ctx:
+        prefetch_comment_feedback(comments)
+    assert len(ctx.captured_queries) == 0
+    for cm in comments:
+        assert (cm.get_reactions(), cm.get_flags()) == expected[cm.pk]
+        assert not hasattr(cm, "_user_vote")
+
+
+@pytest.mark.django_db
+def test_prefetch_comment_feedback_limits_users_listed(an_article, monkeypatch):
+    caching.get_cache().clear()
+    thread_test_step_1(an_article)
+    thread_test_step_2(an_article)
+    thread_test_step_3(an_article)
+    thread_test_step_4(an_article)
+    thread_test_step_5(an_article)
+    users = [
+        User.objects.create_user("user%d" % i, "user%d@example.com" % i)
+        for i in range(3)
+    ]
+    add_feedback_to_comments(users)
+    monkeypatch.setattr(
+        models.settings, "COMMENTS_INK_MAX_USERS_IN_TOOLTIP", 2, raising=False
+    )
+    with CaptureQueriesContext(connection) as ctx:
+        comments = prefetch_comment_feedback(InkComment.objects.filter(pk=1))
+    for item in comments[0].get_reactions()["list"]:
+        assert item["counter"] == 3
+        assert len(item["authors"]) == 2
+    # The authors of each reaction are limited in the query, not in Python.
+    authors_sql = [
+        query["sql"]
+        for query in ctx.captured_queries
+        if "commentreactionauthor" in query["sql"]
+    ]
+    assert len(authors_sql) == 1
+    if DJANGO_VERSION >= (4, 2):
+        assert "ROW_NUMBER" in authors_sql[0]
+
+
+@pytest.mark.django_db
+def test_reactions_list_the_same_users_in_every_path(an_article, monkeypatch):
+    thread_test_step_1(an_article)
+    thread_test_step_2(an_article)
+    thread_test_step_3(an_article)
+    thread_test_step_4(an_article)
+    thread_test_step_5(an_article)
+    users = [
+        User.objects.create_user("user%d" % i, "user%d@example.com" % i)
+        for i in range(3)
+    ]
+    add_feedback_to_comments(users)
+    monkeypatch.setattr(
+        models.settings, "COMMENTS_INK_MAX_USERS_IN_TOOLTIP", 2, raising=False
+    )
+    listed = {}
+    for order in [("-id",), ("id",)]:
+        monkeypatch.setattr(
+            models.settings, "COMMENTS_INK_USERS_REACTED_LIST_ORDER", order
+        )
+        caching.get_cache().clear()
+        prefetched = prefetch_comment_feedback(InkComment.objects.filter(pk=1))
+        caching.get_cache().clear()
+        fetched = InkComment.objects.get(pk=1).get_reactions()
+        assert prefetched[0].get_reactions() == fetched
+        listed[order] = fetched
+    assert listed[("-id",)] != listed[("id",)]
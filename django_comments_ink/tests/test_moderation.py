@@ -3,10 +3,12 @@ from __future__ import unicode_literals
 import importlib
 import re
 from datetime import datetime, timedelta
+from io import StringIO
 from unittest.mock import patch
 
 from django.contrib.auth.models import AnonymousUser, Permission, User
 from django.contrib.contenttypes.models import ContentType
+from django.core.management import call_command
 from django.test import RequestFactory, TestCase
 from django.urls import reverse
 
@@ -14,7 +16,7 @@ import django_comments
 from django_comments.models import Comment, CommentFlag
 from django_comments.views.moderation import delete
 
-from django_comments_ink.models import InkComment
+from django_comments_ink.models import InkComment, OutboxTask
 from django_comments_ink.views.flagging import FlagCommentView
 
 from django_comments_ink.tests.models import (
@@ -263,6 +265,29 @@ class FlaggingRemovalSuggestion(TestCase):
         FlagCommentView.as_view()(request, 1)
         self.assertTrue(self.mailer.call_count == 1)
 
+    @patch.multiple(
+        "django_comments_ink.conf.settings",
+        COMMENTS_INK_OUTBOX=True,
+        COMMENTS_INK_THREADED_EMAILS=False,
+    )
+    def test_email_is_sent_by_the_outbox_worker(self):
+        flag_url = reverse("comments-flag", args=[1])
+        request = request_factory.post(flag_url, secure=True)
+        request.user = self.user
+        request._dont_enforce_csrf_checks = True
+        FlagCommentView.as_view()(request, 1)
+        self.assertTrue(self.mailer.call_count == 0)
+        self.assertEqual(
+            list(OutboxTask.objects.values_list("kind", flat=True)),
+            ["removal_suggestion"],
+        )
+        call_command("dci_worker", "--once", concurrency=1, stdout=StringIO())
+        self.assertTrue(self.mailer.call_count == 1)
+        message = self.mailer.call_args[0][1]
+        self.assertTrue("Removal suggested by: bob" in message)
+        self.assertTrue("https://example.com/diary/" in message)
+        self.assertEqual(OutboxTask.objects.count(), 0)
+
     def test_no_email_when_notify_removal_suggestion_is_None(self):
         with patch.object(
             DiaryCommentModerator, "removal_suggestion_notification", None
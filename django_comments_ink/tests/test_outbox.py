@@ -0,0 +1,160 @@
+from datetime import datetime, timedelta
+from io import StringIO
+
+import pytest
+from django.contrib.contenttypes.models import ContentType
+from django.contrib.sites.models import Site
+from django.core import mail
+from django.core.management import call_command
+from django.db import transaction
+from django.utils.timezone import now
+
+from django_comments_ink import outbox, tokens
+from django_comments_ink.conf import settings
+from django_comments_ink.models import InkComment, OutboxTask
+from django_comments_ink.tests.test_tokens import get_tmp_comment
+from django_comments_ink.views import commenting
+
+
+failures = []
+
+
+def failing_handler(payload):
+    failures.append(payload)
+    raise ConnectionError("SMTP server gone")
+
+
+@pytest.fixture
+def outbox_enabled(monkeypatch):
+    monkeypatch.setattr(settings, "COMMENTS_INK_OUTBOX", True)
+    monkeypatch.setattr(settings, "COMMENTS_INK_THREADED_EMAILS", False)
+
+
+def run_worker(*args):
+    out = StringIO()
+    call_command("dci_worker", "--once", *args, concurrency=1, stdout=out)
+    return out.getvalue()
+
+
+def post_comments(article, names):
+    fields = {
+        "content_type": ContentType.objects.get_for_model(article),
+        "object_pk": article.pk,
+        "site": Site.objects.get(pk=1),
+        "followup": True,
+    }
+    return [
+        InkComment.objects.create(
+            user_name=name,
+            user_email="%s@example.com" % name.lower(),
+            comment="Comment by %s." % name,
+            submit_date=datetime.now(),
+            **fields,
+        )
+        for name in names
+    ]
+
+
+@pytest.mark.django_db
+def test_followup_notifications_are_sent_by_the_worker(
+    outbox_enabled, an_article
+):
+    comments = post_comments(an_article, ["Bob", "Alice", "Charlie"])
+    commenting.notify_comment_followers(comments[-1])
+    assert len(mail.outbox) == 0
+    task = OutboxTask.objects.get()
+    assert task.kind == "followup_notifications"
+    assert task.payload == {"comment_id": comments[-1].pk}
+
+    output = run_worker()
+    assert output == "1 outbox task(s) succeeded, 0 failed.\n"
+    assert sorted(message.to[0] for message in mail.outbox) == [
+        "alice@example.com",
+        "bob@example.com",
+    ]
+    assert OutboxTask.objects.count() == 0
+
+
+@pytest.mark.django_db
+def test_confirmation_request_is_sent_by_the_worker(outbox_enabled, an_article):
+    comment = get_tmp_comment(an_article)
+    key = tokens.dumps(comment, extra_key=settings.COMMENTS_INK_SALT)
+    commenting.request_comment_confirmation(
+        comment, key, Site.objects.get(pk=1)
+    )
+    assert len(mail.outbox) == 0
+    run_worker()
+    assert len(mail.outbox) == 1
+    assert mail.outbox[0].to == ["alice@example.com"]
+    assert "/confirm/%s/" % key.decode("utf-8") in mail.outbox[0].body
+
+
+@pytest.mark.django_db(transaction=True)
+def test_tasks_are_rolled_back_with_the_comment(outbox_enabled, an_article):
+    with pytest.raises(RuntimeError):
+        with transaction.atomic():
+            (comment,) = post_comments(an_article, ["Bob"])
+            commenting.notify_comment_followers(comment)
+            raise RuntimeError("The comment could not be saved.")
+    assert OutboxTask.objects.count() == 0
+    assert InkComment.objects.count() == 0
+
+
+@pytest.mark.django_db
+def test_claim_does_not_give_a_task_to_two_workers():
+    for index in range(3):
+        outbox.enqueue("followup_notifications", {"comment_id": index})
+    first = outbox.claim("worker-1", batch_size=2, lease=60)
+    second = outbox.claim("worker-2", batch_size=2, lease=60)
+    assert [task.payload["comment_id"] for task in first] == [0, 1]
+    assert [task.payload["comment_id"] for task in second] == [2]
+    assert outbox.claim("worker-3", batch_size=2, lease=60) == []
+
+    # Tasks of a worker that stopped are claimed when the lease expires.
+    OutboxTask.objects.filter(locked_by="worker-1").update(
+        locked_until=now() - timedelta(seconds=1)
+    )
+    third = outbox.claim("worker-3", batch_size=10, lease=60)
+    assert [task.payload["comment_id"] for task in third] == [0, 1]
+
+
+@pytest.mark.django_db
+def test_failed_tasks_are_retried_later_and_marked_as_failed(monkeypatch):
+    monkeypatch.setitem(
+        outbox.TASK_HANDLERS,
+        "followup_notifications",
+        "django_comments_ink.tests.test_outbox.failing_handler",
+    )
+    failures.clear()
+    outbox.enqueue("followup_notifications", {"comment_id": 1})
+
+    started = now()
+    output = run_worker("--max-attempts=2", "--retry-delay=60")
+    assert output == "0 outbox task(s) succeeded, 1 failed.\n"
+    task = OutboxTask.objects.get()
+    assert task.status == OutboxTask.PENDING
+    assert task.attempts == 1
+    assert task.available_at >= started + timedelta(seconds=60)
+    assert task.locked_by == ""
+    assert "SMTP server gone" in task.last_error
+
+    # Not available before the delay.
+    run_worker()
+    assert len(failures) == 1
+
+    OutboxTask.objects.update(available_at=now())
+    run_worker("--max-attempts=2")
+    task = OutboxTask.objects.get()
+    assert task.status == OutboxTask.FAILED
+    assert task.attempts == 2
+    assert len(failures) == 2
+
+    # Failed tasks are not run again.
+    OutboxTask.objects.update(available_at=now())
+    run_worker()
+    assert len(failures) == 2
+
+
+def test_enqueue_unknown_kind_raises():
+    with pytest.raises(ValueError):
+        outbox.enqueue("unknown", {})
@@ -1,11 +1,13 @@
 import collections
+import random
 from datetime import datetime
 
 import pytest
 from django.contrib.contenttypes.models import ContentType
 from django.contrib.sites.models import Site
-from django_comments_ink import get_model
-from django_comments_ink.paginator import CommentsPaginator
+from django_comments_ink import caching, get_model
+from django_comments_ink.conf import settings
+from django_comments_ink.paginator import CommentsLayout, CommentsPaginator
 
 InkComment = get_model()
 
@@ -220,3 +222,84 @@ def test_paginator_allow_empty_first_page():
         qs, 10, orphans=3, allow_empty_first_page=False
     )
     assert paginator.num_pages == 0
+
+
+@pytest.mark.parametrize(
+    "counts, in_page, page_start",
+    [
+        ([11, 11, 11, 11, 11, 11, 6, 5], [22, 22, 33], [0, 2, 4]),
+        ([25, 25, 9], [25, 34], [0, 1]),
+        ([25, 9, 9], [25, 18], [0, 1]),
+        ([40, 2, 2], [40, 4], [0, 1]),
+        ([], [], []),
+    ],
+)
+def test_comments_layout(counts, in_page, page_start):
+    thread_ids = list(range(1, len(counts) + 1))
+    layout = CommentsLayout(thread_ids, counts, 25, 10)
+    assert layout.in_page == in_page
+    assert layout.page_start == page_start
+
+
+def test_comments_layout_get_page_number():
+    counts = [11, 11, 11, 11, 11, 11, 6, 5]
+    layout = CommentsLayout(range(10, 18), counts, 25, 10)
+    pages = [layout.get_page_number(thread_id) for thread_id in range(10, 18)]
+    assert pages == [1, 1, 2, 2, 3, 3, 3, 3]
+    assert layout.get_page_number(1) == None
+
+
+@pytest.mark.parametrize("seed", range(10))
+def test_comments_layout_add_comments_matches_compute(seed):
+    rnd = random.Random(seed)
+    counts = [rnd.randint(1, 30) for _ in range(200)]
+    thread_ids = list(range(1, len(counts) + 1))
+    layout = CommentsLayout(thread_ids, counts, 25, 10)
+    for _ in range(50):
+        thread_id = rnd.choice(thread_ids)
+        assert layout.add_comments(thread_id) == True
+        counts[thread_id - 1] += 1
+        expected = CommentsLayout(thread_ids, counts, 25, 10)
+        assert layout.in_page == expected.in_page
+        assert layout.page_start == expected.page_start
+    assert layout.add_comments(1000) == False
+
+
+@pytest.mark.django_db
+def test_reply_carries_cached_layout_over(
+    an_article, django_assert_num_queries, django_capture_on_commit_callbacks
+):
+    caching.get_cache().clear()
+    article_ct = ContentType.objects.get(app_label="tests", model="article")
+    attrs = {
+        "content_type": article_ct,
+        "object_pk": an_article.pk,
+        "content_object": an_article,
+        "site": Site.objects.get(pk=1),
+        "comment": "comment",
+        "submit_date": datetime.now(),
+    }
+    roots = []
+    for index in range(5):
+        roots.append(InkComment.objects.create(**attrs))
+        for _ in range(index + 5):
+            InkComment.objects.create(**attrs, parent_id=roots[-1].pk)
+
+    def get_paginator():
+        ckey_prefix = settings.COMMENTS_INK_CACHE_KEYS["comments_paged"].format(
+            ctype_pk=article_ct.pk,
+            object_pk=an_article.pk,
+            site_id=1,
+            gen=caching.get_generation(article_ct.pk, an_article.pk, 1),
+        )
+        return CommentsPaginator(
+            InkComment.objects.all(), 10, 3, cache_key_prefix=ckey_prefix
+        )
+
+    assert get_paginator().in_page == [6, 7, 8, 9, 10]
+    # The layout is carried over when the reply is committed.
+    with django_capture_on_commit_callbacks(execute=True):
+        InkComment.objects.create(**attrs, parent_id=roots[1].pk)
+    paginator = get_paginator()
+    with django_assert_num_queries(0):
+        assert paginator.in_page == [6, 8, 8, 9, 10]
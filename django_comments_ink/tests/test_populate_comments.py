@@ -8,7 +8,7 @@ from django.core.management import call_command
 from django.db.utils import ConnectionHandler
 from django_comments.models import Comment
 from django_comments_ink.management.commands import populate_comments
-from django_comments_ink.models import InkComment
+from django_comments_ink.models import CommentThread, InkComment
 
 
 def create_comments(an_article, model=Comment):
@@ -30,6 +30,19 @@ def test_populate_comments(an_article):
     create_comments(an_article)
     output = StringIO()
     call_command("populate_comments", stdout=output)
+    lines = output.getvalue().splitlines()
+    last_id = Comment.objects.order_by("pk").last().pk
+    assert len(lines) == 2
+    assert lines[0].startswith(f"Imported 5 of 5 comments, up to ID {last_id} ")
+    assert lines[0].endswith(" comments/s).")
+    assert lines[1] == "Added 5 InkComment object(s)."
+
+
+@pytest.mark.django_db
+def test_populate_comments_without_progress(an_article):
+    create_comments(an_article)
+    output = StringIO()
+    call_command("populate_comments", verbosity=0, stdout=output)
     assert output.getvalue() == "Added 5 InkComment object(s).\n"
 
 
@@ -53,3 +66,54 @@ def test_populate_comments_raise_IntegrityError_1(an_article):
         "Table 'django_comments_ink_inkcomment' must be empty.\n"
         "Added 0 InkComment object(s).\n"
     )
+
+
+@pytest.mark.django_db
+def test_populate_comments_in_batches(an_article):
+    create_comments(an_article)
+    output = StringIO()
+    call_command("populate_comments", batch_size=2, stdout=output)
+    lines = output.getvalue().splitlines()
+    ids = list(Comment.objects.order_by("pk").values_list("pk", flat=True))
+    assert len(lines) == 4
+    assert lines[0].startswith(f"Imported 2 of 5 comments, up to ID {ids[1]} ")
+    assert lines[1].startswith(f"Imported 4 of 5 comments, up to ID {ids[3]} ")
+    assert lines[2].startswith(f"Imported 5 of 5 comments, up to ID {ids[4]} ")
+    assert lines[3] == "Added 5 InkComment object(s)."
+    for comment in InkComment.objects.all():
+        assert comment.thread_id == comment.parent_id == comment.pk
+        assert (comment.level, comment.order, comment.nested_count) == (0, 1, 0)
+
+
+@pytest.mark.django_db
+def test_populate_comments_resumes_after_IntegrityError(an_article):
+    create_comments(an_article)
+    ids = list(Comment.objects.order_by("pk").values_list("pk", flat=True))
+    # Make the second batch fail.
+    CommentThread.objects.bulk_create([CommentThread(id=ids[2])])
+    output = StringIO()
+    call_command("populate_comments", batch_size=2, stdout=output)
+    lines = output.getvalue().splitlines()
+    assert lines[0].startswith(f"Imported 2 of 5 comments, up to ID {ids[1]} ")
+    assert lines[1].startswith(
+        f"Could not import the comments with ID {ids[2]} to {ids[3]}: "
+    )
+    assert lines[2:] == [
+        "Run the command again with --resume to continue "
+        f"after the comment with ID {ids[1]}.",
+        "Added 2 InkComment object(s).",
+    ]
+    # The first batch was committed.
+    assert list(InkComment.objects.values_list("pk", flat=True)) == ids[:2]
+
+    CommentThread.objects.filter(id=ids[2]).delete()
+    output = StringIO()
+    call_command(
+        "populate_comments",
+        batch_size=2,
+        resume=True,
+        verbosity=0,
+        stdout=output,
+    )
+    assert output.getvalue() == "Added 3 InkComment object(s).\n"
+    assert InkComment.objects.count() == 5
@@ -0,0 +1,180 @@
+import json
+import multiprocessing
+from io import StringIO
+
+import pytest
+from django.core.management import call_command
+
+from django_comments_ink.management.commands import rebuild_threads
+from django_comments_ink.models import InkComment
+from django_comments_ink.tests.test_models import create_thread_steps_1_to_6
+from django_comments_ink.tests.test_update_nested_count import SerialExecutor
+
+
+def get_threads():
+    return list(
+        InkComment.norel_objects.order_by("thread_id", "order").values_list(
+            "pk", "thread_id", "parent_id", "level", "order", "nested_count"
+        )
+    )
+
+
+@pytest.mark.django_db
+def test_rebuild_threads_finds_no_issues(an_article):
+    create_thread_steps_1_to_6(an_article)
+    output = StringIO()
+    call_command("rebuild_threads", stdout=output)
+    assert output.getvalue() == (
+        "Checked 11 comments in 3 threads in 'default': "
+        "0 issue(s) found, 0 comment(s) fixed.\n"
+    )
+
+
+@pytest.mark.django_db
+def test_rebuild_threads_fixes_comments(an_article, tmp_path):
+    create_thread_steps_1_to_6(an_article)
+    expected = get_threads()
+    InkComment.norel_objects.filter(pk=8).update(level=5, nested_count=4)
+    InkComment.norel_objects.filter(pk=2).update(parent_id=6)
+
+    report = tmp_path / "report.jsonl"
+    output = StringIO()
+    call_command("rebuild_threads", report=str(report), stdout=output)
+    assert output.getvalue() == (
+        "Checked 11 comments in 3 threads in 'default': "
+        "3 issue(s) found, 2 comment(s) fixed.\n"
+    )
+    assert get_threads() == expected
+    issues = [json.loads(line) for line in report.read_text().splitlines()]
+    assert issues == [
+        {
+            "comment": 8,
+            "issue": "level",
+            "found": 5,
+            "expected": 2,
+            "thread": 1,
+            "fixed": True,
+        },
+        {
+            "comment": 8,
+            "issue": "nested_count",
+            "found": 4,
+            "expected": 1,
+            "thread": 1,
+            "fixed": True,
+        },
+        {
+            "comment": 2,
+            "issue": "parent_id",
+            "found": 6,
+            "expected": 2,
+            "thread": 2,
+            "fixed": True,
+        },
+    ]
+
+
+@pytest.mark.django_db
+def test_rebuild_threads_renumbers_threads_out_of_order(an_article):
+    create_thread_steps_1_to_6(an_article)
+    # Comment 4 moved before comment 3, without its replies 7 and 10.
+    InkComment.norel_objects.filter(pk=4).update(order=2)
+    output = StringIO()
+    call_command("rebuild_threads", stdout=output)
+    assert "6 issue(s) found, 6 comment(s) fixed." in output.getvalue()
+    # Siblings keep their relative order, followed by their replies.
+    assert [(row[0], row[4]) for row in get_threads()[:7]] == [
+        (1, 1),
+        (4, 1025),
+        (7, 2049),
+        (10, 3073),
+        (3, 4097),
+        (8, 5121),
+        (11, 6145),
+    ]
+
+
+@pytest.mark.django_db
+def test_rebuild_threads_reports_orphans(an_article, tmp_path):
+    create_thread_steps_1_to_6(an_article)
+    InkComment.norel_objects.filter(pk=7).update(parent_id=999)
+    report = tmp_path / "report.jsonl"
+    output = StringIO()
+    call_command(
+        "rebuild_threads", dry_run=True, report=str(report), stdout=output
+    )
+    issues = [json.loads(line) for line in report.read_text().splitlines()]
+    assert {(i["comment"], i["issue"], i["fixed"]) for i in issues} == {
+        (1, "nested_count", False),
+        (4, "nested_count", False),
+        (7, "orphan", False),
+        (10, "orphan", False),
+    }
+    assert "4 issue(s) found, 0 comment(s) fixed." in output.getvalue()
+    # Nothing written.
+    assert InkComment.norel_objects.get(pk=1).nested_count == 6
+
+
+@pytest.mark.django_db
+def test_rebuild_threads_moves_comments_to_the_thread_of_their_root(
+    an_article, tmp_path
+):
+    create_thread_steps_1_to_6(an_article)
+    expected = get_threads()
+    # c7 and c10 are replies to c4, in thread 1.
+    InkComment.norel_objects.filter(pk__in=[7, 10]).update(thread_id=2)
+
+    report = tmp_path / "report.jsonl"
+    call_command("rebuild_threads", report=str(report), stdout=StringIO())
+    assert get_threads() == expected
+    issues = [json.loads(line) for line in report.read_text().splitlines()]
+    moved = [i for i in issues if i["issue"] == "thread_id"]
+    assert [(i["comment"], i["found"], i["expected"]) for i in moved] == [
+        (7, 2, 1),
+        (10, 2, 1),
+    ]
+    assert [path.name for path in tmp_path.iterdir()] == ["report.jsonl"]
+
+
+@pytest.mark.django_db
+def test_rebuild_threads_with_workers(an_article, monkeypatch, tmp_path):
+    monkeypatch.setattr(rebuild_threads, "ProcessPoolExecutor", SerialExecutor)
+    create_thread_steps_1_to_6(an_article)
+    expected = get_threads()
+    InkComment.norel_objects.update(nested_count=0)
+
+    report = tmp_path / "report.jsonl"
+    output = StringIO()
+    call_command(
+        "rebuild_threads",
+        workers=2,
+        batch_size=1,
+        report=str(report),
+        stdout=output,
+    )
+    assert get_threads() == expected
+    assert "7 issue(s) found, 7 comment(s) fixed." in output.getvalue()
+    assert len(report.read_text().splitlines()) == 7
+    assert [path.name for path in tmp_path.iterdir()] == ["report.jsonl"]
+
+
+# The in-memory test DB reaches the workers only when they are forked.
+@pytest.mark.skipif(
+    multiprocessing.get_start_method() != "fork",
+    reason="Workers don't share the in-memory test DB.",
+)
+@pytest.mark.django_db(transaction=True, reset_sequences=True)
+def test_rebuild_threads_with_process_pool(an_article):
+    create_thread_steps_1_to_6(an_article)
+    InkComment.norel_objects.update(nested_count=0)
+
+    output = StringIO()
+    call_command("rebuild_threads", dry_run=True, workers=2, stdout=output)
+    assert "7 issue(s) found, 0 comment(s) fixed." in output.getvalue()
+
+
+@pytest.mark.django_db
+def test_rebuild_threads_raise_ConnectionDoesNotExist():
+    output = StringIO()
+    call_command("rebuild_threads", "nondb", stdout=output)
+    assert output.getvalue() == "DB connection 'nondb' does not exist.\n"
@@ -14,6 +14,7 @@ from django.test import TestCase
 from django.urls import reverse
 from django_comments.moderation import CommentModerator
 from django_comments.signals import comment_will_be_posted
+from django_comments_ink.api import serializers
 from django_comments_ink.api.serializers import (
     FlagSerializer,
     ReadCommentSerializer,
@@ -458,6 +459,43 @@ def test_ReadCommentSerializer_get_flags(a_comments_flag):
     assert flag["user"] == user_repr
 
 
+@pytest.mark.django_db
+def test_ReadCommentSerializer_get_permalink(monkeypatch, an_articles_comment):
+    comment = an_articles_comment
+    context = {"request": None}
+    ser = ReadCommentSerializer(comment, context=context)
+    assert ser.data["permalink"] == comment.get_absolute_url()
+
+    # The ids are not at the end of the URL, and the prefix has 0s and %s.
+    def reverse(name, args):
+        return "/0%%/cr/%s/0/%s/%s/go/" % args
+
+    monkeypatch.setattr(serializers, "reverse", reverse)
+    ser = ReadCommentSerializer(comment, context=context)
+    assert ser.data["permalink"] == "/0%%/cr/%s/0/%s/%s/go/#comment-%s" % (
+        comment.content_type_id,
+        comment.object_pk,
+        comment.pk,
+        comment.pk,
+    )
+
+
+@pytest.mark.django_db
+def test_ReadCommentSerializer_get_permalink_fallback(
+    monkeypatch, an_articles_comment
+):
+    comment = an_articles_comment
+    # The URL holds one of the arguments twice, it can't be used as format.
+    monkeypatch.setattr(
+        serializers,
+        "reverse",
+        lambda name, args: "/cr/%s/%s/%s/%s/" % (args + args[:1]),
+    )
+    ser = ReadCommentSerializer(comment, context={"request": None})
+    assert ser.get_permalink_format() == ""
+    assert ser.data["permalink"] == comment.get_absolute_url()
+
+
 @pytest.mark.django_db
 def test_WriteCommentReactionSerializer(an_articles_comment):
     # 1st: Test a non-existing reaction is caught by the serializer.
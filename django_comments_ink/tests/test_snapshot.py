@@ -0,0 +1,142 @@
+import pickle
+
+import pytest
+from django.contrib.auth.models import AnonymousUser, User
+from django.db import connection
+from django.template import Context, Template
+from django.test.utils import CaptureQueriesContext
+
+from django_comments_ink import caching, get_model
+from django_comments_ink.snapshot import CommentsSnapshot
+from django_comments_ink.tests.test_models import (
+    thread_test_step_1,
+    thread_test_step_2,
+    thread_test_step_3,
+    thread_test_step_4,
+    thread_test_step_5,
+)
+
+
+def create_comments(article):
+    #  step   id   parent level-0  level-1  level-2
+    #    1     1      -      c1                     <- cm1
+    #    2     3      1      --       c3            <- cm1 to cm1
+    #    5     8      3      --       --       c8   <- cm1 to cm1 to cm1
+    #    2     4      1      --       c4            <- cm2 to cm1
+    #    4     7      4      --       --       c7   <- cm1 to cm2 to cm1
+    #    1     2      -      c2                     <- cm2
+    #    3     5      2      --       c5            <- cm1 to cm2
+    #    4     6      5      --       --       c6   <- cm1 to cm1 to cm2
+    #    5     9      -      c9                     <- cm9
+    thread_test_step_1(article)
+    thread_test_step_2(article)
+    thread_test_step_3(article)
+    thread_test_step_4(article)
+    thread_test_step_5(article)
+
+
+@pytest.mark.django_db
+def test_snapshot_from_queryset(an_article):
+    create_comments(an_article)
+    snapshot = CommentsSnapshot.from_queryset(get_model().objects.all())
+    assert len(snapshot) == snapshot.count() == 9
+    assert snapshot.ids == [1, 3, 8, 4, 7, 2, 5, 6, 9]
+    assert snapshot.details == None
+    assert snapshot.top_level() == [(1, 4), (2, 2), (9, 0)]
+
+
+@pytest.mark.django_db
+def test_snapshot_fold(an_article):
+    create_comments(an_article)
+    snapshot = CommentsSnapshot.from_queryset(get_model().objects.all())
+    assert snapshot.fold({}) is snapshot
+    assert snapshot.fold({1}).ids == [1, 2, 5, 6, 9]
+    assert snapshot.fold({1, 2}).ids == [1, 2, 9]
+
+
+@pytest.mark.django_db
+def test_snapshot_iterates_over_comments(an_article):
+    create_comments(an_article)
+    snapshot = CommentsSnapshot.from_queryset(get_model().objects.all())
+    page = snapshot[1:4]
+    assert isinstance(page, CommentsSnapshot)
+    comments = list(page)
+    assert [cm.id for cm in comments] == [3, 8, 4]
+    assert all(isinstance(cm, get_model()) for cm in comments)
+    assert page.details != None
+    assert page[0] is comments[0]
+
+
+@pytest.mark.django_db
+def test_pickled_snapshot_rebuilds_comments_without_queries(an_article):
+    create_comments(an_article)
+    expected = list(get_model().objects.select_related("thread")[:3])
+    page = CommentsSnapshot.from_queryset(get_model().objects.all())[0:3]
+    page.materialize()
+    data = pickle.dumps(page)
+    assert b"_result_cache" not in data
+
+    restored = pickle.loads(data)
+    restored[0].content_type  # Let the ContentType cache be populated.
+    with CaptureQueriesContext(connection) as ctx:
+        comments = list(restored)
+        for comment, other in zip(comments, expected):
+            assert comment.id == other.id
+            assert comment.comment == other.comment
+            assert comment.name == other.name
+            assert comment.level == other.level
+            assert comment.nested_count == other.nested_count
+            assert comment.thread.score == other.thread.score
+            assert comment.content_type == other.content_type
+            assert comment.get_absolute_url() == other.get_absolute_url()
+    assert len(ctx.captured_queries) == 0
+
+
+@pytest.mark.django_db
+def test_warm_render_runs_no_comment_queries(an_article):
+    caching.get_cache().clear()
+    create_comments(an_article)
+    t = "{% load comments_ink %}{% render_inkcomment_list for object %}"
+    context = {"object": an_article, "user": AnonymousUser()}
+    result_1 = Template(t).render(Context(context))
+
+    comments_table = get_model()._meta.db_table
+    with CaptureQueriesContext(connection) as ctx:
+        result_2 = Template(t).render(Context(context))
+    assert result_1 == result_2
+    for query in ctx.captured_queries:
+        assert comments_table not in query["sql"]
+
+
+@pytest.mark.django_db
+def test_warm_render_fetches_the_users_at_once(an_article):
+    caching.get_cache().clear()
+    bob = User.objects.create_user("bob", "bob@example.com")
+    thread_test_step_1(an_article, user=bob)
+    thread_test_step_2(an_article, user=bob)
+    t = "{% load comments_ink %}{% render_inkcomment_list for object %}"
+    context = {"object": an_article, "user": AnonymousUser()}
+    result_1 = Template(t).render(Context(context))
+
+    with CaptureQueriesContext(connection) as ctx:
+        result_2 = Template(t).render(Context(context))
+    assert result_1 == result_2
+    # The article, and the users of the comments listed.
+    assert len(ctx.captured_queries) == 2
+
+
+@pytest.mark.django_db
+def test_pickled_snapshot_fetches_the_users_with_one_query(an_article):
+    bob = User.objects.create_user("bob", "bob@example.com")
+    thread_test_step_1(an_article, user=bob)
+    thread_test_step_2(an_article)
+    page = CommentsSnapshot.from_queryset(get_model().objects.all())
+    page.materialize()
+
+    restored = pickle.loads(pickle.dumps(page))
+    restored[0].content_type  # Let the ContentType cache be populated.
+    restored = pickle.loads(pickle.dumps(page))
+    with CaptureQueriesContext(connection) as ctx:
+        users = [comment.user for comment in restored]
+    assert users == [bob, None, None, bob]
+    assert len(ctx.captured_queries) == 1
@@ -10,12 +10,16 @@ from django.contrib.auth.models import AnonymousUser
 from django.contrib.contenttypes.models import ContentType
 from django.contrib.sites.models import Site
 from django.core.paginator import PageNotAnInteger
+from django.db import connection
 from django.db.models import Q
 from django.db.models.signals import pre_save
 from django.http.response import Http404
 from django.template import Context, Template, TemplateSyntaxError, loader
 from django.test import TestCase as DjangoTestCase
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from django_comments.models import CommentFlag
 
 from django_comments_ink import (
     caching,
@@ -25,13 +29,14 @@ from django_comments_ink import (
 )
 from django_comments_ink.conf import settings
 from django_comments_ink.models import (
+    CommentVote,
     InkComment,
     publish_or_withhold_on_pre_save,
 )
 from django_comments_ink.templatetags import comments_ink
 from django_comments_ink.utils import get_current_site_id, get_html_id_suffix
 
-from django_comments_ink.tests.models import Article, MyComment
+from django_comments_ink.tests.models import Article, Diary, MyComment
 from django_comments_ink.tests.test_models import (
     thread_test_step_1,
     thread_test_step_2,
@@ -183,9 +188,7 @@ class RenderInkCommentListTestCase(DjangoTestCase):
         c1.save()
         self._assert_all_comments_are_published()
 
-    @patch.multiple(
-        "django_comments_ink.conf.settings", COMMENTS_INK_MODEL=_ink_model
-    )
+    @override_settings(COMMENTS_INK_MODEL=_ink_model)
     def test_render_inkcomment_tree_using_customized_comments(self):
         self._create_comments(use_custom_model=True)
         # Passsing use_custom_model will use the customized comments model,
@@ -469,14 +472,32 @@ class FakeCache:
         self.store = {}
         self.found = {}
 
-    def get(self, key):
-        value = self.store.get(key, None)
+    def get(self, key, default=None):
+        value = self.store.get(key, default)
         self.found[key] = value != None
         return value
 
     def set(self, key, value, timeout=None):
         self.store[key] = value
 
+    def get_many(self, keys):
+        return {key: self.store[key] for key in keys if key in self.store}
+
+    def set_many(self, data, timeout=None):
+        self.store.update(data)
+
+    def add(self, key, value, timeout=None):
+        if key in self.store:
+            return False
+        self.store[key] = value
+        return True
+
+    def incr(self, key, delta=1):
+        if key not in self.store:
+            raise ValueError("Key '%s' not found" % key)
+        self.store[key] += delta
+        return self.store[key]
+
     def delete(self, key):
         if key in self.store:
             self.store.pop(key)
@@ -667,23 +688,89 @@ def test_get_inkcomment_count_uses_cached_count(monkeypatch, an_article):
         "{% get_inkcomment_count for object as count %}"
         "{{ count }}"
     )
-    assert len(fake_cache.store) == 0
+    # Only the generation key, incremented while creating the comments,
+    # and the time of its last increment.
+    assert list(fake_cache.store) == [
+        "/comment_gen/16/1/1",
+        "/comment_gen/16/1/1|modified",
+    ]
 
     result_1 = Template(t).render(Context({"object": an_article}))
-    assert len(fake_cache.store) == 2
-    assert "/comment_qs/15/1/1" in fake_cache.store
-    assert "/comment_count/15/1/1" in fake_cache.store
-    assert fake_cache.found["/comment_count/15/1/1"] == False
+    # The generation keys, the comment_qs key and the comment_count key.
+    assert len(fake_cache.store) == 4
+    gen = fake_cache.store["/comment_gen/16/1/1"]
+    assert f"/comment_qs/16/1/1/{gen}" in fake_cache.store
+    assert f"/comment_count/16/1/1/{gen}" in fake_cache.store
+    assert fake_cache.found[f"/comment_count/16/1/1/{gen}"] == False
 
     result_2 = Template(t).render(Context({"object": an_article}))
-    assert len(fake_cache.store) == 2
-    assert "/comment_qs/15/1/1" in fake_cache.store
-    assert "/comment_count/15/1/1" in fake_cache.store
-    assert fake_cache.found["/comment_count/15/1/1"] == True
+    assert len(fake_cache.store) == 4
+    assert f"/comment_qs/16/1/1/{gen}" in fake_cache.store
+    assert f"/comment_count/16/1/1/{gen}" in fake_cache.store
+    assert fake_cache.found[f"/comment_count/16/1/1/{gen}"] == True
 
     assert result_1 == result_2 == "77"
 
 
+@pytest.mark.django_db
+def test_get_inkcomment_count_caches_zero(monkeypatch, an_article):
+    fake_cache = FakeCache()
+    monkeypatch.setattr(comments_ink.caching, "get_cache", lambda: fake_cache)
+    t = (
+        "{% load comments_ink %}"
+        "{% get_inkcomment_count for object as count %}"
+        "{{ count }}"
+    )
+    assert Template(t).render(Context({"object": an_article})) == "0"
+    assert Template(t).render(Context({"object": an_article})) == "0"
+    gen = fake_cache.store["/comment_gen/16/1/1"]
+    assert fake_cache.found[f"/comment_count/16/1/1/{gen}"] == True
+
+
+@pytest.mark.django_db
+def test_get_inkcomment_counts_raises_TemplateSyntaxError():
+    t = "{% load comments_ink %}{% get_inkcomment_counts for objects %}"
+    with pytest.raises(TemplateSyntaxError):
+        Template(t)
+
+
+@pytest.mark.django_db
+def test_get_inkcomment_counts(monkeypatch, django_assert_num_queries):
+    fake_cache = FakeCache()
+    monkeypatch.setattr(comments_ink.caching, "get_cache", lambda: fake_cache)
+    articles = [
+        Article.objects.create(
+            title="Article %d" % index, slug="article-%d" % index, body="..."
+        )
+        for index in range(5)
+    ]
+    thread_test_step_1(articles[1])
+    thread_test_step_1(articles[3])
+    thread_test_step_2(articles[3])
+    t = (
+        "{% load comments_ink %}"
+        "{% get_inkcomment_counts for objects as counts %}"
+        "{% for article, count in counts %}{{ count }} {% endfor %}"
+    )
+    # One grouped query for the 5 articles, and none once cached.
+    with django_assert_num_queries(1):
+        result = Template(t).render(Context({"objects": articles}))
+    assert result == "0 2 0 4 0 "
+    with django_assert_num_queries(0):
+        result = Template(t).render(Context({"objects": articles}))
+    assert result == "0 2 0 4 0 "
+
+    # Counts are shared with the get_inkcomment_count tag.
+    t = (
+        "{% load comments_ink %}"
+        "{% get_inkcomment_count for object as count %}"
+        "{{ count }}"
+    )
+    with django_assert_num_queries(0):
+        result = Template(t).render(Context({"object": articles[3]}))
+    assert result == "4"
+
+
 # -----------------------------------------------
 @pytest.mark.django_db
 def test_render_inkcomment_list_raises_IndexError(an_article):
@@ -710,29 +797,92 @@ def test_render_inkcomment_list_raises_TemplateSyntaxError(an_article):
 def test_render_inkcomment_list_uses_cached_list(monkeypatch, an_article):
     fake_cache = FakeCache()
     fake_request = FakeRequest(
-        path="/comment_list/15/1/1", user=AnonymousUser()
+        path="/comment_list/16/1/1", user=AnonymousUser()
     )
     monkeypatch.setattr(comments_ink.caching, "get_cache", lambda: fake_cache)
     setup_paginator_example_1(an_article)
 
     t = "{% load comments_ink %}" "{% render_inkcomment_list for object %}"
 
-    assert len(fake_cache.store) == 0
-    assert not "/comment_list/15/1/1|anon" in fake_cache.store
+    assert list(fake_cache.store) == [
+        "/comment_gen/16/1/1",
+        "/comment_gen/16/1/1|modified",
+    ]
 
     result_1 = Template(t).render(
         Context({"request": fake_request, "object": an_article})
     )
-    assert "/comment_list/15/1/1|anon" in fake_cache.store
-    assert fake_cache.found["/comment_list/15/1/1|anon"] == False
+    gen = fake_cache.store["/comment_gen/16/1/1"]
+    assert f"/comment_list/16/1/1|anon|{gen}" in fake_cache.store
+    assert fake_cache.found[f"/comment_list/16/1/1|anon|{gen}"] == False
 
     result_2 = Template(t).render(
         Context({"request": fake_request, "object": an_article})
     )
-    assert "/comment_list/15/1/1|anon" in fake_cache.store
-    assert fake_cache.found["/comment_list/15/1/1|anon"] == True
+    assert f"/comment_list/16/1/1|anon|{gen}" in fake_cache.store
+    assert fake_cache.found[f"/comment_list/16/1/1|anon|{gen}"] == True
 
     assert result_1 == result_2
+    # The stale list is kept per object, page and folded comments.
+    assert "/comment_list/16/1/1|anon|stale/16/1/1/1/" in fake_cache.store
+
+
+@pytest.mark.django_db
+def test_render_inkcomment_list_shares_list_among_users(
+    monkeypatch, an_article, an_user, an_user_2
+):
+    fake_cache = FakeCache()
+    monkeypatch.setattr(comments_ink.caching, "get_cache", lambda: fake_cache)
+    monkeypatch.setattr(
+        settings,
+        "COMMENTS_INK_APP_MODEL_OPTIONS",
+        dict(
+            settings.COMMENTS_INK_APP_MODEL_OPTIONS,
+            **{
+                "tests.article": {
+                    "comment_votes_enabled": True,
+                    "comment_flagging_enabled": True,
+                }
+            },
+        ),
+    )
+    setup_small_comments_thread(an_article)
+    CommentVote.objects.create(
+        comment_id=1, author=an_user, vote=CommentVote.POSITIVE
+    )
+    CommentFlag.objects.create(
+        comment_id=4, user=an_user, flag=CommentFlag.SUGGEST_REMOVAL
+    )
+
+    t = "{% load comments_ink %}{% render_inkcomment_list for object %}"
+    results = {}
+    for user in [an_user, an_user_2]:
+        fake_request = FakeRequest(path="/comment_list/16/1/1", user=user)
+        results[user.username] = Template(t).render(
+            Context({"request": fake_request, "object": an_article})
+        )
+
+    # Both users get the same cached list, followed by their own overlay.
+    gen = fake_cache.store["/comment_gen/16/1/1"]
+    assert fake_cache.found[f"/comment_list/16/1/1|auth|{gen}"] == True
+    html_1, overlay_1 = results[an_user.username].split(
+        '<script id="dci-user-overlay"'
+    )
+    html_2, overlay_2 = results[an_user_2.username].split(
+        '<script id="dci-user-overlay"'
+    )
+    assert html_1 == html_2
+    assert "You voted up" not in html_1
+
+    overlay_1 = json.loads(overlay_1[overlay_1.index(">") + 1 : -9])
+    assert overlay_1["votes"] == {"1": "+"}
+    assert overlay_1["flags"] == [4]
+    assert set(overlay_1["html"]) == {"cm-votes-1", "cm-flags-4"}
+    assert "You voted up" in overlay_1["html"]["cm-votes-1"]
+    assert "You have flagged" in overlay_1["html"]["cm-flags-4"]
+
+    overlay_2 = json.loads(overlay_2[overlay_2.index(">") + 1 : -9])
+    assert overlay_2 == {"votes": {}, "flags": [], "html": {}}
 
 
 def setup_small_comments_thread(an_article):
@@ -1046,7 +1196,7 @@ def test_get_inkcomment_permalink_in_page_eq_1(an_articles_comment):
 def test_get_inkcomment_permalink_in_page_gt_1(an_articles_comment):
     t = "{% load comments_ink %}" "{% get_inkcomment_permalink comment 2 %}"
     output = Template(t).render(Context({"comment": an_articles_comment}))
-    assert output == "/comments/cr/15/1/1/?cpage=2#comment-1"
+    assert output == "/comments/cr/16/1/1/?cpage=2#comment-1"
 
 
 @pytest.mark.django_db
@@ -1055,7 +1205,7 @@ def test_get_inkcomment_permalink_in_var_page_gt_1(an_articles_comment):
     output = Template(t).render(
         Context({"comment": an_articles_comment, "cpage": 2})
     )
-    assert output == "/comments/cr/15/1/1/?cpage=2#comment-1"
+    assert output == "/comments/cr/16/1/1/?cpage=2#comment-1"
 
 
 @pytest.mark.django_db
@@ -1065,7 +1215,7 @@ def test_get_inkcomment_permalink_page_1_fold_1_and_97(an_articles_comment):
         "{% get_inkcomment_permalink comment 2 '1,97' %}"
     )
     output = Template(t).render(Context({"comment": an_articles_comment}))
-    assert output == "/comments/cr/15/1/1/?cpage=2&cfold=1,97#comment-1"
+    assert output == "/comments/cr/16/1/1/?cpage=2&cfold=1,97#comment-1"
 
 
 @pytest.mark.django_db
@@ -1077,7 +1227,7 @@ def test_get_inkcomment_permalink_var_page_var_fold(an_articles_comment):
     output = Template(t).render(
         Context({"comment": an_articles_comment, "cpage": 2, "cfold": "1,97"})
     )
-    assert output == "/comments/cr/15/1/1/?cpage=2&cfold=1,97#comment-1"
+    assert output == "/comments/cr/16/1/1/?cpage=2&cfold=1,97#comment-1"
 
 
 @pytest.mark.django_db
@@ -1097,7 +1247,7 @@ def test_get_inkcomment_permalink_in_page_gt_1_custom(an_articles_comment):
         '{% get_inkcomment_permalink comment 2 "1,97" "#c%(id)s" %}'
     )
     output = Template(t).render(Context({"comment": an_articles_comment}))
-    assert output == "/comments/cr/15/1/1/?cpage=2&cfold=1,97#c1"
+    assert output == "/comments/cr/16/1/1/?cpage=2&cfold=1,97#c1"
 
 
 @pytest.mark.django_db
@@ -1626,4 +1776,85 @@ def test_render_object_reactions_form_for_object_case_2(a_diary_entry, an_user):
 def test_object_reactions_form_target(a_diary_entry):
     t = "{% load comments_ink %}{% object_reactions_form_target object %}"
     result = Template(t).render(Context({"object": a_diary_entry}))
-    assert result == "/comments/react/16/1/"
+    assert result == "/comments/react/17/1/"
+
+
+# ---------------------------------------------------------------------
+@pytest.mark.django_db
+def test_get_objects_reactions(
+    monkeypatch, django_assert_num_queries, an_object_reaction_2, an_article
+):
+    fake_cache = FakeCache()
+    monkeypatch.setattr(comments_ink.caching, "get_cache", lambda: fake_cache)
+    entries = [Diary.objects.create(body="Entry %d" % i) for i in range(3)]
+    entries.insert(1, an_object_reaction_2.content_object)
+    t = (
+        "{% load comments_ink %}"
+        "{% get_objects_reactions for objects as reactions_list %}"
+        "{% for object, object_reactions in reactions_list %}"
+        "{% for reaction in object_reactions %}"
+        "{{ reaction.counter }}{% for a in reaction.authors %} {{ a }}"
+        "{% endfor %};{% endfor %}|"
+        "{% endfor %}"
+    )
+    # The object reactions and their authors, for the 4 entries. The article
+    # has no object reactions enabled.
+    with django_assert_num_queries(2):
+        result = Template(t).render(
+            Context({"objects": [*entries, an_article]})
+        )
+    assert result == "0;0;|2 alice joe;0;|0;0;|0;0;||"
+
+    # Once cached, get_object_reactions uses the same keys.
+    with django_assert_num_queries(0):
+        result = Template(t).render(Context({"objects": entries}))
+        reactions = comments_ink.get_object_reactions(
+            an_object_reaction_2.content_type,
+            an_object_reaction_2.object_pk,
+            an_object_reaction_2.site_id,
+        )
+    assert result == "0;0;|2 alice joe;0;|0;0;|0;0;|"
+    assert reactions[0]["counter"] == 2
+
+
+@pytest.mark.django_db
+def test_get_objects_reactions_limits_users_listed(
+    monkeypatch, an_object_reaction_2
+):
+    fake_cache = FakeCache()
+    monkeypatch.setattr(comments_ink.caching, "get_cache", lambda: fake_cache)
+    monkeypatch.setattr(settings, "COMMENTS_INK_MAX_USERS_IN_TOOLTIP", 1)
+    with CaptureQueriesContext(connection) as ctx:
+        reactions = comments_ink.get_object_reactions(
+            an_object_reaction_2.content_type,
+            an_object_reaction_2.object_pk,
+            an_object_reaction_2.site_id,
+        )
+    assert reactions[0]["counter"] == 2
+    assert reactions[0]["authors"] == ["alice"]
+    # The authors of each reaction are limited in the query, not in Python.
+    if django.VERSION >= (4, 2):
+        assert "ROW_NUMBER" in ctx.captured_queries[-1]["sql"]
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize("order", [("-id",), ("id",)])
+def test_get_objects_reactions_lists_users_as_the_author_list(
+    monkeypatch, an_object_reaction_2, order
+):
+    fake_cache = FakeCache()
+    monkeypatch.setattr(comments_ink.caching, "get_cache", lambda: fake_cache)
+    monkeypatch.setattr(settings, "COMMENTS_INK_MAX_USERS_IN_TOOLTIP", 1)
+    monkeypatch.setattr(
+        settings, "COMMENTS_INK_USERS_REACTED_LIST_ORDER", order
+    )
+    reactions = comments_ink.get_object_reactions(
+        an_object_reaction_2.content_type,
+        an_object_reaction_2.object_pk,
+        an_object_reaction_2.site_id,
+    )
+    # The same users listed by ObjectReactionAuthorList, in the same order.
+    author = an_object_reaction_2.authors.order_by(*order)[0]
+    assert reactions[0]["authors"] == [
+        settings.COMMENTS_INK_API_USER_REPR(author)
+    ]
@@ -0,0 +1,104 @@
+from datetime import datetime
+
+import pytest
+from django.contrib.contenttypes.models import ContentType
+
+from django_comments_ink import signed, tokens
+from django_comments_ink.models import TmpInkComment
+
+
+def get_tmp_comment(article):
+    comment = TmpInkComment()
+    comment.update(
+        {
+            "content_type": ContentType.objects.get_for_model(article),
+            "object_pk": str(article.pk),
+            "content_object": article,
+            "site_id": 1,
+            "user_name": "Alice",
+            "user_email": "alice@example.com",
+            "user_url": "",
+            "comment": "A comment ’ to confirm.",
+            "submit_date": datetime(2022, 5, 14, 10, 30, 15, 123456),
+            "is_public": True,
+            "is_removed": False,
+            "ip_address": "127.0.0.1",
+            "parent_id": 0,
+            "level": 0,
+            "order": 1,
+            "followup": True,
+            "comments_page": 2,
+        }
+    )
+    return comment
+
+
+@pytest.mark.django_db
+def test_confirmation_token_is_reversible(an_article):
+    comment = get_tmp_comment(an_article)
+    key = tokens.dumps(comment, extra_key=b"salt")
+    data = tokens.loads(key.decode("utf-8"), extra_key=b"salt")
+    assert isinstance(data, TmpInkComment)
+    assert "content_object" not in data
+    for field in tokens.CONFIRM_FIELDS:
+        assert data[field] == comment[field]
+    # The target object is retrieved when used.
+    assert data.content_object == an_article
+
+
+@pytest.mark.django_db
+def test_mute_token_is_shorter_than_a_signed_pickle(an_articles_comment):
+    key = tokens.dumps(an_articles_comment, kind=tokens.MUTE)
+    legacy_key = signed.dumps(an_articles_comment, compress=True)
+    assert len(key) < len(legacy_key) / 4
+
+    data = tokens.loads(key)
+    assert set(data) == set(tokens.MUTE_FIELDS)
+    assert data.content_type == an_articles_comment.content_type
+    assert data.submit_date == an_articles_comment.submit_date
+    assert data.user_email == an_articles_comment.user_email
+
+
+@pytest.mark.django_db
+def test_loads_detects_tampering(an_article):
+    key = tokens.dumps(get_tmp_comment(an_article))
+    transforms = (
+        lambda s: s[:-1],
+        lambda s: s + b"a",
+        lambda s: s.replace(b".", b""),
+        lambda s: tokens.dumps(get_tmp_comment(an_article)).split(b".")[0]
+        + b"."
+        + s.split(b".")[1][::-1],
+    )
+    for transform in transforms:
+        with pytest.raises(signed.BadSignature):
+            tokens.loads(transform(key))
+    with pytest.raises(signed.BadSignature):
+        tokens.loads(key, extra_key=b"another salt")
+
+
+@pytest.mark.django_db
+def test_loads_rejects_tokens_of_another_kind(an_articles_comment):
+    confirm_key = tokens.dumps(an_articles_comment, kind=tokens.CONFIRM)
+    mute_key = tokens.dumps(an_articles_comment, kind=tokens.MUTE)
+    with pytest.raises(signed.BadSignature):
+        tokens.loads(confirm_key, expected_kind=tokens.MUTE)
+    with pytest.raises(signed.BadSignature):
+        tokens.loads(mute_key, expected_kind=tokens.CONFIRM)
+    data = tokens.loads(mute_key, expected_kind=tokens.MUTE)
+    assert set(data) == set(tokens.MUTE_FIELDS)
+
+
+@pytest.mark.django_db
+def test_loads_legacy_tokens(monkeypatch, an_article):
+    comment = get_tmp_comment(an_article)
+    legacy_key = signed.dumps(comment, compress=True, extra_key=b"salt")
+    data = tokens.loads(legacy_key, extra_key=b"salt")
+    assert data.user_email == "alice@example.com"
+    assert data.content_object == an_article
+
+    monkeypatch.setattr(
+        tokens.settings, "COMMENTS_INK_LEGACY_TOKENS", False, raising=False
+    )
+    with pytest.raises(signed.BadSignature):
+        tokens.loads(legacy_key, extra_key=b"salt")
@@ -0,0 +1,141 @@
+import multiprocessing
+import subprocess
+import sys
+from concurrent.futures import Future
+from io import StringIO
+
+import pytest
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from django_comments_ink import caching
+from django_comments_ink.management.commands import update_nested_count
+from django_comments_ink.models import InkComment
+from django_comments_ink.tests.test_models import create_thread_steps_1_to_6
+
+
+class SerialExecutor:
+    """Runs the tasks submitted in the current process."""
+
+    def __init__(self, max_workers=None, initializer=None):
+        self.max_workers = max_workers
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+    def submit(self, fn, *args, **kwargs):
+        future = Future()
+        future.set_result(fn(*args, **kwargs))
+        return future
+
+
+def get_nested_counts():
+    return dict(InkComment.norel_objects.values_list("pk", "nested_count"))
+
+
+@pytest.mark.django_db
+def test_update_nested_count_dry_run(an_article):
+    create_thread_steps_1_to_6(an_article)
+    expected = get_nested_counts()
+    InkComment.norel_objects.filter(pk__in=[1, 8]).update(nested_count=0)
+
+    output = StringIO()
+    call_command("update_nested_count", dry_run=True, stdout=output)
+    assert output.getvalue() == (
+        "Checked 0 InkComments for tests.diary.\n"
+        "Checked additional 11 InkComments.\n"
+        "2 InkComment object(s) with a wrong nested_count.\n"
+        "11 InkComment object(s) processed in all DBs.\n"
+    )
+    assert get_nested_counts() != expected
+
+
+@pytest.mark.django_db
+def test_update_nested_count_writes_only_changed_rows(an_article):
+    create_thread_steps_1_to_6(an_article)
+    expected = get_nested_counts()
+    InkComment.norel_objects.filter(pk__in=[1, 8]).update(nested_count=0)
+    generation = caching.get_generation(
+        InkComment.objects.get(pk=1).content_type_id, an_article.pk, 1
+    )
+
+    output = StringIO()
+    with CaptureQueriesContext(connection) as ctx:
+        call_command("update_nested_count", verbosity=2, stdout=output)
+    assert get_nested_counts() == expected
+    assert "InkComment 1: nested_count 0 -> 6.\n" in output.getvalue()
+    assert "InkComment 8: nested_count 0 -> 1.\n" in output.getvalue()
+    assert output.getvalue().endswith(
+        "2 InkComment object(s) with a wrong nested_count fixed.\n"
+        "11 InkComment object(s) processed in all DBs.\n"
+    )
+    updates = [q for q in ctx.captured_queries if q["sql"].startswith("UPDATE")]
+    assert len(updates) == 1
+    # The cache of the article is cleared once.
+    assert (
+        caching.get_generation(
+            InkComment.objects.get(pk=1).content_type_id, an_article.pk, 1
+        )
+        == generation + 1
+    )
+
+
+@pytest.mark.django_db
+def test_update_nested_count_with_workers(an_article, monkeypatch):
+    monkeypatch.setattr(
+        update_nested_count, "ProcessPoolExecutor", SerialExecutor
+    )
+    create_thread_steps_1_to_6(an_article)
+    expected = get_nested_counts()
+    InkComment.norel_objects.update(nested_count=0)
+
+    output = StringIO()
+    call_command("update_nested_count", workers=3, stdout=output)
+    assert get_nested_counts() == expected
+    assert output.getvalue().endswith(
+        "7 InkComment object(s) with a wrong nested_count fixed.\n"
+        "11 InkComment object(s) processed in all DBs.\n"
+    )
+
+
+def test_workers_module_is_importable_before_django_setup():
+    # Workers started with 'spawn' unpickle their tasks before django.setup().
+    subprocess.run(
+        [sys.executable, "-c", "import django_comments_ink.management.workers"],
+        check=True,
+    )
+
+
+# The in-memory test DB reaches the workers only when they are forked.
+@pytest.mark.skipif(
+    multiprocessing.get_start_method() != "fork",
+    reason="Workers don't share the in-memory test DB.",
+)
+@pytest.mark.django_db(transaction=True, reset_sequences=True)
+def test_update_nested_count_with_process_pool(an_article):
+    create_thread_steps_1_to_6(an_article)
+    InkComment.norel_objects.filter(pk__in=[1, 8]).update(nested_count=0)
+
+    output = StringIO()
+    call_command("update_nested_count", dry_run=True, workers=2, stdout=output)
+    assert output.getvalue().endswith(
+        "2 InkComment object(s) with a wrong nested_count.\n"
+        "11 InkComment object(s) processed in all DBs.\n"
+    )
+    # The connection of the command is still usable.
+    assert InkComment.norel_objects.count() == 11
+
+
+@pytest.mark.django_db
+def test_update_nested_count_raise_ConnectionDoesNotExist(an_article):
+    output = StringIO()
+    call_command("update_nested_count", "nondb", stdout=output)
+    assert output.getvalue() == (
+        "DB connection 'nondb' does not exist.\n"
+        "0 InkComment object(s) with a wrong nested_count fixed.\n"
+        "0 InkComment object(s) processed in all DBs.\n"
+    )
@@ -1,12 +1,16 @@
 from datetime import datetime
 
 import pytest
+from django.apps import apps
 from django.contrib.contenttypes.models import ContentType
 from django.contrib.sites.models import Site
+from django.core import mail
+from django.core.signals import setting_changed
 from django.utils.functional import cached_property
 from django_comments_ink import get_model, utils
 from django_comments_ink.conf import settings
 from django_comments_ink.conf.defaults import COMMENTS_INK_APP_MODEL_OPTIONS
+from django_comments_ink.dispatcher import MailDispatcher
 from django_comments_ink.paginator import CommentsPaginator
 from django_comments_ink.tests import models
 
@@ -14,7 +18,9 @@ InkComment = get_model()
 
 
 @pytest.mark.django_db
-def test_send_mail_uses_EmailThread(monkeypatch):
+def test_send_mail_uses_the_dispatcher(monkeypatch):
+    dispatcher = MailDispatcher(workers=1, retry_delay=0)
+    monkeypatch.setattr(utils, "get_dispatcher", lambda: dispatcher)
     monkeypatch.setattr(utils.settings, "COMMENTS_INK_THREADED_EMAILS", True)
     utils.send_mail(
         "the subject",
@@ -23,7 +29,37 @@ def test_send_mail_uses_EmailThread(monkeypatch):
         ["fulanito@example.com"],
         html="<p>The message.</p>",
     )
-    assert utils.mail_sent_queue.get() == True
+    dispatcher.join()
+    dispatcher.shutdown()
+    assert dispatcher.stats()["sent"] == 1
+    assert mail.outbox[0].to == ["fulanito@example.com"]
+
+
+class FakeDispatcher:
+    def __init__(self):
+        self.jobs = []
+
+    def submit(self, job):
+        self.jobs.append(job)
+
+
+@pytest.mark.parametrize("fail_silently", [False, True])
+def test_dispatched_jobs_keep_fail_silently(monkeypatch, fail_silently):
+    dispatcher = FakeDispatcher()
+    monkeypatch.setattr(utils, "get_dispatcher", lambda: dispatcher)
+    monkeypatch.setattr(utils.settings, "COMMENTS_INK_THREADED_EMAILS", True)
+    utils.send_mail(
+        "the subject",
+        "the message",
+        "helpdesk@example.com",
+        ["fulanito@example.com"],
+        fail_silently=fail_silently,
+    )
+    utils.send_messages([], fail_silently=fail_silently)
+    assert [job.fail_silently for job in dispatcher.jobs] == [
+        fail_silently,
+        fail_silently,
+    ]
 
 
 # ---------------------------------------
@@ -49,6 +85,83 @@ def test_send_mail_uses__send_amil(monkeypatch):
     assert send_mail_called == True
 
 
+# ---------------------------------------
+class FakeConnection:
+    def __init__(self):
+        self.opened = 0
+        self.chunks = []
+
+    def __enter__(self):
+        self.opened += 1
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+    def send_messages(self, messages):
+        self.chunks.append([message.to[0] for message in messages])
+        return len(messages)
+
+
+def test_send_messages_in_chunks_over_one_connection(monkeypatch):
+    connection = FakeConnection()
+    monkeypatch.setattr(utils, "get_connection", lambda **kwargs: connection)
+    monkeypatch.setattr(utils.settings, "COMMENTS_INK_THREADED_EMAILS", False)
+    monkeypatch.setattr(utils.settings, "COMMENTS_INK_MAIL_CHUNK_SIZE", 2)
+    messages = (
+        utils.get_message("subject", "body", "helpdesk@example.com", [email])
+        for email in ["a@example.com", "b@example.com", "c@example.com"]
+    )
+    utils.send_messages(messages)
+    assert connection.opened == 1
+    assert connection.chunks == [
+        ["a@example.com", "b@example.com"],
+        ["c@example.com"],
+    ]
+
+
+def test_messages_job_resumes_with_the_chunk_that_failed(monkeypatch):
+    connection = FakeConnection()
+    send_messages = connection.send_messages
+    failures = [True]
+
+    def fail_once(messages):
+        if failures.pop() if len(failures) else False:
+            raise ConnectionError("SMTP server gone")
+        return send_messages(messages)
+
+    connection.send_messages = fail_once
+    monkeypatch.setattr(utils, "get_connection", lambda **kwargs: connection)
+    monkeypatch.setattr(utils.settings, "COMMENTS_INK_MAIL_CHUNK_SIZE", 2)
+    job = utils.MessagesJob(
+        utils.get_message("subject", "body", "helpdesk@example.com", [email])
+        for email in ["a@example.com", "b@example.com", "c@example.com"]
+    )
+    with pytest.raises(ConnectionError):
+        job()
+    assert job() == 3
+    assert connection.chunks == [
+        ["a@example.com", "b@example.com"],
+        ["c@example.com"],
+    ]
+
+
+def test_send_messages_to_locmem_backend(monkeypatch):
+    monkeypatch.setattr(utils.settings, "COMMENTS_INK_THREADED_EMAILS", False)
+    messages = (
+        utils.get_message(
+            "subject", "body", "helpdesk@example.com", [email], html="<p/>"
+        )
+        for email in ["a@example.com", "b@example.com"]
+    )
+    assert utils._send_messages(messages) == 2
+    assert [message.to for message in mail.outbox] == [
+        ["a@example.com"],
+        ["b@example.com"],
+    ]
+    assert mail.outbox[0].alternatives[0][0] == "<p/>"
+
+
 # ----------------------------------------------
 @pytest.mark.django_db
 def test_get_app_model_options_without_args():
@@ -113,7 +226,7 @@ def test_get_app_model_options_with_comment(an_articles_comment, monkeypatch):
         default_and_article_options,
     )
     _options = utils.get_app_model_options(comment=an_articles_comment)
-    expected_options = default_and_article_options["default"]
+    expected_options = dict(default_and_article_options["default"])
     expected_options.update(default_and_article_options["tests.article"])
     assert _options == expected_options
 
@@ -127,7 +240,7 @@ def test_get_app_model_options_with_content_type(monkeypatch):
     )
     ctype = ContentType.objects.get_for_model(models.Article)
     _options = utils.get_app_model_options(content_type=ctype)
-    expected_options = default_and_article_options["default"]
+    expected_options = dict(default_and_article_options["default"])
     expected_options.update(default_and_article_options["tests.article"])
     assert _options == expected_options
 
@@ -142,6 +255,59 @@ def test_get_app_model_options_with_content_type_None(monkeypatch):
     _options = utils.get_app_model_options(content_type=None)
     expected_options = default_and_article_options["default"]
     assert _options == expected_options
+    # The defaults of the app are not modified.
+    assert COMMENTS_INK_APP_MODEL_OPTIONS["default"][
+        "comment_votes_enabled"
+    ] == (False)
+
+
+@pytest.mark.django_db
+def test_get_app_model_options_does_not_load_the_content_object(
+    an_articles_comment, django_assert_num_queries
+):
+    comment = InkComment.objects.get(pk=an_articles_comment.pk)
+    comment.content_type  # Retrieved once by ContentType's cache.
+    with django_assert_num_queries(0):
+        options = utils.get_app_model_options(comment=comment)
+    assert options["comment_flagging_enabled"] == False
+    # Callers get a copy they can modify.
+    options.pop("check_input_allowed")
+    assert "check_input_allowed" in utils.get_app_model_options(comment=comment)
+
+
+@pytest.mark.django_db
+def test_get_app_model_options_is_rebuilt_on_setting_changed(settings):
+    options = dict(
+        COMMENTS_INK_APP_MODEL_OPTIONS,
+        **{"tests.diary": {"who_can_post": "users"}},
+    )
+    settings.COMMENTS_INK_APP_MODEL_OPTIONS = options
+    ctype = ContentType.objects.get_for_model(models.Diary)
+    assert utils.get_app_model_options(content_type=ctype)["who_can_post"] == (
+        "users"
+    )
+    settings.COMMENTS_INK_APP_MODEL_OPTIONS = COMMENTS_INK_APP_MODEL_OPTIONS
+    assert utils.get_app_model_options(content_type=ctype)["who_can_post"] == (
+        "all"
+    )
+
+
+def test_setting_changed_receivers_are_connected_once():
+    def count_receivers():
+        return sum(
+            key in ("dci_symbol_settings", "dci_app_model_options")
+            for (key, _), *_ in setting_changed.receivers
+        )
+
+    assert count_receivers() == 2
+    apps.get_app_config("django_comments_ink").ready()
+    assert count_receivers() == 2
+
+
+def test_get_check_input_allowed_imports_once():
+    path = "django_comments_ink.utils.check_input_allowed"
+    assert utils.get_check_input_allowed(path) is utils.check_input_allowed
+    assert path in utils._check_input_allowed_funcs
 
 
 # ----------------------------------------------
@@ -172,14 +338,14 @@ class FakeRequest:
 def test_redirect_to_with_request(an_articles_comment):
     request = FakeRequest(cpage=2)
     http_response = utils.redirect_to(an_articles_comment, request)
-    assert http_response.url == "/comments/cr/15/1/1/?cpage=2#comment-1"
+    assert http_response.url == "/comments/cr/16/1/1/?cpage=2#comment-1"
 
 
 # ----------------------------------------------
 @pytest.mark.django_db
 def test_redirect_to_with_page_number(an_articles_comment):
     http_response = utils.redirect_to(an_articles_comment, comments_page=2)
-    assert http_response.url == "/comments/cr/15/1/1/?cpage=2#comment-1"
+    assert http_response.url == "/comments/cr/16/1/1/?cpage=2#comment-1"
 
 
 # ----------------------------------------------
@@ -245,6 +411,34 @@ def test_get_comment_page_number(an_article):
         assert page_number == 3
 
 
+@pytest.mark.django_db
+def test_get_comment_page_number_does_not_load_pages(
+    an_article, django_assert_num_queries
+):
+    create_scenario_1(an_article)
+    comment = InkComment.objects.filter(level=1).last()
+    # One query to check that the comment is listed, one to build the
+    # layout of the pages and one to count the comments. None of the
+    # pages is loaded.
+    with django_assert_num_queries(3):
+        assert utils.get_comment_page_number(None, comment) == 3
+
+
+@pytest.mark.django_db
+def test_get_comment_page_number_for_unlisted_comment(an_article):
+    create_scenario_1(an_article)
+    comment = InkComment.objects.filter(level=1).first()
+    with pytest.raises(Exception):
+        utils.get_comment_page_number(
+            None, comment, comments_folded={comment.thread_id}
+        )
+
+    comment.is_public = False
+    comment.save()
+    with pytest.raises(Exception):
+        utils.get_comment_page_number(None, comment)
+
+
 # -------------------------------------------
 class FakeCommentsPaginator(CommentsPaginator):
     @cached_property
@@ -14,6 +14,7 @@ import pytest
 from django.contrib.auth.models import AnonymousUser, User
 from django.contrib.contenttypes.models import ContentType
 from django.contrib.sites.models import Site
+from django.core import mail
 from django.core.exceptions import ObjectDoesNotExist, ValidationError
 from django.http import Http404, JsonResponse
 from django.test import RequestFactory, TestCase
@@ -24,7 +25,7 @@ from django_comments.views.comments import CommentPostBadRequest
 from rest_framework import status
 from rest_framework.exceptions import ErrorDetail, PermissionDenied
 
-from django_comments_ink import signals, signed
+from django_comments_ink import signals, tokens
 from django_comments_ink.conf import settings
 from django_comments_ink.models import (
     CommentReaction,
@@ -125,7 +126,9 @@ def confirm_comment_url(key, follow=True):
         reverse("comments-ink-confirm", kwargs={"key": key}), follow=follow
     )
     request.user = AnonymousUser()
-    return confirm(request, key)
+    # Follow-up notifications are sent once the comment is committed.
+    with TestCase.captureOnCommitCallbacks(execute=True):
+        return confirm(request, key)
 
 
 app_model_options_mock = {"tests.article": {"who_can_post": "users"}}
@@ -236,6 +239,14 @@ class ConfirmCommentTestCase(TestCase):
     def setUp(self):
         patcher = patch("django_comments_ink.views.commenting.utils.send_mail")
         self.mock_mailer = patcher.start()
+        self.addCleanup(patcher.stop)
+        # Follow-up notifications are sent without threads, to mail.outbox.
+        settings_patcher = patch.multiple(
+            "django_comments_ink.conf.settings",
+            COMMENTS_INK_THREADED_EMAILS=False,
+        )
+        settings_patcher.start()
+        self.addCleanup(settings_patcher.stop)
         # Create random string so that it's harder for zlib to compress
         content = "".join(random.choice(string.printable) for _ in range(6096))
         self.article = Article.objects.create(
@@ -263,7 +274,6 @@ class ConfirmCommentTestCase(TestCase):
                 self.mock_mailer.call_args[0][1],
             ).group("key")
         )
-        self.addCleanup(patcher.stop)
 
     def test_confirm_url_is_short_enough(self):
         # Tests that the length of the confirm url's length isn't
@@ -302,7 +312,7 @@ class ConfirmCommentTestCase(TestCase):
         # and redirects to the article detail page
         Site.objects.get_current().domain = "testserver"  # django bug #7743
         response = confirm_comment_url(self.key, follow=False)
-        data = signed.loads(self.key, extra_key=settings.COMMENTS_INK_SALT)
+        data = tokens.loads(self.key, extra_key=settings.COMMENTS_INK_SALT)
         try:
             comment = InkComment.objects.get(
                 content_type=data["content_type"],
@@ -345,25 +355,23 @@ class ConfirmCommentTestCase(TestCase):
             self.mock_mailer.call_args[0][1],
         ).group("key")
         confirm_comment_url(self.key)
-        self.assertEqual(self.mock_mailer.call_count, 3)
-        self.assertTrue(
-            # We can find the 'comment' in the text_message.
-            self.mock_mailer.call_args[0][1].index(data["comment"])
-            > -1
-        )
-        articles_title = f"Post: {self.article.title}"
-        self.assertTrue(
-            # We can find article's title (comment.content_object.title).
-            self.mock_mailer.call_args[0][1].index(articles_title)
-            > -1
-        )
-        self.assertTrue(self.mock_mailer.call_args[0][3] == ["bob@example.com"])
+        self.assertEqual(self.mock_mailer.call_count, 2)
+        self.assertEqual(len(mail.outbox), 1)
+        message = mail.outbox[0]
+        # We can find the 'comment' in the text_message.
+        self.assertTrue(data["comment"] in message.body)
+        # We can find article's title (comment.content_object.title).
+        self.assertTrue(f"Post: {self.article.title}" in message.body)
+        self.assertEqual(message.to, ["bob@example.com"])
+        self.assertTrue("Bob," in message.body)
+        self.assertFalse("dci-" in message.body)
         self.assertTrue(
-            self.mock_mailer.call_args[0][1].find(
-                "There is a new comment following up yours."
-            )
-            > -1
+            "There is a new comment following up yours." in message.body
         )
+        html, mimetype = message.alternatives[0]
+        self.assertEqual(mimetype, "text/html")
+        mute_url = re.search(r"http://.+/mute/[^/]+/", message.body).group(0)
+        self.assertEqual(html.count(mute_url), 2)
 
     @patch.multiple(
         "django_comments_ink.conf.settings", COMMENTS_INK_SEND_HTML_EMAIL=False
@@ -398,15 +406,13 @@ class ConfirmCommentTestCase(TestCase):
             self.mock_mailer.call_args[0][1],
         ).group("key")
         confirm_comment_url(self.key)
-        self.assertEqual(self.mock_mailer.call_count, 3)
-        self.assertTrue(self.mock_mailer.call_args[0][3] == ["bob@example.com"])
+        self.assertEqual(self.mock_mailer.call_count, 2)
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].to, ["bob@example.com"])
         self.assertTrue(
-            self.mock_mailer.call_args[0][1].find(
-                "There is a new comment following up yours."
-            )
-            > -1
+            "There is a new comment following up yours." in mail.outbox[0].body
         )
-        self.assertEqual(self.mock_mailer.call_args[1], {"html": None})
+        self.assertEqual(mail.outbox[0].alternatives, [])
 
     def test_notify_followers_dupes(self):
         # first of all confirm Bob's comment otherwise it doesn't reach DB
@@ -466,13 +472,13 @@ class ConfirmCommentTestCase(TestCase):
             self.mock_mailer.call_args[0][1],
         ).group("key")
         confirm_comment_url(self.key)
-        self.assertEqual(self.mock_mailer.call_count, 4)
-        self.assertTrue(self.mock_mailer.call_args[0][3] == ["bob@example.com"])
+        self.assertEqual(self.mock_mailer.call_count, 3)
+        # The moderator of the diary got a notification of Charlie's comment.
+        messages = [m for m in mail.outbox if m.to == ["bob@example.com"]]
+        self.assertEqual(len(mail.outbox), 2)
+        self.assertEqual(len(messages), 1)
         self.assertTrue(
-            self.mock_mailer.call_args[0][1].find(
-                "There is a new comment following up yours."
-            )
-            > -1
+            "There is a new comment following up yours." in messages[0].body
         )
 
     def test_no_notification_for_same_user_email(self):
@@ -582,6 +588,14 @@ class MuteFollowUpTestCase(TestCase):
         # Second comment has to send one notification (to Bob).
         patcher = patch("django_comments_ink.views.commenting.utils.send_mail")
         self.mock_mailer = patcher.start()
+        self.addCleanup(patcher.stop)
+        # Follow-up notifications are sent without threads, to mail.outbox.
+        settings_patcher = patch.multiple(
+            "django_comments_ink.conf.settings",
+            COMMENTS_INK_THREADED_EMAILS=False,
+        )
+        settings_patcher.start()
+        self.addCleanup(settings_patcher.stop)
         self.article = Article.objects.create(
             title="September", slug="september", body="John's September"
         )
@@ -603,13 +617,13 @@ class MuteFollowUpTestCase(TestCase):
         self.assertEqual(response.status_code, 302)
         self.assertTrue(response.url.startswith("/comments/sent/?c="))
         self.assertTrue(self.mock_mailer.call_count == 1)
-        bobkey = str(
+        self.bobs_confirmkey = str(
             re.search(
                 r"http://.+/confirm/(?P<key>[\S]+)/",
                 self.mock_mailer.call_args[0][1],
             ).group("key")
         )
-        confirm_comment_url(bobkey)  # confirm Bob's comment
+        confirm_comment_url(self.bobs_confirmkey)  # confirm Bob's comment
 
         # Alice sends 2nd comment to the article with follow-up
         data = {
@@ -636,14 +650,14 @@ class MuteFollowUpTestCase(TestCase):
         confirm_comment_url(alicekey)  # confirm Alice's comment
 
         # Bob receives a follow-up notification
-        self.assertTrue(self.mock_mailer.call_count == 3)
+        self.assertTrue(self.mock_mailer.call_count == 2)
+        self.assertEqual(len(mail.outbox), 1)
         self.bobs_mutekey = str(
             re.search(
                 r"http://.+/mute/(?P<key>[\S]+)/",
-                self.mock_mailer.call_args[0][1],
+                mail.outbox[0].body,
             ).group("key")
         )
-        self.addCleanup(patcher.stop)
 
     def get_mute_followup_url(self, key):
         request = request_factory.get(
@@ -676,7 +690,7 @@ class MuteFollowUpTestCase(TestCase):
         self.assertEqual(response.status_code, 302)
         self.assertTrue(response.url.startswith("/comments/sent/?c="))
         # Alice confirms her comment...
-        self.assertTrue(self.mock_mailer.call_count == 4)
+        self.assertTrue(self.mock_mailer.call_count == 3)
         alicekey = str(
             re.search(
                 r"http://.+/confirm/(?P<key>[\S]+)/",
@@ -686,7 +700,8 @@ class MuteFollowUpTestCase(TestCase):
         confirm_comment_url(alicekey)  # confirm Alice's comment.
         # Alice confirmed her comment, but this time Bob won't receive any
         # notification, neither do Alice being the sender.
-        self.assertTrue(self.mock_mailer.call_count == 4)
+        self.assertTrue(self.mock_mailer.call_count == 3)
+        self.assertEqual(len(mail.outbox), 1)
 
     def test_mute_followup_notifications_with_wrong_key(self):
         # Bob's receive a notification and click on the mute link to
@@ -701,6 +716,16 @@ class MuteFollowUpTestCase(TestCase):
         self.assertEqual(response.status_code, 400)
         self.assertTrue(response.content.find(b"Bad Request") > -1)
 
+    def test_mute_followup_notifications_with_confirmation_key(self):
+        # Bob's confirmation key is valid, but it's not a mute key.
+        key = self.bobs_confirmkey
+        request = request_factory.get(
+            reverse("comments-ink-mute", kwargs={"key": key}), follow=True
+        )
+        request.user = AnonymousUser()
+        response = MuteCommentView.as_view()(request, key)
+        self.assertEqual(response.status_code, 400)
+
     def test_muting_twice_raise_http_404(self):
         # Mute one time.
         self.get_mute_followup_url(self.bobs_mutekey)
@@ -720,6 +745,7 @@ class HTMLDisabledMailTestCase(TestCase):
         # to see wheter messages has multiparts or not.
         patcher = patch("django_comments_ink.views.commenting.utils.send_mail")
         self.mock_mailer = patcher.start()
+        self.addCleanup(patcher.stop)
         self.article = Article.objects.create(
             title="September", slug="september", body="John's September"
         )
@@ -760,6 +786,85 @@ class HTMLDisabledMailTestCase(TestCase):
         self.assertTrue(self.mock_mailer.call_args[1]["html"] is not None)
 
 
+@pytest.mark.django_db
+def test_notify_comment_followers_in_one_query(
+    monkeypatch,
+    django_assert_num_queries,
+    django_capture_on_commit_callbacks,
+    an_article,
+):
+    monkeypatch.setattr(
+        commenting.settings, "COMMENTS_INK_THREADED_EMAILS", False
+    )
+    fields = {
+        "content_type": ContentType.objects.get_for_model(an_article),
+        "object_pk": an_article.pk,
+        "site": Site.objects.get(pk=1),
+        "followup": True,
+    }
+    for name in ["Bob", "Alice", "Bob", "Charlie", "Bob"]:
+        InkComment.objects.create(
+            user_name=name,
+            user_email="%s@example.com" % name.lower(),
+            comment="Comment by %s." % name,
+            submit_date=datetime.now(),
+            **fields,
+        )
+    comment = InkComment.objects.create(
+        user_name="Charlie",
+        user_email="charlie@example.com",
+        comment="Last comment.",
+        submit_date=datetime.now(),
+        **fields,
+    )
+
+    with django_assert_num_queries(1):
+        followers = commenting.get_comment_followers(comment)
+    assert [follower.user_email for follower in followers] == [
+        "alice@example.com",
+        "bob@example.com",
+    ]
+
+    with django_capture_on_commit_callbacks(execute=True):
+        commenting.notify_comment_followers(comment)
+    assert [message.to for message in mail.outbox] == [
+        ["alice@example.com"],
+        ["bob@example.com"],
+    ]
+    assert "Alice," in mail.outbox[0].body
+    assert "Bob," in mail.outbox[1].body
+    # Each follower gets its own mute URL.
+    mute_urls = [
+        re.search(r"/mute/[^/]+/", message.body).group(0)
+        for message in mail.outbox
+    ]
+    assert mute_urls[0] != mute_urls[1]
+    for mute_url in mute_urls:
+        response = MuteCommentView.as_view()(
+            request_factory.get(mute_url), mute_url.split("/")[-2]
+        )
+        assert response.status_code == 200
+
+
+@pytest.mark.django_db
+def test_notify_comment_followers_waits_for_the_commit(
+    monkeypatch, django_capture_on_commit_callbacks, an_article
+):
+    sent = []
+    monkeypatch.setattr(commenting, "send_followup_notifications", sent.append)
+    comment = InkComment.objects.create(
+        content_type=ContentType.objects.get_for_model(an_article),
+        object_pk=an_article.pk,
+        site=Site.objects.get(pk=1),
+        comment="A comment.",
+        submit_date=datetime.now(),
+    )
+    with django_capture_on_commit_callbacks(execute=True):
+        commenting.notify_comment_followers(comment)
+        assert sent == []
+    assert sent == [comment]
+
+
 # ---------------------------------------------------------------------
 # Test module level `_*_tmpl` variables. Verify that they include
 # the them (settings.COMMENTS_INK_THEME) in the path when that
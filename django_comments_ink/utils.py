@@ -1,79 +1,134 @@
 import hashlib
 import logging
 import os
-import queue as queue
-import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from itertools import islice
+from types import MappingProxyType
 from urllib.parse import urlencode
 
-from django.contrib.contenttypes.models import ContentType
 from django.contrib.sites.shortcuts import get_current_site
-from django.core.mail import EmailMultiAlternatives
+from django.core.mail import EmailMultiAlternatives, get_connection
 from django.db.models import Q
 from django.http.response import HttpResponseRedirect
 from django.utils.crypto import salted_hmac
+from django.utils.module_loading import import_string
 
 from rest_framework import status
 from rest_framework.exceptions import PermissionDenied
 
-from django_comments_ink import get_model
+from django_comments_ink import caching, get_model
 from django_comments_ink.conf import settings
 from django_comments_ink.conf.defaults import COMMENTS_INK_APP_MODEL_OPTIONS
+from django_comments_ink.dispatcher import get_dispatcher
 from django_comments_ink.paginator import CommentsPaginator
 
 
 logger = logging.getLogger(__name__)
 
-mail_sent_queue = queue.Queue()
 
+_sending_synchronously = ContextVar("sending_synchronously", default=False)
 
-class EmailThread(threading.Thread):
-    # Idea borrowed from Selwin Ong post:
-    # http://ui.co.id/blog/asynchronous-send_mail-in-django
-    def __init__(
-        self, subject, body, from_email, recipient_list, fail_silently, html
-    ):
-        self.subject = subject
-        self.body = body
-        self.recipient_list = recipient_list
-        self.from_email = from_email
+
+def get_message(subject, body, from_email, recipient_list, html=None):
+    msg = EmailMultiAlternatives(subject, body, from_email, recipient_list)
+    if html:
+        msg.attach_alternative(html, "text/html")
+    return msg
+
+
+class MessagesJob:
+    """
+    Sends the email messages produced by the iterable `messages` over one
+    connection, in chunks of COMMENTS_INK_MAIL_CHUNK_SIZE messages.
+
+    If sending a chunk fails, calling the job again resumes with that chunk.
+    """
+
+    def __init__(self, messages, fail_silently=False):
+        self.messages = iter(messages)
         self.fail_silently = fail_silently
-        self.html = html
-        threading.Thread.__init__(self)
+        self.chunk = []
+        self.num_sent = 0
 
-    def run(self):
-        _send_mail(
-            self.subject,
-            self.body,
-            self.from_email,
-            self.recipient_list,
-            self.fail_silently,
-            self.html,
-        )
-        mail_sent_queue.put(True)
+    def __call__(self):
+        chunk_size = max(settings.COMMENTS_INK_MAIL_CHUNK_SIZE, 1)
+        with get_connection(fail_silently=self.fail_silently) as connection:
+            while True:
+                if not len(self.chunk):
+                    self.chunk = list(islice(self.messages, chunk_size))
+                    if not len(self.chunk):
+                        return self.num_sent
+                self.num_sent += connection.send_messages(self.chunk) or 0
+                self.chunk = []
+
+    def __repr__(self):
+        return "<MessagesJob: %d sent>" % self.num_sent
 
 
 def _send_mail(
     subject, body, from_email, recipient_list, fail_silently=False, html=None
 ):
-    msg = EmailMultiAlternatives(subject, body, from_email, recipient_list)
-    if html:
-        msg.attach_alternative(html, "text/html")
+    msg = get_message(subject, body, from_email, recipient_list, html)
     msg.send(fail_silently)
 
 
+def _send_messages(messages, fail_silently=False):
+    """
+    Sends the email messages produced by the iterable `messages` over one
+    connection, in chunks of COMMENTS_INK_MAIL_CHUNK_SIZE messages.
+
+    Returns the number of messages sent.
+    """
+    return MessagesJob(messages, fail_silently)()
+
+
+@contextmanager
+def sending_synchronously():
+    """
+    Within this context, emails are sent before send_mail and send_messages
+    return, even if COMMENTS_INK_THREADED_EMAILS is True.
+    """
+    token = _sending_synchronously.set(True)
+    try:
+        yield
+    finally:
+        _sending_synchronously.reset(token)
+
+
+def use_dispatcher():
+    return (
+        settings.COMMENTS_INK_THREADED_EMAILS
+        and not _sending_synchronously.get()
+    )
+
+
 def send_mail(
     subject, body, from_email, recipient_list, fail_silently=False, html=None
 ):
-    if settings.COMMENTS_INK_THREADED_EMAILS:
-        EmailThread(
-            subject, body, from_email, recipient_list, fail_silently, html
-        ).start()
+    if use_dispatcher():
+        # Failures are retried, and logged, by the dispatcher, unless the
+        # connection is told to fail silently.
+        msg = get_message(subject, body, from_email, recipient_list, html)
+        get_dispatcher().submit(MessagesJob([msg], fail_silently))
     else:
         _send_mail(
             subject, body, from_email, recipient_list, fail_silently, html
         )
 
 
+def send_messages(messages, fail_silently=False):
+    """
+    Sends the email messages produced by the iterable `messages`, using
+    the mail dispatcher when COMMENTS_INK_THREADED_EMAILS is True. In that
+    case, `messages` must not query the database.
+    """
+    if use_dispatcher():
+        get_dispatcher().submit(MessagesJob(messages, fail_silently))
+    else:
+        _send_messages(messages, fail_silently)
+
+
 # --------------------------------------------------------------------
 def get_max_thread_level(content_type):
     """Get the max_thread_level for a given content_type."""
@@ -83,43 +138,103 @@ def get_max_thread_level(content_type):
 
 
 # --------------------------------------------------------------------
+class AppModelOptions:
+    """
+    Registry of the options in COMMENTS_INK_APP_MODEL_OPTIONS, merged with
+    the defaults once. The options of each 'app_label.model' are the
+    'default' ones, updated with the ones given for the 'app_label.model'.
+
+    Options are read-only mappings, looked up by content type id, and the
+    functions in 'check_input_allowed' are imported when the registry is
+    built.
+    """
+
+    def __init__(self, app_model_options):
+        self.source = app_model_options
+        default = dict(COMMENTS_INK_APP_MODEL_OPTIONS["default"])
+        default.update(app_model_options.get("default", {}))
+        self.default = MappingProxyType(default)
+        self.by_app_model = {
+            app_model: MappingProxyType(dict(default, **options))
+            for app_model, options in app_model_options.items()
+            if app_model != "default"
+        }
+        self.by_content_type_id = {}
+        for options in [self.default, *self.by_app_model.values()]:
+            get_check_input_allowed(options["check_input_allowed"])
+
+    def get(self, content_type=None):
+        if content_type == None:
+            return self.default
+        try:
+            return self.by_content_type_id[content_type.pk]
+        except KeyError:
+            pass
+        key = "%s.%s" % (content_type.app_label, content_type.model)
+        options = self.by_app_model.get(key, self.default)
+        self.by_content_type_id[content_type.pk] = options
+        return options
+
+
+_app_model_options = None
+_check_input_allowed_funcs = {}
+
+
+def get_app_model_options_registry():
+    """
+    Returns the AppModelOptions of the current value of the setting
+    COMMENTS_INK_APP_MODEL_OPTIONS, building it when the setting changes.
+    """
+    global _app_model_options
+    registry = _app_model_options
+    source = settings.COMMENTS_INK_APP_MODEL_OPTIONS
+    if registry == None or registry.source is not source:
+        registry = _app_model_options = AppModelOptions(source)
+    return registry
+
+
+def on_app_model_options_changed(setting, value, **kwargs):
+    # django_comments_ink.conf.settings holds a copy of the settings,
+    # update it for override_settings, and rebuild the registry.
+    # Connected to setting_changed in CommentsInkConfig.ready.
+    global _app_model_options
+    if setting == "COMMENTS_INK_APP_MODEL_OPTIONS":
+        if value == None:
+            value = COMMENTS_INK_APP_MODEL_OPTIONS
+        setattr(settings, setting, value)
+        _app_model_options = None
+
+
 def get_app_model_options(comment=None, content_type=None):
     """
     Get the app_model_option from COMMENTS_INK_APP_MODEL_OPTIONS.
 
-    If a comment is given, the content_type is extracted from it. Otherwise,
+    If a comment is given, the content_type is taken from it. Otherwise,
     the content_type kwarg has to be provided. Checks whether there is a
     matching dictionary for the app_label.model of the content_type, and
-    returns it. Otherwise it returns the default from:
+    returns it, updating the default options. Otherwise it returns the
+    default from:
 
-        `django_comments_ink.conf.defaults.COMMENTS_INK_APP_MODEL_OPTIONS`.
+        `django_comments_ink.conf.defaults.COMMENTS_INK_APP_MODEL_OPTIONS`,
 
+    updated with the 'default' entry of the setting, if any. The dictionary
+    returned is a copy, that callers can modify.
     """
-    defaults_options = dict.copy(COMMENTS_INK_APP_MODEL_OPTIONS)
-    settings_options = dict.copy(settings.COMMENTS_INK_APP_MODEL_OPTIONS)
-    if defaults_options != settings_options and "default" in settings_options:
-        defaults_options["default"].update(settings_options.pop("default"))
-
-    model_app_options = {}
-    for app_model in settings_options.keys():
-        for k in defaults_options["default"].keys():
-            if k not in settings_options[app_model]:
-                model_app_options[k] = defaults_options["default"][k]
-            else:
-                model_app_options[k] = settings_options[app_model][k]
-
     if comment:
-        content_type = ContentType.objects.get_for_model(comment.content_object)
-        key = "%s.%s" % (content_type.app_label, content_type.model)
-    elif content_type:
-        key = "%s.%s" % (content_type.app_label, content_type.model)
-    else:
-        return defaults_options["default"]
+        content_type = comment.content_type
+    return dict(get_app_model_options_registry().get(content_type))
+
+
+def get_check_input_allowed(path):
+    """
+    Returns the function in the given dotted path, the value of the option
+    'check_input_allowed', importing it only the first time.
+    """
     try:
-        model_app_options.update(settings.COMMENTS_INK_APP_MODEL_OPTIONS[key])
-        return model_app_options
-    except Exception:
-        return model_app_options
+        return _check_input_allowed_funcs[path]
+    except KeyError:
+        func = _check_input_allowed_funcs[path] = import_string(path)
+        return func
 
 
 option_msgs = {
@@ -164,7 +279,7 @@ def check_option(option, comment=None, content_type=None, options=None):
         if settings.DEBUG:
             app_label, model = "", ""
             if comment:
-                ct = ContentType.objects.get_for_model(comment.content_object)
+                ct = comment.content_type
                 app_label, model = ct.app_label, ct.model
             if content_type:
                 app_label, model = content_type.app_label, content_type.model
@@ -270,6 +385,9 @@ def get_comment_page_number(request, comment, comments_folded=None):
         ctype_pk=comment.content_type.pk,
         object_pk=comment.object_pk,
         site_id=site_id,
+        gen=caching.get_generation(
+            comment.content_type.pk, comment.object_pk, site_id
+        ),
     )
 
     paginator = CommentsPaginator(
@@ -280,11 +398,14 @@ def get_comment_page_number(request, comment, comments_folded=None):
         cache_key_prefix=ckey_prefix,
     )
 
-    for page_number in range(1, paginator.num_pages + 1):
-        page = paginator.page(page_number)
-        if comment.pk in [cm.id for cm in page.object_list]:
-            return page_number
-    raise Exception("Comment %d not listed in any page." % comment.pk)
+    # The layout of the paginator knows the page of every thread, so there
+    # is no need to go through the pages looking for the comment.
+    page_number = None
+    if qs.filter(pk=comment.pk).exists():
+        page_number = paginator.layout.get_page_number(comment.thread_id)
+    if page_number == None or page_number > paginator.num_pages:
+        raise Exception("Comment %d not listed in any page." % comment.pk)
+    return page_number
 
 
 def does_theme_dir_exist(theme_dir):
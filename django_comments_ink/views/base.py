@@ -6,13 +6,12 @@ from django.http import Http404, JsonResponse
 from django.shortcuts import get_object_or_404, resolve_url
 from django.template import loader
 from django.utils.http import url_has_allowed_host_and_scheme
-from django.utils.module_loading import import_string
 from django.utils.translation import gettext_lazy as _
 from django.views.generic import DetailView
 from django.views.generic.base import RedirectView
 
 from django_comments_ink import get_model as get_comment_model
-from django_comments_ink import signed, utils
+from django_comments_ink import tokens, utils
 from django_comments_ink.conf import settings
 from django_comments_ink.models import InkComment, TmpInkComment
 from django_comments_ink.views.templates import theme_dir
@@ -186,7 +185,7 @@ class SingleCommentView(CommentsParamsMixin, JsonResponseMixin, DetailView):
             utils.check_option(self.check_option, options=self.options)
 
         check_input_allowed_str = self.options.pop("check_input_allowed")
-        check_func = import_string(check_input_allowed_str)
+        check_func = utils.get_check_input_allowed(check_input_allowed_str)
         target_obj = comment.content_type.get_object_for_this_type(
             pk=comment.object_pk
         )
@@ -233,9 +232,15 @@ class SingleTmpCommentView(DetailView):
         "get",
     ]
     template_list = None
+    # Kind of token expected in the URL, tokens.CONFIRM or tokens.MUTE.
+    token_kind = None
 
     def get_object(self, key):
-        return signed.loads(str(key), extra_key=settings.COMMENTS_INK_SALT)
+        return tokens.loads(
+            str(key),
+            extra_key=settings.COMMENTS_INK_SALT,
+            expected_kind=self.token_kind,
+        )
 
     def get_template_names(self):
         if self.template_list is None:
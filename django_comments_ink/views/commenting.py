@@ -2,6 +2,7 @@ from django import http
 from django.apps import apps
 from django.contrib.auth import REDIRECT_FIELD_NAME
 from django.contrib.auth.views import redirect_to_login
+from django.contrib.sites.models import Site
 from django.contrib.sites.shortcuts import get_current_site
 from django.core import signing
 from django.core.exceptions import (
@@ -9,11 +10,12 @@ from django.core.exceptions import (
     ObjectDoesNotExist,
     ValidationError,
 )
-from django.db.utils import NotSupportedError
+from django.db import connection, transaction
 from django.shortcuts import render, resolve_url
 from django.template.loader import get_template
 from django.urls import reverse
 from django.utils.decorators import method_decorator
+from django.utils.crypto import get_random_string
 from django.utils.html import escape
 from django.utils.translation import gettext_lazy as _
 from django.views.decorators.csrf import csrf_protect
@@ -24,7 +26,7 @@ from django_comments.signals import comment_was_posted, comment_will_be_posted
 from django_comments.views.comments import CommentPostBadRequest
 
 from django_comments_ink import get_form, get_model
-from django_comments_ink import signals, signed, utils
+from django_comments_ink import outbox, signals, signed, tokens, utils
 from django_comments_ink.conf import settings
 from django_comments_ink.models import (
     MaxThreadLevelExceededException,
@@ -88,6 +90,27 @@ def send_email_confirmation_request(
     )
 
 
+def request_comment_confirmation(comment, key, site):
+    """
+    Sends the email requesting the confirmation of a comment, or writes it
+    to the outbox when COMMENTS_INK_OUTBOX is True.
+    """
+    if outbox.is_enabled():
+        payload = {"key": key.decode("utf-8"), "site_id": site.pk}
+        outbox.enqueue("confirmation_request", payload)
+    else:
+        send_email_confirmation_request(comment, key, site)
+
+
+def send_queued_confirmation_request(payload):
+    key = payload["key"].encode("utf-8")
+    comment = tokens.loads(
+        key, extra_key=settings.COMMENTS_INK_SALT, expected_kind=tokens.CONFIRM
+    )
+    site = Site.objects.get(pk=payload["site_id"])
+    send_email_confirmation_request(comment, key, site)
+
+
 # ---------------------------------------------------------------------
 def get_comment_if_exists(comment: TmpInkComment):
     """
@@ -116,73 +139,105 @@ def create_comment(tmp_comment):
 
 
 # ---------------------------------------------------------------------
-def notify_comment_followers(comment):
-    followers = {}
-    kwargs = {
-        "content_type": comment.content_type,
-        "object_pk": comment.object_pk,
-        "is_public": True,
-        "followup": True,
-    }
-    previous_comments = InkComment.objects.filter(**kwargs).exclude(
-        user_email=comment.user_email
+def get_comment_followers(comment):
+    """
+    Returns a list of TmpInkComment, one per user following the thread of
+    `comment`, with the fields needed to create a mute token. It runs one
+    query.
+    """
+    qs = (
+        InkComment.norel_objects.filter(
+            content_type=comment.content_type,
+            object_pk=comment.object_pk,
+            is_public=True,
+            followup=True,
+        )
+        .exclude(user_email=comment.user_email)
+        .order_by("user_email")
     )
-
-    def feed_followers(gen):
-        for instance in gen:
-            followers[instance.user_email] = (
-                instance.user_name,
-                signed.dumps(
-                    instance,
-                    compress=True,
-                    extra_key=settings.COMMENTS_INK_SALT,
-                ),
+    fields = ("object_pk", "user_name", "user_email", "followup", "submit_date")
+    if connection.features.can_distinct_on_fields:
+        qs = qs.distinct("user_email")
+    followers = {}
+    for values in qs.values(*fields):
+        if values["user_email"] not in followers:
+            followers[values["user_email"]] = TmpInkComment(
+                values, content_type=comment.content_type
             )
+    return list(followers.values())
 
-    try:
-        gen = previous_comments.distinct("user_email").order_by("user_email")
-        feed_followers(gen)
-    except NotSupportedError:
-        feed_followers(previous_comments)
-
-    for instance in previous_comments:
-        followers[instance.user_email] = (
-            instance.user_name,
-            signed.dumps(
-                instance, compress=True, extra_key=settings.COMMENTS_INK_SALT
-            ),
-        )
 
-    subject = _("new comment posted")
-    text_message_template = get_template("comments/email_followup_comment.txt")
+def notify_comment_followers(comment):
+    """
+    Sends the follow-up notifications of a new comment once the transaction
+    is committed, or writes them to the outbox when COMMENTS_INK_OUTBOX is
+    True.
+    """
+    if outbox.is_enabled():
+        outbox.enqueue("followup_notifications", {"comment_id": comment.pk})
+    else:
+        # Sent once the comment is committed, so that mails don't hold the
+        # transaction open, nor go out for comments that are rolled back.
+        transaction.on_commit(lambda: send_followup_notifications(comment))
+
+
+def send_queued_followup_notifications(payload):
+    try:
+        comment = InkComment.objects.get(pk=payload["comment_id"])
+    except InkComment.DoesNotExist:
+        return  # The comment has been removed since.
+    send_followup_notifications(comment)
+
+
+def send_followup_notifications(comment):
+    followers = get_comment_followers(comment)
+    if not len(followers):
+        return
+
+    # Templates are rendered once. The name of the follower and the key of
+    # the mute URL replace their placeholders in the message to each one.
+    placeholders = {
+        "user_name": "dci-user-name-%s" % get_random_string(12),
+        "key": "dci-key-%s" % get_random_string(12),
+    }
+    message_context = {
+        "user_name": placeholders["user_name"],
+        "comment": comment,
+        "content_object": comment.content_object,
+        "mute_url": reverse("comments-ink-mute", args=[placeholders["key"]]),
+        "site": comment.site,
+    }
+    text_template = get_template("comments/email_followup_comment.txt")
+    text_message = text_template.render(message_context)
+    html_message = None
     if settings.COMMENTS_INK_SEND_HTML_EMAIL:
-        html_message_template = get_template(
-            "comments/email_followup_comment.html"
-        )
+        html_template = get_template("comments/email_followup_comment.html")
+        html_message = html_template.render(message_context)
+    subject = str(_("new comment posted"))
+
+    def substitute(message, values):
+        for field, value in values.items():
+            message = message.replace(placeholders[field], value)
+        return message
+
+    def messages():
+        for follower in followers:
+            key = tokens.dumps(
+                follower, kind=tokens.MUTE, extra_key=settings.COMMENTS_INK_SALT
+            )
+            values = {
+                "user_name": escape(follower.user_name),
+                "key": key.decode("utf-8"),
+            }
+            yield utils.get_message(
+                subject,
+                substitute(text_message, values),
+                settings.COMMENTS_INK_FROM_EMAIL,
+                [follower.user_email],
+                html=html_message and substitute(html_message, values),
+            )
 
-    for email, (name, key) in followers.items():
-        mute_url = reverse("comments-ink-mute", args=[key.decode("utf-8")])
-        message_context = {
-            "user_name": name,
-            "comment": comment,
-            "content_object": comment.content_object,
-            "mute_url": mute_url,
-            "site": comment.site,
-        }
-        text_message = text_message_template.render(message_context)
-        if settings.COMMENTS_INK_SEND_HTML_EMAIL:
-            html_message = html_message_template.render(message_context)
-        else:
-            html_message = None
-        utils.send_mail(
-            subject,
-            text_message,
-            settings.COMMENTS_INK_FROM_EMAIL,
-            [
-                email,
-            ],
-            html=html_message,
-        )
+    utils.send_messages(messages())
 
 
 def confirm(
@@ -192,8 +247,10 @@ def confirm(
     template_moderated=themed_templates("moderated"),
 ):
     try:
-        tmp_comment = signed.loads(
-            str(key), extra_key=settings.COMMENTS_INK_SALT
+        tmp_comment = tokens.loads(
+            str(key),
+            extra_key=settings.COMMENTS_INK_SALT,
+            expected_kind=tokens.CONFIRM,
         )
     except (ValueError, signed.BadSignature) as exc:
         return bad_request(request, exc)
@@ -220,7 +277,13 @@ def confirm(
         if response is False:
             return render(request, template_discarded, {"comment": tmp_comment})
 
-    comment = create_comment(tmp_comment)
+    # The notifications are written to the outbox with the comment, or sent
+    # after it's committed.
+    with transaction.atomic():
+        comment = create_comment(tmp_comment)
+        if comment.is_public:
+            notify_comment_followers(comment)
+
     if comment.is_public is False:
         template_list = [
             pth.format(
@@ -232,7 +295,6 @@ def confirm(
         ]
         return render(request, template_list, {"comment": comment})
     else:
-        notify_comment_followers(comment)
         if getattr(settings, "COMMENTS_INK_COMMENTS_PER_PAGE", 0) == 0:
             return utils.redirect_to(comment, comments_page=1)
         else:
@@ -323,19 +385,18 @@ def on_comment_was_posted(sender, comment, request, **kwargs):
 
     if not settings.COMMENTS_INK_CONFIRM_EMAIL or user_is_authenticated:
         if get_comment_if_exists(comment) is None:
-            new_comment = create_comment(comment)
-            comment.ink_comment = new_comment
-            signals.confirmation_received.send(
-                sender=TmpInkComment, comment=comment, request=request
-            )
-            if comment.is_public:
-                notify_comment_followers(new_comment)
+            with transaction.atomic():
+                new_comment = create_comment(comment)
+                comment.ink_comment = new_comment
+                signals.confirmation_received.send(
+                    sender=TmpInkComment, comment=comment, request=request
+                )
+                if comment.is_public:
+                    notify_comment_followers(new_comment)
     else:
-        key = signed.dumps(
-            comment, compress=True, extra_key=settings.COMMENTS_INK_SALT
-        )
+        key = tokens.dumps(comment, extra_key=settings.COMMENTS_INK_SALT)
         site = get_current_site(request)
-        send_email_confirmation_request(comment, key, site)
+        request_comment_confirmation(comment, key, site)
 
 
 comment_was_posted.connect(on_comment_was_posted, sender=TmpInkComment)
@@ -3,7 +3,7 @@ from django.http import Http404
 from django.utils.translation import gettext_lazy as _
 from django.views.defaults import bad_request
 
-from django_comments_ink import signals, signed
+from django_comments_ink import signals, signed, tokens
 from django_comments_ink.models import InkComment
 from django_comments_ink.views.base import SingleTmpCommentView
 from django_comments_ink.views.commenting import get_comment_if_exists
@@ -12,6 +12,7 @@ from django_comments_ink.views.templates import themed_templates
 
 class MuteCommentView(SingleTmpCommentView):
     template_list = themed_templates("muted")
+    token_kind = tokens.MUTE
 
     def get_object(self, key):
         tmp_comment = super().get_object(key)
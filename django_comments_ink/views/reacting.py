@@ -9,7 +9,6 @@ from django.db.models import F
 from django.http import Http404, HttpResponseRedirect
 from django.shortcuts import get_object_or_404
 from django.utils.decorators import method_decorator
-from django.utils.module_loading import import_string
 from django.utils.translation import gettext_lazy as _
 from django.views.decorators.csrf import csrf_protect
 from django.views.generic import DetailView, ListView
@@ -93,10 +92,9 @@ class ReactToCommentView(SingleCommentView):
             comment=self.object, authors=request.user
         )
 
+        reactions_enum = get_comment_reactions_enum()
         for reaction_obj in user_reactions_qs:
-            user_reactions.append(
-                get_comment_reactions_enum()(reaction_obj.reaction)
-            )
+            user_reactions.append(reactions_enum(reaction_obj.reaction))
 
         context = self.get_context_data(
             user_reactions=user_reactions, next=next
@@ -229,7 +227,7 @@ class ReactToObjectView(CommentsParamsMixin, JsonResponseMixin, DetailView):
         utils.check_option(self.check_option, content_type=content_type)
         options = utils.get_app_model_options(content_type=content_type)
         check_input_allowed_str = options.pop("check_input_allowed")
-        check_func = import_string(check_input_allowed_str)
+        check_func = utils.get_check_input_allowed(check_input_allowed_str)
         target_obj = content_type.get_object_for_this_type(pk=object_pk)
         self.is_input_allowed = check_func(target_obj)
 
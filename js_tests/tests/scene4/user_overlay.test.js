@@ -0,0 +1,51 @@
+import path from 'path';
+
+import '@testing-library/jest-dom/extend-expect';
+import { JSDOM, ResourceLoader } from 'jsdom';
+
+
+const html_path = path.resolve(__dirname, './index.html');
+
+let dom;
+let container;
+
+describe("scene 4 - user_overlay.test.js module", () => {
+    beforeEach(async () => {
+        const resourceLoader = new ResourceLoader({
+            proxy: "http://localhost:3000",
+            strictSSL: false
+        });
+        const opts = { runScripts: "dangerously", resources: resourceLoader };
+        dom = await JSDOM.fromFile(html_path, opts);
+        await new Promise(resolve => {
+            dom.window.addEventListener("DOMContentLoaded", () => {
+                container = dom.window.document.body;
+                resolve();
+            });
+        });
+    });
+
+    it("keeps the overlay in window.djCommentsInk.user_overlay", () => {
+        const overlay = dom.window.djCommentsInk.user_overlay;
+        expect(overlay).not.toBe(undefined);
+        expect(overlay.votes).toEqual({"29": "+"});
+        expect(overlay.flags).toEqual([29]);
+    });
+
+    it("replaces the votes of the comment with the user's", () => {
+        const votes_el = container.querySelector("#cm-votes-29");
+        const vote_up_el = votes_el.querySelector(".vote-up");
+        expect(vote_up_el).toHaveClass("active");
+        expect(vote_up_el.getAttribute("title")).toBe("You voted up");
+        const vote_down_el = votes_el.querySelector(".vote-down");
+        expect(vote_down_el).not.toHaveClass("active");
+    });
+
+    it("replaces the flag of the comment with the user's", () => {
+        const flags_el = container.querySelector("#cm-flags-29");
+        const tooltip_el = flags_el.querySelector(".tooltip");
+        expect(tooltip_el.textContent).toBe(
+            "You have flagged this comment as inappropriate"
+        );
+    });
+});